@@ -18,6 +18,11 @@ import time
 import numpy as np
 np.set_printoptions(precision=5, linewidth=200, suppress=True)
 import psi4
+import os
+import sys
+dirname = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(dirname, '../Response-Theory/Self-Consistent-Field'))
+from helper_CPHF import helper_CPHF
 
 # Memory for Psi4 in GB
 psi4.core.set_output_file('output.dat', False)
@@ -25,6 +30,10 @@ psi4.core.set_output_file('output.dat', False)
 # Memory for numpy in GB
 numpy_memory = 2
 
+# Number of singlet and triplet states, found by the Davidson solver of helper_CPHF
+# with sigma vectors from J/K builds, without the determinant Hamiltonian
+nroot = 5
+
 mol = psi4.geometry("""
 O
 H 1 1.1
@@ -44,82 +53,19 @@ t = time.time()
 # First compute SCF energy using Psi4
 scf_e, wfn = psi4.energy('SCF', return_wfn=True)
 
-# Grab data from wavfunction class
-C = wfn.Ca()
-ndocc = wfn.doccpi()[0]
-nmo = wfn.nmo()
-nvirt = nmo - ndocc
-nDet_S = ndocc * nvirt * 2
-
-# Compute size of SO-ERI tensor in GB
-ERI_Size = (nmo**4) * 128e-9
-print('\nSize of the SO ERI tensor will be %4.2f GB.' % ERI_Size)
-memory_footprint = ERI_Size * 5.2
-if memory_footprint > numpy_memory:
-    clean()
-    raise Exception("Estimated memory utilization (%4.2f GB) exceeds numpy_memory \
-                    limit of %4.2f GB." % (memory_footprint, numpy_memory))
-
-# Integral generation from Psi4's MintsHelper
-t = time.time()
-mints = psi4.core.MintsHelper(wfn.basisset())
-H = np.asarray(mints.ao_kinetic()) + np.asarray(mints.ao_potential())
-
-print('\nTotal time taken for ERI integrals: %.3f seconds.\n' % (time.time() - t))
-
-#Make spin-orbital MO
-print('Starting AO -> spin-orbital MO transformation...')
-t = time.time()
-MO = np.asarray(mints.mo_spin_eri(C, C))
-
-# Update H, transform to MO basis and tile for alpha/beta spin
-H = np.einsum('uj,vi,uv', C, C, H)
-H = np.repeat(H, 2, axis=0)
-H = np.repeat(H, 2, axis=1)
-
-# Make H block diagonal
-spin_ind = np.arange(H.shape[0], dtype=np.int) % 2
-H *= (spin_ind.reshape(-1, 1) == spin_ind)
-
-print('..finished transformation in %.3f seconds.\n' % (time.time() - t))
-
-from helper_CI import Determinant, HamiltonianGenerator
-from itertools import combinations
-
-print('Generating %d CIS singlet Determinants...' % (nDet_S + 1))
-t = time.time()
-
-occList = [i for i in range(ndocc)]
-det_ref = Determinant(alphaObtList=occList, betaObtList=occList)
-detList = det_ref.generateSingleExcitationsOfDet(nmo)
-detList.append(det_ref)
-
-print('..finished generating determinants in %.3f seconds.\n' % (time.time() - t))
-
-print('Generating Hamiltonian Matrix...')
-
-t = time.time()
-Hamiltonian_generator = HamiltonianGenerator(H, MO)
-Hamiltonian_matrix = Hamiltonian_generator.generateMatrix(detList)
-
-print('..finished generating Matrix in %.3f seconds.\n' % (time.time() - t))
-
-print('Diagonalizing Hamiltonian Matrix...')
-
-t = time.time()
-
-e_cis, wavefunctions = np.linalg.eigh(Hamiltonian_matrix)
-print('..finished diagonalization in %.3f seconds.\n' % (time.time() - t))
+hartree2eV = 27.211
 
-print('# Determinants:     % 16d' % (len(detList)))
+helper = helper_CPHF(mol, numpy_memory=numpy_memory, scf_wfn=wfn)
 
 print('SCF energy:         % 16.10f' % (scf_e))
 
-hartree2eV = 27.211
+for multiplicity, triplet in (('Singlets', False), ('Triplets', True)):
+    t = time.time()
+    e_cis = helper.solve_excitations(nroot, tda=True, triplet=triplet)
+    print('..finished Davidson in %.3f seconds.\n' % (time.time() - t))
 
-print('\nCIS Excitation Energies (Singlets only):')
-print(' #        Hartree                  eV')
-print('--  --------------------  --------------------')
-for i in range(1, len(e_cis)):
-    excit_e = e_cis[i] + mol.nuclear_repulsion_energy() - scf_e
-    print('%2d %20.10f %20.10f' % (i, excit_e, excit_e * hartree2eV))
+    print('\nCIS Excitation Energies (%s):' % multiplicity)
+    print(' #        Hartree                  eV')
+    print('--  --------------------  --------------------')
+    for i, excit_e in enumerate(e_cis):
+        print('%2d %20.10f %20.10f' % (i + 1, excit_e, excit_e * hartree2eV))
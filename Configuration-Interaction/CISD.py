@@ -20,6 +20,11 @@ import psi4
 # Check energy against psi4?
 compare_psi4 = True
 
+# Hamiltonian builder: 'bitstring' uses the vectorized uint64 bitstring engine
+# and a sparse eigensolver, 'dense' the determinant-pair loop and np.linalg.eigh,
+# 'direct' never stores H and runs Davidson on matrix-free sigma vectors
+ci_algorithm = 'bitstring'
+
 # Memory for Psi4 in GB
 # psi4.core.set_memory(int(2e9), False)
 psi4.core.set_output_file('output.dat', False)
@@ -54,8 +59,8 @@ nDet_S = ndocc * nvirt * 2
 nDet_D = 2 * comb(ndocc, 2) * comb(nvirt, 2) + ndocc**2 * nvirt**2
 nDet = 1 + nDet_S + nDet_D
 H_Size = nDet**2 * 8e-9
-print('\nSize of the Hamiltonian Matrix will be %4.2f GB.' % H_Size)
-if H_Size > numpy_memory:
+print('\nSize of the dense Hamiltonian Matrix will be %4.2f GB.' % H_Size)
+if (ci_algorithm == 'dense') and (H_Size > numpy_memory):
     clean()
     raise Exception("Estimated memory utilization (%4.2f GB) exceeds numpy_memory \
                     limit of %4.2f GB." % (H_Size, numpy_memory))
@@ -83,7 +88,8 @@ H *= (spin_ind.reshape(-1, 1) == spin_ind)
 
 print('..finished transformation in %.3f seconds.\n' % (time.time() - t))
 
-from helper_CI import Determinant, HamiltonianGenerator
+from helper_CI import Determinant, HamiltonianGenerator, BitstringHamiltonianGenerator
+from helper_CI import SigmaGenerator, davidsonSolver
 from itertools import combinations
 
 print('Generating %d CISD Determinants...' % (nDet))
@@ -96,20 +102,37 @@ detList.append(det_ref)
 
 print('..finished generating determinants in %.3f seconds.\n' % (time.time() - t))
 
-print('Generating Hamiltonian Matrix...')
+if ci_algorithm == 'direct':
+    print('Solving for the lowest root with matrix-free sigma vectors...')
 
-t = time.time()
-Hamiltonian_generator = HamiltonianGenerator(H, MO)
-Hamiltonian_matrix = Hamiltonian_generator.generateMatrix(detList)
+    t = time.time()
+    sigma_generator = SigmaGenerator(H, MO, detList)
+    e_cisd, wavefunctions = davidsonSolver(sigma_generator.sigma, sigma_generator.Hd, nroot=1,
+                                           e_shift=mol.nuclear_repulsion_energy())
+    print('..finished Davidson iterations in %.3f seconds.\n' % (time.time() - t))
 
-print('..finished generating Matrix in %.3f seconds.\n' % (time.time() - t))
+else:
+    print('Generating Hamiltonian Matrix...')
 
-print('Diagonalizing Hamiltonian Matrix...')
+    t = time.time()
+    if ci_algorithm == 'bitstring':
+        Hamiltonian_generator = BitstringHamiltonianGenerator(H, MO)
+    else:
+        Hamiltonian_generator = HamiltonianGenerator(H, MO)
+    Hamiltonian_matrix = Hamiltonian_generator.generateMatrix(detList)
 
-t = time.time()
+    print('..finished generating Matrix in %.3f seconds.\n' % (time.time() - t))
+
+    print('Diagonalizing Hamiltonian Matrix...')
+
+    t = time.time()
 
-e_cisd, wavefunctions = np.linalg.eigh(Hamiltonian_matrix)
-print('..finished diagonalization in %.3f seconds.\n' % (time.time() - t))
+    if ci_algorithm == 'bitstring':
+        from scipy.sparse.linalg import eigsh
+        e_cisd, wavefunctions = eigsh(Hamiltonian_matrix, k=1, which='SA')
+    else:
+        e_cisd, wavefunctions = np.linalg.eigh(Hamiltonian_matrix)
+    print('..finished diagonalization in %.3f seconds.\n' % (time.time() - t))
 
 cisd_mol_e = e_cisd[0] + mol.nuclear_repulsion_energy()
 
@@ -23,6 +23,12 @@ import psi4
 # Check energy against psi4?
 compare_psi4 = True
 
+# Hamiltonian builder: 'bitstring' uses the vectorized uint64 bitstring engine
+# and a sparse eigensolver, 'dense' the determinant-pair loop and np.linalg.eigh,
+# 'direct' never stores H and runs Davidson on matrix-free sigma vectors,
+# 'string' runs Davidson on string-driven (Knowles-Handy) sigma vectors
+ci_algorithm = 'bitstring'
+
 # Memory for Psi4 in GB
 # psi4.core.set_memory(int(2e9), False)
 psi4.core.set_output_file('output.dat', False)
@@ -58,8 +64,12 @@ nmo = wfn.nmo()
 from scipy.special import comb
 nDet = comb(nmo, ndocc)**2
 H_Size = nDet**2 * 8e-9
-print('\nSize of the Hamiltonian Matrix will be %4.2f GB.' % H_Size)
-if H_Size > numpy_memory:
+print('\nSize of the dense Hamiltonian Matrix will be %4.2f GB.' % H_Size)
+# The string-driven sigma keeps the nmo^2 * nDet intermediates D and G
+if ci_algorithm == 'string':
+    H_Size = 2 * nmo**2 * nDet * 8e-9
+    print('Size of the string-driven sigma intermediates will be %4.2f GB.' % H_Size)
+if (ci_algorithm in ['dense', 'string']) and (H_Size > numpy_memory):
     clean()
     raise Exception("Estimated memory utilization (%4.2f GB) exceeds numpy_memory \
                     limit of %4.2f GB." % (H_Size, numpy_memory))
@@ -87,36 +97,65 @@ H *= (spin_ind.reshape(-1, 1) == spin_ind)
 
 print('..finished transformation in %.3f seconds.\n' % (time.time() - t))
 
-from helper_CI import Determinant, HamiltonianGenerator
+from helper_CI import Determinant, HamiltonianGenerator, BitstringHamiltonianGenerator
+from helper_CI import SigmaGenerator, StringFCI, davidsonSolver
 from itertools import combinations
 
-print('Generating %d Full CI Determinants...' % (nDet))
-t = time.time()
-detList = []
-for alpha in combinations(range(nmo), ndocc):
-    for beta in combinations(range(nmo), ndocc):
-        detList.append(Determinant(alphaObtList=alpha, betaObtList=beta))
+# The string engine addresses determinants through its alpha and beta strings
+if ci_algorithm != 'string':
+    print('Generating %d Full CI Determinants...' % (nDet))
+    t = time.time()
+    detList = []
+    for alpha in combinations(range(nmo), ndocc):
+        for beta in combinations(range(nmo), ndocc):
+            detList.append(Determinant(alphaObtList=alpha, betaObtList=beta))
 
-print('..finished generating determinants in %.3f seconds.\n' % (time.time() - t))
+    print('..finished generating determinants in %.3f seconds.\n' % (time.time() - t))
 
-print('Generating Hamiltonian Matrix...')
+if ci_algorithm == 'string':
+    print('Solving for the lowest root with string-driven sigma vectors...')
 
-t = time.time()
-Hamiltonian_generator = HamiltonianGenerator(H, MO)
-Hamiltonian_matrix = Hamiltonian_generator.generateMatrix(detList)
+    t = time.time()
+    string_fci = StringFCI(H, MO, ndocc, ndocc)
+    e_fci, wavefunctions = davidsonSolver(string_fci.sigma, string_fci.Hd, nroot=1,
+                                          e_shift=mol.nuclear_repulsion_energy())
+    print('..finished Davidson iterations in %.3f seconds.\n' % (time.time() - t))
 
-print('..finished generating Matrix in %.3f seconds.\n' % (time.time() - t))
+elif ci_algorithm == 'direct':
+    print('Solving for the lowest root with matrix-free sigma vectors...')
 
-print('Diagonalizing Hamiltonian Matrix...')
+    t = time.time()
+    sigma_generator = SigmaGenerator(H, MO, detList)
+    e_fci, wavefunctions = davidsonSolver(sigma_generator.sigma, sigma_generator.Hd, nroot=1,
+                                          e_shift=mol.nuclear_repulsion_energy())
+    print('..finished Davidson iterations in %.3f seconds.\n' % (time.time() - t))
 
-t = time.time()
+else:
+    print('Generating Hamiltonian Matrix...')
+
+    t = time.time()
+    if ci_algorithm == 'bitstring':
+        Hamiltonian_generator = BitstringHamiltonianGenerator(H, MO)
+    else:
+        Hamiltonian_generator = HamiltonianGenerator(H, MO)
+    Hamiltonian_matrix = Hamiltonian_generator.generateMatrix(detList)
+
+    print('..finished generating Matrix in %.3f seconds.\n' % (time.time() - t))
+
+    print('Diagonalizing Hamiltonian Matrix...')
+
+    t = time.time()
 
-e_fci, wavefunctions = np.linalg.eigh(Hamiltonian_matrix)
-print('..finished diagonalization in %.3f seconds.\n' % (time.time() - t))
+    if ci_algorithm == 'bitstring':
+        from scipy.sparse.linalg import eigsh
+        e_fci, wavefunctions = eigsh(Hamiltonian_matrix, k=1, which='SA')
+    else:
+        e_fci, wavefunctions = np.linalg.eigh(Hamiltonian_matrix)
+    print('..finished diagonalization in %.3f seconds.\n' % (time.time() - t))
 
 fci_mol_e = e_fci[0] + mol.nuclear_repulsion_energy()
 
-print('# Determinants:     % 16d' % (len(detList)))
+print('# Determinants:     % 16d' % (nDet))
 
 print('SCF energy:         % 16.10f' % (scf_e))
 print('FCI correlation:    % 16.10f' % (fci_mol_e - scf_e))
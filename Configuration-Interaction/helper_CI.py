@@ -70,11 +70,12 @@ class Determinant:
     @staticmethod
     def countNumOrbitalsInBitsUpTo4(bits):
         """
-        Return the number of orbitals in this bits
+        Return the number of orbitals in this bits, counting stops after 5 so
+        any return value above 4 means "more than 4"
         """
 
         count = 0
-        while bits != 0 and count < 4:
+        while bits != 0 and count <= 4:
             if bits & 1 == 1:
                 count += 1
             bits >>= 1
@@ -493,3 +494,547 @@ class HamiltonianGenerator:
             for n in range(m + 1, length):
                 Relem += self.antiSym2eInt[spinObtList[m], spinObtList[n], spinObtList[m], spinObtList[n]]
         return Helem + Relem
+
+
+class BitstringHamiltonianGenerator:
+    """
+    class for CI matrix elements over packed uint64 determinant bitstrings
+
+    The determinant list is stored as two uint64 arrays (alpha and beta
+    strings).  Connected pairs are found with a vectorized popcount of the
+    XOR of the strings, and the matrix elements of every excitation class are
+    evaluated in bulk from precomputed sign and index arrays, so there is no
+    Python-level loop over determinant pairs.
+    """
+
+    # Masks for the SWAR popcount of 64-bit words
+    m1 = np.uint64(0x5555555555555555)
+    m2 = np.uint64(0x3333333333333333)
+    m4 = np.uint64(0x0f0f0f0f0f0f0f0f)
+    h01 = np.uint64(0x0101010101010101)
+
+    def __init__(self, H_spin, mo_spin_eri, blockSize=1024):
+        """
+        Constructor for BitstringHamiltonianGenerator
+
+        blockSize is the number of determinant rows compared at once; the
+        temporaries of one block scale as blockSize * N_det.
+        """
+
+        self.Hspin = H_spin
+        self.antiSym2eInt = mo_spin_eri
+        self.blockSize = blockSize
+        self.nmo = H_spin.shape[0] // 2
+        if self.nmo > 64:
+            raise Exception("BitstringHamiltonianGenerator packs orbitals into uint64 strings, "
+                            "%d orbitals requested." % self.nmo)
+
+        # h_mm and <mn||mn> needed for the diagonal elements
+        self.HspinDiag = np.diag(H_spin).copy()
+        self.antiSymDiag = np.einsum('mnmn->mn', mo_spin_eri).copy()
+
+    @staticmethod
+    def packDeterminants(detList):
+        """
+        Return the alpha and beta strings of a list of Determinants as uint64 arrays
+        """
+
+        alpha = np.array([det.alphaObtBits for det in detList], dtype=np.uint64)
+        beta = np.array([det.betaObtBits for det in detList], dtype=np.uint64)
+        return alpha, beta
+
+    @staticmethod
+    def popcount(bits):
+        """
+        Return the number of set bits of every element of a uint64 array
+        """
+
+        cls = BitstringHamiltonianGenerator
+        bits = bits - ((bits >> np.uint64(1)) & cls.m1)
+        bits = (bits & cls.m2) + ((bits >> np.uint64(2)) & cls.m2)
+        bits = (bits + (bits >> np.uint64(4))) & cls.m4
+        return ((bits * cls.h01) >> np.uint64(56)).astype(np.int64)
+
+    @staticmethod
+    def countBitsBelow(bits, index):
+        """
+        Return the number of set bits of bits below the orbital index, elementwise
+        """
+
+        mask = (np.uint64(1) << index.astype(np.uint64)) - np.uint64(1)
+        return BitstringHamiltonianGenerator.popcount(bits & mask)
+
+    @staticmethod
+    def lowestBitIndex(bits):
+        """
+        Return the index of the lowest set bit of every (nonzero) element
+        """
+
+        lowest = bits & (~bits + np.uint64(1))
+        return BitstringHamiltonianGenerator.popcount(lowest - np.uint64(1))
+
+    @staticmethod
+    def twoBitIndices(bits):
+        """
+        Return the indices of the two set bits (lower, higher) of every element
+        """
+
+        low = BitstringHamiltonianGenerator.lowestBitIndex(bits)
+        high = BitstringHamiltonianGenerator.lowestBitIndex(bits ^ (np.uint64(1) << low.astype(np.uint64)))
+        return low, high
+
+    def occupationMatrix(self, alpha, beta):
+        """
+        Return the (N_det, 2 * nmo) spin-orbital occupations in mixed spin index order
+        """
+
+        shifts = np.arange(self.nmo, dtype=np.uint64)
+        occ = np.empty((alpha.shape[0], 2 * self.nmo))
+        occ[:, 0::2] = (alpha[:, None] >> shifts) & np.uint64(1)
+        occ[:, 1::2] = (beta[:, None] >> shifts) & np.uint64(1)
+        return occ
+
+    def findConnectedPairs(self, alpha, beta, start, stop):
+        """
+        Return row, column and the alpha/beta differing orbital counts of all
+        pairs in rows [start, stop) with row > column that differ by at most a
+        double excitation
+        """
+
+        da = self.popcount(alpha[start:stop, None] ^ alpha[None, :stop])
+        db = self.popcount(beta[start:stop, None] ^ beta[None, :stop])
+        lower = np.arange(start, stop)[:, None] > np.arange(stop)
+        I, J = np.nonzero(((da + db) <= 4) & lower)
+        return I + start, J, da[I, J], db[I, J]
+
+    def calcDiagonalElements(self, occ):
+        """
+        Calculate all diagonal matrix elements from the occupation matrix
+        """
+
+        return occ.dot(self.HspinDiag) + 0.5 * np.einsum('dm,dm->d', occ.dot(self.antiSymDiag), occ)
+
+    def calcSingleElements(self, bits1, bits2, spin, occ1):
+        """
+        Calculate matrix elements for pairs differing by one spin orbital of the given spin
+
+        bits1/bits2 are the strings of the excited spin and occ1 the occupation
+        matrix of the first determinants.
+        """
+
+        m = self.lowestBitIndex(bits1 & ~bits2)
+        p = self.lowestBitIndex(bits2 & ~bits1)
+        parity = self.countBitsBelow(bits1, m) + self.countBitsBelow(bits2, p)
+        sign = 1.0 - 2.0 * (parity % 2)
+        m = 2 * m + spin
+        p = 2 * p + spin
+
+        # sum_n <mn||pn> over the occupied orbitals of det1; the n = m term vanishes
+        nso = 2 * self.nmo
+        ar = np.arange(nso)
+        Relem = np.einsum('kn,kn->k', occ1, self.antiSym2eInt[m[:, None], ar, p[:, None], ar])
+        return sign * (self.Hspin[m, p] + Relem)
+
+    def calcDoubleElementsSameSpin(self, bits1, bits2, spin):
+        """
+        Calculate matrix elements for pairs differing by two spin orbitals of the same spin
+        """
+
+        m1, m2 = self.twoBitIndices(bits1 & ~bits2)
+        p1, p2 = self.twoBitIndices(bits2 & ~bits1)
+        parity = (self.countBitsBelow(bits1, m1) + self.countBitsBelow(bits1, m2) + self.countBitsBelow(bits2, p1) +
+                  self.countBitsBelow(bits2, p2))
+        sign = 1.0 - 2.0 * (parity % 2)
+        return sign * self.antiSym2eInt[2 * m1 + spin, 2 * m2 + spin, 2 * p1 + spin, 2 * p2 + spin]
+
+    def calcDoubleElementsMixedSpin(self, alpha1, alpha2, beta1, beta2):
+        """
+        Calculate matrix elements for pairs differing by one alpha and one beta spin orbital
+        """
+
+        ma = self.lowestBitIndex(alpha1 & ~alpha2)
+        pa = self.lowestBitIndex(alpha2 & ~alpha1)
+        mb = self.lowestBitIndex(beta1 & ~beta2)
+        pb = self.lowestBitIndex(beta2 & ~beta1)
+        parity = (self.countBitsBelow(alpha1, ma) + self.countBitsBelow(alpha2, pa) + self.countBitsBelow(beta1, mb) +
+                  self.countBitsBelow(beta2, pb))
+        sign = 1.0 - 2.0 * (parity % 2)
+        return sign * self.antiSym2eInt[2 * ma, 2 * mb + 1, 2 * pa, 2 * pb + 1]
+
+    def calcConnectedElements(self, alpha, beta, rows, cols, diffAlpha, diffBeta):
+        """
+        Calculate the off-diagonal matrix elements of the determinant pairs
+        (rows, cols), given the number of differing alpha and beta orbitals
+        """
+
+        values = np.zeros(rows.shape[0])
+
+        # Single excitations
+        for spin, mask, bits in ((0, (diffAlpha == 2) & (diffBeta == 0), alpha),
+                                 (1, (diffAlpha == 0) & (diffBeta == 2), beta)):
+            I, J = rows[mask], cols[mask]
+            values[mask] = self.calcSingleElements(bits[I], bits[J], spin, self.occupationMatrix(alpha[I], beta[I]))
+
+        # Same-spin double excitations
+        for spin, mask, bits in ((0, diffAlpha == 4, alpha), (1, diffBeta == 4, beta)):
+            I, J = rows[mask], cols[mask]
+            values[mask] = self.calcDoubleElementsSameSpin(bits[I], bits[J], spin)
+
+        # Opposite-spin double excitations
+        mask = (diffAlpha == 2) & (diffBeta == 2)
+        I, J = rows[mask], cols[mask]
+        values[mask] = self.calcDoubleElementsMixedSpin(alpha[I], alpha[J], beta[I], beta[J])
+        return values
+
+    def generateMatrix(self, detList):
+        """
+        Generate the CI Matrix as a scipy.sparse CSR matrix
+        """
+
+        import scipy.sparse
+
+        alpha, beta = self.packDeterminants(detList)
+        numDet = alpha.shape[0]
+
+        allRows, allCols, allValues = [], [], []
+        for start in range(0, numDet, self.blockSize):
+            stop = min(start + self.blockSize, numDet)
+            rows, cols, diffAlpha, diffBeta = self.findConnectedPairs(alpha, beta, start, stop)
+            values = self.calcConnectedElements(alpha, beta, rows, cols, diffAlpha, diffBeta)
+
+            nonzero = values != 0.0
+            rows, cols, values = rows[nonzero], cols[nonzero], values[nonzero]
+            allRows += [rows, cols]
+            allCols += [cols, rows]
+            allValues += [values, values]
+
+        diag = np.arange(numDet)
+        allRows = np.concatenate(allRows + [diag])
+        allCols = np.concatenate(allCols + [diag])
+        allValues = np.concatenate(allValues + [self.calcDiagonalElements(self.occupationMatrix(alpha, beta))])
+        return scipy.sparse.csr_matrix((allValues, (allRows, allCols)), shape=(numDet, numDet))
+
+
+class SigmaGenerator:
+    """
+    class for matrix-free sigma vectors (H c) over a list of Determinants
+
+    The connected determinants of every row are regenerated on the fly with
+    Determinant.generateSingleAndDoubleExcitationsOfDet and located through a
+    determinant -> index hash map, so H is never stored.  The matrix elements
+    of a batch of rows are evaluated together with the kernels of
+    BitstringHamiltonianGenerator.
+    """
+
+    def __init__(self, H_spin, mo_spin_eri, detList, batchSize=256):
+        """
+        Constructor for SigmaGenerator
+        """
+
+        self.elements = BitstringHamiltonianGenerator(H_spin, mo_spin_eri)
+        self.nmo = self.elements.nmo
+        self.detList = detList
+        self.numDet = len(detList)
+        self.batchSize = batchSize
+        self.detIndex = {det.toIntTuple(): i for i, det in enumerate(detList)}
+        self.alpha, self.beta = BitstringHamiltonianGenerator.packDeterminants(detList)
+
+        self.Hd = np.zeros(self.numDet)
+        for start in range(0, self.numDet, self.batchSize):
+            stop = min(start + self.batchSize, self.numDet)
+            occ = self.elements.occupationMatrix(self.alpha[start:stop], self.beta[start:stop])
+            self.Hd[start:stop] = self.elements.calcDiagonalElements(occ)
+
+    def getConnectedIndices(self, index):
+        """
+        Return the indices of all determinants in the list that are a single or
+        double excitation of determinant index
+        """
+
+        excitations = self.detList[index].generateSingleAndDoubleExcitationsOfDet(self.nmo)
+        connected = (self.detIndex.get(det.toIntTuple()) for det in excitations)
+        return [j for j in connected if j is not None]
+
+    def sigma(self, c):
+        """
+        Return H c for a single vector (N_det,) or a stack of vectors (nvec, N_det)
+        """
+
+        C = np.atleast_2d(c)
+        S = C * self.Hd
+        for start in range(0, self.numDet, self.batchSize):
+            stop = min(start + self.batchSize, self.numDet)
+            connected = [self.getConnectedIndices(i) for i in range(start, stop)]
+            rows = np.repeat(np.arange(start, stop), [len(js) for js in connected])
+            cols = np.fromiter((j for js in connected for j in js), dtype=np.int64, count=rows.shape[0])
+            diffAlpha = BitstringHamiltonianGenerator.popcount(self.alpha[rows] ^ self.alpha[cols])
+            diffBeta = BitstringHamiltonianGenerator.popcount(self.beta[rows] ^ self.beta[cols])
+            values = self.elements.calcConnectedElements(self.alpha, self.beta, rows, cols, diffAlpha, diffBeta)
+            for n in range(C.shape[0]):
+                S[n, start:stop] += np.bincount(rows - start, weights=values * C[n, cols], minlength=stop - start)
+        return S.reshape(np.shape(c))
+
+
+def davidsonSolver(sigma, Hd, nroot=1, guess_size=4, max_subspace=None, maxiter=100, etol=1.e-9, ctol=1.e-5,
+                   e_shift=0.0):
+    """
+    Return the lowest nroot eigenvalues and eigenvectors (nroot, N) of a matrix
+    available only through sigma(b) -> H b and its diagonal Hd
+
+    Uses the same convergence test as CI_DL.py: the change of the root-averaged
+    energy must drop below etol and the root-averaged norm of the
+    preconditioned residual below ctol.  The subspace is kept in preallocated
+    arrays and collapsed onto the current Ritz vectors when it would exceed
+    max_subspace.  e_shift is only added to the printed energies.
+    """
+
+    ndet = Hd.shape[0]
+    guess_size = min(max(guess_size, nroot), ndet)
+    if max_subspace is None:
+        max_subspace = max(8 * nroot, 2 * guess_size)
+    max_subspace = min(max_subspace, ndet)
+
+    # Unit vectors on the lowest diagonal elements as the guess space
+    B = np.zeros((max_subspace, ndet))
+    S = np.zeros((max_subspace, ndet))
+    for x, idx in enumerate(np.argsort(Hd)[:guess_size]):
+        B[x, idx] = 1.0
+    S[:guess_size] = sigma(B[:guess_size])
+    num_vecs = guess_size
+
+    delta_c = np.zeros(nroot)
+    Eold = 0.0
+    for CI_ITER in range(maxiter):
+
+        # Subspace Matrix, Gij = < bi | H | bj >
+        G = B[:num_vecs].dot(S[:num_vecs].T)
+        G = 0.5 * (G + G.T)
+        evals, evecs = np.linalg.eigh(G)
+
+        # Ritz vectors, their sigma vectors and preconditioned residuals
+        X = evecs[:, :nroot].T.dot(B[:num_vecs])
+        SX = evecs[:, :nroot].T.dot(S[:num_vecs])
+        corrections = []
+        for n in range(nroot):
+            denom = evals[n] - Hd
+            denom[np.abs(denom) < 1.e-8] = 1.e-8
+            new_vec = (SX[n] - evals[n] * X[n]) / denom
+            delta_c[n] = np.linalg.norm(new_vec)
+            corrections.append(new_vec)
+
+        # Use average over roots as convergence criteria
+        avg_energy = np.mean(evals[:nroot]) + e_shift
+        avg_dc = np.mean(delta_c)
+        print('CI Iteration %3d: Energy = %4.16f   dE = % 1.5E   dC = %1.5E' % (CI_ITER, avg_energy,
+                                                                                (avg_energy - Eold), avg_dc))
+        if (abs(avg_energy - Eold) < etol) and (avg_dc < ctol) and (CI_ITER > 3):
+            print('CI has converged!\n')
+            break
+        Eold = avg_energy
+
+        # Collapse the subspace onto the Ritz vectors
+        if num_vecs + nroot > max_subspace:
+            B[:nroot] = X
+            S[:nroot] = SX
+            num_vecs = nroot
+
+        # Add new vectors orthonormal to all previous vectors
+        start = num_vecs
+        for n in range(nroot):
+            new_vec = corrections[n]
+            if delta_c[n] < 1e-9:
+                continue
+            for rep in range(2):
+                new_vec -= B[:num_vecs].T.dot(B[:num_vecs].dot(new_vec))
+            norm = np.linalg.norm(new_vec)
+            if norm < 1e-9:
+                continue
+            B[num_vecs] = new_vec / norm
+            num_vecs += 1
+        if num_vecs == start:
+            break
+        S[start:num_vecs] = sigma(B[start:num_vecs])
+    else:
+        print('CI did not converge in %d iterations!\n' % maxiter)
+
+    return evals[:nroot], X
+
+
+class StringFCI:
+    """
+    class for string-driven Full CI sigma vectors [Knowles:1984:315] and [Olsen:1988:2185]
+
+    Alpha and beta strings are addressed separately through lexical
+    addressing graphs, and every string carries a precomputed list of its
+    single replacements E_pq.  The CI vector is handled as a matrix
+    C[I_alpha, I_beta] and sigma is formed as
+
+        D[pq] = E_pq C
+        G[pq] = k_pq C + 1/2 sum_rs (pq|rs) D[rs]
+        sigma = sum_pq E_pq G[pq]
+
+    where the two-electron step is a single GEMM over all strings and
+    k_pq = h_pq - 1/2 sum_r (pr|rq).  Determinant I_alpha * N_beta + I_beta
+    is the same determinant as in the itertools.combinations ordering of FCI.py.
+    """
+
+    def __init__(self, H_spin, mo_spin_eri, nalpha, nbeta):
+        """
+        Constructor for StringFCI from the spin-orbital integrals of HamiltonianGenerator
+        """
+
+        self.nmo = H_spin.shape[0] // 2
+        self.nalpha = nalpha
+        self.nbeta = nbeta
+
+        # Spatial integrals from the alpha blocks, (pq|rs) = <p r||q s> for p, q alpha and r, s beta
+        self.h = H_spin[::2, ::2].copy()
+        self.eri = mo_spin_eri[::2, 1::2, ::2, 1::2].transpose(0, 2, 1, 3).copy()
+        self.k = self.h - 0.5 * np.einsum('prrq->pq', self.eri)
+        self.eriMatrix = 0.5 * self.eri.reshape(self.nmo**2, self.nmo**2)
+
+        self.alphaStrings = StringFCI.generateStrings(self.nmo, nalpha)
+        self.betaStrings = StringFCI.generateStrings(self.nmo, nbeta)
+        self.alphaGraph = StringFCI.buildAddressingGraph(self.nmo, nalpha)
+        self.betaGraph = StringFCI.buildAddressingGraph(self.nmo, nbeta)
+        self.alphaReplacements = StringFCI.buildReplacementLists(self.alphaStrings, self.alphaGraph, self.nmo)
+        self.betaReplacements = StringFCI.buildReplacementLists(self.betaStrings, self.betaGraph, self.nmo)
+
+        self.numAlpha = len(self.alphaStrings)
+        self.numBeta = len(self.betaStrings)
+        self.numDet = self.numAlpha * self.numBeta
+        self.Hd = self.calcDiagonal().ravel()
+
+    @staticmethod
+    def generateStrings(nmo, nel):
+        """
+        Return all strings of nel electrons in nmo orbitals as sorted orbital tuples
+        """
+
+        return list(combinations(range(nmo), nel))
+
+    @staticmethod
+    def binomial(n, k):
+        """
+        Return the binomial coefficient n over k, zero for k > n
+        """
+
+        if k < 0 or k > n:
+            return 0
+        result = 1
+        for i in range(k):
+            result = result * (n - i) // (i + 1)
+        return result
+
+    @staticmethod
+    def buildAddressingGraph(nmo, nel):
+        """
+        Return the arc weights Y[k, o] and offset of the lexical addressing
+        graph, address = offset + sum_k Y[k, o_k] for the occupied orbitals o_k
+        """
+
+        Y = np.zeros((max(nel, 1), nmo), dtype=np.int64)
+        for k in range(nel):
+            for o in range(nmo):
+                Y[k, o] = -StringFCI.binomial(nmo - 1 - o, nel - k)
+        return StringFCI.binomial(nmo, nel) - 1, Y
+
+    @staticmethod
+    def stringAddress(graph, string):
+        """
+        Return the address of a sorted orbital tuple from its addressing graph
+        """
+
+        offset, Y = graph
+        return offset + sum(Y[k, o] for k, o in enumerate(string))
+
+    @staticmethod
+    def buildReplacementLists(strings, graph, nmo):
+        """
+        Return the single replacement lists (target, sign, pq) of every string
+
+        Entry s of string I satisfies a+_q a_p |target[I, s]> = sign[I, s] |I>
+        with pq[I, s] = p * nmo + q, i.e. (E_pq)[I, target] = sign.  The
+        diagonal replacements E_pp of the occupied orbitals are included.
+        """
+
+        nstr = len(strings)
+        nel = len(strings[0])
+        nrep = nel * (nmo - nel + 1)
+        target = np.zeros((nstr, nrep), dtype=np.int64)
+        sign = np.zeros((nstr, nrep))
+        pq = np.zeros((nstr, nrep), dtype=np.int64)
+        for I, string in enumerate(strings):
+            occupied = set(string)
+            s = 0
+            for i, q in enumerate(string):
+                # Annihilate q, the sign counts the occupied orbitals below q
+                removed = string[:i] + string[i + 1:]
+                for p in range(nmo):
+                    if p in occupied and p != q:
+                        continue
+                    below = sum(1 for o in removed if o < p)
+                    new = tuple(sorted(removed + (p, )))
+                    target[I, s] = StringFCI.stringAddress(graph, new)
+                    sign[I, s] = (-1)**(i + below)
+                    # a+_p a_q |I> = sign |new>  <=>  (E_qp)[new, I] = (E_pq)[I, new] = sign
+                    pq[I, s] = q * nmo + p
+                    s += 1
+        return target, sign, pq
+
+    def calcDiagonal(self):
+        """
+        Return the diagonal of H as an (N_alpha, N_beta) array
+        """
+
+        occA = np.zeros((len(self.alphaStrings), self.nmo))
+        for I, string in enumerate(self.alphaStrings):
+            occA[I, list(string)] = 1.0
+        occB = np.zeros((len(self.betaStrings), self.nmo))
+        for I, string in enumerate(self.betaStrings):
+            occB[I, list(string)] = 1.0
+
+        hdiag = np.diag(self.h)
+        J = np.einsum('iijj->ij', self.eri)
+        K = np.einsum('ijji->ij', self.eri)
+        Ea = occA.dot(hdiag) + 0.5 * np.einsum('Ii,ij,Ij->I', occA, J - K, occA)
+        Eb = occB.dot(hdiag) + 0.5 * np.einsum('Ii,ij,Ij->I', occB, J - K, occB)
+        return Ea[:, None] + Eb[None, :] + occA.dot(J).dot(occB.T)
+
+    def applyReplacements(self, X, out):
+        """
+        Add sum_pq E_pq X[pq] into out, or out[pq] += E_pq X when X is (N_alpha, N_beta)
+
+        X and out are (nmo^2, N_alpha, N_beta) or (N_alpha, N_beta) arrays,
+        exactly one of them carries the pq index.
+        """
+
+        for lists, axis in ((self.alphaReplacements, 1), (self.betaReplacements, 2)):
+            target, sign, pq = lists
+            for s in range(target.shape[1]):
+                if axis == 1:
+                    if X.ndim == 2:
+                        out[pq[:, s], np.arange(target.shape[0]), :] += sign[:, s, None] * X[target[:, s], :]
+                    else:
+                        out += sign[:, s, None] * X[pq[:, s], target[:, s], :]
+                else:
+                    if X.ndim == 2:
+                        out[pq[:, s], :, np.arange(target.shape[0])] += sign[:, s, None] * X[:, target[:, s]].T
+                    else:
+                        out += sign[:, s] * X[pq[:, s], :, target[:, s]].T
+        return out
+
+    def sigma(self, c):
+        """
+        Return H c for a single vector (N_det,) or a stack of vectors (nvec, N_det)
+        """
+
+        Cs = np.atleast_2d(c).reshape(-1, self.numAlpha, self.numBeta)
+        nmo2 = self.nmo**2
+        S = np.zeros_like(Cs)
+        for n, C in enumerate(Cs):
+            D = self.applyReplacements(C, np.zeros((nmo2, self.numAlpha, self.numBeta)))
+            G = self.eriMatrix.dot(D.reshape(nmo2, -1)).reshape(D.shape)
+            G += self.k.reshape(nmo2, 1, 1) * C
+            self.applyReplacements(G, S[n])
+        return S.reshape(np.shape(c))
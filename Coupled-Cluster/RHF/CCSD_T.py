@@ -0,0 +1,54 @@
+"""
+Script to compute the closed-shell RHF-CCSD(T) energy with HelperCCEnergy.
+
+The (T) correction is spin adapted and loops over unique occupied triplets
+(helper_cctriples), so it works with the nocc x nvir spatial orbital amplitudes
+instead of the spin orbital ones of Spin_Orbitals/CCSD/CCSD_T.py.
+
+References:
+1. K. Raghavachari, G. W. Trucks, J. A. Pople, and M. Head-Gordon,
+   Chem. Phys. Lett., volume 157, pp. 479-483 (1989).
+"""
+
+__authors__ = "The Psi4NumPy Developers"
+__credits__ = ["T. D. Crawford", "Daniel G. A. Smith", "Ashutosh Kumar"]
+
+__copyright__ = "(c) 2014-2018, The Psi4NumPy Developers"
+__license__ = "BSD-3-Clause"
+__date__ = "2026-10-18"
+
+import numpy as np
+import psi4
+from helper_ccenergy import *
+np.set_printoptions(precision=5, linewidth=200, suppress=True)
+
+psi4.set_memory('2 GB')
+psi4.core.set_output_file('output.dat', False)
+
+mol = psi4.geometry("""
+O
+H 1 1.1
+H 1 1.1 2 104
+symmetry c1
+""")
+
+psi4.set_options({'basis': 'cc-pVDZ'})
+
+compare_psi4 = True
+
+# Worker processes for the (T) triplets. Values above 1 rely on the fork start
+# method (Linux) since this script has no __main__ guard
+nproc = 1
+
+rhf_e, rhf_wfn = psi4.energy('SCF', return_wfn=True)
+ccsd = HelperCCEnergy(mol, rhf_e, rhf_wfn)
+ccsd.compute_energy()
+ccsd.compute_triples(nproc=nproc)
+
+print('\nFinal CCSD correlation energy:          % 16.10f' % ccsd.ccsd_corr_e)
+print('Total CCSD energy:                      % 16.10f' % ccsd.ccsd_e)
+print('Pertubative (T) correlation energy:     % 16.10f' % ccsd.triples_e)
+print('Total CCSD(T) energy:                   % 16.10f' % ccsd.ccsd_t_e)
+if compare_psi4:
+    psi4.compare_values(psi4.energy('CCSD(T)'), ccsd.ccsd_t_e, 6, 'CCSD(T) Energy')
+    psi4.compare_values(psi4.variable('(T) CORRECTION ENERGY'), ccsd.triples_e, 6, '(T) Correction Energy')
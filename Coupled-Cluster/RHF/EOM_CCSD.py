@@ -49,12 +49,16 @@ nvec_per_root = 30
 e_tol = 1.0e-6
 max_iter = 80
 
+# Integrals for the CC helpers: 'conventional' (nmo^4 MO tensor), or the three-index
+# 'df' / 'cholesky' factors. Only 'conventional' reproduces the psi4 values compared below
+cc_integrals = 'conventional'
+
 # roots per irrep must be set to do the eom calculation with psi4
 psi4.set_options({'basis': 'cc-pvdz', 'roots_per_irrep': [nroot]})
 
 # Compute CCSD energy for required integrals and T-amplitudes
 rhf_e, rhf_wfn = psi4.energy('SCF', return_wfn=True)
-ccsd = HelperCCEnergy(mol, rhf_e, rhf_wfn)
+ccsd = HelperCCEnergy(mol, rhf_e, rhf_wfn, integrals=cc_integrals)
 ccsd.compute_energy()
 
 ccsd_cor_e = ccsd.ccsd_corr_e
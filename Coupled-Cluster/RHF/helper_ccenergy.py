@@ -2,6 +2,19 @@
 A simple python script to compute RHF-CCSD energy. Equations (Spin orbitals) from reference 1
 have been spin-factored. However, explicit building of Wabef intermediates are avoided here.
 
+All intermediates and residuals live in a BufferPool: they are allocated on
+the first iteration and refilled in place (ndot(..., out=)) afterwards, so an
+iteration does not allocate any new o^2v^2 or larger arrays.
+
+With integrals='df' or 'cholesky' the nmo^4 MO tensor is replaced by the three-index
+factors of helper_dfints.DFIntegrals, which assemble the blocks with an occupied index
+once and keep them for get_MO. The Hbar, Lambda, EOM and perturbation helpers slice
+ccsd.MO and work with either backend. With any backend the tau <ab|ef> ladder streams batches of
+<ab|ef> (at most ladder_memory GB) instead of touching the whole vvvv block.
+
+compute_triples() adds the closed-shell (T) correction of helper_cctriples on
+top of the converged amplitudes.
+
 References: 
 1. J.F. Stanton, J. Gauss, J.D. Watts, and R.J. Bartlett, 
    J. Chem. Phys., volume 94, pp. 4334-4345 (1991).
@@ -21,10 +34,22 @@ import numpy as np
 import psi4
 from utils import ndot
 from utils import helper_diis
+from utils import BufferPool
+from utils import peak_rss
+from utils import contract_ladder
+from helper_dfints import DFIntegrals
+from helper_cctriples import compute_triples_energy
 
 
 class HelperCCEnergy(object):
-    def __init__(self, mol, rhf_e, rhf_wfn, memory=2):
+    def __init__(self,
+                 mol,
+                 rhf_e,
+                 rhf_wfn,
+                 memory=2,
+                 integrals='conventional',
+                 cholesky_tol=1.e-4,
+                 ladder_memory=0.5):
 
         print("\nInitalizing CCSD object...\n")
 
@@ -36,10 +61,14 @@ class HelperCCEnergy(object):
 
         self.ccsd_corr_e = 0.0
         self.ccsd_e = 0.0
+        self.triples_e = 0.0
+        self.ccsd_t_e = 0.0
 
         self.ndocc = self.wfn.doccpi()[0]
         self.nmo = self.wfn.nmo()
         self.memory = memory
+        # Cap (GB) on the batches of <ab|ef> streamed through the ladder term
+        self.ladder_memory = ladder_memory
         self.C = self.wfn.Ca()
         self.npC = np.asarray(self.C)
 
@@ -53,26 +82,62 @@ class HelperCCEnergy(object):
 
         print('Starting AO ->  MO transformation...')
 
-        ERI_Size = self.nmo * 128.e-9
-        memory_footprint = ERI_Size * 5
-        if memory_footprint > self.memory:
-            psi.clean()
-            raise Exception(
-                "Estimated memory utilization (%4.2f GB) exceeds numpy_memory \
-                            limit of %4.2f GB." % (memory_footprint,
-                                                   self.memory))
-
-        # Integral generation from Psi4's MintsHelper
-        self.MO = np.asarray(self.mints.mo_eri(self.C, self.C, self.C, self.C))
-        # Physicist notation
-        self.MO = self.MO.swapaxes(1, 2)
-        print("Size of the ERI tensor is %4.2f GB, %d basis functions." %
-              (ERI_Size, self.nmo))
-
         # Update nocc and nvirt
         self.nocc = self.ndocc
         self.nvirt = self.nmo - self.nocc
 
+        # The pooled intermediates: eleven o^2v^2 sized buffers, two oooo and one ovoo
+        o, v = self.nocc, self.nvirt
+        pool_size = (11 * o * o * v * v + 2 * o**4 + o**3 * v) * 8.e-9
+
+        if integrals == 'conventional':
+            # The MO ERI tensor and the batches of the vvvv ladder
+            ERI_Size = (self.nmo**4) * 8.e-9
+            memory_footprint = ERI_Size + self.ladder_memory + pool_size
+            if memory_footprint > self.memory:
+                psi4.core.clean()
+                raise Exception(
+                    "Estimated memory utilization (%4.2f GB) exceeds numpy_memory \
+                                limit of %4.2f GB." % (memory_footprint,
+                                                       self.memory))
+
+            # Integral generation from Psi4's MintsHelper
+            self.MO = np.asarray(self.mints.mo_eri(self.C, self.C, self.C, self.C))
+            # Physicist notation
+            self.MO = self.MO.swapaxes(1, 2)
+            print("Size of the ERI tensor is %4.2f GB, %d basis functions." %
+                  (ERI_Size, self.nmo))
+
+        elif integrals in ['df', 'cholesky']:
+            # The (Q|pq) factors and the blocks of <pq|rs> with an occupied index
+            # are kept; the vvvv term is contracted from the factors
+            basis = self.wfn.basisset()
+            if integrals == 'df':
+                aux = psi4.core.BasisSet.build(mol, "DF_BASIS_CC", "", "RIFIT",
+                                               psi4.core.get_global_option('BASIS'))
+                self.MO = DFIntegrals.from_df(self.mints, basis, self.npC, aux, nocc=o)
+            else:
+                self.MO = DFIntegrals.from_cholesky(self.mints, basis, self.npC,
+                                                    tol=cholesky_tol, nocc=o)
+
+            # The factors, the cached oooo/ooov/oovv/ovov/ovvv blocks and the vvvv batches
+            ERI_Size = self.MO.nbytes * 1.e-9
+            memory_footprint = ERI_Size + self.MO.cache_nbytes * 1.e-9 + self.ladder_memory + pool_size
+            if memory_footprint > self.memory:
+                psi4.core.clean()
+                raise Exception(
+                    "Estimated memory utilization (%4.2f GB) exceeds numpy_memory \
+                                limit of %4.2f GB." % (memory_footprint,
+                                                       self.memory))
+            print("Size of the (Q|pq) factors is %4.2f GB, %d auxiliary functions, %d basis functions." %
+                  (ERI_Size, self.MO.naux, self.nmo))
+
+        else:
+            psi4.core.clean()
+            raise Exception("HelperCCEnergy: integrals must be 'conventional', 'df' or 'cholesky', not %s." %
+                            integrals)
+        self.integrals = integrals
+
         # Make slices
         self.slice_o = slice(0, self.nocc)
         self.slice_v = slice(self.nocc, self.nmo)
@@ -82,6 +147,10 @@ class HelperCCEnergy(object):
             'v': self.slice_v,
             'a': self.slice_a
         }
+        self.dim_dict = {'o': self.nocc, 'v': self.nvirt, 'a': self.nmo}
+
+        # Reusable storage for the intermediates of update()
+        self.buffers = BufferPool()
 
         # Compute Fock matrix
         self.F = H + 2.0 * np.einsum('pmqm->pq',
@@ -125,182 +194,207 @@ class HelperCCEnergy(object):
             raise Exception('get_F: string %s must have 4 elements.' % string)
         return self.F[self.slice_dict[string[0]], self.slice_dict[string[1]]]
 
+    def get_buffer(self, name, string):
+        """
+        Returns the pooled array called name with the shape of the index
+        string (e.g. 'oovv'), allocating it on first use.
+        """
+        return self.buffers.get(name, [self.dim_dict[x] for x in string])
+
     #Equations from Reference 1 (Stanton's paper)
 
+    # The build_* functions below return pooled arrays that are overwritten
+    # by the next call, copy the result if it has to survive an iteration.
+
     #Bulid Eqn 9:
     def build_tilde_tau(self):
-        ttau = self.t2.copy()
-        tmp = 0.5 * np.einsum('ia,jb->ijab', self.t1, self.t1)
-        ttau += tmp
+        ttau = self.get_buffer('tilde_tau', 'oovv')
+        np.einsum('ia,jb->ijab', self.t1, self.t1, out=ttau)
+        ttau *= 0.5
+        ttau += self.t2
         return ttau
 
     #Build Eqn 10:
     def build_tau(self):
-        ttau = self.t2.copy()
-        tmp = np.einsum('ia,jb->ijab', self.t1, self.t1)
-        ttau += tmp
+        ttau = self.get_buffer('tau', 'oovv')
+        np.einsum('ia,jb->ijab', self.t1, self.t1, out=ttau)
+        ttau += self.t2
         return ttau
 
     #Build Eqn 3:
-    def build_Fae(self):
-        Fae = self.get_F('vv').copy()
-        Fae -= ndot('me,ma->ae', self.get_F('ov'), self.t1, prefactor=0.5)
-        Fae += ndot('mf,mafe->ae', self.t1, self.get_MO('ovvv'), prefactor=2.0)
-        Fae += ndot(
-            'mf,maef->ae', self.t1, self.get_MO('ovvv'), prefactor=-1.0)
-        Fae -= ndot(
-            'mnaf,mnef->ae',
-            self.build_tilde_tau(),
-            self.get_MO('oovv'),
-            prefactor=2.0)
-        Fae -= ndot(
-            'mnaf,mnfe->ae',
-            self.build_tilde_tau(),
-            self.get_MO('oovv'),
-            prefactor=-1.0)
+    def build_Fae(self, tilde_tau=None):
+        if tilde_tau is None:
+            tilde_tau = self.build_tilde_tau()
+        Fae = self.get_buffer('Fae', 'vv')
+        tmp = self.get_buffer('vv', 'vv')
+        Fae[:] = self.get_F('vv')
+        Fae -= ndot('me,ma->ae', self.get_F('ov'), self.t1, prefactor=0.5, out=tmp)
+        Fae += ndot('mf,mafe->ae', self.t1, self.get_MO('ovvv'), prefactor=2.0, out=tmp)
+        Fae += ndot('mf,maef->ae', self.t1, self.get_MO('ovvv'), prefactor=-1.0, out=tmp)
+        Fae -= ndot('mnaf,mnef->ae', tilde_tau, self.get_MO('oovv'), prefactor=2.0, out=tmp)
+        Fae -= ndot('mnaf,mnfe->ae', tilde_tau, self.get_MO('oovv'), prefactor=-1.0, out=tmp)
         return Fae
 
     #Build Eqn 4:
-    def build_Fmi(self):
-        Fmi = self.get_F('oo').copy()
-        Fmi += ndot('ie,me->mi', self.t1, self.get_F('ov'), prefactor=0.5)
-        Fmi += ndot('ne,mnie->mi', self.t1, self.get_MO('ooov'), prefactor=2.0)
-        Fmi += ndot(
-            'ne,mnei->mi', self.t1, self.get_MO('oovo'), prefactor=-1.0)
-        Fmi += ndot(
-            'inef,mnef->mi',
-            self.build_tilde_tau(),
-            self.get_MO('oovv'),
-            prefactor=2.0)
-        Fmi += ndot(
-            'inef,mnfe->mi',
-            self.build_tilde_tau(),
-            self.get_MO('oovv'),
-            prefactor=-1.0)
+    def build_Fmi(self, tilde_tau=None):
+        if tilde_tau is None:
+            tilde_tau = self.build_tilde_tau()
+        Fmi = self.get_buffer('Fmi', 'oo')
+        tmp = self.get_buffer('oo', 'oo')
+        Fmi[:] = self.get_F('oo')
+        Fmi += ndot('ie,me->mi', self.t1, self.get_F('ov'), prefactor=0.5, out=tmp)
+        Fmi += ndot('ne,mnie->mi', self.t1, self.get_MO('ooov'), prefactor=2.0, out=tmp)
+        Fmi += ndot('ne,mnei->mi', self.t1, self.get_MO('oovo'), prefactor=-1.0, out=tmp)
+        Fmi += ndot('inef,mnef->mi', tilde_tau, self.get_MO('oovv'), prefactor=2.0, out=tmp)
+        Fmi += ndot('inef,mnfe->mi', tilde_tau, self.get_MO('oovv'), prefactor=-1.0, out=tmp)
         return Fmi
 
     #Build Eqn 5:
     def build_Fme(self):
-        Fme = self.get_F('ov').copy()
-        Fme += ndot('nf,mnef->me', self.t1, self.get_MO('oovv'), prefactor=2.0)
-        Fme += ndot(
-            'nf,mnfe->me', self.t1, self.get_MO('oovv'), prefactor=-1.0)
+        Fme = self.get_buffer('Fme', 'ov')
+        tmp = self.get_buffer('ov', 'ov')
+        Fme[:] = self.get_F('ov')
+        Fme += ndot('nf,mnef->me', self.t1, self.get_MO('oovv'), prefactor=2.0, out=tmp)
+        Fme += ndot('nf,mnfe->me', self.t1, self.get_MO('oovv'), prefactor=-1.0, out=tmp)
         return Fme
 
     #Build Eqn 6:
-    def build_Wmnij(self):
-        Wmnij = self.get_MO('oooo').copy()
-        Wmnij += ndot('je,mnie->mnij', self.t1, self.get_MO('ooov'))
-        Wmnij += ndot('ie,mnej->mnij', self.t1, self.get_MO('oovo'))
+    def build_Wmnij(self, tau=None):
+        if tau is None:
+            tau = self.build_tau()
+        Wmnij = self.get_buffer('Wmnij', 'oooo')
+        tmp = self.get_buffer('oooo', 'oooo')
+        Wmnij[:] = self.get_MO('oooo')
+        Wmnij += ndot('je,mnie->mnij', self.t1, self.get_MO('ooov'), out=tmp)
+        Wmnij += ndot('ie,mnej->mnij', self.t1, self.get_MO('oovo'), out=tmp)
         # prefactor of 1 instead of 0.5 below to fold the last term of
         # 0.5 * tau_ijef Wabef in Wmnij contraction: 0.5 * tau_mnab Wmnij_mnij
-        Wmnij += ndot(
-            'ijef,mnef->mnij',
-            self.build_tau(),
-            self.get_MO('oovv'),
-            prefactor=1.0)
+        Wmnij += ndot('ijef,mnef->mnij', tau, self.get_MO('oovv'), prefactor=1.0, out=tmp)
         return Wmnij
 
+    # 0.5 * t_jnfb + t_jf * t_nb, shared by Wmbej and Wmbje
+    def build_half_tau(self):
+        tmp = self.get_buffer('half_tau', 'oovv')
+        np.einsum('jf,nb->jnfb', self.t1, self.t1, out=tmp)
+        tmp *= 2.0
+        tmp += self.t2
+        tmp *= 0.5
+        return tmp
+
     #Build Eqn 8:
-    def build_Wmbej(self):
-        Wmbej = self.get_MO('ovvo').copy()
-        Wmbej += ndot('jf,mbef->mbej', self.t1, self.get_MO('ovvv'))
-        Wmbej -= ndot('nb,mnej->mbej', self.t1, self.get_MO('oovo'))
-        tmp = (0.5 * self.t2)
-        tmp += np.einsum('jf,nb->jnfb', self.t1, self.t1)
-        Wmbej -= ndot('jnfb,mnef->mbej', tmp, self.get_MO('oovv'))
-        Wmbej += ndot(
-            'njfb,mnef->mbej', self.t2, self.get_MO('oovv'), prefactor=1.0)
-        Wmbej += ndot(
-            'njfb,mnfe->mbej', self.t2, self.get_MO('oovv'), prefactor=-0.5)
+    def build_Wmbej(self, half_tau=None):
+        if half_tau is None:
+            half_tau = self.build_half_tau()
+        Wmbej = self.get_buffer('Wmbej', 'ovvo')
+        tmp = self.get_buffer('ovvo', 'ovvo')
+        Wmbej[:] = self.get_MO('ovvo')
+        Wmbej += ndot('jf,mbef->mbej', self.t1, self.get_MO('ovvv'), out=tmp)
+        Wmbej -= ndot('nb,mnej->mbej', self.t1, self.get_MO('oovo'), out=tmp)
+        Wmbej -= ndot('jnfb,mnef->mbej', half_tau, self.get_MO('oovv'), out=tmp)
+        Wmbej += ndot('njfb,mnef->mbej', self.t2, self.get_MO('oovv'), prefactor=1.0, out=tmp)
+        Wmbej += ndot('njfb,mnfe->mbej', self.t2, self.get_MO('oovv'), prefactor=-0.5, out=tmp)
         return Wmbej
 
     # This intermediate appaears in the spin factorization of Wmbej terms.
-    def build_Wmbje(self):
-        Wmbje = -1.0 * (self.get_MO('ovov').copy())
-        Wmbje -= ndot('jf,mbfe->mbje', self.t1, self.get_MO('ovvv'))
-        Wmbje += ndot('nb,mnje->mbje', self.t1, self.get_MO('ooov'))
-        tmp = (0.5 * self.t2)
-        tmp += np.einsum('jf,nb->jnfb', self.t1, self.t1)
-        Wmbje += ndot('jnfb,mnfe->mbje', tmp, self.get_MO('oovv'))
+    def build_Wmbje(self, half_tau=None):
+        if half_tau is None:
+            half_tau = self.build_half_tau()
+        Wmbje = self.get_buffer('Wmbje', 'ovov')
+        tmp = self.get_buffer('ovov', 'ovov')
+        np.negative(self.get_MO('ovov'), out=Wmbje)
+        Wmbje -= ndot('jf,mbfe->mbje', self.t1, self.get_MO('ovvv'), out=tmp)
+        Wmbje += ndot('nb,mnje->mbje', self.t1, self.get_MO('ooov'), out=tmp)
+        Wmbje += ndot('jnfb,mnfe->mbje', half_tau, self.get_MO('oovv'), out=tmp)
         return Wmbje
 
     # This intermediate is required to build second term of 0.5 * tau_ijef * Wabef,
     # as explicit construction of Wabef is avoided here.
-    def build_Zmbij(self):
-        Zmbij = 0
-        Zmbij += ndot('mbef,ijef->mbij', self.get_MO('ovvv'), self.build_tau())
-        return Zmbij
+    def build_Zmbij(self, tau=None):
+        if tau is None:
+            tau = self.build_tau()
+        Zmbij = self.get_buffer('Zmbij', 'ovoo')
+        return ndot('mbef,ijef->mbij', self.get_MO('ovvv'), tau, out=Zmbij)
+
+    # <ab|ef> for a0 <= a < a1 (virtual indices), a view of the stored tensor or
+    # assembled from the factors
+    def get_vvvv_batch(self, a0, a1):
+        if self.integrals == 'conventional':
+            return self.get_MO('vvvv')[a0:a1]
+        return self.MO.vvvv_batch(self.slice_v, a0, a1)
+
+    # tau_ijef <ab|ef>, streamed over batches of a so that no vvvv sized
+    # array is ever allocated
+    def build_ladder(self, tau, out=None):
+        return contract_ladder(tau, self.get_vvvv_batch, memory=self.ladder_memory, out=out)
 
     def update(self):
 
+        # tau and tilde_tau are built once per iteration and shared by all
+        # the intermediates below
+        ttau = self.build_tilde_tau()
+        tau = self.build_tau()
+
         ### Build OEI intermediates
-        Fae = self.build_Fae()
-        Fmi = self.build_Fmi()
+        Fae = self.build_Fae(ttau)
+        Fmi = self.build_Fmi(ttau)
         Fme = self.build_Fme()
 
         #### Build residual of T1 equations by spin adaption of  Eqn 1:
-        r_T1 = self.get_F('ov').copy()
-        r_T1 += ndot('ie,ae->ia', self.t1, Fae)
-        r_T1 -= ndot('ma,mi->ia', self.t1, Fmi)
-        r_T1 += ndot('imae,me->ia', self.t2, Fme, prefactor=2.0)
-        r_T1 += ndot('imea,me->ia', self.t2, Fme, prefactor=-1.0)
-        r_T1 += ndot(
-            'nf,nafi->ia', self.t1, self.get_MO('ovvo'), prefactor=2.0)
-        r_T1 += ndot(
-            'nf,naif->ia', self.t1, self.get_MO('ovov'), prefactor=-1.0)
-        r_T1 += ndot(
-            'mief,maef->ia', self.t2, self.get_MO('ovvv'), prefactor=2.0)
-        r_T1 += ndot(
-            'mife,maef->ia', self.t2, self.get_MO('ovvv'), prefactor=-1.0)
-        r_T1 -= ndot(
-            'mnae,nmei->ia', self.t2, self.get_MO('oovo'), prefactor=2.0)
-        r_T1 -= ndot(
-            'mnae,nmie->ia', self.t2, self.get_MO('ooov'), prefactor=-1.0)
+        r_T1 = self.get_buffer('r_T1', 'ov')
+        tmp = self.get_buffer('ov', 'ov')
+        r_T1[:] = self.get_F('ov')
+        r_T1 += ndot('ie,ae->ia', self.t1, Fae, out=tmp)
+        r_T1 -= ndot('ma,mi->ia', self.t1, Fmi, out=tmp)
+        r_T1 += ndot('imae,me->ia', self.t2, Fme, prefactor=2.0, out=tmp)
+        r_T1 += ndot('imea,me->ia', self.t2, Fme, prefactor=-1.0, out=tmp)
+        r_T1 += ndot('nf,nafi->ia', self.t1, self.get_MO('ovvo'), prefactor=2.0, out=tmp)
+        r_T1 += ndot('nf,naif->ia', self.t1, self.get_MO('ovov'), prefactor=-1.0, out=tmp)
+        r_T1 += ndot('mief,maef->ia', self.t2, self.get_MO('ovvv'), prefactor=2.0, out=tmp)
+        r_T1 += ndot('mife,maef->ia', self.t2, self.get_MO('ovvv'), prefactor=-1.0, out=tmp)
+        r_T1 -= ndot('mnae,nmei->ia', self.t2, self.get_MO('oovo'), prefactor=2.0, out=tmp)
+        r_T1 -= ndot('mnae,nmie->ia', self.t2, self.get_MO('ooov'), prefactor=-1.0, out=tmp)
 
         ### Build residual of T2 equations by spin adaptation of Eqn 2:
         # <ij||ab> ->  <ij|ab>
         #   spin   ->  spin-adapted (<alpha beta| alpha beta>)
-        r_T2 = self.get_MO('oovv').copy()
+        r_T2 = self.get_buffer('r_T2', 'oovv')
+        r_T2[:] = self.get_MO('oovv')
 
         # Conventions used:
         #   P(ab) f(a,b) = f(a,b) - f(b,a)
         #   P(ij) f(i,j) = f(i,j) - f(j,i)
         #   P^(ab)_(ij) f(a,b,i,j) = f(a,b,i,j) + f(b,a,j,i)
 
-        # P(ab) {t_ijae Fae_be}  ->  P^(ab)_(ij) {t_ijae Fae_be}
-        tmp = ndot('ijae,be->ijab', self.t2, Fae)
-        r_T2 += tmp
-        r_T2 += tmp.swapaxes(0, 1).swapaxes(2, 3)
-
-        # P(ab) {-0.5 * t_ijae t_mb Fme_me} -> P^(ab)_(ij) {-0.5 * t_ijae t_mb Fme_me}
-        tmp = ndot('mb,me->be', self.t1, Fme)
-        first = ndot('ijae,be->ijab', self.t2, tmp, prefactor=0.5)
-        r_T2 -= first
-        r_T2 -= first.swapaxes(0, 1).swapaxes(2, 3)
-
-        # P(ij) {-t_imab Fmi_mj}  ->  P^(ab)_(ij) {-t_imab Fmi_mj}
-        tmp = ndot('imab,mj->ijab', self.t2, Fmi, prefactor=1.0)
-        r_T2 -= tmp
-        r_T2 -= tmp.swapaxes(0, 1).swapaxes(2, 3)
-
-        # P(ij) {-0.5 * t_imab t_je Fme_me}  -> P^(ab)_(ij) {-0.5 * t_imab t_je Fme_me}
-        tmp = ndot('je,me->jm', self.t1, Fme)
-        first = ndot('imab,jm->ijab', self.t2, tmp, prefactor=0.5)
-        r_T2 -= first
-        r_T2 -= first.swapaxes(0, 1).swapaxes(2, 3)
+        # Every term carrying P^(ab)_(ij) is accumulated into Pr_T2 and the
+        # permutation is applied once at the end.
+        Pr_T2 = self.get_buffer('Pr_T2', 'oovv')
+        tmp = self.get_buffer('oovv', 'oovv')
+
+        # P(ab) {t_ijae Fae_be} and P(ab) {-0.5 * t_ijae t_mb Fme_me}
+        #   -> P^(ab)_(ij) {t_ijae (Fae_be - 0.5 * t_mb Fme_me)}
+        tmp_vv = self.get_buffer('vv', 'vv')
+        ndot('mb,me->be', self.t1, Fme, prefactor=-0.5, out=tmp_vv)
+        tmp_vv += Fae
+        ndot('ijae,be->ijab', self.t2, tmp_vv, out=Pr_T2)
+
+        # P(ij) {-t_imab Fmi_mj} and P(ij) {-0.5 * t_imab t_je Fme_me}
+        #   -> P^(ab)_(ij) {-t_imab (Fmi_mj + 0.5 * t_je Fme_me)}
+        tmp_oo = self.get_buffer('oo', 'oo')
+        ndot('je,me->mj', self.t1, Fme, prefactor=0.5, out=tmp_oo)
+        tmp_oo += Fmi
+        Pr_T2 -= ndot('imab,mj->ijab', self.t2, tmp_oo, out=tmp)
 
         # Build TEI Intermediates
-        tmp_tau = self.build_tau()
-        Wmnij = self.build_Wmnij()
-        Wmbej = self.build_Wmbej()
-        Wmbje = self.build_Wmbje()
-        Zmbij = self.build_Zmbij()
+        half_tau = self.build_half_tau()
+        Wmnij = self.build_Wmnij(tau)
+        Wmbej = self.build_Wmbej(half_tau)
+        Wmbje = self.build_Wmbje(half_tau)
+        Zmbij = self.build_Zmbij(tau)
 
         # 0.5 * tau_mnab Wmnij_mnij  -> tau_mnab Wmnij_mnij
         # This also includes the last term in 0.5 * tau_ijef Wabef
         # as Wmnij is modified to include this contribution.
-        r_T2 += ndot('mnab,mnij->ijab', tmp_tau, Wmnij, prefactor=1.0)
+        r_T2 += ndot('mnab,mnij->ijab', tau, Wmnij, prefactor=1.0, out=tmp)
 
         # Wabef used in eqn 2 of reference 1 is very expensive to build and store, so we have
         # broken down the term , 0.5 * tau_ijef * Wabef (eqn. 7) into different components
@@ -308,62 +402,49 @@ class HelperCCEnergy(object):
         # for in the contraction just above.
 
         # First term: 0.5 * tau_ijef <ab||ef> -> tau_ijef <ab|ef>
-        r_T2 += ndot(
-            'ijef,abef->ijab', tmp_tau, self.get_MO('vvvv'), prefactor=1.0)
+        r_T2 += self.build_ladder(tau, out=tmp)
 
         # Second term: 0.5 * tau_ijef (-P(ab) t_mb <am||ef>)  -> -P^(ab)_(ij) {t_ma * Zmbij_mbij}
         # where Zmbij_mbij = <mb|ef> * tau_ijef
-        tmp = ndot('ma,mbij->ijab', self.t1, Zmbij)
-        r_T2 -= tmp
-        r_T2 -= tmp.swapaxes(0, 1).swapaxes(2, 3)
+        # P(ab) {-t_ma <mb||ij>} -> P^(ab)_(ij) {-t_ma <mb|ij>} shares the
+        # t_ma contraction, so <mb|ij> is folded into Zmbij here.
+        Zmbij += self.get_MO('ovoo')
+        Pr_T2 -= ndot('ma,mbij->ijab', self.t1, Zmbij, out=tmp)
 
         # P(ij)P(ab) t_imae Wmbej -> Broken down into three terms below
-        # First term: P^(ab)_(ij) {(t_imae - t_imea)* Wmbej_mbej}
-        tmp = ndot('imae,mbej->ijab', self.t2, Wmbej, prefactor=1.0)
-        tmp += ndot('imea,mbej->ijab', self.t2, Wmbej, prefactor=-1.0)
-        r_T2 += tmp
-        r_T2 += tmp.swapaxes(0, 1).swapaxes(2, 3)
-
-        # Second term: P^(ab)_(ij) t_imae * (Wmbej_mbej + Wmbje_mbje)
-        tmp = ndot('imae,mbej->ijab', self.t2, Wmbej, prefactor=1.0)
-        tmp += ndot('imae,mbje->ijab', self.t2, Wmbje, prefactor=1.0)
-        r_T2 += tmp
-        r_T2 += tmp.swapaxes(0, 1).swapaxes(2, 3)
+        # First and second terms: P^(ab)_(ij) {(t_imae - t_imea)* Wmbej_mbej}
+        #                       + P^(ab)_(ij) t_imae * (Wmbej_mbej + Wmbje_mbje)
+        # -> P^(ab)_(ij) {(2 t_imae - t_imea) * Wmbej_mbej + t_imae * Wmbje_mbje}
+        tmp_t2 = self.get_buffer('oovv_t2', 'oovv')
+        np.multiply(self.t2, 2.0, out=tmp_t2)
+        tmp_t2 -= self.t2.swapaxes(2, 3)
+        Pr_T2 += ndot('imae,mbej->ijab', tmp_t2, Wmbej, out=tmp)
+        Pr_T2 += ndot('imae,mbje->ijab', self.t2, Wmbje, out=tmp)
 
         # Third term: P^(ab)_(ij) t_mjae * Wmbje_mbie
-        tmp = ndot('mjae,mbie->ijab', self.t2, Wmbje, prefactor=1.0)
-        r_T2 += tmp
-        r_T2 += tmp.swapaxes(0, 1).swapaxes(2, 3)
+        Pr_T2 += ndot('mjae,mbie->ijab', self.t2, Wmbje, prefactor=1.0, out=tmp)
 
         # -P(ij)P(ab) {-t_ie * t_ma * <mb||ej>} -> P^(ab)_(ij) {-t_ie * t_ma * <mb|ej>
         #                                                      + t_ie * t_mb * <ma|je>}
-        tmp = ndot('ie,ma->imea', self.t1, self.t1)
-        tmp1 = ndot('imea,mbej->ijab', tmp, self.get_MO('ovvo'))
-        r_T2 -= tmp1
-        r_T2 -= tmp1.swapaxes(0, 1).swapaxes(2, 3)
-        tmp = ndot('ie,mb->imeb', self.t1, self.t1)
-        tmp1 = ndot('imeb,maje->ijab', tmp, self.get_MO('ovov'))
-        r_T2 -= tmp1
-        r_T2 -= tmp1.swapaxes(0, 1).swapaxes(2, 3)
+        np.einsum('ie,ma->imea', self.t1, self.t1, out=tmp_t2)
+        Pr_T2 -= ndot('imea,mbej->ijab', tmp_t2, self.get_MO('ovvo'), out=tmp)
+        np.einsum('ie,mb->imeb', self.t1, self.t1, out=tmp_t2)
+        Pr_T2 -= ndot('imeb,maje->ijab', tmp_t2, self.get_MO('ovov'), out=tmp)
 
         # P(ij) {t_ie <ab||ej>} -> P^(ab)_(ij) {t_ie <ab|ej>}
-        tmp = ndot(
-            'ie,abej->ijab', self.t1, self.get_MO('vvvo'), prefactor=1.0)
-        r_T2 += tmp
-        r_T2 += tmp.swapaxes(0, 1).swapaxes(2, 3)
+        Pr_T2 += ndot('ie,abej->ijab', self.t1, self.get_MO('vvvo'), prefactor=1.0, out=tmp)
 
-        # P(ab) {-t_ma <mb||ij>} -> P^(ab)_(ij) {-t_ma <mb|ij>}
-        tmp = ndot(
-            'ma,mbij->ijab', self.t1, self.get_MO('ovoo'), prefactor=1.0)
-        r_T2 -= tmp
-        r_T2 -= tmp.swapaxes(0, 1).swapaxes(2, 3)
+        r_T2 += Pr_T2
+        r_T2 += Pr_T2.swapaxes(0, 1).swapaxes(2, 3)
 
         ### Update T1 and T2 amplitudes
-        self.t1 += r_T1 / self.Dia
-        self.t2 += r_T2 / self.Dijab
+        r_T1 /= self.Dia
+        r_T2 /= self.Dijab
+        self.t1 += r_T1
+        self.t2 += r_T2
 
-        rms = np.einsum('ia,ia->', r_T1 / self.Dia, r_T1 / self.Dia)
-        rms += np.einsum('ijab,ijab->', r_T2 / self.Dijab, r_T2 / self.Dijab)
+        rms = np.vdot(r_T1, r_T1)
+        rms += np.vdot(r_T2, r_T2)
 
         return np.sqrt(rms)
 
@@ -379,12 +460,19 @@ class HelperCCEnergy(object):
         self.ccsd_e = self.rhf_e + self.ccsd_corr_e
         return CCSDcorr_E
 
+    def print_memory(self):
+        print('CCSD buffer pool: %s' % self.buffers.report())
+        rss = peak_rss()
+        if rss is not None:
+            print('Peak resident memory: %.3f GB' % rss)
+
     def compute_energy(self,
                        e_conv=1e-7,
                        r_conv=1e-7,
                        maxiter=100,
                        max_diis=8,
-                       start_diis=1):
+                       start_diis=1,
+                       diis_storage='memory'):
 
         ### Start Iterations
         ccsd_tstart = time.time()
@@ -396,7 +484,7 @@ class HelperCCEnergy(object):
             (0, CCSDcorr_E_old, -CCSDcorr_E_old))
 
         # Set up DIIS before iterations begin
-        diis_object = helper_diis(self.t1, self.t2, max_diis)
+        diis_object = helper_diis(self.t1, self.t2, max_diis, storage=diis_storage)
 
         # Iterate!
         for CCSD_iter in range(1, maxiter + 1):
@@ -416,6 +504,7 @@ class HelperCCEnergy(object):
             if (abs(CCSDcorr_E - CCSDcorr_E_old) < e_conv and rms < r_conv):
                 print('\nCCSD has converged in %.3f seconds!' %
                       (time.time() - ccsd_tstart))
+                self.print_memory()
                 return CCSDcorr_E
 
             # Update old energy
@@ -427,5 +516,27 @@ class HelperCCEnergy(object):
             if CCSD_iter >= start_diis:
                 self.t1, self.t2 = diis_object.extrapolate(self.t1, self.t2)
 
+    def compute_triples(self, nproc=1, block_size=None):
+        """
+        (T) correction from the converged t1 and t2 (canonical RHF orbitals).
+        nproc > 1 spreads blocks of unique triplets over a process pool.
+        """
+        triples_tstart = time.time()
+        print('\nComputing the (T) correction over unique triplets...')
+
+        Focc = np.diag(self.get_F('oo'))
+        Fvir = np.diag(self.get_F('vv'))
+        E_T, stats = compute_triples_energy(self.t1, self.t2, self.get_MO('vvvo'),
+                                            self.get_MO('vooo'), self.get_MO('oovv'),
+                                            Focc, Fvir, nproc=nproc, block_size=block_size)
+
+        print('(T) over %d triplets in %d block(s) on %d process(es), %.3f GB of slabs per process'
+              % (stats['triplets'], stats['blocks'], stats['nproc'], stats['slab_gb']))
+        print('(T) has been computed in %.3f seconds!' % (time.time() - triples_tstart))
+
+        self.triples_e = E_T
+        self.ccsd_t_e = self.ccsd_e + E_T
+        return E_T
+
 
 # End HelperCCEnergy class
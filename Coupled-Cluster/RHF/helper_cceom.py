@@ -63,6 +63,7 @@ class HelperCCEom(object):
         self.Hvv = cchbar.Hvv
         self.Hoooo = cchbar.Hoooo
         self.Hvvvv = cchbar.Hvvvv
+        self.contract_Hvvvv = cchbar.contract_Hvvvv
         self.Hvovv = cchbar.Hvovv
         self.Hooov = cchbar.Hooov
         self.Hovvo = cchbar.Hovvo
@@ -178,7 +179,7 @@ class HelperCCEom(object):
         S_2 -= ndot('mi,mjab->ijab', self.Hoo, B2)
 
         S_2 += ndot('mnij,mnab->ijab', self.Hoooo, B2, prefactor=0.5)
-        S_2 += ndot('ijef,abef->ijab', B2, self.Hvvvv, prefactor=0.5)
+        S_2 += self.contract_Hvvvv(B2, prefactor=0.5)
 
         S_2 -= ndot('imeb,maje->ijab', B2, self.Hovov)
         S_2 -= ndot('imea,mbej->ijab', B2, self.Hovvo)
@@ -13,6 +13,8 @@ import time
 import numpy as np
 import psi4
 from utils import ndot
+from utils import contract_ladder
+from utils import ladder_batch_size
 
 
 class HelperCCHbar(object):
@@ -29,7 +31,7 @@ class HelperCCHbar(object):
     1. J. Gauss and J.F. Stanton, J. Chem. Phys., volume 103, pp. 3561-3577 (1995). 
     """
 
-    def __init__(self, ccsd, memory=2):
+    def __init__(self, ccsd, memory=2, store_Hvvvv=False):
 
         # Start of the cchbar class
         time_init = time.time()
@@ -55,6 +57,10 @@ class HelperCCHbar(object):
         self.t1 = ccsd.t1
         self.t2 = ccsd.t2
 
+        # Batches of <ab|ef> for the ladder terms, see HelperCCEnergy.get_vvvv_batch
+        self.get_vvvv_batch = ccsd.get_vvvv_batch
+        self.ladder_memory = ccsd.ladder_memory
+
         print('\nBuilding HBAR components ...')
 
         self.build_Loovv()
@@ -65,7 +71,10 @@ class HelperCCHbar(object):
         self.build_Hoo()
         self.build_Hvv()
         self.build_Hoooo()
-        self.build_Hvvvv()
+        # Hvvvv is only stored on request, contract_Hvvvv() applies it otherwise
+        self.Hvvvv = None
+        if store_Hvvvv:
+            self.build_Hvvvv()
         self.build_Hvovv()
         self.build_Hooov()
         self.build_Hovvo()
@@ -168,6 +177,42 @@ class HelperCCHbar(object):
                            self.get_MO('oovv'))
         return self.Hvvvv
 
+    def contract_Hvvvv(self, X, transpose=False, prefactor=None):
+        """
+            X_ijef <ab|Hbar|ef>, or X_ijef <ef|Hbar|ab> with transpose=True.
+
+            Uses Hvvvv when it was stored. Otherwise the terms of build_Hvvvv are
+            applied one at a time, with <ab|ef> streamed through contract_ladder,
+            so no vvvv sized array is formed.
+        """
+        if self.Hvvvv is not None:
+            if transpose:
+                return ndot('ijef,efab->ijab', X, self.Hvvvv, prefactor=prefactor)
+            return ndot('ijef,abef->ijab', X, self.Hvvvv, prefactor=prefactor)
+
+        # <ab|ef> = <ef|ab>, so the ladder itself is the same both ways
+        R = contract_ladder(X, self.get_vvvv_batch, memory=self.ladder_memory)
+        if transpose:
+            # - t_mf <em|ab> - t_me <fm|ba> + tau_mnef <mn|ab>
+            tmp = ndot('ijef,mf->ijem', X, self.t1)
+            R -= ndot('ijem,emab->ijab', tmp, self.get_MO('vovv'))
+            tmp = ndot('ijef,me->ijfm', X, self.t1)
+            R -= ndot('ijfm,fmba->ijab', tmp, self.get_MO('vovv'))
+            tmp = ndot('ijef,mnef->ijmn', X, self.build_tau())
+            R += ndot('ijmn,mnab->ijab', tmp, self.get_MO('oovv'))
+        else:
+            # - t_mb <am|ef> - t_ma <bm|fe> + tau_mnab <mn|ef>
+            tmp = ndot('ijef,amef->ijam', X, self.get_MO('vovv'))
+            R -= ndot('ijam,mb->ijab', tmp, self.t1)
+            tmp = ndot('ijef,bmfe->ijbm', X, self.get_MO('vovv'))
+            R -= ndot('ijbm,ma->ijab', tmp, self.t1)
+            tmp = ndot('ijef,mnef->ijmn', X, self.get_MO('oovv'))
+            R += ndot('ijmn,mnab->ijab', tmp, self.build_tau())
+
+        if prefactor is not None:
+            R *= prefactor
+        return R
+
     def build_Hvovv(self):
         """ <am|Hbar|ef> = <am||ef> - t_na <nm||ef> """
         self.Hvovv = self.get_MO('vovv').copy()
@@ -222,7 +267,10 @@ class HelperCCHbar(object):
 
         # t_if Wabef
 
-        self.Hvvvo += ndot('if,abef->abei', self.t1, self.get_MO('vvvv'))
+        batch = ladder_batch_size(self.nvirt, self.ladder_memory)
+        for a0 in range(0, self.nvirt, batch):
+            a1 = min(a0 + batch, self.nvirt)
+            self.Hvvvo[a0:a1] += ndot('if,abef->abei', self.t1, self.get_vvvv_batch(a0, a1))
         tmp = ndot('if,ma->imfa', self.t1, self.t1)
         self.Hvvvo -= ndot('imfa,mbef->abei', tmp, self.get_MO('ovvv'))
         self.Hvvvo -= ndot('imfb,amef->abei', tmp, self.get_MO('vovv'))
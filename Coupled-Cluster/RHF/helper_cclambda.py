@@ -55,6 +55,7 @@ class HelperCCLambda(object):
         self.Hoo = hbar.Hoo
         self.Hoooo = hbar.Hoooo
         self.Hvvvv = hbar.Hvvvv
+        self.contract_Hvvvv = hbar.contract_Hvvvv
         self.Hvovv = hbar.Hvovv
         self.Hooov = hbar.Hooov
         self.Hovvo = hbar.Hovvo
@@ -163,7 +164,7 @@ class HelperCCLambda(object):
         r_l2 += ndot('ijeb,ea->ijab', self.l2, self.Hvv)
         r_l2 -= ndot('im,mjab->ijab', self.Hoo, self.l2)
         r_l2 += ndot('ijmn,mnab->ijab', self.Hoooo, self.l2, prefactor=0.5)
-        r_l2 += ndot('ijef,efab->ijab', self.l2, self.Hvvvv, prefactor=0.5)
+        r_l2 += self.contract_Hvvvv(self.l2, transpose=True, prefactor=0.5)
         r_l2 += ndot('ie,ejab->ijab', self.l1, self.Hvovv, prefactor=2.0)
         r_l2 += ndot('ie,ejba->ijab', self.l1, self.Hvovv, prefactor=-1.0)
         r_l2 -= ndot('mb,jima->ijab', self.l1, self.Hooov, prefactor=2.0)
@@ -199,7 +200,8 @@ class HelperCCLambda(object):
                        r_conv=1e-7,
                        maxiter=100,
                        max_diis=8,
-                       start_diis=1):
+                       start_diis=1,
+                       diis_storage='memory'):
 
         ### Start Iterations
         cclambda_tstart = time.time()
@@ -209,7 +211,7 @@ class HelperCCLambda(object):
               (0, pseudoenergy_old, -pseudoenergy_old))
 
         # Set up DIIS before iterations begin
-        diis_object = helper_diis(self.l1, self.l2, max_diis)
+        diis_object = helper_diis(self.l1, self.l2, max_diis, storage=diis_storage)
 
         # Iterate!
         for CCLAMBDA_iter in range(1, maxiter + 1):
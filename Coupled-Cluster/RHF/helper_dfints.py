@@ -0,0 +1,209 @@
+"""
+Three-index factorizations of the MO electron repulsion integrals for the RHF
+coupled cluster helpers.
+
+The two-electron integrals are approximated as (pq|rs) ~ sum_Q B^Q_pq B^Q_rs,
+with B^Q_pq either density fitted with an auxiliary basis or the vectors of a
+pivoted Cholesky decomposition of the AO integrals (computed on the fly, one
+shell pair column at a time). DFIntegrals keeps only the O(N^3) factors and can
+be sliced like the physicist-notation MO tensor of HelperCCEnergy, so HelperCCHbar,
+HelperCCLambda, HelperCCEOM and HelperCCPert use it unchanged.
+
+References:
+1. H. Koch, A. Sanchez de Meras, and T. B. Pedersen,
+   J. Chem. Phys., volume 118, pp. 9481-9484 (2003).
+2. A. E. DePrince and C. D. Sherrill,
+   J. Chem. Theory Comput., volume 9, pp. 2687-2696 (2013).
+"""
+
+__authors__ = "The Psi4NumPy Developers"
+__credits__ = ["Ashutosh Kumar", "Daniel G. A. Smith"]
+
+__copyright__ = "(c) 2014-2018, The Psi4NumPy Developers"
+__license__ = "BSD-3-Clause"
+__date__ = "2026-10-18"
+
+import numpy as np
+import psi4
+
+
+def pivoted_cholesky(diagonal, column, tol=1.e-4, max_vecs=None):
+    """
+    Incomplete Cholesky decomposition of a positive semidefinite matrix M that
+    is only available through its diagonal and column(p) -> M[:, p].
+
+    Returns L with shape (nvec, n) such that M ~ L.T L, stopping once the
+    largest remaining diagonal element drops below tol.
+    """
+
+    D = np.array(diagonal, dtype=np.float64)
+    n = D.shape[0]
+    if max_vecs is None:
+        max_vecs = n
+
+    L = np.zeros((min(n, 64), n))
+    nvec = 0
+    while nvec < max_vecs:
+        p = np.argmax(D)
+        if D[p] < tol:
+            break
+
+        if nvec == L.shape[0]:
+            L = np.vstack((L, np.zeros((min(n, 2 * nvec) - nvec, n))))
+
+        col = np.array(column(p), dtype=np.float64)
+        col -= np.dot(L[:nvec, p], L[:nvec])
+        L[nvec] = col / np.sqrt(D[p])
+        D -= L[nvec]**2
+        D[p] = 0.0
+        nvec += 1
+
+    return L[:nvec].copy()
+
+
+def cholesky_ao_factors(mints, basis, tol=1.e-4):
+    """
+    Cholesky vectors L^Q_mn of the AO integrals, (mn|ls) ~ sum_Q L^Q_mn L^Q_ls.
+
+    The full nbf^4 tensor is never formed: the diagonal comes from the (MN|MN)
+    shell quartets and each pivot column from the (MN|PQ) quartets of its shell pair.
+    """
+
+    nbf = basis.nbf()
+    nshell = basis.nshell()
+    first = [basis.shell_to_basis_function(M) for M in range(nshell)]
+    nfunc = [basis.shell(M).nfunction for M in range(nshell)]
+    shell_of = np.repeat(np.arange(nshell), nfunc)
+    sl = [slice(first[M], first[M] + nfunc[M]) for M in range(nshell)]
+
+    diag = np.zeros((nbf, nbf))
+    for M in range(nshell):
+        for N in range(nshell):
+            block = np.asarray(mints.ao_eri_shell(M, N, M, N))
+            block = block.reshape(nfunc[M] * nfunc[N], nfunc[M] * nfunc[N])
+            diag[sl[M], sl[N]] = np.diag(block).reshape(nfunc[M], nfunc[N])
+
+    # Columns of the most recent shell pair, pivots tend to stay within a pair
+    cache = {}
+
+    def column(p):
+        m, n = divmod(p, nbf)
+        M, N = shell_of[m], shell_of[n]
+        if (M, N) not in cache:
+            cache.clear()
+            cols = np.zeros((nfunc[M], nfunc[N], nbf, nbf))
+            for P in range(nshell):
+                for Q in range(nshell):
+                    block = np.asarray(mints.ao_eri_shell(M, N, P, Q))
+                    cols[:, :, sl[P], sl[Q]] = block.reshape(nfunc[M], nfunc[N], nfunc[P], nfunc[Q])
+            cache[(M, N)] = cols
+        return cache[(M, N)][m - first[M], n - first[N]].ravel()
+
+    L = pivoted_cholesky(diag.ravel(), column, tol=tol)
+    return L.reshape(-1, nbf, nbf)
+
+
+def df_ao_factors(mints, basis, aux):
+    """
+    Density-fitted AO factors B^Q_mn = sum_P (Q|P)^-1/2 (P|mn).
+    """
+
+    zero_bas = psi4.core.BasisSet.zero_ao_basis_set()
+    Ppq = np.squeeze(mints.ao_eri(zero_bas, aux, basis, basis))
+    metric = mints.ao_eri(zero_bas, aux, zero_bas, aux)
+    metric.power(-0.5, 1.e-14)
+    metric = np.squeeze(metric)
+    naux = aux.nbf()
+    return np.dot(metric, Ppq.reshape(naux, -1)).reshape(Ppq.shape)
+
+
+# Index permutations that leave a real <pq|rs> = (pr|qs) unchanged
+_ERI_PERMUTATIONS = [(0, 1, 2, 3), (0, 3, 2, 1), (1, 0, 3, 2), (1, 2, 3, 0),
+                     (2, 1, 0, 3), (2, 3, 0, 1), (3, 0, 1, 2), (3, 2, 1, 0)]
+
+
+class DFIntegrals(object):
+    """
+    MO integrals <pq|rs> = (pr|qs) held as the factors B^Q_pq (naux, nmo, nmo).
+
+    Slicing with four slices, as in MO[o, o, v, v], returns that block of the
+    physicist-notation tensor. Given nocc, the blocks with at least one
+    occupied index (oooo, ooov, oovv, ovov, ovvv) are assembled once and every
+    other ordering of them (ovvo, vvvo, ...) is a transposed view of the
+    cached block. Other blocks are assembled on demand, and vvvv_batch() hands
+    out slices of the vvvv block for utils.contract_ladder without ever
+    forming all of it.
+    """
+
+    def __init__(self, B, nocc=None):
+        self.B = B
+        self.naux = B.shape[0]
+        self.nmo = B.shape[1]
+        self.shape = (self.nmo, ) * 4
+        self.ndim = 4
+
+        self.cache = {}
+        if nocc is not None:
+            o, v = slice(0, nocc), slice(nocc, self.nmo)
+            for block in ['oooo', 'ooov', 'oovv', 'ovov', 'ovvv']:
+                key = tuple(o if x == 'o' else v for x in block)
+                self.cache[self._cache_key(key)] = self._assemble(key)
+
+    @classmethod
+    def from_df(cls, mints, basis, C, aux, nocc=None):
+        return cls(cls.transform(df_ao_factors(mints, basis, aux), C), nocc=nocc)
+
+    @classmethod
+    def from_cholesky(cls, mints, basis, C, tol=1.e-4, nocc=None):
+        return cls(cls.transform(cholesky_ao_factors(mints, basis, tol=tol), C), nocc=nocc)
+
+    @staticmethod
+    def transform(Bao, C):
+        """
+        AO -> MO transformation of the factors, B^Q_pq = C_mp B^Q_mn C_nq.
+        """
+        tmp = np.dot(Bao, C)
+        return np.matmul(C.T, tmp)
+
+    @property
+    def nbytes(self):
+        return self.B.nbytes
+
+    @property
+    def cache_nbytes(self):
+        return sum(block.nbytes for block in self.cache.values())
+
+    def _cache_key(self, key):
+        return tuple(x.indices(self.nmo) for x in key)
+
+    def __getitem__(self, key):
+        if (len(key) != 4) or not all(isinstance(x, slice) for x in key):
+            psi4.core.clean()
+            raise Exception('DFIntegrals: can only be indexed with four slices.')
+
+        key_ = self._cache_key(key)
+        for perm in _ERI_PERMUTATIONS:
+            block = self.cache.get(tuple(key_[i] for i in perm))
+            if block is not None:
+                return block.transpose(np.argsort(perm))
+        return self._assemble(key)
+
+    def _assemble(self, key):
+        """
+        Assembles the block <pq|rs> = sum_Q B^Q_pr B^Q_qs for four slices.
+        """
+        p, q, r, s = key
+        Bpr = self.B[:, p, r]
+        Bqs = self.B[:, q, s]
+        block = np.dot(Bpr.reshape(self.naux, -1).T, Bqs.reshape(self.naux, -1))
+        return block.reshape(Bpr.shape[1:] + Bqs.shape[1:]).swapaxes(1, 2)
+
+    def vvvv_batch(self, vslice, a0, a1):
+        """
+        Returns <ab|ef> = (ae|bf) over the virtual block vslice for
+        a0 <= a < a1, assembled from the factors.
+        """
+        Bvv = self.B[:, vslice, vslice]
+        nb, nvir = a1 - a0, Bvv.shape[1]
+        slab = np.dot(Bvv[:, a0:a1].reshape(self.naux, -1).T, Bvv.reshape(self.naux, -1))
+        return slab.reshape(nb, nvir, nvir, nvir).swapaxes(1, 2)
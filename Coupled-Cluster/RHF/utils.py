@@ -1,173 +1,325 @@
+import sys
 import time
 import numpy as np
 import psi4
 
+# The DIIS engine is shared with the SCF and response helpers
+import os.path
+dirname = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(dirname, '../../Self-Consistent-Field'))
+from helper_DIIS import DIIS
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+# Compiled ndot contractions keyed on (subscripts, shapes, strides)
+_ndot_plans = {}
+
+# Call counters, see ndot_statistics()
+_ndot_counts = {'calls': 0, 'plans': 0, 'gemm': 0, 'tensordot': 0, 'einsum': 0}
+_ndot_einsum_fallbacks = {}
+
+
+class NdotPlan(object):
+    """
+    The compiled form of one ndot contraction.
+
+    Stores how the operands are laid out for the matrix multiply (or which
+    fallback is used), the shape of the raw result and the axis permutation
+    that brings it into the requested output order, so that repeated calls
+    skip all subscript parsing.
+    """
+
+    def __init__(self, input_string, shape1, shape2):
+
+        inp, output_ind = input_string.split('->')
+        input_left, input_right = inp.split(',')
+
+        size_dict = {}
+        for s, size in zip(input_left, shape1):
+            size_dict[s] = size
+        for s, size in zip(input_right, shape2):
+            size_dict[s] = size
+
+        set_left = set(input_left)
+        set_right = set(input_right)
+        set_out = set(output_ind)
+
+        idx_removed = (set_left | set_right) - set_out
+        keep_left = set_left - idx_removed
+        keep_right = set_right - idx_removed
+
+        # Tensordot axes
+        left_pos, right_pos = (), ()
+        for s in idx_removed:
+            left_pos += (input_left.find(s), )
+            right_pos += (input_right.find(s), )
+        self.tdot_axes = (left_pos, right_pos)
+
+        # Get result ordering
+        tdot_result = input_left + input_right
+        for s in idx_removed:
+            tdot_result = tdot_result.replace(s, '')
+
+        rs = len(idx_removed)
+        dim_left, dim_right, dim_removed = 1, 1, 1
+        for key, size in size_dict.items():
+            if key in keep_left:
+                dim_left *= size
+            if key in keep_right:
+                dim_right *= size
+            if key in idx_removed:
+                dim_removed *= size
+
+        self.input_string = input_string
+        self.shape_result = tuple(size_dict[x] for x in tdot_result)
+        self.shape_out = tuple(size_dict[x] for x in output_ind)
+        self.gemm_shape = (dim_left, dim_right)
+
+        # GEMM layout: shapes the operands are viewed as and whether each is transposed
+        self.kind = 'gemm'
+        # No transpose needed
+        if input_left[-rs:] == input_right[:rs]:
+            self.left_layout = ((dim_left, dim_removed), False)
+            self.right_layout = ((dim_removed, dim_right), False)
+
+        # Transpose both
+        elif input_left[:rs] == input_right[-rs:]:
+            self.left_layout = ((dim_removed, dim_left), True)
+            self.right_layout = ((dim_right, dim_removed), True)
+
+        # Transpose right
+        elif input_left[-rs:] == input_right[-rs:]:
+            self.left_layout = ((dim_left, dim_removed), False)
+            self.right_layout = ((dim_right, dim_removed), True)
+
+        # Tranpose left
+        elif input_left[:rs] == input_right[:rs]:
+            self.left_layout = ((dim_removed, dim_left), True)
+            self.right_layout = ((dim_removed, dim_right), False)
+
+        # If we have to transpose vector-matrix, einsum is faster
+        elif (len(keep_left) == 0) or (len(keep_right) == 0):
+            self.kind = 'einsum'
+
+        else:
+            self.kind = 'tensordot'
+
+        # Output permutation, None if the raw result is already in output order
+        if (self.kind == 'einsum') or (tdot_result == output_ind):
+            self.perm = None
+        else:
+            self.perm = tuple(tdot_result.index(x) for x in output_ind)
+
+    def contract(self, op1, op2, prefactor=None, out=None):
+        """
+        Runs the contraction, writing into out when given.
+        """
+
+        if self.kind == 'einsum':
+            new_view = np.einsum(self.input_string, op1, op2, out=out)
+            if prefactor is not None:
+                new_view *= prefactor
+            return new_view
+
+        # The GEMM can write straight into a contiguous output buffer
+        direct = (out is not None) and (self.kind == 'gemm') and (self.perm is None) and out.flags.c_contiguous
+
+        if self.kind == 'gemm':
+            shape, trans = self.left_layout
+            left = op1.reshape(shape).T if trans else op1.reshape(shape)
+            shape, trans = self.right_layout
+            right = op2.reshape(shape).T if trans else op2.reshape(shape)
+            if direct:
+                np.dot(left, right, out=out.reshape(self.gemm_shape))
+                new_view = out
+            else:
+                new_view = np.dot(left, right)
+        else:
+            new_view = np.tensordot(op1, op2, axes=self.tdot_axes)
+
+        # Make sure the resulting shape is correct
+        if (new_view.shape != self.shape_result) and not direct:
+            if (len(self.shape_result) > 0):
+                new_view = new_view.reshape(self.shape_result)
+            else:
+                new_view = np.squeeze(new_view)
+
+        # In-place mult by prefactor if requested
+        if prefactor is not None:
+            new_view *= prefactor
+
+        # Do final tranpose if needed
+        if self.perm is not None:
+            new_view = new_view.transpose(self.perm)
+        if (out is not None) and not direct:
+            out[...] = new_view
+            return out
+        return new_view
+
+
+def plan_ndot(input_string, op1, op2):
+    """
+    Returns the cached NdotPlan for these subscripts, shapes and strides,
+    compiling it on first use.
+    """
+
+    key = (input_string, op1.shape, op2.shape, op1.strides, op2.strides)
+    plan = _ndot_plans.get(key)
+    if plan is None:
+        plan = NdotPlan(input_string, op1.shape, op2.shape)
+        _ndot_plans[key] = plan
+        _ndot_counts['plans'] += 1
+    return plan
+
+
+def ndot_statistics(reset=False):
+    """
+    Returns the ndot call counters: total calls, compiled plans, calls per
+    kind (gemm, tensordot, einsum) and the einsum fallbacks per subscript.
+    """
+
+    stats = dict(_ndot_counts)
+    stats['einsum_fallbacks'] = dict(_ndot_einsum_fallbacks)
+    if reset:
+        for key in _ndot_counts:
+            _ndot_counts[key] = 0
+        _ndot_einsum_fallbacks.clear()
+    return stats
+
 
 # N dimensional dot
 # Like a mini DPD library
-def ndot(input_string, op1, op2, prefactor=None):
+def ndot(input_string, op1, op2, prefactor=None, out=None):
     """
     No checks, if you get weird errors its up to you to debug.
 
     ndot('abcd,cdef->abef', arr1, arr2)
+
+    The contraction plan is cached on (subscripts, shapes, strides). If out
+    is given the result is written into it (and out is returned).
     """
-    inp, output_ind = input_string.split('->')
-    input_left, input_right = inp.split(',')
-
-    size_dict = {}
-    for s, size in zip(input_left, op1.shape):
-        size_dict[s] = size
-    for s, size in zip(input_right, op2.shape):
-        size_dict[s] = size
-
-    set_left = set(input_left)
-    set_right = set(input_right)
-    set_out = set(output_ind)
-
-    idx_removed = (set_left | set_right) - set_out
-    keep_left = set_left - idx_removed
-    keep_right = set_right - idx_removed
-
-    # Tensordot axes
-    left_pos, right_pos = (), ()
-    for s in idx_removed:
-        left_pos += (input_left.find(s), )
-        right_pos += (input_right.find(s), )
-    tdot_axes = (left_pos, right_pos)
-
-    # Get result ordering
-    tdot_result = input_left + input_right
-    for s in idx_removed:
-        tdot_result = tdot_result.replace(s, '')
-
-    rs = len(idx_removed)
-    dim_left, dim_right, dim_removed = 1, 1, 1
-    for key, size in size_dict.items():
-        if key in keep_left:
-            dim_left *= size
-        if key in keep_right:
-            dim_right *= size
-        if key in idx_removed:
-            dim_removed *= size
-
-    shape_result = tuple(size_dict[x] for x in tdot_result)
-    used_einsum = False
-
-    # Matrix multiply
-    # No transpose needed
-    if input_left[-rs:] == input_right[:rs]:
-        new_view = np.dot(
-            op1.reshape(dim_left, dim_removed),
-            op2.reshape(dim_removed, dim_right))
-
-    # Transpose both
-    elif input_left[:rs] == input_right[-rs:]:
-        new_view = np.dot(
-            op1.reshape(dim_removed, dim_left).T,
-            op2.reshape(dim_right, dim_removed).T)
-
-    # Transpose right
-    elif input_left[-rs:] == input_right[-rs:]:
-        new_view = np.dot(
-            op1.reshape(dim_left, dim_removed),
-            op2.reshape(dim_right, dim_removed).T)
-
-    # Tranpose left
-    elif input_left[:rs] == input_right[:rs]:
-        new_view = np.dot(
-            op1.reshape(dim_removed, dim_left).T,
-            op2.reshape(dim_removed, dim_right))
-
-    # If we have to transpose vector-matrix, einsum is faster
-    elif (len(keep_left) == 0) or (len(keep_right) == 0):
-        new_view = np.einsum(input_string, op1, op2)
-        used_einsum = True
-
-    else:
-        new_view = np.tensordot(op1, op2, axes=tdot_axes)
-
-    # Make sure the resulting shape is correct
-    if (new_view.shape != shape_result) and not used_einsum:
-        if (len(shape_result) > 0):
-            new_view = new_view.reshape(shape_result)
-        else:
-            new_view = np.squeeze(new_view)
 
-    # In-place mult by prefactor if requested
-    if prefactor is not None:
-        new_view *= prefactor
+    plan = plan_ndot(input_string, op1, op2)
+    _ndot_counts['calls'] += 1
+    _ndot_counts[plan.kind] += 1
+    if plan.kind == 'einsum':
+        _ndot_einsum_fallbacks[input_string] = _ndot_einsum_fallbacks.get(input_string, 0) + 1
+    return plan.contract(op1, op2, prefactor=prefactor, out=out)
 
-    # Do final tranpose if needed
-    if used_einsum:
-        return new_view
-    elif tdot_result == output_ind:
-        return new_view
-    else:
-        return np.einsum(tdot_result + '->' + output_ind, new_view)
 
+def ladder_batch_size(nvir, memory=0.5):
+    """
+    Number of a indices of <ab|ef> that fit in memory (GB), counting the batch
+    and one reordered copy of it.
+    """
 
-class helper_diis(object):
-    def __init__(self, t1, t2, max_diis):
+    batch = int(memory * 1.e9 / (2 * 8 * nvir**3))
+    return max(1, min(nvir, batch))
 
-        self.oldt1 = t1.copy()
-        self.oldt2 = t2.copy()
-        self.diis_vals_t1 = [t1.copy()]
-        self.diis_vals_t2 = [t2.copy()]
-        self.diis_errors = []
-        self.diis_size = 0
-        self.max_diis = max_diis
 
-    def add_error_vector(self, t1, t2):
+def contract_ladder(tau, vvvv_batch, memory=0.5, out=None):
+    """
+    Particle-particle ladder sum_ef tau_ijef <ab|ef> without holding the vvvv
+    integrals at once.
 
-        # Add DIIS vectors
-        self.diis_vals_t1.append(t1.copy())
-        self.diis_vals_t2.append(t2.copy())
-        # Add new error vectors
-        error_t1 = (self.diis_vals_t1[-1] - self.oldt1).ravel()
-        error_t2 = (self.diis_vals_t2[-1] - self.oldt2).ravel()
-        self.diis_errors.append(np.concatenate((error_t1, error_t2)))
-        self.oldt1 = t1.copy()
-        self.oldt2 = t2.copy()
+    vvvv_batch(a0, a1) returns <ab|ef> for a0 <= a < a1 with shape
+    (a1 - a0, nvir, nvir, nvir); batches are sized to fit in memory (GB).
+    """
+
+    nvir = tau.shape[2]
+    if out is None:
+        out = np.empty(tau.shape[:2] + (nvir, nvir))
+    batch = ladder_batch_size(nvir, memory)
+    for a0 in range(0, nvir, batch):
+        a1 = min(a0 + batch, nvir)
+        ndot('ijef,abef->ijab', tau, vvvv_batch(a0, a1), out=out[:, :, a0:a1])
+    return out
 
-    def extrapolate(self, t1, t2):
 
-        # Limit size of DIIS vector
-        if (len(self.diis_vals_t1) > self.max_diis):
-            del self.diis_vals_t1[0]
-            del self.diis_vals_t2[0]
-            del self.diis_errors[0]
+class BufferPool(object):
+    """
+    Named work arrays that are allocated once and handed back on every later
+    request, so iterative solvers stop going through the allocator for their
+    intermediates. Tracks the bytes currently held and the high-water mark.
+    """
 
-        self.diis_size = len(self.diis_vals_t1) - 1
+    def __init__(self):
+        self.buffers = {}
+        self.nbytes = 0
+        self.peak_nbytes = 0
+
+    def get(self, name, shape, zero=False):
+        """
+        Returns the buffer called name, (re)allocating it if the shape changed.
+        The contents are whatever the last user left unless zero is set.
+        """
+
+        shape = tuple(shape)
+        buf = self.buffers.get(name)
+        if (buf is None) or (buf.shape != shape):
+            if buf is not None:
+                self.nbytes -= buf.nbytes
+            buf = np.empty(shape)
+            self.buffers[name] = buf
+            self.nbytes += buf.nbytes
+            self.peak_nbytes = max(self.peak_nbytes, self.nbytes)
+        if zero:
+            buf.fill(0.0)
+        return buf
+
+    def release(self, name=None):
+        """
+        Drops one buffer, or every buffer when name is None.
+        """
+
+        names = list(self.buffers) if name is None else [name]
+        for key in names:
+            buf = self.buffers.pop(key, None)
+            if buf is not None:
+                self.nbytes -= buf.nbytes
+
+    def report(self):
+        return "%d buffers, %.3f GB held, %.3f GB peak" % (
+            len(self.buffers), self.nbytes * 1.e-9, self.peak_nbytes * 1.e-9)
+
+
+def peak_rss():
+    """
+    Returns the peak resident set size of this process in GB, or None where
+    the resource module is unavailable.
+    """
 
-        # Build error matrix B
-        B = np.ones((self.diis_size + 1, self.diis_size + 1)) * -1
-        B[-1, -1] = 0
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    if sys.platform == 'darwin':
+        return peak * 1.e-9
+    return peak * 1.e-6
 
-        for n1, e1 in enumerate(self.diis_errors):
-            B[n1, n1] = np.dot(e1, e1)
-            for n2, e2 in enumerate(self.diis_errors):
-                if n1 >= n2: continue
-                B[n1, n2] = np.dot(e1, e2)
-                B[n2, n1] = B[n1, n2]
 
-        B[:-1, :-1] /= np.abs(B[:-1, :-1]).max()
+class helper_diis(object):
+    """
+    DIIS on the (t1, t2)-like amplitude pairs of the CC helpers, using the
+    shared helper_DIIS.DIIS engine with the amplitude change as error vector.
+    storage='disk' memory maps the stored amplitudes and errors.
+    """
 
-        # Build residual vector
-        resid = np.zeros(self.diis_size + 1)
-        resid[-1] = -1
+    def __init__(self, t1, t2, max_diis, storage='memory', scratch_dir=None):
 
-        # Solve pulay equations
-        ci = np.linalg.solve(B, resid)
+        self.diis = DIIS(max_vec=max_diis, storage=storage, scratch_dir=scratch_dir)
+        self.diis.set_reference((t1, t2))
 
-        # Calculate new amplitudes
-        t1 = np.zeros_like(self.oldt1)
-        t2 = np.zeros_like(self.oldt2)
-        for num in range(self.diis_size):
-            t1 += ci[num] * self.diis_vals_t1[num + 1]
-            t2 += ci[num] * self.diis_vals_t2[num + 1]
+    @property
+    def diis_size(self):
+        return self.diis.diis_size
 
-        # Save extrapolated amplitudes to old_t amplitudes
-        self.oldt1 = t1.copy()
-        self.oldt2 = t2.copy()
+    def add_error_vector(self, t1, t2):
+        self.diis.add((t1, t2))
 
-        return t1, t2
+    def extrapolate(self, t1, t2):
+        return self.diis.extrapolate()
@@ -48,61 +48,22 @@ CCSD_E = ccsd.ccsd_e
 print('\nFinal CCSD correlation energy:          % 16.10f' % CCSDcorr_E)
 print('Total CCSD energy:                      % 16.10f' % CCSD_E)
 
-# Triples correction required o^3v^3 storage due the noddy algorithm
-T_Size = (ccsd.nocc ** 3 * ccsd.nvirt ** 3) * 8e-9
-print("\nSize of the T3 tensor will be %4.2f GB." % T_Size)
-memory_footprint = T_Size * 4.2
-if memory_footprint > numpy_memory:
-    clean()
-    raise Exception("Estimated memory utilization for pertubative triples (%4.2f GB) exceeds numpy_memory limit of %4.2f GB." % (memory_footprint, numpy_memory))
-
-# P(i/jk) * P(a/bc)
-# (ijk - jik - kji) * (abc - bac - cba)
-# (ijkabc - ijkbac - ijkcba - jikabc + jikbac + jikcba - kjiabc + kjicac + kjicba)
-
-# Build disconnected t3
-print('\nBuilding disconnected T3...')
-t = time.time()
-tmp = np.einsum('ia,jkbc->ijkabc', ccsd.t1, ccsd.get_MO('oovv'))
-t3d = tmp.copy()
-t3d -= np.einsum('ijkabc->ijkbac', tmp)
-t3d -= np.einsum('ijkabc->ijkcba', tmp)
-t3d -= np.einsum('ijkabc->jikabc', tmp)
-t3d += np.einsum('ijkabc->jikbac', tmp)
-t3d += np.einsum('ijkabc->jikcba', tmp)
-t3d -= np.einsum('ijkabc->kjiabc', tmp)
-t3d += np.einsum('ijkabc->kjibac', tmp)
-t3d += np.einsum('ijkabc->kjicba', tmp)
-print('...built disconnected T3 in %.3f seconds.' % (time.time() - t))
-
-# Build connected t3
-print('\nBuilding connected T3...')
-t = time.time()
-tmp = ndot('jkae,eibc->ijkabc', ccsd.t2, ccsd.get_MO('vovv')).copy()
-tmp -= ndot('imbc,majk->ijkabc', ccsd.t2, ccsd.get_MO('ovoo'))
-t3c = tmp.copy()
-t3c -= np.einsum('ijkabc->ijkbac', tmp)
-t3c -= np.einsum('ijkabc->ijkcba', tmp)
-t3c -= np.einsum('ijkabc->jikabc', tmp)
-t3c += np.einsum('ijkabc->jikbac', tmp)
-t3c += np.einsum('ijkabc->jikcba', tmp)
-t3c -= np.einsum('ijkabc->kjiabc', tmp)
-t3c += np.einsum('ijkabc->kjibac', tmp)
-t3c += np.einsum('ijkabc->kjicba', tmp)
-print('...built connected T3 in %.3f seconds.' % (time.time() - t))
-
-# Form last intermediate
-tmp = t3c + t3d
-
-# Construct D3
+# Loop over unique occupied triplets i > j > k (helper_triples) with O(v^3) memory
+# per triplet instead of the o^3v^3 T3 arrays of the noddy algorithm
+
+# Worker processes for the blocked triples. Values above 1 rely on the fork start
+# method (Linux) since this script has no __main__ guard
+nproc = 1
+
+from helper_triples import compute_triples_energy
+
+print('\nComputing blocked (T) correction...')
 Focc = np.diag(ccsd.get_F('oo'))
 Fvir = np.diag(ccsd.get_F('vv'))
-Dijkabc = Focc.reshape(-1, 1, 1, 1, 1, 1) + Focc.reshape(-1, 1, 1, 1, 1) + Focc.reshape(-1, 1, 1, 1)
-Dijkabc = Dijkabc - Fvir.reshape(-1, 1, 1) - Fvir.reshape(-1, 1) - Fvir
-tmp /= Dijkabc
-
-# Compute energy expression
-Pert_T = (1.0/36) * np.einsum('ijkabc,ijkabc', t3c, tmp)
+Pert_T, stats = compute_triples_energy(ccsd.t1, ccsd.t2, ccsd.get_MO('vovv'), ccsd.get_MO('ovoo'),
+                                       ccsd.get_MO('oovv'), Focc, Fvir, nproc=nproc)
+print('...%d triplets in %d blocks on %d processes in %.3f seconds, %.3f GB of slabs per process.' %
+      (stats['triplets'], stats['blocks'], stats['nproc'], stats['seconds'], stats['slab_gb']))
 
 CCSD_T_E = CCSD_E + Pert_T
 
@@ -18,99 +18,13 @@ import numpy as np
 import psi4
 
 
-# N dimensional dot
-# Like a mini DPD library
-def ndot(input_string, op1, op2, prefactor=None):
-    """
-    No checks, if you get weird errors its up to you to debug.
-
-    ndot('abcd,cdef->abef', arr1, arr2)
-    """
-    inp, output_ind = input_string.split('->')
-    input_left, input_right = inp.split(',')
-
-    size_dict = {}
-    for s, size in zip(input_left, op1.shape):
-        size_dict[s] = size
-    for s, size in zip(input_right, op2.shape):
-        size_dict[s] = size
-
-    set_left = set(input_left)
-    set_right = set(input_right)
-    set_out = set(output_ind)
-
-    idx_removed = (set_left | set_right) - set_out
-    keep_left = set_left - idx_removed
-    keep_right = set_right - idx_removed
-
-    # Tensordot axes
-    left_pos, right_pos = (), ()
-    for s in idx_removed:
-        left_pos += (input_left.find(s), )
-        right_pos += (input_right.find(s), )
-    tdot_axes = (left_pos, right_pos)
-
-    # Get result ordering
-    tdot_result = input_left + input_right
-    for s in idx_removed:
-        tdot_result = tdot_result.replace(s, '')
-
-    rs = len(idx_removed)
-    dim_left, dim_right, dim_removed = 1, 1, 1
-    for key, size in size_dict.items():
-        if key in keep_left:
-            dim_left *= size
-        if key in keep_right:
-            dim_right *= size
-        if key in idx_removed:
-            dim_removed *= size
-
-    shape_result = tuple(size_dict[x] for x in tdot_result)
-    used_einsum = False
-
-    # Matrix multiply
-    # No transpose needed
-    if input_left[-rs:] == input_right[:rs]:
-        new_view = np.dot(op1.reshape(dim_left, dim_removed), op2.reshape(dim_removed, dim_right))
-
-    # Transpose both
-    elif input_left[:rs] == input_right[-rs:]:
-        new_view = np.dot(op1.reshape(dim_removed, dim_left).T, op2.reshape(dim_right, dim_removed).T)
-
-    # Transpose right
-    elif input_left[-rs:] == input_right[-rs:]:
-        new_view = np.dot(op1.reshape(dim_left, dim_removed), op2.reshape(dim_right, dim_removed).T)
-
-    # Tranpose left
-    elif input_left[:rs] == input_right[:rs]:
-        new_view = np.dot(op1.reshape(dim_removed, dim_left).T, op2.reshape(dim_removed, dim_right))
-
-    # If we have to transpose vector-matrix, einsum is faster
-    elif (len(keep_left) == 0) or (len(keep_right) == 0):
-        new_view = np.einsum(input_string, op1, op2)
-        used_einsum = True
-
-    else:
-        new_view = np.tensordot(op1, op2, axes=tdot_axes)
-
-    # Make sure the resulting shape is correct
-    if (new_view.shape != shape_result) and not used_einsum:
-        if (len(shape_result) > 0):
-            new_view = new_view.reshape(shape_result)
-        else:
-            new_view = np.squeeze(new_view)
-
-    # In-place mult by prefactor if requested
-    if prefactor is not None:
-        new_view *= prefactor
-
-    # Do final tranpose if needed
-    if used_einsum:
-        return new_view
-    elif tdot_result == output_ind:
-        return new_view
-    else:
-        return np.einsum(tdot_result + '->' + output_ind, new_view)
+# ndot and its contraction plan cache are shared with the RHF-CC helpers
+import os.path
+import sys
+dirname = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(dirname, '../../RHF'))
+from utils import ndot
+from utils import helper_diis
 
 
 class helper_CCSD(object):
@@ -345,6 +259,25 @@ class helper_CCSD(object):
         Wabef += ndot('mnab,mnef->abef', self.build_tau(), self.get_MO('oovv'), prefactor=0.25)
         return Wabef
 
+    def build_ladder(self, tau):
+        """
+        Returns 0.5 * tau_ijef Wabef ([Stanton:1991:4334] Eqns. 2 and 7) without
+        forming Wabef: <ab||ef> is contracted straight from the MO tensor and the
+        other terms of Eqn. 7 are applied to tau first.
+        """
+        ladder = ndot('ijef,abef->ijab', tau, self.get_MO('vvvv'), prefactor=0.5)
+
+        # -0.5 * P(ab) t_mb tau_ijef <am||ef>
+        tmp = ndot('ijef,amef->ijam', tau, self.get_MO('vovv'))
+        Pab = ndot('ijam,mb->ijab', tmp, self.t1, prefactor=0.5)
+        ladder -= Pab
+        ladder += Pab.swapaxes(2, 3)
+
+        # 0.125 * tau_mnab tau_ijef <mn||ef>
+        tmp = ndot('ijef,mnef->ijmn', tau, self.get_MO('oovv'))
+        ladder += ndot('ijmn,mnab->ijab', tmp, tau, prefactor=0.125)
+        return ladder
+
     #Build Eqn 8:
     def build_Wmbej(self):
         """Builds [Stanton:1991:4334] Eqn. 8"""
@@ -392,9 +325,8 @@ class helper_CCSD(object):
 
         tmp_tau = self.build_tau()
         Wmnij = self.build_Wmnij()
-        Wabef = self.build_Wabef()
         rhs_T2 += ndot('mnab,mnij->ijab', tmp_tau, Wmnij, prefactor=0.5)
-        rhs_T2 += ndot('ijef,abef->ijab', tmp_tau, Wabef, prefactor=0.5)
+        rhs_T2 += self.build_ladder(tmp_tau)
 
         # P_(ij) * P_(ab)
         # (ij - ji) * (ab - ba)
@@ -431,12 +363,10 @@ class helper_CCSD(object):
         self.ccsd_e = self.rhf_e + self.ccsd_corr_e
         return CCSDcorr_E
 
-    def compute_energy(self, e_conv=1.e-8, maxiter=20, max_diis=8):
+    def compute_energy(self, e_conv=1.e-8, maxiter=20, max_diis=8, diis_storage='memory'):
         """Computes total CCSD energy."""
         ### Setup DIIS
-        diis_vals_t1 = [self.t1.copy()]
-        diis_vals_t2 = [self.t2.copy()]
-        diis_errors = []
+        diis_object = helper_diis(self.t1, self.t2, max_diis, storage=diis_storage)
 
         ### Start Iterations
         ccsd_tstart = time.time()
@@ -446,13 +376,8 @@ class helper_CCSD(object):
         print("CCSD Iteration %3d: CCSD correlation = %.12f   dE = % .5E   MP2" % (0, CCSDcorr_E_old, -CCSDcorr_E_old))
 
         # Iterate!
-        diis_size = 0
         for CCSD_iter in range(1, maxiter + 1):
 
-            # Save new amplitudes
-            oldt1 = self.t1.copy()
-            oldt2 = self.t2.copy()
-
             self.update()
 
             # Compute CCSD correlation energy
@@ -460,60 +385,19 @@ class helper_CCSD(object):
 
             # Print CCSD iteration information
             print('CCSD Iteration %3d: CCSD correlation = %.12f   dE = % .5E   DIIS = %d' %
-                  (CCSD_iter, CCSDcorr_E, (CCSDcorr_E - CCSDcorr_E_old), diis_size))
+                  (CCSD_iter, CCSDcorr_E, (CCSDcorr_E - CCSDcorr_E_old), diis_object.diis_size))
 
             # Check convergence
             if (abs(CCSDcorr_E - CCSDcorr_E_old) < e_conv):
                 print('\nCCSD has converged in %.3f seconds!' % (time.time() - ccsd_tstart))
                 return CCSDcorr_E
 
-            # Add DIIS vectors
-            diis_vals_t1.append(self.t1.copy())
-            diis_vals_t2.append(self.t2.copy())
-
-            # Build new error vector
-            error_t1 = (diis_vals_t1[-1] - oldt1).ravel()
-            error_t2 = (diis_vals_t2[-1] - oldt2).ravel()
-            diis_errors.append(np.concatenate((error_t1, error_t2)))
-
             # Update old energy
             CCSDcorr_E_old = CCSDcorr_E
 
-            if CCSD_iter >= 1:
-                # Limit size of DIIS vector
-                if (len(diis_vals_t1) > max_diis):
-                    del diis_vals_t1[0]
-                    del diis_vals_t2[0]
-                    del diis_errors[0]
-
-                diis_size = len(diis_vals_t1) - 1
-
-                # Build error matrix B, [Pulay:1980:393], Eqn. 6, LHS
-                B = np.ones((diis_size + 1, diis_size + 1)) * -1
-                B[-1, -1] = 0
-
-                for n1, e1 in enumerate(diis_errors):
-                    B[n1, n1] = np.dot(e1, e1)
-                    for n2, e2 in enumerate(diis_errors):
-                        if n1 >= n2: continue
-                        B[n1, n2] = np.dot(e1, e2)
-                        B[n2, n1] = B[n1, n2]
-
-                B[:-1, :-1] /= np.abs(B[:-1, :-1]).max()
-
-                # Build residual vector, [Pulay:1980:393], Eqn. 6, RHS
-                resid = np.zeros(diis_size + 1)
-                resid[-1] = -1
-
-                # Solve pulay equations, [Pulay:1980:393], Eqn. 6
-                ci = np.linalg.solve(B, resid)
-
-                # Calculate new amplitudes
-                self.t1[:] = 0
-                self.t2[:] = 0
-                for num in range(diis_size):
-                    self.t1 += ci[num] * diis_vals_t1[num + 1]
-                    self.t2 += ci[num] * diis_vals_t2[num + 1]
+            # Add the new error vector (the amplitude change) and extrapolate
+            diis_object.add_error_vector(self.t1, self.t2)
+            self.t1, self.t2 = diis_object.extrapolate(self.t1, self.t2)
 
             # End DIIS amplitude update
             # End CCSD class
@@ -44,6 +44,17 @@ psi4.set_options({'basis': 'aug-cc-pVDZ',
 
 check_energy = False
 
+# The blocked DGEMM kernel of helper_DFMP2 picks its occupied block size to fit
+# into numpy_memory (GB)
+numpy_memory = 2
+
+# Keep (Q|ia) in a memory-mapped scratch file instead of RAM?
+out_of_core = False
+
+# Worker processes for the blocked kernel, sharing one copy of (Q|ia). Values above 1
+# rely on the fork start method (Linux) since this script has no __main__ guard
+nproc = 1
+
 print('\nStarting RHF...')
 t = time.time()
 RHF_E, wfn = psi4.energy('SCF', return_wfn=True)
@@ -63,9 +74,25 @@ print('\nBuilding DF ERI tensor Qov...')
 t = time.time()
 C = wfn.Ca()
 aux = psi4.core.BasisSet.build(mol, "DF_BASIS_MP2", "", "RIFIT", "aug-cc-pvdz")
-df = psi4.core.DFTensor(wfn.basisset(), aux, C, ndocc, nvirt) 
-# Transformed MO DF tensor
-Qov = np.asarray(df.Qov())
+if out_of_core:
+    from helper_DFMP2 import DFTensorStore, aux_atom_blocks, transform_to_store
+
+    # (P|Q)^-1/2 metric; the raw (P|pq) is computed and transformed one auxiliary atom at a time
+    mints = psi4.core.MintsHelper(wfn.basisset())
+    zero_bas = psi4.core.BasisSet.zero_ao_basis_set()
+    metric = mints.ao_eri(zero_bas, aux, zero_bas, aux)
+    metric.power(-0.5, 1.e-14)
+    metric = np.squeeze(metric)
+
+    C = np.asarray(C)
+    Qov = DFTensorStore(aux.nbf(), ndocc, nvirt)
+    Ppq = aux_atom_blocks(mol, wfn.basisset(), "DF_BASIS_MP2", "", "RIFIT", "aug-cc-pvdz")
+    transform_to_store(Ppq, C[:, :ndocc], C[:, ndocc:], Qov, metric=metric, memory=numpy_memory)
+    print('...Qov written to %s' % Qov.filename)
+else:
+    df = psi4.core.DFTensor(wfn.basisset(), aux, C, ndocc, nvirt)
+    # Transformed MO DF tensor
+    Qov = np.asarray(df.Qov())
 print('...Qov build in %.3f seconds with a shape of %s, %.3f GB.' \
 % (time.time() - t, str(Qov.shape), np.prod(Qov.shape) * 8.e-9))
 
@@ -78,42 +105,22 @@ t = time.time()
 # MP2
 # MO = np.einsum('Qia,Qjb->iajb', Qov, Qov)
 
-# A smarter algorithm, loop over occupied indices and exploit ERI symmetry
-
-# This part of the denominator is identical for all i,j pairs
-vv_denom = - eps_vir.reshape(-1, 1) - eps_vir
-
-MP2corr_OS = 0.0
-MP2corr_SS = 0.0
-for i in range(ndocc):
-    eps_i = eps_occ[i]
-    i_Qv = Qov[:, i, :].copy()
-    for j in range(i, ndocc):
-
-        eps_j = eps_occ[j]
-        j_Qv = Qov[:, j, :]
-
-        # We can either use einsum here
-#        tmp = np.einsum('Qa,Qb->ab', i_Qv, j_Qv)
-
-        # Or a dot product (DGEMM) for speed)
-        tmp = np.dot(i_Qv.T, j_Qv)
-
-        # Diagonal elements
-        if i == j:
-            div = 1.0 / (eps_i + eps_j + vv_denom)
-        # Off-diagonal elements
-        else:
-            div = 2.0 / (eps_i + eps_j + vv_denom)
-
-        # Opposite spin computation
-        MP2corr_OS += np.einsum('ab,ab,ab->', tmp, tmp, div)
-
-        # Notice the same-spin compnent has an "exchange" like term associated with it
-        MP2corr_SS += np.einsum('ab,ab,ab->', tmp - tmp.T, tmp, div)
+# A smarter algorithm, loop over blocks of occupied indices and exploit ERI symmetry,
+# forming (ia|jb) for a whole pair of blocks with one DGEMM
+from helper_DFMP2 import df_mp2_energy, df_mp2_energy_parallel
+if nproc > 1:
+    MP2corr_OS, MP2corr_SS, stats = df_mp2_energy_parallel(Qov, eps_occ, eps_vir, nproc=nproc,
+                                                           memory=numpy_memory)
+else:
+    MP2corr_OS, MP2corr_SS, stats = df_mp2_energy(Qov, eps_occ, eps_vir, memory=numpy_memory)
+print('...blocked kernel used occupied blocks of %d, %.2f GFLOP at %.2f GFLOP/s.' %
+      (stats['block_size'], stats['gflop'], stats['gflops']))
 
 print('...finished computing MP2 energy in %.3f seconds.' % (time.time() - t))
 
+if out_of_core:
+    Qov.close()
+
 MP2corr_E = MP2corr_SS + MP2corr_OS
 MP2_E = RHF_E + MP2corr_E
 
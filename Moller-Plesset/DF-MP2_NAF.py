@@ -54,6 +54,13 @@ psi4.set_options({'basis': 'aug-cc-pVDZ', 'df_basis_mp2': 'aug-cc-pvdz-ri'})
 
 check_energy = True
 
+# The blocked DGEMM kernel of helper_DFMP2 picks its occupied block size to fit
+# into numpy_memory (GB)
+numpy_memory = 2
+
+# Keep (Q|ia) in a memory-mapped scratch file instead of RAM?
+out_of_core = False
+
 print('\nStarting RHF...')
 t = time.time()
 RHF_E, wfn = psi4.energy('SCF', return_wfn=True)
@@ -127,17 +134,26 @@ print("N^bar  = (Q^bar|Q) dim)", Nbar.shape)
 Npbar = np.dot(L, Nbar)
 print("N'^bar  = (P^bar|Q) dim)", Npbar.shape)
 
-# form J(bar) = I * N'(bar) (eq 13)
-# we form the transpose of Jbar to be inline with PSI4
-Jbar = np.einsum('Ppq,PQ->Qpq', Ppq, Npbar, optimize=True)
-print("J^bar  = (Q|pq) dim)", Npbar.shape)
-
-# ==> AO->MO transform: Qpq -> Qmo @ O(N^4) <==
-print('AO->MO transform')
 Cocc = C[:, :ndocc]
 Cvirt = C[:, ndocc:]
-Qov = np.einsum('pi,Qpq->Qqi', Cocc, Jbar, optimize=True)
-Qov = np.einsum('Qqi,qa->Qia', Qov, Cvirt, optimize=True)
+if out_of_core:
+    # Transform (P|pq) one block of auxiliary functions at a time, then fit to J(bar) (eq 13)
+    # in occupied blocks. Ppq itself stays in core since W (eq 10) already needed all of it
+    from helper_DFMP2 import DFTensorStore, transform_to_store
+    print('AO->MO transform to disk')
+    Qov = DFTensorStore(naux2, ndocc, nvirt)
+    transform_to_store(Ppq, Cocc, Cvirt, Qov, metric=Npbar, memory=numpy_memory)
+    print('...Qov written to %s' % Qov.filename)
+else:
+    # form J(bar) = I * N'(bar) (eq 13)
+    # we form the transpose of Jbar to be inline with PSI4
+    Jbar = np.einsum('Ppq,PQ->Qpq', Ppq, Npbar, optimize=True)
+    print("J^bar  = (Q|pq) dim)", Npbar.shape)
+
+    # ==> AO->MO transform: Qpq -> Qmo @ O(N^4) <==
+    print('AO->MO transform')
+    Qov = np.einsum('pi,Qpq->Qqi', Cocc, Jbar, optimize=True)
+    Qov = np.einsum('Qqi,qa->Qia', Qov, Cvirt, optimize=True)
 
 time_qov = time.time() - t
 print('...Qov build in %.3f seconds with a shape of %s, %.3f GB.' \
@@ -147,38 +163,17 @@ print('...Qov build in %.3f seconds with a shape of %s, %.3f GB.' \
 print('\nComputing MP2 energy...')
 t = time.time()
 
-# This part of the denominator is identical for all i,j pairs
-vv_denom = -eps_vir.reshape(-1, 1) - eps_vir
-
-MP2corr_OS = 0.0
-MP2corr_SS = 0.0
-for i in range(ndocc):
-    eps_i = eps_occ[i]
-    i_Qv = Qov[:, i, :].copy()
-    for j in range(i, ndocc):
-
-        eps_j = eps_occ[j]
-        j_Qv = Qov[:, j, :]
-
-        # Or a dot product (DGEMM) for speed)
-        tmp = np.dot(i_Qv.T, j_Qv)
-
-        # Diagonal elements
-        if i == j:
-            div = 1.0 / (eps_i + eps_j + vv_denom)
-        # Off-diagonal elements
-        else:
-            div = 2.0 / (eps_i + eps_j + vv_denom)
-
-        # Opposite spin computation
-        MP2corr_OS += np.einsum('ab,ab,ab->', tmp, tmp, div)
-
-        # Notice the same-spin compnent has an "exchange" like term associated with it
-        MP2corr_SS += np.einsum('ab,ab,ab->', tmp - tmp.T, tmp, div)
+from helper_DFMP2 import df_mp2_energy
+MP2corr_OS, MP2corr_SS, stats = df_mp2_energy(Qov, eps_occ, eps_vir, memory=numpy_memory)
+print('...blocked kernel used occupied blocks of %d, %.2f GFLOP at %.2f GFLOP/s.' %
+      (stats['block_size'], stats['gflop'], stats['gflops']))
 
 time_mp2 = time.time() - t
 print('...finished computing MP2 energy in %.3f seconds.' % (time_mp2))
 
+if out_of_core:
+    Qov.close()
+
 MP2corr_E = MP2corr_SS + MP2corr_OS
 MP2_E = RHF_E + MP2corr_E
 
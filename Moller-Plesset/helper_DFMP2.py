@@ -0,0 +1,401 @@
+"""
+Helper functions for density-fitted MP2 energies.
+
+The occupied index is processed in blocks: for a pair of occupied blocks
+(I, J) all (ia|jb) integrals are formed with a single DGEMM over the
+auxiliary index and the opposite- and same-spin energies are reduced with
+vectorized dot products, instead of one small GEMM per (i, j) pair.
+
+For tensors that do not fit into memory, DFTensorStore keeps (Q|ia) in a
+memory-mapped scratch file that is written in blocks of auxiliary functions
+and read back in blocks of occupied orbitals. The raw AO (P|pq) integrals
+can be streamed one auxiliary atom at a time with aux_atom_blocks, so the
+naux * nbf^2 tensor never has to fit into memory either.
+
+References:
+- Algorithm modified from Rob Parrish's most excellent Psi4 plugin example
+Bottom of the page: http://www.psicode.org/developers.php
+"""
+
+__authors__   = "The Psi4NumPy Developers"
+__credits__   = ["Daniel G. A. Smith", "Dominic A. Sirianni"]
+
+__copyright__ = "(c) 2014-2018, The Psi4NumPy Developers"
+__license__   = "BSD-3-Clause"
+__date__      = "2026-10-18"
+
+import os
+import time
+import tempfile
+import multiprocessing
+import numpy as np
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:
+    # Python < 3.8, df_mp2_energy_parallel falls back to df_mp2_energy for in-core tensors
+    shared_memory = None
+
+
+def occupied_block_size(nocc, nvir, naux, memory=2):
+    """
+    Returns the largest occupied block size b for which the two (Q|ia) slabs
+    (2 * naux * b * nvir) and the four (ia|jb) sized temporaries of one block
+    pair (4 * b^2 * nvir^2) fit into `memory` GB.
+    """
+
+    words = memory * 1.e9 / 8
+    quad = 4.0 * nvir**2
+    lin = 2.0 * naux * nvir
+    block = int((-lin + np.sqrt(lin**2 + 4.0 * quad * words)) / (2.0 * quad))
+    return max(1, min(block, nocc))
+
+
+class DFTensorStore(object):
+    """
+    Disk-backed (Q|ia) tensor.
+
+    The tensor lives in a numpy memmap laid out as (i, Q, a) so that a block
+    of occupied orbitals is one contiguous read. `shape` reports the
+    (naux, nocc, nvir) shape of the in-core Qov tensor it replaces.
+    """
+
+    def __init__(self, naux, nocc, nvir, filename=None, scratch=None):
+
+        self.shape = (naux, nocc, nvir)
+        self.temporary = filename is None
+        if self.temporary:
+            fd, filename = tempfile.mkstemp(suffix='.qia', dir=scratch)
+            os.close(fd)
+        self.filename = filename
+        self.data = np.memmap(filename, dtype=np.float64, mode='w+', shape=(nocc, naux, nvir))
+
+    @classmethod
+    def attach(cls, filename, naux, nocc, nvir):
+        """Opens an existing store read-only, e.g. from a worker process."""
+        store = cls.__new__(cls)
+        store.shape = (naux, nocc, nvir)
+        store.temporary = False
+        store.filename = filename
+        store.data = np.memmap(filename, dtype=np.float64, mode='r', shape=(nocc, naux, nvir))
+        return store
+
+    def nbytes(self):
+        return 8 * np.prod(self.shape)
+
+    def write_aux_block(self, q0, Qia):
+        """Writes the (nQ, nocc, nvir) block Qia to auxiliary functions q0:q0 + nQ."""
+        self.data[:, q0:q0 + Qia.shape[0], :] = Qia.transpose(1, 0, 2)
+
+    def write_occupied_block(self, i0, Qia):
+        """Writes the (naux, ni, nvir) block Qia to occupied orbitals i0:i0 + ni."""
+        self.data[i0:i0 + Qia.shape[1]] = Qia.transpose(1, 0, 2)
+
+    def read_occupied_block(self, i0, i1):
+        """Returns the contiguous (naux, i1 - i0, nvir) block of occupied orbitals i0:i1."""
+        return np.ascontiguousarray(np.asarray(self.data[i0:i1]).transpose(1, 0, 2))
+
+    def flush(self):
+        self.data.flush()
+
+    def close(self):
+        """Releases the memmap and removes the scratch file if the store created it."""
+        if self.data is not None:
+            self.data.flush()
+            self.data = None
+            if self.temporary and os.path.exists(self.filename):
+                os.remove(self.filename)
+
+
+def aux_block_size(naux, nbf, nocc, nvir, memory=2):
+    """
+    Returns the number of auxiliary functions for which the AO block (P|pq),
+    the half-transformed (P|iq) and the (P|ia) block fit into `memory` GB.
+    """
+
+    words = memory * 1.e9 / 8
+    per_aux = nbf * nbf + nocc * nbf + 2 * nocc * nvir
+    return int(max(1, min(naux, words // per_aux)))
+
+
+def aux_atom_blocks(mol, basis, key, target, fitrole="RIFIT", other=None):
+    """
+    Yields (p0, (P|pq)) raw AO three-index blocks, one atom of the auxiliary
+    basis at a time, so the full naux * nbf^2 tensor is never held in memory.
+
+    The arguments after `basis` are those of psi4.core.BasisSet.build for the
+    auxiliary basis. Each block is computed from the auxiliary functions of a
+    single atom, which psi4 orders contiguously and in atom order.
+    """
+
+    import psi4
+
+    mints = psi4.core.MintsHelper(basis)
+    zero_bas = psi4.core.BasisSet.zero_ao_basis_set()
+    geom = np.asarray(mol.geometry())
+
+    p0 = 0
+    for A in range(mol.natom()):
+        atom = psi4.core.Molecule.from_arrays(geom=geom[A], elem=[mol.symbol(A)], real=[mol.Z(A) != 0],
+                                              units='Bohr', fix_com=True, fix_orientation=True,
+                                              fix_symmetry='c1')
+        aux_A = psi4.core.BasisSet.build(atom, key, target, fitrole, other)
+        if aux_A.nbf() == 0:
+            continue
+        block = np.asarray(mints.ao_eri(zero_bas, aux_A, basis, basis))
+        yield p0, block.reshape(aux_A.nbf(), basis.nbf(), basis.nbf())
+        p0 += aux_A.nbf()
+
+
+def transform_to_store(Ppq, Cocc, Cvir, store, metric=None, memory=2):
+    """
+    Writes (Q|ia) = sum_P sum_pq C_pi (P|pq) C_qa metric[P, Q] into a
+    DFTensorStore while holding only one block of (P|pq) in memory.
+
+    Ppq is either an array supporting slicing on its first index (e.g. a
+    numpy memmap), which is read in blocks of auxiliary functions, or an
+    iterable of (p0, (P|pq) block) pairs such as aux_atom_blocks yields.
+    Each raw block is transformed to (P|ia) on its own. If `metric`
+    (naux_in, naux) is given the raw (P|ia) goes to a scratch store first and
+    is fitted one block of occupied orbitals at a time.
+    """
+
+    nbf = Cocc.shape[0]
+    naux, nocc, nvir = store.shape
+    if metric is None:
+        raw = store
+    else:
+        raw = DFTensorStore(metric.shape[0], nocc, nvir, scratch=os.path.dirname(store.filename))
+
+    blocks = Ppq
+    if hasattr(Ppq, 'shape'):
+        naux_in = Ppq.shape[0]
+        p_block = aux_block_size(naux_in, nbf, nocc, nvir, memory)
+        blocks = ((p0, Ppq[p0:p0 + p_block]) for p0 in range(0, naux_in, p_block))
+
+    for p0, block in blocks:
+        Piq = np.einsum('pi,Ppq->Piq', Cocc, np.asarray(block), optimize=True)
+        raw.write_aux_block(p0, np.einsum('Piq,qa->Pia', Piq, Cvir, optimize=True))
+
+    if metric is not None:
+        fit_store(raw, metric, store, memory)
+        raw.close()
+    store.flush()
+    return store
+
+
+def fit_store(raw, metric, store, memory=2):
+    """
+    Writes (Q|ia) = sum_P metric[P, Q] (P|ia) from the store `raw` into
+    `store`, one block of occupied orbitals at a time.
+    """
+
+    naux_in, nocc, nvir = raw.shape
+    naux = store.shape[0]
+    words = memory * 1.e9 / 8 - naux_in * naux
+    i_block = int(max(1, min(nocc, words // ((naux_in + naux) * nvir))))
+    for i0 in range(0, nocc, i_block):
+        i1 = min(i0 + i_block, nocc)
+        Pia = raw.read_occupied_block(i0, i1)
+        Qia = np.dot(metric.T, Pia.reshape(naux_in, -1))
+        store.write_occupied_block(i0, Qia.reshape(naux, i1 - i0, nvir))
+
+
+def occupied_slab(Qov, i0, i1):
+    """
+    Returns the contiguous (naux, i1 - i0, nvir) slice of Qov, read through
+    the memory map when Qov is a DFTensorStore.
+    """
+
+    if isinstance(Qov, DFTensorStore):
+        return Qov.read_occupied_block(i0, i1)
+    return np.ascontiguousarray(Qov[:, i0:i1, :])
+
+
+def df_mp2_block_energy(Qi, Qj, eps_i, eps_j, eps_vir, diagonal):
+    """
+    Returns the opposite- and same-spin MP2 energies of one occupied block pair.
+
+    Qi and Qj are (naux, ni, nvir) and (naux, nj, nvir) slices of Qov. For
+    off-diagonal block pairs the (J, I) pair is accounted for by a factor of two.
+    """
+
+    naux, ni, nvir = Qi.shape
+    nj = Qj.shape[1]
+
+    # (ia|jb) for the whole block pair in one GEMM
+    iajb = np.dot(Qi.reshape(naux, ni * nvir).T, Qj.reshape(naux, nj * nvir))
+    iajb = iajb.reshape(ni, nvir, nj, nvir)
+
+    denom = (eps_i.reshape(-1, 1, 1, 1) - eps_vir.reshape(-1, 1, 1) + eps_j.reshape(-1, 1) - eps_vir)
+    np.divide(1.0, denom, out=denom)
+    denom *= iajb
+
+    # Opposite spin: (ia|jb)^2 / D, same spin adds the exchange-like (ib|ja) term
+    E_OS = np.vdot(denom, iajb)
+    E_SS = E_OS - np.vdot(denom, iajb.transpose(0, 3, 2, 1))
+
+    if not diagonal:
+        E_OS *= 2.0
+        E_SS *= 2.0
+    return E_OS, E_SS
+
+
+def df_mp2_energy(Qov, eps_occ, eps_vir, memory=2, block_size=None):
+    """
+    Computes the DF-MP2 correlation energy in occupied blocks.
+
+    Parameters
+    ----------
+    Qov : array or DFTensorStore, (naux, nocc, nvir)
+        Fitted three-index integrals (Q|ia). A DFTensorStore is streamed
+        from disk one occupied block at a time.
+    eps_occ, eps_vir : array
+        Occupied and virtual orbital energies.
+    memory : float
+        Memory budget in GB used to pick the occupied block size.
+    block_size : int, optional
+        Overrides the block size derived from `memory`.
+
+    Returns
+    -------
+    MP2corr_OS, MP2corr_SS : float
+        Opposite- and same-spin correlation energies.
+    stats : dict
+        Block size, GEMM GFLOP count, wall time and achieved GFLOP/s.
+    """
+
+    naux, nocc, nvir = Qov.shape
+    if block_size is None:
+        block_size = occupied_block_size(nocc, nvir, naux, memory)
+    blocks = [(start, min(start + block_size, nocc)) for start in range(0, nocc, block_size)]
+
+    t = time.time()
+    MP2corr_OS = 0.0
+    MP2corr_SS = 0.0
+    flops = 0.0
+    for bi, (i0, i1) in enumerate(blocks):
+        Qi = occupied_slab(Qov, i0, i1)
+        for bj, (j0, j1) in enumerate(blocks[bi:], bi):
+            Qj = Qi if bi == bj else occupied_slab(Qov, j0, j1)
+            E_OS, E_SS = df_mp2_block_energy(Qi, Qj, eps_occ[i0:i1], eps_occ[j0:j1], eps_vir, bi == bj)
+            MP2corr_OS += E_OS
+            MP2corr_SS += E_SS
+            flops += 2.0 * naux * (i1 - i0) * nvir * (j1 - j0) * nvir
+
+    seconds = time.time() - t
+    stats = {
+        'block_size': block_size,
+        'gflop': flops * 1.e-9,
+        'seconds': seconds,
+        'gflops': flops * 1.e-9 / max(seconds, 1.e-12)
+    }
+    return MP2corr_OS, MP2corr_SS, stats
+
+
+# Per-process location of the shared (Q|ia) tensor, set by _set_shared_Qov
+_worker_source = None
+_worker_shape = None
+
+
+def _set_shared_Qov(source, shape):
+    """Pool initializer: records where the parent's (Q|ia) lives."""
+    global _worker_source, _worker_shape
+    _worker_source = source
+    _worker_shape = shape
+
+
+def _df_mp2_pair_task(task):
+    """Returns the OS/SS energies and GEMM flops of one occupied block pair."""
+    (i0, i1), (j0, j1), eps_i, eps_j, eps_vir = task
+    naux, nocc, nvir = _worker_shape
+
+    # Map the parent's (Q|ia) without copying it, and release the mapping afterwards
+    shm = None
+    Qov = Qi = Qj = None
+    try:
+        if _worker_source[0] == 'store':
+            Qov = DFTensorStore.attach(_worker_source[1], *_worker_shape)
+        else:
+            shm = shared_memory.SharedMemory(name=_worker_source[1])
+            Qov = np.ndarray(_worker_shape, dtype=np.float64, buffer=shm.buf)
+        Qi = occupied_slab(Qov, i0, i1)
+        Qj = Qi if i0 == j0 else occupied_slab(Qov, j0, j1)
+        E_OS, E_SS = df_mp2_block_energy(Qi, Qj, eps_i, eps_j, eps_vir, i0 == j0)
+    finally:
+        # Views into shm.buf must be gone before it can be closed
+        Qov = Qi = Qj = None
+        if shm is not None:
+            shm.close()
+    return E_OS, E_SS, 2.0 * naux * (i1 - i0) * nvir * (j1 - j0) * nvir
+
+
+def df_mp2_energy_parallel(Qov, eps_occ, eps_vir, nproc=None, memory=2, block_size=None):
+    """
+    Computes the DF-MP2 correlation energy with the occupied block pairs of
+    df_mp2_energy spread over `nproc` worker processes.
+
+    An in-core Qov is placed once into a multiprocessing.shared_memory
+    segment that all workers map; a DFTensorStore is opened read-only by
+    every worker and shared through the page cache. `memory` (GB) is the
+    total budget and is divided between the workers. Each worker should run
+    single-threaded BLAS (e.g. OMP_NUM_THREADS=1) to avoid oversubscription.
+    Without multiprocessing.shared_memory (Python < 3.8) an in-core Qov is
+    handled by the serial df_mp2_energy.
+
+    Returns the same (MP2corr_OS, MP2corr_SS, stats) as df_mp2_energy.
+    """
+
+    if (shared_memory is None) and not isinstance(Qov, DFTensorStore):
+        MP2corr_OS, MP2corr_SS, stats = df_mp2_energy(Qov, eps_occ, eps_vir, memory=memory, block_size=block_size)
+        stats['nproc'] = 1
+        return MP2corr_OS, MP2corr_SS, stats
+
+    if nproc is None:
+        nproc = multiprocessing.cpu_count()
+    naux, nocc, nvir = Qov.shape
+    if block_size is None:
+        block_size = occupied_block_size(nocc, nvir, naux, float(memory) / nproc)
+    blocks = [(start, min(start + block_size, nocc)) for start in range(0, nocc, block_size)]
+
+    # Largest block pairs first for better load balance
+    tasks = [(bi, bj) for b, bi in enumerate(blocks) for bj in blocks[b:]]
+    tasks.sort(key=lambda pair: -(pair[0][1] - pair[0][0]) * (pair[1][1] - pair[1][0]))
+    tasks = [(bi, bj, eps_occ[bi[0]:bi[1]], eps_occ[bj[0]:bj[1]], eps_vir) for bi, bj in tasks]
+
+    t = time.time()
+    shm = None
+    try:
+        if isinstance(Qov, DFTensorStore):
+            Qov.flush()
+            source = ('store', Qov.filename)
+        else:
+            shm = shared_memory.SharedMemory(create=True, size=max(1, Qov.size * 8))
+            shared = np.ndarray(Qov.shape, dtype=np.float64, buffer=shm.buf)
+            shared[:] = Qov
+            del shared
+            source = ('shm', shm.name)
+
+        pool = multiprocessing.Pool(nproc, initializer=_set_shared_Qov, initargs=(source, Qov.shape))
+        try:
+            results = pool.map(_df_mp2_pair_task, tasks, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+    finally:
+        if shm is not None:
+            shm.close()
+            shm.unlink()
+
+    MP2corr_OS = sum(r[0] for r in results)
+    MP2corr_SS = sum(r[1] for r in results)
+    flops = sum(r[2] for r in results)
+    seconds = time.time() - t
+    stats = {
+        'block_size': block_size,
+        'nproc': nproc,
+        'gflop': flops * 1.e-9,
+        'seconds': seconds,
+        'gflops': flops * 1.e-9 / max(seconds, 1.e-12)
+    }
+    return MP2corr_OS, MP2corr_SS, stats
@@ -54,6 +54,12 @@ symmetry c1
 # How many samples to run?
 nsample = 5000
 
+# Keep (Q|ia) in a memory-mapped scratch file instead of RAM? The raw (P|pq) is then
+# computed one auxiliary atom at a time and the random vectors of all samples are
+# contracted with (Q|ia) in a single pass over the file (2 * nsample * nocc * nvir words)
+out_of_core = False
+numpy_memory = 2
+
 # ==> Basis sets <==
 psi4.set_options({
     'basis': 'aug-cc-pvdz',
@@ -78,19 +84,17 @@ mints = psi4.core.MintsHelper(orb)
 
 # ==> Build Density-Fitted Integrals <==
 
-# Build (P|pq) raw 3-index ERIs, dimension (1, Naux, nbf, nbf)
-Ppq = mints.ao_eri(zero_bas, aux, orb, orb)
-
 # Build & invert Coulomb metric, dimension (1, Naux, 1, Naux)
 metric = mints.ao_eri(zero_bas, aux, zero_bas, aux)
 metric.power(-0.5, 1.e-14)
-
-# Remove excess dimensions of Ppq, & metric
-Ppq = np.squeeze(Ppq)
 metric = np.squeeze(metric)
 
-# Build the Qso object
-Qpq = np.einsum('QP,Ppq->Qpq', metric, Ppq)
+if not out_of_core:
+    # Build (P|pq) raw 3-index ERIs, dimension (1, Naux, nbf, nbf)
+    Ppq = np.squeeze(mints.ao_eri(zero_bas, aux, orb, orb))
+
+    # Build the Qso object
+    Qpq = np.einsum('QP,Ppq->Qpq', metric, Ppq)
 
 # ==> Perform HF <==
 energy, scf_wfn = psi4.energy('scf', return_wfn=True)
@@ -103,11 +107,17 @@ evecs = np.array(scf_wfn.epsilon_a())
 Co = scf_wfn.Ca_subset("AO", "OCC")
 Cv = scf_wfn.Ca_subset("AO", "VIR")
 
-Qia = np.einsum("Qpq,pi,qa->Qia", Qpq, Co, Cv, optimize=True)
-
 nocc = scf_wfn.nalpha()
 nvirt = scf_wfn.nmo() - nocc
 
+if out_of_core:
+    from helper_DFMP2 import DFTensorStore, aux_atom_blocks, occupied_block_size, transform_to_store
+    Qia = DFTensorStore(aux.nbf(), nocc, nvirt)
+    Ppq = aux_atom_blocks(mol, orb, "DF_BASIS_SCF", "", "RIFIT", "aug-cc-pVDZ")
+    transform_to_store(Ppq, np.asarray(Co), np.asarray(Cv), Qia, metric=metric, memory=numpy_memory)
+else:
+    Qia = np.einsum("Qpq,pi,qa->Qia", Qpq, Co, Cv, optimize=True)
+
 denom = 1.0 / (evecs[:nocc].reshape(-1, 1, 1, 1) + evecs[:nocc].reshape(-1, 1, 1) -
                evecs[nocc:].reshape(-1, 1) - evecs[nocc:])
 
@@ -115,18 +125,34 @@ t = time.time()
 e_srimp2 = 0.0
 print("Transformed ERIs...")
 
+if out_of_core:
+    # Contract the two random vectors of every sample with (Q|ia), one occupied block at a time
+    naux = Qia.shape[0]
+    vecs = np.random.choice([-1, 1], size=(2 * nsample, naux)).astype(np.float64)
+    R = np.empty((2 * nsample, nocc, nvirt))
+    i_block = occupied_block_size(nocc, nvirt, naux, numpy_memory)
+    for i0 in range(0, nocc, i_block):
+        i1 = min(i0 + i_block, nocc)
+        Qi = Qia.read_occupied_block(i0, i1)
+        R[:, i0:i1] = np.dot(vecs, Qi.reshape(naux, -1)).reshape(-1, i1 - i0, nvirt)
+    Qia.close()
+
 # Loop over samples to reduce stochastic noise
 print("Starting sample loop...")
 for x in range(nsample):
 
     # ==> Build Stochastic Integral Matrices <==
-    # Create two random vector
-    vec = np.random.choice([-1, 1], size=(Qia.shape[0]))
-    vecp = np.random.choice([-1, 1], size=(Qia.shape[0]))
-
-    # Generate first R matrices
-    ia = np.einsum("Q,Qia->ia", vec, Qia)
-    iap = np.einsum("Q,Qia->ia", vecp, Qia)
+    if out_of_core:
+        ia = R[2 * x]
+        iap = R[2 * x + 1]
+    else:
+        # Create two random vector
+        vec = np.random.choice([-1, 1], size=(Qia.shape[0]))
+        vecp = np.random.choice([-1, 1], size=(Qia.shape[0]))
+
+        # Generate first R matrices
+        ia = np.einsum("Q,Qia->ia", vec, Qia)
+        iap = np.einsum("Q,Qia->ia", vecp, Qia)
 
     # ==> Calculate a single stochastic RI-MP2 (sRI-MP2) sample <==
 
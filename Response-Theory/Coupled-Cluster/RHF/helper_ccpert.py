@@ -59,6 +59,7 @@ class HelperCCPert(object):
         self.Hoo   =  hbar.Hoo
         self.Hoooo =  hbar.Hoooo
         self.Hvvvv =  hbar.Hvvvv
+        self.contract_Hvvvv = hbar.contract_Hvvvv
         self.Hvovv =  hbar.Hvovv
         self.Hooov =  hbar.Hooov
         self.Hovvo =  hbar.Hovvo
@@ -250,7 +251,7 @@ class HelperCCPert(object):
         r_x2 += ndot('ijeb,ae->ijab', self.x2, self.Hvv)
         r_x2 -= ndot('mi,mjab->ijab', self.Hoo, self.x2)
         r_x2 += ndot('mnij,mnab->ijab', self.Hoooo, self.x2, prefactor=0.5)
-        r_x2 += ndot('ijef,abef->ijab', self.x2, self.Hvvvv, prefactor=0.5)
+        r_x2 += self.contract_Hvvvv(self.x2, prefactor=0.5)
         r_x2 += ndot('miea,mbej->ijab', self.x2, self.Hovvo, prefactor=2.0)
         r_x2 += ndot('miea,mbje->ijab', self.x2, self.Hovov, prefactor=-1.0)
         r_x2 -= ndot('imeb,maje->ijab', self.x2, self.Hovov)
@@ -381,8 +382,9 @@ class HelperCCPert(object):
         tmp  -= ndot('ifne,nmaf->iema', self.Hovov, self.l2)
         tmp  -= ndot('inef,mfan->iema', self.l2, self.Hovvo)
         tmp  -= ndot('ifen,nmfa->iema', self.Hovvo, self.l2)
-        tmp  += ndot('imfg,fgae->iema', self.l2, self.Hvvvv, prefactor=0.5)
-        tmp  += ndot('imgf,fgea->iema', self.l2, self.Hvvvv, prefactor=0.5)
+        # 0.5 * l_imfg Hvvvv_fgae and 0.5 * l_imgf Hvvvv_fgea, returned as ..ae and ..ea
+        tmp  += self.contract_Hvvvv(self.l2, transpose=True, prefactor=0.5).transpose(0, 3, 1, 2)
+        tmp  += self.contract_Hvvvv(self.l2.swapaxes(2, 3), transpose=True, prefactor=0.5).transpose(0, 2, 1, 3)
         tmp  += ndot('imno,onea->iema', self.Hoooo, self.l2, prefactor=0.5)
         tmp  += ndot('mino,noea->iema', self.Hoooo, self.l2, prefactor=0.5)
         r_y1 += ndot('iema,me->ia', tmp, self.x1) 
@@ -470,7 +472,7 @@ class HelperCCPert(object):
         r_y2 += ndot('ijeb,ea->ijab', self.y2, self.Hvv)
         r_y2 -= ndot('im,mjab->ijab', self.Hoo, self.y2)
         r_y2 += ndot('ijmn,mnab->ijab', self.Hoooo, self.y2, prefactor=0.5)
-        r_y2 += ndot('ijef,efab->ijab', self.y2, self.Hvvvv, prefactor=0.5)
+        r_y2 += self.contract_Hvvvv(self.y2, transpose=True, prefactor=0.5)
         r_y2 += ndot('ie,ejab->ijab', self.y1, self.Hvovv, prefactor=2.0)
         r_y2 += ndot('ie,ejba->ijab', self.y1, self.Hvovv, prefactor=-1.0)
         r_y2 -= ndot('mb,jima->ijab', self.y1, self.Hooov, prefactor=2.0)
@@ -513,7 +515,7 @@ class HelperCCPert(object):
 
         return -2.0 * (polar1 + polar2)
 
-    def solve(self, hand, r_conv=1.e-7, maxiter=100, max_diis=8, start_diis=1):
+    def solve(self, hand, r_conv=1.e-7, maxiter=100, max_diis=8, start_diis=1, diis_storage='memory'):
 
         ### Start of the solve routine 
         ccpert_tstart = time.time()
@@ -524,9 +526,9 @@ class HelperCCPert(object):
 
         # Set up DIIS before iterations begin
         if hand == 'right':
-            diis_object = helper_diis(self.x1, self.x2, max_diis)
+            diis_object = helper_diis(self.x1, self.x2, max_diis, storage=diis_storage)
         else:
-            diis_object = helper_diis(self.y1, self.y2, max_diis)
+            diis_object = helper_diis(self.y1, self.y2, max_diis, storage=diis_storage)
             # calculate the inhomogenous terms of the left hand amplitudes equation before iterations begin
             self.im_y1 = self.inhomogenous_y1()
             self.im_y2 = self.inhomogenous_y2()
@@ -639,3 +641,712 @@ class HelperCCLinresp(object):
         return -1.0*(self.polar1 + self.polar2)
 
 # End HelperCCLinresp class
+
+class HelperCCPertSubspace(object):
+    """
+    An orthonormal subspace V of packed amplitude vectors together with the
+    Hbar products HV = sigma(V) and the projected matrix G = V HV^T, for the
+    Krylov solver of HelperCCPertBatch.
+    """
+
+    def __init__(self, sigma, tol=1.e-8):
+        self.sigma = sigma
+        self.tol = tol
+        self.V = None
+        self.HV = None
+        self.G = None
+        self.nsigma = 0
+
+    def size(self):
+        return 0 if self.V is None else self.V.shape[0]
+
+    def add(self, vecs):
+        """
+        Orthonormalizes vecs against the subspace and among themselves and
+        adds the new directions, with their sigma vectors built in one stack.
+
+        Returns
+        -------
+        nadd : int
+            The number of vectors added.
+        """
+
+        new = []
+        for v in vecs:
+            v = v.copy()
+            norm = np.linalg.norm(v)
+            if norm < 1.e-14:
+                continue
+            # Two passes of Gram-Schmidt, first against V then within the block
+            for gs_pass in range(2):
+                if self.V is not None:
+                    v -= np.dot(np.dot(self.V, v), self.V)
+                for u in new:
+                    v -= np.dot(u, v) * u
+            vnorm = np.linalg.norm(v)
+            if vnorm / norm > self.tol:
+                new.append(v / vnorm)
+
+        if len(new) == 0:
+            return 0
+
+        new = np.array(new)
+        Hnew = self.sigma(new)
+        self.nsigma += new.shape[0]
+
+        if self.V is None:
+            self.V, self.HV = new, Hnew
+            self.G = np.dot(new, Hnew.T)
+        else:
+            nold = self.V.shape[0]
+            G = np.zeros((nold + new.shape[0], nold + new.shape[0]))
+            G[:nold, :nold] = self.G
+            G[:nold, nold:] = np.dot(self.V, Hnew.T)
+            G[nold:, :nold] = np.dot(new, self.HV.T)
+            G[nold:, nold:] = np.dot(new, Hnew.T)
+            self.V = np.vstack((self.V, new))
+            self.HV = np.vstack((self.HV, Hnew))
+            self.G = G
+
+        return new.shape[0]
+
+    def collapse(self, C):
+        """Collapses the subspace onto the span of the columns of C, without new sigma vectors."""
+
+        Q, R = np.linalg.qr(C)
+        self.V = np.dot(Q.T, self.V)
+        self.HV = np.dot(Q.T, self.HV)
+        self.G = np.dot(Q.T, np.dot(self.G, Q))
+
+
+class HelperCCPertBatch(object):
+    """
+    Solves the X and Y amplitudes of several perturbations at several
+    frequencies at once.
+
+    The amplitudes of all (perturbation, omega) systems are stacked along a
+    leading batch index N, x1[N, i, a] and x2[N, i, j, a, b], so every Hbar
+    term of update_X / update_Y is one wide contraction over all systems
+    instead of one small contraction per HelperCCPert. The perturbation
+    pieces A_bar and the L(0)-Hbar(0) intermediates of the Y equations do not
+    depend on omega and are built once per perturbation or once overall.
+    Every system keeps its own DIIS and stops updating once it has converged,
+    so the amplitudes are the ones of separate HelperCCPert solves.
+
+    System k is perturbation k // nomega at frequency omegas[k % nomega].
+    """
+
+    def __init__(self, names, perts, ccsd, hbar, cclambda, omegas):
+
+        time_init = time.time()
+
+        self.names = list(names)
+        self.npert = len(self.names)
+
+        # One HelperCCPert per perturbation holds its A_bar builders
+        self.ccperts = [HelperCCPert(name, pert, ccsd, hbar, cclambda, 0.0) for name, pert in zip(self.names, perts)]
+        ref = self.ccperts[0]
+        self.nocc = ref.nocc
+        self.nvirt = ref.nvirt
+        self.t2 = ref.t2
+        self.l1 = ref.l1
+        self.l2 = ref.l2
+        self.hbar = hbar
+        self.MO_oovv = ref.get_MO('oovv')
+
+        # Omega independent perturbation pieces, stacked over perturbations
+        self.Avo = np.array([p.build_Avo().swapaxes(0, 1) for p in self.ccperts])
+        self.Aov = np.array([p.build_Aov() for p in self.ccperts])
+        self.Aoo = np.array([p.build_Aoo() for p in self.ccperts])
+        self.Avv = np.array([p.build_Avv() for p in self.ccperts])
+        self.pertbar = np.array([p.pertbar_ijab for p in self.ccperts])
+        self.pertbar_sym = self.pertbar + self.pertbar.swapaxes(1, 2).swapaxes(3, 4)
+
+        # Denominators without omega
+        self.Dia = ref.Dia - ref.omega
+        self.Dijab = ref.Dijab - ref.omega
+
+        # Omega independent Y intermediates, see build_Y_intermediates
+        self.L1_miae = None
+
+        # Krylov subspaces of the right and left hand equations, see solve_subspace
+        self.subspaces = {}
+
+        self.set_omegas(omegas)
+
+        print('\nInitialized %d perturbations at %d frequencies in %.3f seconds.' %
+              (self.npert, self.nomega, time.time() - time_init))
+
+    def set_omegas(self, omegas):
+        """
+        Switches the batch to new frequencies and resets the amplitudes to the
+        guesses of HelperCCPert. The omega independent intermediates and the
+        Krylov subspaces of solve_subspace are kept.
+        """
+
+        self.omegas = np.array(omegas, dtype=float).ravel()
+        self.nomega = self.omegas.shape[0]
+        self.nsys = self.npert * self.nomega
+        self.pert_index = np.repeat(np.arange(self.npert), self.nomega)
+        self.omega = np.tile(self.omegas, self.npert)
+
+        # Guesses, as in HelperCCPert
+        self.x1 = self.Avo[self.pert_index] / self.denom_ia(self.omega)
+        self.x2 = self.pertbar_sym[self.pert_index] / self.denom_ijab(self.omega)
+        self.y1 = 2.0 * self.x1
+        self.y2 = 4.0 * self.x2 - 2.0 * self.x2.swapaxes(3, 4)
+
+    def index(self, name, omega):
+        """Returns the batch index of perturbation name at frequency omega."""
+        w = np.where(np.abs(self.omegas - omega) < 1.e-12)[0]
+        if (name not in self.names) or (w.shape[0] == 0):
+            psi4.core.clean()
+            raise Exception('HelperCCPertBatch: no system %s at omega = %f.' % (name, omega))
+        return self.names.index(name) * self.nomega + w[0]
+
+    def denom_ia(self, omega):
+        return self.Dia + omega.reshape(-1, 1, 1)
+
+    def denom_ijab(self, omega):
+        return self.Dijab + omega.reshape(-1, 1, 1, 1, 1)
+
+    def contract_Hvvvv(self, X, transpose=False, prefactor=None):
+        """contract_Hvvvv of Hbar with the batch index folded into i."""
+        N = X.shape[0]
+        R = self.hbar.contract_Hvvvv(X.reshape((N * X.shape[1], ) + X.shape[2:]), transpose=transpose,
+                                     prefactor=prefactor)
+        return R.reshape(X.shape)
+
+    def residual_X(self, x1, x2, pidx, omega):
+        """The X1 and X2 residuals of HelperCCPert.update_X for a stack of systems."""
+
+        r_x1, r_x2 = self.sigma_X(x1, x2)
+        r_x1 += self.Avo[pidx]
+        r_x1 -= omega.reshape(-1, 1, 1) * x1
+        r_x2 += self.pertbar[pidx]
+        r_x2 -= 0.5 * omega.reshape(-1, 1, 1, 1, 1) * x2
+        return r_x1, r_x2
+
+    def sigma_X(self, x1, x2):
+        """
+        The Hbar(0) terms of the X residuals, <phi^a_i|Hbar|X> and half of
+        <phi^ab_ij|Hbar|X> (the final X2 term is r_ijab + r_jiba).
+        """
+
+        H = self.hbar
+
+        # Z intermediates
+        Zvv  = ndot('Nmf,amef->Nae', x1, H.Hvovv, prefactor=2.0)
+        Zvv -= ndot('Nmf,amfe->Nae', x1, H.Hvovv)
+        Zvv -= ndot('Nmnaf,mnef->Nae', x2, H.Loovv)
+        Zoo  = ndot('Nne,mnie->Nmi', x1, H.Hooov, prefactor=-2.0)
+        Zoo += ndot('Nne,nmie->Nmi', x1, H.Hooov)
+        Zoo -= ndot('Ninef,mnef->Nmi', x2, H.Loovv)
+
+        # X1 equations
+        r_x1  = ndot('Nie,ae->Nia', x1, H.Hvv)
+        r_x1 -= ndot('Nma,mi->Nia', x1, H.Hoo)
+        r_x1 += ndot('Nme,maei->Nia', x1, H.Hovvo, prefactor=2.0)
+        r_x1 -= ndot('Nme,maie->Nia', x1, H.Hovov)
+        r_x1 += ndot('Nmiea,me->Nia', x2, H.Hov, prefactor=2.0)
+        r_x1 -= ndot('Nimea,me->Nia', x2, H.Hov)
+        r_x1 += ndot('Nimef,amef->Nia', x2, H.Hvovv, prefactor=2.0)
+        r_x1 -= ndot('Nimef,amfe->Nia', x2, H.Hvovv)
+        r_x1 -= ndot('Nmnae,mnie->Nia', x2, H.Hooov, prefactor=2.0)
+        r_x1 += ndot('Nmnae,nmie->Nia', x2, H.Hooov)
+
+        # X2 equations, symmetrized as in update_X
+        r_x2  = ndot('Nie,abej->Nijab', x1, H.Hvvvo)
+        r_x2 -= ndot('Nma,mbij->Nijab', x1, H.Hovoo)
+        r_x2 += ndot('Nijeb,ae->Nijab', x2, H.Hvv)
+        r_x2 -= ndot('Nmjab,mi->Nijab', x2, H.Hoo)
+        r_x2 += ndot('Nmnab,mnij->Nijab', x2, H.Hoooo, prefactor=0.5)
+        r_x2 += self.contract_Hvvvv(x2, prefactor=0.5)
+        r_x2 += ndot('Nmiea,mbej->Nijab', x2, H.Hovvo, prefactor=2.0)
+        r_x2 -= ndot('Nmiea,mbje->Nijab', x2, H.Hovov)
+        r_x2 -= ndot('Nimeb,maje->Nijab', x2, H.Hovov)
+        r_x2 -= ndot('Nimea,mbej->Nijab', x2, H.Hovvo)
+        r_x2 += ndot('Nmi,mjab->Nijab', Zoo, self.t2)
+        r_x2 += ndot('Nae,ijeb->Nijab', Zvv, self.t2)
+
+        return r_x1, r_x2
+
+    def build_Y_intermediates(self):
+        """
+        The omega and X independent parts of the Y equations: the <O|L(0)|A_bar|..>
+        terms of every perturbation and the L(0)-Hbar(0) intermediates that
+        inhomogenous_y1 rebuilds for every HelperCCPert.
+        """
+
+        if self.L1_miae is not None:
+            return
+
+        H = self.hbar
+        l1, l2 = self.l1, self.l2
+
+        self.im_y1_pert = []
+        self.im_y2_pert = []
+        for p in self.ccperts:
+            Aov, Aoo, Avv, Aovoo = p.build_Aov(), p.build_Aoo(), p.build_Avv(), p.build_Aovoo()
+            r_y1  = 2.0 * Aov
+            r_y1 -= ndot('im,ma->ia', Aoo, l1)
+            r_y1 += ndot('ie,ea->ia', l1, Avv)
+            r_y1 += ndot('imfe,feam->ia', l2, p.build_Avvvo())
+            r_y1 -= ndot('ienm,mnea->ia', Aovoo, l2, prefactor=0.5)
+            r_y1 -= ndot('iemn,mnae->ia', Aovoo, l2, prefactor=0.5)
+            self.im_y1_pert.append(r_y1)
+
+            r_y2  = ndot('ia,jb->ijab', l1, Aov, prefactor=2.0)
+            r_y2 -= ndot('ja,ib->ijab', l1, Aov)
+            r_y2 += ndot('ijeb,ea->ijab', l2, Avv)
+            r_y2 -= ndot('im,mjab->ijab', Aoo, l2)
+            self.im_y2_pert.append(r_y2)
+        self.im_y1_pert = np.array(self.im_y1_pert)
+        self.im_y2_pert = np.array(self.im_y2_pert)
+
+        # <O|L1(0)|[Hbar(0), X1]|phi^a_i> = L1_miae X1_me
+        tmp  = ndot('ma,ie->miae', H.Hov, l1, prefactor=-1.0)
+        tmp -= ndot('ma,ie->miae', l1, H.Hov)
+        tmp -= ndot('mina,ne->miae', H.Hooov, l1, prefactor=2.0)
+        tmp -= ndot('imna,ne->miae', H.Hooov, l1, prefactor=-1.0)
+        tmp -= ndot('imne,na->miae', H.Hooov, l1, prefactor=2.0)
+        tmp -= ndot('mine,na->miae', H.Hooov, l1, prefactor=-1.0)
+        tmp += ndot('fmae,if->miae', H.Hvovv, l1, prefactor=2.0)
+        tmp += ndot('fmea,if->miae', H.Hvovv, l1, prefactor=-1.0)
+        tmp += ndot('fiea,mf->miae', H.Hvovv, l1, prefactor=2.0)
+        tmp += ndot('fiae,mf->miae', H.Hvovv, l1, prefactor=-1.0)
+        self.L1_miae = tmp
+
+        # <O|L2(0)|[Hbar(0), X1]|phi^a_i> = L2_iema X1_me
+        tmp  = ndot('nief,mfna->iema', l2, H.Hovov, prefactor=-1.0)
+        tmp -= ndot('ifne,nmaf->iema', H.Hovov, l2)
+        tmp -= ndot('inef,mfan->iema', l2, H.Hovvo)
+        tmp -= ndot('ifen,nmfa->iema', H.Hovvo, l2)
+        tmp += H.contract_Hvvvv(l2, transpose=True, prefactor=0.5).transpose(0, 3, 1, 2)
+        tmp += H.contract_Hvvvv(l2.swapaxes(2, 3), transpose=True, prefactor=0.5).transpose(0, 2, 1, 3)
+        tmp += ndot('imno,onea->iema', H.Hoooo, l2, prefactor=0.5)
+        tmp += ndot('mino,noea->iema', H.Hoooo, l2, prefactor=0.5)
+        self.L2_iema = tmp
+
+        # Gvv(t2, l2) and Goo(t2, l2)
+        self.Gvv_tl = -ndot('ijab,ijeb->ae', self.t2, l2)
+        self.Goo_tl = ndot('mjab,ijab->mi', self.t2, l2)
+
+    def inhomogenous_Y(self, x1, x2, pidx):
+        """HelperCCPert.inhomogenous_y1 and inhomogenous_y2 for a stack of systems."""
+
+        H = self.hbar
+        l1, l2 = self.l1, self.l2
+        Loovv = H.Loovv
+
+        # Y1: <O|A_bar|phi^a_i> and <O|L(0)|A_bar|phi^a_i>
+        r_y1 = self.im_y1_pert[pidx]
+        # <O|[Hbar(0), X1]|phi^a_i> and <O|L1(0)|[Hbar(0), X1]|phi^a_i>
+        r_y1 += ndot('Nme,imae->Nia', x1, Loovv, prefactor=2.0)
+        r_y1 += ndot('Nme,miae->Nia', x1, self.L1_miae)
+        # <O|L1(0)|[Hbar(0), X2]|phi^a_i>
+        tmp  = ndot('Nmnef,nf->Nme', x2, l1, prefactor=2.0)
+        tmp -= ndot('Nmnfe,nf->Nme', x2, l1)
+        r_y1 += ndot('Nme,imae->Nia', tmp, Loovv)
+        r_y1 -= ndot('Nni,na->Nia', ndot('Nmjab,ijab->Nmi', x2, Loovv), l1)
+        r_y1 -= ndot('Nea,ie->Nia', ndot('Nijab,ijeb->Nae', x2, Loovv), l1)
+        # <O|L2(0)|[Hbar(0), X1]|phi^a_i>
+        r_y1 += ndot('Nme,iema->Nia', x1, self.L2_iema)
+        tmp = ndot('Nnb,fb->Nnf', x1, self.Gvv_tl)
+        r_y1 += ndot('Nnf,inaf->Nia', tmp, Loovv)
+        tmp = ndot('Nme,mief->Nif', x1, Loovv)
+        r_y1 += ndot('Nif,fa->Nia', tmp, self.Gvv_tl)
+        tmp = ndot('Nme,mnea->Nna', x1, Loovv)
+        r_y1 -= ndot('Nna,ni->Nia', tmp, self.Goo_tl)
+        tmp = ndot('Njf,nj->Nfn', x1, self.Goo_tl)
+        r_y1 -= ndot('Nfn,inaf->Nia', tmp, Loovv)
+        # <O|L2(0)|[Hbar(0), X2]|phi^a_i>
+        Goo_xl = ndot('Nmjab,ijab->Nmi', x2, l2)
+        Gvv_xl = -ndot('Nijab,ijeb->Nae', x2, l2)
+        Gvv_lx = -ndot('Nijeb,ijab->Nae', x2, l2)
+        r_y1 -= ndot('Nmi,ma->Nia', Goo_xl, H.Hov)
+        r_y1 += ndot('Nea,ie->Nia', Gvv_xl, H.Hov)
+        tmp = ndot('Nmnef,imfg->Nigne', x2, l2)
+        r_y1 -= ndot('Nigne,gnea->Nia', tmp, H.Hvovv)
+        tmp = ndot('Nmnef,mifg->Nigne', x2, l2)
+        r_y1 -= ndot('Nigne,gnae->Nia', tmp, H.Hvovv)
+        tmp = ndot('Nmnef,mnga->Ngaef', x2, l2)
+        r_y1 -= ndot('Ngaef,gief->Nia', tmp, H.Hvovv)
+        tmp  = ndot('Nmnef,gmae->Nganf', x2, H.Hvovv, prefactor=2.0)
+        tmp -= ndot('Nmnef,gmea->Nganf', x2, H.Hvovv)
+        r_y1 += ndot('Nganf,nifg->Nia', tmp, l2)
+        r_y1 -= ndot('Nge,giea->Nia', Gvv_lx, H.Hvovv, prefactor=2.0)
+        r_y1 += ndot('Nge,giae->Nia', Gvv_lx, H.Hvovv)
+        tmp = ndot('Nmnef,oief->Noimn', x2, l2)
+        r_y1 += ndot('Noimn,mnoa->Nia', tmp, H.Hooov)
+        tmp = ndot('Nmnef,mofa->Noane', x2, l2)
+        r_y1 += ndot('Noane,inoe->Nia', tmp, H.Hooov)
+        tmp = ndot('Nmnef,onea->Noamf', x2, l2)
+        r_y1 += ndot('Noamf,miof->Nia', tmp, H.Hooov)
+        r_y1 -= ndot('Nmo,mioa->Nia', Goo_xl, H.Hooov, prefactor=2.0)
+        r_y1 += ndot('Nmo,imoa->Nia', Goo_xl, H.Hooov)
+        tmp  = ndot('Nmnef,imoe->Nionf', x2, H.Hooov, prefactor=-2.0)
+        tmp += ndot('Nmnef,mioe->Nionf', x2, H.Hooov)
+        r_y1 += ndot('Nionf,nofa->Nia', tmp, l2)
+
+        # Y2: <O|L1(0)|A_bar|phi^ab_ij> and <O|L2(0)|A_bar|phi^ab_ij>
+        r_y2 = self.im_y2_pert[pidx]
+        # <O|L1(0)|[Hbar(0), X1]|phi^ab_ij>
+        tmp = ndot('Nme,mieb->Nib', x1, Loovv)
+        r_y2 -= ndot('Nib,ja->Nijab', tmp, l1)
+        tmp = ndot('Nme,mb->Neb', x1, l1)
+        r_y2 -= ndot('Neb,ijae->Nijab', tmp, Loovv)
+        tmp = ndot('Nme,ie->Nmi', x1, l1)
+        r_y2 -= ndot('Nmi,jmba->Nijab', tmp, Loovv)
+        tmp = ndot('Nme,imae->Nia', x1, Loovv, prefactor=2.0)
+        r_y2 += ndot('Nia,jb->Nijab', tmp, l1)
+        # <O|L2(0)|[Hbar(0), X1]|phi^ab_ij>
+        tmp = ndot('Nme,ma->Nea', x1, H.Hov)
+        r_y2 -= ndot('Nea,ijeb->Nijab', tmp, l2)
+        tmp = ndot('Nme,ie->Nmi', x1, H.Hov)
+        r_y2 -= ndot('Nmi,jmba->Nijab', tmp, l2)
+        tmp = ndot('Nme,ijef->Nmijf', x1, l2)
+        r_y2 -= ndot('Nmijf,fmba->Nijab', tmp, H.Hvovv)
+        tmp = ndot('Nme,imbf->Neibf', x1, l2)
+        r_y2 -= ndot('Neibf,fjea->Nijab', tmp, H.Hvovv)
+        tmp = ndot('Nme,jmfa->Nejfa', x1, l2)
+        r_y2 -= ndot('Nejfa,fibe->Nijab', tmp, H.Hvovv)
+        tmp  = ndot('Nme,fmae->Nfa', x1, H.Hvovv, prefactor=2.0)
+        tmp -= ndot('Nme,fmea->Nfa', x1, H.Hvovv)
+        r_y2 += ndot('Nfa,ijfb->Nijab', tmp, l2)
+        tmp  = ndot('Nme,fiea->Nmfia', x1, H.Hvovv, prefactor=2.0)
+        tmp -= ndot('Nme,fiae->Nmfia', x1, H.Hvovv)
+        r_y2 += ndot('Nmfia,jmbf->Nijab', tmp, l2)
+        tmp = ndot('Nme,jmna->Nejna', x1, H.Hooov)
+        r_y2 += ndot('Nejna,ineb->Nijab', tmp, l2)
+        tmp = ndot('Nme,mjna->Nejna', x1, H.Hooov)
+        r_y2 += ndot('Nejna,nieb->Nijab', tmp, l2)
+        tmp = ndot('Nme,nmba->Nenba', x1, l2)
+        r_y2 += ndot('Nenba,jine->Nijab', tmp, H.Hooov)
+        tmp  = ndot('Nme,mina->Neina', x1, H.Hooov, prefactor=2.0)
+        tmp -= ndot('Nme,imna->Neina', x1, H.Hooov)
+        r_y2 -= ndot('Neina,njeb->Nijab', tmp, l2)
+        tmp  = ndot('Nme,imne->Nin', x1, H.Hooov, prefactor=2.0)
+        tmp -= ndot('Nme,mine->Nin', x1, H.Hooov)
+        r_y2 -= ndot('Nin,jnba->Nijab', tmp, l2)
+        # <O|L2(0)|[Hbar(0), X2]|phi^ab_ij>
+        tmp = ndot('Nmnef,ijef->Nijmn', x2, l2, prefactor=0.5)
+        r_y2 += ndot('Nijmn,mnab->Nijab', tmp, self.MO_oovv)
+        tmp = ndot('Nmnef,ijfe->Nijmn', x2, self.MO_oovv, prefactor=0.5)
+        r_y2 += ndot('Nijmn,mnba->Nijab', tmp, l2)
+        tmp = ndot('Nmnef,mifb->Nibne', x2, l2)
+        r_y2 += ndot('Nibne,jnae->Nijab', tmp, self.MO_oovv)
+        tmp = ndot('Nmnef,imfb->Nibne', x2, l2)
+        r_y2 += ndot('Nibne,njae->Nijab', tmp, self.MO_oovv)
+        tmp = ndot('Nmnef,mjfb->Njbne', x2, l2)
+        r_y2 -= ndot('Njbne,inae->Nijab', tmp, Loovv)
+        r_y2 -= ndot('Nin,jnba->Nijab', ndot('Nijab,mjab->Nmi', x2, Loovv), l2)
+        r_y2 -= ndot('Naf,ijfb->Nijab', ndot('Nijeb,ijab->Nae', x2, Loovv), l2)
+        r_y2 += ndot('Nbe,ijae->Nijab', Gvv_lx, Loovv)
+        r_y2 -= ndot('Njm,imab->Nijab', ndot('Nijab,mjab->Nmi', x2, l2), Loovv)
+        tmp = ndot('Nmnef,nifb->Nibme', x2, l2)
+        r_y2 -= ndot('Nibme,mjea->Nijab', tmp, Loovv)
+        tmp = ndot('Nmnef,njfb->Njbme', x2, l2, prefactor=2.0)
+        r_y2 += ndot('Njbme,imae->Nijab', tmp, Loovv)
+
+        return r_y1, r_y2
+
+    def residual_Y(self, y1, y2, im_y1, im_y2, omega):
+        """The Y1 and Y2 residuals of HelperCCPert.update_Y for a stack of systems."""
+
+        r_y1, r_y2 = self.sigma_Y(y1, y2)
+        r_y1 += im_y1
+        r_y1 += omega.reshape(-1, 1, 1) * y1
+        r_y2 += im_y2
+        r_y2 += 0.5 * omega.reshape(-1, 1, 1, 1, 1) * y2
+        return r_y1, r_y2
+
+    def sigma_Y(self, y1, y2):
+        """The Hbar(0) terms of the Y residuals, <Y|Hbar|phi^a_i> and half of <Y|Hbar|phi^ab_ij>."""
+
+        H = self.hbar
+        Gvv = -ndot('Nijab,ijeb->Nae', y2, self.t2)
+        Goo = ndot('Nijab,mjab->Nmi', y2, self.t2)
+
+        # Y1 equations
+        r_y1  = ndot('Nie,ea->Nia', y1, H.Hvv)
+        r_y1 -= ndot('Nma,im->Nia', y1, H.Hoo)
+        r_y1 += ndot('Nme,ieam->Nia', y1, H.Hovvo, prefactor=2.0)
+        r_y1 -= ndot('Nme,iema->Nia', y1, H.Hovov)
+        r_y1 += ndot('Nimef,efam->Nia', y2, H.Hvvvo)
+        r_y1 -= ndot('Nmnae,iemn->Nia', y2, H.Hovoo)
+        r_y1 -= ndot('Nef,eifa->Nia', Gvv, H.Hvovv, prefactor=2.0)
+        r_y1 += ndot('Nef,eiaf->Nia', Gvv, H.Hvovv)
+        r_y1 -= ndot('Nmn,mina->Nia', Goo, H.Hooov, prefactor=2.0)
+        r_y1 += ndot('Nmn,imna->Nia', Goo, H.Hooov)
+
+        # Y2 equations, symmetrized as in update_Y
+        r_y2  = ndot('Nia,jb->Nijab', y1, H.Hov, prefactor=2.0)
+        r_y2 -= ndot('Nja,ib->Nijab', y1, H.Hov)
+        r_y2 += ndot('Nijeb,ea->Nijab', y2, H.Hvv)
+        r_y2 -= ndot('Nmjab,im->Nijab', y2, H.Hoo)
+        r_y2 += ndot('Nmnab,ijmn->Nijab', y2, H.Hoooo, prefactor=0.5)
+        r_y2 += self.contract_Hvvvv(y2, transpose=True, prefactor=0.5)
+        r_y2 += ndot('Nie,ejab->Nijab', y1, H.Hvovv, prefactor=2.0)
+        r_y2 -= ndot('Nie,ejba->Nijab', y1, H.Hvovv)
+        r_y2 -= ndot('Nmb,jima->Nijab', y1, H.Hooov, prefactor=2.0)
+        r_y2 += ndot('Nmb,ijma->Nijab', y1, H.Hooov)
+        r_y2 += ndot('Nmjeb,ieam->Nijab', y2, H.Hovvo, prefactor=2.0)
+        r_y2 -= ndot('Nmjeb,iema->Nijab', y2, H.Hovov)
+        r_y2 -= ndot('Nmibe,jema->Nijab', y2, H.Hovov)
+        r_y2 -= ndot('Nmieb,jeam->Nijab', y2, H.Hovvo)
+        r_y2 += ndot('Nae,ijeb->Nijab', Gvv, H.Loovv)
+        r_y2 -= ndot('Nmi,mjab->Nijab', Goo, H.Loovv)
+
+        return r_y1, r_y2
+
+    def pseudoresponse(self, hand, systems=None):
+        """HelperCCPert.pseudoresponse of the given systems (default all)."""
+
+        if systems is None:
+            systems = np.arange(self.nsys)
+        if hand == 'right':
+            z1, z2 = self.x1[systems], self.x2[systems]
+        else:
+            z1, z2 = self.y1[systems], self.y2[systems]
+        pidx = self.pert_index[systems]
+
+        polar1 = 2.0 * np.einsum('Nia,Nia->N', z1, self.Avo[pidx])
+        tmp = self.pertbar_sym[pidx]
+        polar2 = 2.0 * np.einsum('Nijab,Nijab->N', z2, tmp)
+        polar2 -= np.einsum('Nijba,Nijab->N', z2, tmp)
+        return -2.0 * (polar1 + polar2)
+
+    def solve(self, hand, r_conv=1.e-7, maxiter=100, max_diis=8, start_diis=1, diis_storage='memory',
+              solver='diis', max_subspace=None):
+        """
+        Solves the right (X) or left (Y) amplitudes of all systems, with
+        Jacobi iterations and one DIIS per system (solver='diis') or with
+        solve_subspace (solver='krylov').
+
+        Returns
+        -------
+        pseudoresponse : ndarray
+            The pseudoresponse of every system, shape (npert, nomega).
+        """
+
+        if solver == 'krylov':
+            return self.solve_subspace(hand, r_conv=r_conv, maxiter=maxiter, max_subspace=max_subspace)
+        elif solver != 'diis':
+            psi4.core.clean()
+            raise Exception('HelperCCPertBatch: solver %s is not available, use diis or krylov.' % solver)
+
+        ccpert_tstart = time.time()
+
+        if hand == 'right':
+            amps = [self.x1, self.x2]
+        else:
+            amps = [self.y1, self.y2]
+            # Inhomogenous terms of all systems, built once before the iterations
+            self.build_Y_intermediates()
+            self.im_y1, self.im_y2 = self.inhomogenous_Y(self.x1, self.x2, self.pert_index)
+
+        diis = [helper_diis(amps[0][k], amps[1][k], max_diis, storage=diis_storage) for k in range(self.nsys)]
+        rms = np.zeros(self.nsys)
+        active = np.arange(self.nsys)
+
+        pseudoresponse_old = self.pseudoresponse(hand)
+        for CCPERT_iter in range(1, maxiter + 1):
+
+            # Residuals of the unconverged systems, in one stack
+            z1, z2 = amps[0][active], amps[1][active]
+            omega = self.omega[active]
+            if hand == 'right':
+                r1, r2 = self.residual_X(z1, z2, self.pert_index[active], omega)
+            else:
+                r1, r2 = self.residual_Y(z1, z2, self.im_y1[active], self.im_y2[active], omega)
+
+            dz1 = r1 / self.denom_ia(omega)
+            tmp = r2 / self.denom_ijab(omega)
+            dz2 = tmp + tmp.swapaxes(1, 2).swapaxes(3, 4)
+            amps[0][active] = z1 + dz1
+            amps[1][active] = z2 + dz2
+            rms[active] = np.sqrt(np.einsum('Nia,Nia->N', dz1, dz1) + np.einsum('Nijab,Nijab->N', dz2, dz2))
+
+            pseudoresponse = self.pseudoresponse(hand)
+            print('CCPERT_%s Iteration %3d: %3d/%d active   max rms = %.5E   max dE = % .5E' %
+                  (hand, CCPERT_iter, active.shape[0], self.nsys, rms[active].max(),
+                   np.abs(pseudoresponse - pseudoresponse_old)[active].max()))
+            pseudoresponse_old = pseudoresponse
+
+            # Converged systems keep their amplitudes, as in separate solves
+            active = active[rms[active] >= r_conv]
+            if active.shape[0] == 0:
+                print('\nCCPERT_%s for %d systems has converged in %.3f seconds!' %
+                      (hand, self.nsys, time.time() - ccpert_tstart))
+                return pseudoresponse.reshape(self.npert, self.nomega)
+
+            for k in active:
+                diis[k].add_error_vector(amps[0][k], amps[1][k])
+                if CCPERT_iter >= start_diis:
+                    amps[0][k], amps[1][k] = diis[k].extrapolate(amps[0][k], amps[1][k])
+
+        psi4.core.clean()
+        raise Exception('CCPERT_%s: %d systems did not converge in %d iterations.' % (hand, active.shape[0], maxiter))
+
+    def pack(self, z1, z2):
+        """Packs a stack of singles and doubles into vectors of shape (N, ov + oovv)."""
+
+        n = z1.shape[0]
+        return np.hstack((z1.reshape(n, -1), z2.reshape(n, -1)))
+
+    def unpack(self, z):
+        """The inverse of pack."""
+
+        o, v = self.Dia.shape
+        n = z.shape[0]
+        return z[:, :o * v].reshape(n, o, v), z[:, o * v:].reshape(n, o, o, v, v)
+
+    def sigma_packed(self, hand, z):
+        """Hbar(0) times packed vectors, with the doubles in full (symmetrized) form."""
+
+        z1, z2 = self.unpack(z)
+        if hand == 'right':
+            r1, r2 = self.sigma_X(z1, z2)
+        else:
+            r1, r2 = self.sigma_Y(z1, z2)
+        return self.pack(r1, r2 + r2.swapaxes(1, 2).swapaxes(3, 4))
+
+    def solve_subspace(self, hand, r_conv=1.e-7, maxiter=100, max_subspace=None):
+        """
+        Solves the right (X) or left (Y) amplitudes of all systems in one
+        Krylov subspace. The residual of every system is
+
+            R = B + (sigma + s omega) Z,  s = -1 (right), +1 (left),
+
+        with sigma the Hbar(0) products of sigma_X or sigma_Y. Each iteration
+        solves the projected equations of all systems, then adds the Jacobi
+        preconditioned residuals of the unconverged ones to the subspace, so
+        every sigma product serves all perturbations and frequencies. The
+        subspace is kept between calls, and after set_omegas the new
+        frequencies start from it.
+
+        Returns
+        -------
+        pseudoresponse : ndarray
+            The pseudoresponse of every system, shape (npert, nomega).
+        """
+
+        ccpert_tstart = time.time()
+
+        if max_subspace is None:
+            max_subspace = 20 * self.nsys
+        if max_subspace < 2 * self.nsys:
+            psi4.core.clean()
+            raise Exception('HelperCCPertBatch: max_subspace must be at least twice the number of systems.')
+
+        pidx = self.pert_index
+        if hand == 'right':
+            sign = -1.0
+            B = self.pack(self.Avo[pidx], self.pertbar_sym[pidx])
+        else:
+            sign = 1.0
+            self.build_Y_intermediates()
+            self.im_y1, self.im_y2 = self.inhomogenous_Y(self.x1, self.x2, pidx)
+            B = self.pack(self.im_y1, self.im_y2 + self.im_y2.swapaxes(1, 2).swapaxes(3, 4))
+        shift = sign * self.omega
+
+        # Jacobi preconditioner (Hbar(0) diagonal + s omega)
+        D = np.array([self.pack(self.denom_ia(np.array([-w])), self.denom_ijab(np.array([-w])))[0]
+                      for w in shift])
+
+        if hand not in self.subspaces:
+            self.subspaces[hand] = HelperCCPertSubspace(lambda z: self.sigma_packed(hand, z))
+        space = self.subspaces[hand]
+        nsigma_start = space.nsigma
+        if space.size() == 0:
+            space.add(B / D)
+
+        rms = np.zeros(self.nsys)
+        for CCPERT_iter in range(1, maxiter + 1):
+
+            # Projected equations (G + s omega) c = -V B of every system
+            VB = np.dot(space.V, B.T)
+            C = np.zeros((space.size(), self.nsys))
+            for k in range(self.nsys):
+                C[:, k] = np.linalg.solve(space.G + shift[k] * np.eye(space.size()), -VB[:, k])
+
+            Z = np.dot(C.T, space.V)
+            R = B + np.dot(C.T, space.HV) + shift.reshape(-1, 1) * Z
+            delta = R / D
+            rms = np.linalg.norm(delta, axis=1)
+            active = np.where(rms >= r_conv)[0]
+
+            print('CCPERT_%s Iteration %3d: %3d/%d active   max rms = %.5E   subspace = %d' %
+                  (hand, CCPERT_iter, active.shape[0], self.nsys, rms.max(), space.size()))
+
+            if active.shape[0] == 0:
+                break
+
+            if space.size() + active.shape[0] > max_subspace:
+                space.collapse(C)
+                continue
+
+            if space.add(delta[active]) == 0:
+                psi4.core.clean()
+                raise Exception('CCPERT_%s: the Krylov subspace stagnated with %d unconverged systems.' %
+                                (hand, active.shape[0]))
+        else:
+            psi4.core.clean()
+            raise Exception('CCPERT_%s: %d systems did not converge in %d iterations.' % (hand, active.shape[0], maxiter))
+
+        if hand == 'right':
+            self.x1, self.x2 = self.unpack(Z)
+        else:
+            self.y1, self.y2 = self.unpack(Z)
+
+        print('\nCCPERT_%s for %d systems has converged in %.3f seconds with %d sigma vectors!' %
+              (hand, self.nsys, time.time() - ccpert_tstart, space.nsigma - nsigma_start))
+        return self.pseudoresponse(hand).reshape(self.npert, self.nomega)
+
+    def linresp(self):
+        """
+        Computes all linear response functions <<A;B>>_omega of the batch,
+        with the same terms as HelperCCLinresp.linresp.
+
+        Returns
+        -------
+        tensor : ndarray
+            tensor[a, b, w] = <<A_a;B_b>> at omegas[w], using the X and Y
+            amplitudes of B_b.
+        """
+
+        l1, l2 = self.l1, self.l2
+        x1, x2, y1, y2 = self.x1, self.x2, self.y1, self.y2
+
+        # Omega independent weights of X1 from <0|L2(0)[A_bar, X1(B)]|0>
+        W = []
+        for p in self.ccperts:
+            Aovoo = p.build_Aovoo()
+            w  = ndot('ijbc,bcaj->ia', l2, p.build_Avvvo())
+            w -= ndot('ijab,kbij->ka', l2, Aovoo, prefactor=0.5)
+            w -= ndot('ijab,kaji->kb', l2, Aovoo, prefactor=0.5)
+            W.append(w)
+        W = np.array(W)
+        AooT = self.Aoo.swapaxes(1, 2)
+
+        # <0|Y(B) * A_bar|0>
+        polar1  = ndot('Aia,Nia->AN', self.Avo, y1)
+        polar1 += ndot('Aijab,Nijab->AN', self.pertbar_sym, y2, prefactor=0.5)
+
+        # <0|(1 + L(0))[A_bar, X(B)]|0>
+        polar2  = ndot('Aia,Nia->AN', self.Aov, x1, prefactor=2.0)
+        polar2 += ndot('Aac,Nac->AN', self.Avv, ndot('Nic,ia->Nac', x1, l1))
+        polar2 -= ndot('Aik,Nik->AN', AooT, ndot('Nka,ia->Nik', x1, l1))
+        tmp = 2.0 * x2 - x2.swapaxes(3, 4)
+        polar2 += ndot('Ajb,Njb->AN', self.Aov, ndot('Nijab,ia->Njb', tmp, l1))
+        polar2 += ndot('Aia,Nia->AN', W, x1)
+        polar2 -= ndot('Aik,Nik->AN', AooT, ndot('Nkjab,ijab->Nik', x2, l2), prefactor=0.5)
+        polar2 -= ndot('Ajk,Njk->AN', AooT, ndot('Nkiba,ijab->Njk', x2, l2), prefactor=0.5)
+        polar2 += ndot('Abc,Nbc->AN', self.Avv, ndot('Nijac,ijab->Nbc', x2, l2), prefactor=0.5)
+        polar2 += ndot('Aac,Nac->AN', self.Avv, ndot('Nijcb,ijab->Nac', x2, l2), prefactor=0.5)
+
+        tensor = -1.0 * (polar1 + polar2)
+        return tensor.reshape(self.npert, self.npert, self.nomega)
+
+# End HelperCCPertBatch class
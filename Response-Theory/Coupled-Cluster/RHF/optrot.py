@@ -81,14 +81,13 @@ omega_nm = 589
 
 # convert from nm into hartree
 omega = (pc.c * pc.h * 1e9) / (pc.hartree2J * omega_nm)
-Om = str(omega)
-Om_0 = str(0)
+
+# Amplitude solver of the batches: 'diis' (Jacobi + DIIS per system) or 'krylov'
+# (one subspace for all systems, reusing Hbar products)
+cc_solver = 'krylov'
 
 cart = ['X', 'Y', 'Z']
 pert = {}
-ccpert = {}
-tensor = {}
-cclinresp = {}
 optrot_lg = np.zeros(9)
 optrot_vg_om = np.zeros(9)
 optrot_vg_0 = np.zeros(9)
@@ -109,40 +108,43 @@ dipole_array = ccsd.mints.ao_dipole()
 # Angular Momentum
 angmom_array = ccsd.mints.ao_angular_momentum()
 
-for i in range(0, 3):
-    Mu = "MU_" + cart[i]
-    L = "L_" + cart[i]
+# Momentum, used by the velocity gauges below
+nabla_array = ccsd.mints.ao_nabla()
 
+for i in range(0, 3):
     # Transform perturbations from AO to MO basis
-    pert[Mu] = np.einsum('uj,vi,uv', ccsd.npC, ccsd.npC,
-                         np.asarray(dipole_array[i]))
-    pert[L] = -0.5 * np.einsum('uj,vi,uv', ccsd.npC, ccsd.npC,
-                               np.asarray(angmom_array[i]))
-
-    # Initializing the perturbation class corresponding to each perturabtion at the given omega
-    ccpert[Mu + Om] = HelperCCPert(Mu, pert[Mu], ccsd, cchbar, cclambda, omega)
-    ccpert[L + Om] = HelperCCPert(L, pert[L], ccsd, cchbar, cclambda, omega)
-
-    # Solve X and Y amplitudes corresponding to each perturabtion at the given omega
-    print(
-        '\nsolving right hand perturbed amplitudes for %s @ omega = %s a.u.\n'
-        % (Mu, Om))
-    ccpert[Mu + Om].solve('right', r_conv=1e-10)
-
-    print(
-        '\nsolving left hand perturbed amplitudes for %s @ omega = %s a.u.\n' %
-        (Mu, Om))
-    ccpert[Mu + Om].solve('left', r_conv=1e-10)
-
-    print(
-        '\nsolving right hand perturbed amplitudes for %s @ omega = %s a.u.\n'
-        % (L, Om))
-    ccpert[L + Om].solve('right', r_conv=1e-10)
-
-    print(
-        '\nsolving left hand perturbed amplitudes for %s @ omega = %s a.u.\n' %
-        (L, Om))
-    ccpert[L + Om].solve('left', r_conv=1e-10)
+    pert["MU_" + cart[i]] = np.einsum('uj,vi,uv', ccsd.npC, ccsd.npC,
+                                      np.asarray(dipole_array[i]))
+    pert["L_" + cart[i]] = -0.5 * np.einsum('uj,vi,uv', ccsd.npC, ccsd.npC,
+                                            np.asarray(angmom_array[i]))
+    pert["P_" + cart[i]] = np.einsum('uj,vi,uv', ccsd.npC, ccsd.npC,
+                                     np.asarray(nabla_array[i]))
+
+
+def solve_batch(names, omega):
+    """
+    Solves the X and Y amplitudes of all perturbations in names at omega together
+    with HelperCCPertBatch and returns the linear response functions <<A;B>> of all pairs.
+    """
+    ccpert_batch = HelperCCPertBatch(names, [pert[name] for name in names], ccsd,
+                                     cchbar, cclambda, [omega])
+    print('\nsolving right hand perturbed amplitudes for %d perturbations @ omega = %s a.u.\n'
+          % (len(names), str(omega)))
+    ccpert_batch.solve('right', r_conv=1e-10, solver=cc_solver)
+    print('\nsolving left hand perturbed amplitudes for %d perturbations @ omega = %s a.u.\n'
+          % (len(names), str(omega)))
+    ccpert_batch.solve('left', r_conv=1e-10, solver=cc_solver)
+
+    linresp = ccpert_batch.linresp()
+    tensor = {}
+    for a, str_A in enumerate(names):
+        for b, str_B in enumerate(names):
+            tensor["<<" + str_A + ";" + str_B + ">>"] = linresp[a, b, 0]
+    return tensor
+
+
+# MU, L and P at the given omega in one batch, P is needed by the velocity gauge
+tensor = solve_batch(["MU_" + c for c in cart] + ["L_" + c for c in cart] + ["P_" + c for c in cart], omega)
 
 for A in range(0, 3):
     str_A = "MU_" + cart[A]
@@ -151,19 +153,9 @@ for A in range(0, 3):
         str_AB = "<<" + str_A + ";" + str_B + ">>"
         str_BA = "<<" + str_B + ";" + str_A + ">>"
 
-        # constructing the linear response functions <<MU;L>> and <<L;MU>> @ given omega
         # The optical rotation tensor beta can be written in length gauge as:
         # beta_pq = 0.5 * (<<MU_p;L_q>>  - <<L_q;MU_p>), Please refer to eq. 49 of 
         # [Pedersen:1997:8059].
-
-        cclinresp[str_AB] = HelperCCLinresp(cclambda, ccpert[str_A + Om],
-                                            ccpert[str_B + Om])
-        cclinresp[str_BA] = HelperCCLinresp(cclambda, ccpert[str_B + Om],
-                                            ccpert[str_A + Om])
-
-        tensor[str_AB] = cclinresp[str_AB].linresp()
-        tensor[str_BA] = cclinresp[str_BA].linresp()
-
         optrot_lg[3 * A + B] = 0.5 * (tensor[str_AB] - tensor[str_BA])
 
 # Isotropic optical rotation in length gauge @ given omega
@@ -201,30 +193,6 @@ print("Specific rotation @ %d nm (Length Gauge): %10.5lf deg/[dm (g/cm^3)]" %
 
 print("\n\n Velocity Gauge Calculations Starting ..\n\n")
 
-# Grabbing the momentum integrals from mints
-nabla_array = ccsd.mints.ao_nabla()
-
-for i in range(0, 3):
-    P = "P_" + cart[i]
-
-    # Transform momentum from AO to MO basis
-    pert[P] = np.einsum('uj,vi,uv', ccsd.npC, ccsd.npC,
-                        np.asarray(nabla_array[i]))
-
-    # Initializing the perturbation class
-    ccpert[P + Om] = HelperCCPert(P, pert[P], ccsd, cchbar, cclambda, omega)
-
-    # Solve X and Y amplitudes corresponding to the perturabtion at the given omega
-    print(
-        '\nsolving right hand perturbed amplitudes for %s @ omega = %s a.u.\n'
-        % (P, Om))
-    ccpert[P + Om].solve('right', r_conv=1e-10)
-
-    print(
-        '\nsolving left hand perturbed amplitudes for %s @ omega = %s a.u.\n' %
-        (P, Om))
-    ccpert[P + Om].solve('left', r_conv=1e-10)
-
 for A in range(0, 3):
     str_A = "P_" + cart[A]
     for B in range(0, 3):
@@ -232,17 +200,9 @@ for A in range(0, 3):
         str_AB = "<<" + str_A + ";" + str_B + ">>"
         str_BA = "<<" + str_B + ";" + str_A + ">>"
 
-        # constructing the linear response functions <<P;L>> and <<L;P>> @ given omega
         # The optical rotation tensor beta can be written in velocity gauge as:
         # beta_pq = 0.5 * (<<MU_p;L_q>> + <<L_q;MU_p>), Please refer to eq. 49 of 
         # [Pedersen:1991:8059].
-
-        cclinresp[str_AB] = HelperCCLinresp(cclambda, ccpert[str_A + Om],
-                                            ccpert[str_B + Om])
-        cclinresp[str_BA] = HelperCCLinresp(cclambda, ccpert[str_B + Om],
-                                            ccpert[str_A + Om])
-        tensor[str_AB] = cclinresp[str_AB].linresp()
-        tensor[str_BA] = cclinresp[str_BA].linresp()
         optrot_vg_om[3 * A + B] = 0.5 * (tensor[str_AB] + tensor[str_BA])
 
 # Isotropic optical rotation in velocity gauge @ given omega
@@ -270,37 +230,8 @@ print("Specific rotation @ %d nm (Velocity Gauge): %10.5lf deg/[dm (g/cm^3)]" %
 
 print("\n\nModified Velocity Gauge Calculations Starting ..\n\n")
 
-Om_0 = str(0)
-for i in range(0, 3):
-    L = "L_" + cart[i]
-    P = "P_" + cart[i]
-    Om_0 = str(0)
-
-    # Initializing perturbation classes at zero frequency
-    ccpert[L + Om_0] = HelperCCPert(L, pert[L], ccsd, cchbar, cclambda, 0)
-    ccpert[P + Om_0] = HelperCCPert(P, pert[P], ccsd, cchbar, cclambda, 0)
-
-    # Solving X and Y amplitudes of the perturbation classes at zero frequency
-
-    print(
-        '\nsolving right hand perturbed amplitudes for %s @ omega = %s (a.u.)\n'
-        % (L, Om_0))
-    ccpert[L + Om_0].solve('right', r_conv=1e-10)
-
-    print(
-        '\nsolving left hand perturbed amplitudes for %s @ omega = %s (a.u.)\n'
-        % (L, Om_0))
-    ccpert[L + Om_0].solve('left', r_conv=1e-10)
-
-    print(
-        '\nsolving right hand perturbed amplitudes for %s @ omega = %s (a.u.)\n'
-        % (P, Om_0))
-    ccpert[P + Om_0].solve('right', r_conv=1e-10)
-
-    print(
-        '\nsolving left hand perturbed amplitudes for %s @ omega = %s (a.u.)\n'
-        % (P, Om_0))
-    ccpert[P + Om_0].solve('left', r_conv=1e-10)
+# L and P at zero frequency in a second batch
+tensor = solve_batch(["L_" + c for c in cart] + ["P_" + c for c in cart], 0.0)
 
 for A in range(0, 3):
     str_A = "P_" + cart[A]
@@ -310,15 +241,6 @@ for A in range(0, 3):
         str_BA = "<<" + str_B + ";" + str_A + ">>"
 
         # constructing the linear response functions <<P;L>> and <<L;P>> @ zero frequency)
-
-        cclinresp[str_AB] = HelperCCLinresp(cclambda, ccpert[str_A + Om_0],
-                                            ccpert[str_B + Om_0])
-        cclinresp[str_BA] = HelperCCLinresp(cclambda, ccpert[str_B + Om_0],
-                                            ccpert[str_A + Om_0])
-
-        tensor[str_AB] = cclinresp[str_AB].linresp()
-        tensor[str_BA] = cclinresp[str_BA].linresp()
-
         optrot_vg_0[3 * A + B] = 0.5 * (tensor[str_AB] + tensor[str_BA])
 
 #  MVG(omega) = VG(omega) - VG(0)
@@ -51,10 +51,14 @@ psi4.set_options({
 })
 rhf_e, rhf_wfn = psi4.energy('SCF', return_wfn=True)
 
+# Integrals for the CC helpers: 'conventional' (nmo^4 MO tensor), or the three-index
+# 'df' / 'cholesky' factors. Only 'conventional' reproduces the psi4 values compared below
+cc_integrals = 'conventional'
+
 print('RHF Final Energy                          % 16.10f\n' % rhf_e)
 
 # Calculate Ground State CCSD energy
-ccsd = HelperCCEnergy(mol, rhf_e, rhf_wfn, memory=2)
+ccsd = HelperCCEnergy(mol, rhf_e, rhf_wfn, memory=2, integrals=cc_integrals)
 ccsd.compute_energy(e_conv=1e-10, r_conv=1e-10)
 
 CCSDcorr_E = ccsd.ccsd_corr_e
@@ -77,9 +81,16 @@ omega_nm = 589
 omega_nm = 589
 omega = (pc.c * pc.h * 1e9) / (pc.hartree2J * omega_nm)
 
+# Further wavelengths (nm) for the dispersion curve of the isotropic polarizability,
+# solved in the same batch
+dispersion_nm = []
+
+# Amplitude solver of the batch: 'diis' (Jacobi + DIIS per system) or 'krylov'
+# (one subspace for all systems, reusing Hbar products)
+cc_solver = 'krylov'
+
 cart = ['X', 'Y', 'Z']
 Mu = {}
-ccpert = {}
 polar_AB = {}
 
 # Obtain AO Dipole Matrices From Mints
@@ -92,30 +103,39 @@ for i in range(0, 3):
     Mu[string] = np.einsum('uj,vi,uv', ccsd.npC, ccsd.npC,
                            np.asarray(dipole_array[i]))
 
-    # Initializing the perturbation classs corresponding to dipole perturabtion at the given omega
-    ccpert[string] = HelperCCPert(string, Mu[string], ccsd, cchbar, cclambda,
-                                  omega)
+wavelengths = [omega_nm] + list(dispersion_nm)
+omegas = [(pc.c * pc.h * 1e9) / (pc.hartree2J * nm) for nm in wavelengths]
 
-    # Solve X and Y amplitudes corresponding to dipole perturabtion at the given omega
-    print('\nsolving right hand perturbed amplitudes for %s\n' % string)
-    ccpert[string].solve('right', r_conv=1e-10)
+# Initializing one perturbation batch for all components at all frequencies,
+# every term of the amplitude equations is one wide contraction per iteration
+names = ["MU_" + cart[i] for i in range(0, 3)]
+ccpert = HelperCCPertBatch(names, [Mu[name] for name in names], ccsd, cchbar,
+                           cclambda, omegas)
 
-    print('\nsolving left hand perturbed amplitudes for %s\n' % string)
-    ccpert[string].solve('left', r_conv=1e-10)
+# Solve X and Y amplitudes corresponding to dipole perturabtion at the given omegas
+print('\nsolving right hand perturbed amplitudes for %d systems\n' % ccpert.nsys)
+ccpert.solve('right', r_conv=1e-10, solver=cc_solver)
+
+print('\nsolving left hand perturbed amplitudes for %d systems\n' % ccpert.nsys)
+ccpert.solve('left', r_conv=1e-10, solver=cc_solver)
 
 # Please refer to eq. 94 of [Koch:1991:3333] for the general form of linear response functions.
 # For electric dipole polarizabilities, A = mu[x/y/z] and B = mu[x/y/z],
 # Ex. alpha_xy = <<mu_x;mu_y>>, where mu_x = x and mu_y = y
+# tensor[a, b, w] = <<Mu_a;Mu_b>> at omegas[w]
+tensor = ccpert.linresp()
 
 print("\nComputing <<Mu;Mu> tensor @ %d nm" % omega_nm)
 
 for a in range(0, 3):
-    str_a = "MU_" + cart[a]
     for b in range(0, 3):
-        str_b = "MU_" + cart[b]
         # Computing the alpha tensor
-        polar_AB[3 * a + b] = HelperCCLinresp(cclambda, ccpert[str_a],
-                                              ccpert[str_b]).linresp()
+        polar_AB[3 * a + b] = tensor[a, b, 0]
+
+if len(dispersion_nm) > 0:
+    print('\n  Wavelength (nm)    omega (a.u.)    Isotropic alpha (a.u.)')
+    for w, nm in enumerate(wavelengths):
+        print('  %15.2f  %14.8f  %24.10f' % (nm, omegas[w], np.trace(tensor[:, :, w]) / 3.0))
 
 # Symmetrizing the tensor
 for a in range(0, 3):
@@ -2,10 +2,27 @@
 Helper classes and functions for molecular properties requiring
 solution of CPHF equations.
 
+The direct solvers build the orbital Hessian from MO integrals and invert it.
+The matrix-free solvers only need products of the Hessian with trial vectors,
+which come from one J/K build of the transition densities Co x Cv^T
+(helper_JK backends). solve_static_pcg runs preconditioned conjugate
+gradients for all dipole components together; solve_dynamic_subspace
+projects the frequency-dependent (TDHF/RPA) equations onto one subspace of
+trial vectors, shared by all components and frequencies. solve_excitations
+finds the lowest TDHF/RPA or CIS (TDA) excitation energies with a Davidson
+solver built on the same products.
+
+helper_beta computes first hyperpolarizabilities beta(-w_sigma; w1, w2) with
+the 2n+1 rule from first-order responses that are solved once per frequency
+and cached, so dispersion scans only solve for new frequencies.
+
 References:
 - Equations and algorithms from [Szabo:1996] and Project 3 from
 Daniel Crawford's programming website:
 http://github.com/CrawfordGroup/ProgrammingProjects
+- Reduced linear response equations with paired trial vectors from [Olsen:1988:265]
+- Davidson solver for the RPA eigenvalue problem from [Stratmann:1998:8218]
+- Hyperpolarizabilities from [Karna:1991:487]
 """
 
 __authors__   =  "Daniel G. A. Smith"
@@ -16,6 +33,7 @@ __license__   = "BSD-3-Clause"
 __date__      = "2017-8-30"
 
 import time
+from itertools import permutations
 import numpy as np
 np.set_printoptions(precision=5, linewidth=200, suppress=True)
 import psi4
@@ -25,17 +43,21 @@ import sys
 dirname = os.path.dirname(os.path.abspath(__file__))
 sys.path.append(os.path.join(dirname, '../../Self-Consistent-Field'))
 from helper_HF import DIIS_helper
+from helper_JK import build_jk
 
 
 class helper_CPHF(object):
 
-    def __init__(self, mol, numpy_memory=2):
+    def __init__(self, mol, numpy_memory=2, jk_type='psi4', scf_wfn=None):
 
         self.mol = mol
         self.numpy_memory = numpy_memory
+        self.jk_type = jk_type
 
         # Compute the reference wavefunction and CPHF using Psi
-        scf_e, self.scf_wfn = psi4.energy('SCF', return_wfn=True)
+        if scf_wfn is None:
+            scf_e, scf_wfn = psi4.energy('SCF', return_wfn=True)
+        self.scf_wfn = scf_wfn
 
         self.C = self.scf_wfn.Ca()
         self.Co = self.scf_wfn.Ca_subset("AO", "OCC")
@@ -64,9 +86,18 @@ class helper_CPHF(object):
             Fia *= -2
             self.dipoles_xyz.append(Fia)
 
+        # Orbital energy differences e_a - e_i, the diagonal preconditioner
+        self.ia_denom = self.epsilon[self.nocc:] - self.epsilon[:self.nocc].reshape(-1, 1)
+
         self.x = None
         self.rhsvecs = None
 
+        # J/K backend and trial vector subspace of the matrix-free solvers
+        self.jk = None
+        self.subspace = None
+        self.responses = {}
+        self.excitations = None
+
     def run(self, method='direct', omega=None):
         self.method = method
         if self.method == 'direct':
@@ -79,6 +110,11 @@ class helper_CPHF(object):
                 self.solve_static_iterative()
             else:
                 self.solve_dynamic_iterative(omega=omega)
+        elif self.method == 'krylov':
+            if not omega:
+                self.solve_static_pcg()
+            else:
+                self.solve_dynamic_subspace(omega=omega)
         else:
             raise Exception("Method %s is not recognized" % self.method)
         self.form_polarizability()
@@ -180,7 +216,8 @@ class helper_CPHF(object):
         S1 = np.hstack((S11, D11))
         S2 = np.hstack((D11, -S11))
         S = np.vstack((S1, S2))
-        S *= omega
+        # Out of place, so omega may also be an imaginary frequency
+        S = S * omega
         print('Hessian formation took %.3f seconds\n' % (time.time() - t))
 
         t = time.time()
@@ -369,12 +406,507 @@ class helper_CPHF(object):
             print('CPHF Iteration %3d: Average RMS = %3.8f  Maximum RMS = %3.8f' %
                   (CPHF_ITER, avg_RMS, max_RMS))
 
+    def initialize_jk(self):
+        if self.jk is None:
+            self.jk = build_jk(self.jk_type, self.scf_wfn.basisset(), self.mints,
+                               scf_type=psi4.core.get_global_option('SCF_TYPE'), memory=self.numpy_memory)
+
+    def hessian_products(self, vecs, triplet=False):
+        """
+        Products of the orbital Hessians with a stack of (nocc, nvir) vectors, from
+        one J/K build of the densities D = Co x Cv^T:
+
+            E+ x = (e_a - e_i) x + Co^T (4J - K - K^T) Cv,  [4(ia|jb) - (ib|ja) - (ij|ab)] x_jb
+            E- x = (e_a - e_i) x + Co^T (K^T - K) Cv,       [(ib|ja) - (ij|ab)] x_jb
+
+        E+ is the static Hessian of solve_static_direct, and the blocks of
+        solve_dynamic_direct are A = E+ + E- and B = E- - E+. In terms of the
+        singlet excitation matrices, E+ = A + B and E- = A - B. With triplet the
+        Coulomb term 4J is dropped, which gives the triplet A + B.
+        """
+
+        self.initialize_jk()
+        Co = np.asarray(self.Co)
+        Cv = np.asarray(self.Cv)
+
+        C_right = [Cv.dot(x.T) for x in vecs]
+        J, K = self.jk.compute([Co] * len(C_right), C_right)
+
+        Ep = np.empty_like(vecs)
+        Em = np.empty_like(vecs)
+        for n in range(len(C_right)):
+            if triplet:
+                Ep[n] = self.ia_denom * vecs[n] - (Co.T).dot(K[n] + K[n].T).dot(Cv)
+            else:
+                Ep[n] = self.ia_denom * vecs[n] + (Co.T).dot(4 * J[n] - K[n] - K[n].T).dot(Cv)
+            Em[n] = self.ia_denom * vecs[n] + (Co.T).dot(K[n].T - K[n]).dot(Cv)
+        return Ep, Em
+
+    def solve_static_pcg(self, maxiter=50, conv=1.e-8):
+        """
+        Solves E+ x = b for the three dipole components with preconditioned
+        conjugate gradients. The components keep their own CG recurrences, but
+        share one J/K build per iteration; converged components drop out.
+        """
+
+        nov = self.nocc * self.nvir
+        b = np.array(self.dipoles_xyz)
+
+        x = b / self.ia_denom
+        r = b - self.hessian_products(x)[0]
+        z = r / self.ia_denom
+        p = z.copy()
+        rz = np.einsum('nia,nia->n', r, z)
+        active = np.arange(3)
+
+        print('\nStarting CPHF PCG iterations:')
+        t = time.time()
+        for CPHF_ITER in range(1, maxiter + 1):
+            Hp = self.hessian_products(p[active])[0]
+            alpha = rz[active] / np.einsum('nia,nia->n', p[active], Hp)
+            x[active] += alpha.reshape(-1, 1, 1) * p[active]
+            r[active] -= alpha.reshape(-1, 1, 1) * Hp
+
+            rms = np.sqrt(np.einsum('nia,nia->n', r, r) / nov)
+            print('CPHF Iteration %3d: %d/3 active  Maximum residual RMS = %3.8e' %
+                  (CPHF_ITER, active.shape[0], rms[active].max()))
+
+            active = active[rms[active] >= conv]
+            if active.shape[0] == 0:
+                print('CPHF converged in %d iterations and %.2f seconds.' % (CPHF_ITER, time.time() - t))
+                break
+
+            z[active] = r[active] / self.ia_denom
+            rz_new = np.einsum('nia,nia->n', r[active], z[active])
+            beta = rz_new / rz[active]
+            rz[active] = rz_new
+            p[active] = z[active] + beta.reshape(-1, 1, 1) * p[active]
+        else:
+            psi4.core.clean()
+            raise Exception('CPHF PCG did not converge in %d iterations.' % maxiter)
+
+        self.x = [x[numx].reshape(-1) for numx in range(3)]
+        self.rhsvecs = [self.dipoles_xyz[numx].reshape(-1) for numx in range(3)]
+
+    def orthonormalize(self, Q, vecs, tol=1.e-10):
+        """
+        Orthonormalizes vecs against the rows of Q and among themselves, and
+        drops the linearly dependent ones. Returns the new vectors as rows.
+        """
+
+        new = []
+        for v in vecs:
+            v = v.ravel().copy()
+            norm = np.linalg.norm(v)
+            if norm < 1.e-14:
+                continue
+            # Two passes of Gram-Schmidt for numerical stability
+            for gs_pass in range(2):
+                v -= Q.T.dot(Q.dot(v))
+                for q in new:
+                    v -= q.dot(v) * q
+            vnorm = np.linalg.norm(v)
+            if vnorm / norm > tol:
+                new.append(v / vnorm)
+
+        return np.array(new).reshape(len(new), Q.shape[1])
+
+    def expand_subspace(self, vecs, tol=1.e-10):
+        """
+        Orthonormalizes vecs against the trial vectors and among themselves, and
+        appends the new ones together with their E+ and E- products.
+        Returns the number of vectors added.
+        """
+
+        Q, EpQ, EmQ = self.subspace
+        new = self.orthonormalize(Q, vecs, tol)
+        if len(new) == 0:
+            return 0
+
+        Ep, Em = self.hessian_products(new.reshape(-1, self.nocc, self.nvir))
+        self.subspace = [np.vstack((Q, new)),
+                         np.vstack((EpQ, Ep.reshape(len(new), -1))),
+                         np.vstack((EmQ, Em.reshape(len(new), -1)))]
+        return len(new)
+
+    def solve_dynamic_subspace(self, omega=0.0, maxiter=50, conv=1.e-8, imaginary=False):
+        """
+        Solves the TDHF equations of solve_dynamic_direct for the three dipole
+        components at one or several frequencies without forming the Hessian.
+
+        With u = x - y and v = x + y (x, y the two halves of the direct solution)
+        the equations become
+
+            E+ u - w v = b,   E- v - w u = 0,
+
+        which are projected onto one orthonormal set of trial vectors Q, used for
+        both u and v. Every iteration solves the small projected equations of all
+        components and frequencies and adds their preconditioned residuals to Q.
+        The trial vectors are kept on the helper, so later calls at other
+        frequencies start from the subspace already built.
+
+        Parameters
+        ----------
+        omega : float or list of float
+            Frequencies, or imaginary frequencies i*omega if imaginary is True.
+
+        Notes
+        -----
+        The response vectors of every frequency are stored in self.responses[omega],
+        and self.x holds the ones of the first frequency, as for the other solvers.
+        """
+
+        omegas = [float(w) for w in np.atleast_1d(omega)]
+        nov = self.nocc * self.nvir
+        b = np.array([d.reshape(-1) for d in self.dipoles_xyz])
+        denom = self.ia_denom.reshape(-1)
+
+        if self.subspace is None:
+            self.subspace = [np.zeros((0, nov)), np.zeros((0, nov)), np.zeros((0, nov))]
+        if self.subspace[0].shape[0] == 0:
+            self.expand_subspace(b / denom)
+
+        print('\nStarting TDHF subspace iterations for %d frequencies:' % len(omegas))
+        t = time.time()
+        for CPHF_ITER in range(1, maxiter + 1):
+            Q, EpQ, EmQ = self.subspace
+            m = Q.shape[0]
+            red = np.zeros((2 * m, 2 * m))
+            red[:m, :m] = Q.dot(EpQ.T)
+            red[m:, m:] = Q.dot(EmQ.T)
+            rhs = np.zeros((2 * m, 3))
+            rhs[:m] = Q.dot(b.T)
+
+            solutions = {}
+            new = []
+            max_rms = 0.0
+            for w in omegas:
+                # For i*w, v = i v' keeps the equations real: E+ u + w v' = b, E- v' - w u = 0
+                coupling = w if imaginary else -w
+                red[:m, m:] = coupling * np.eye(m)
+                red[m:, :m] = -w * np.eye(m)
+                c = np.linalg.solve(red, rhs)
+
+                u = c[:m].T.dot(Q)
+                v = c[m:].T.dot(Q)
+                r_u = b - c[:m].T.dot(EpQ) - coupling * v
+                r_v = w * u - c[m:].T.dot(EmQ)
+
+                # Diagonal preconditioner [[d, coupling], [-w, d]]^-1
+                det = denom ** 2 + coupling * w
+                d_u = (denom * r_u - coupling * r_v) / det
+                d_v = (w * r_u + denom * r_v) / det
+                rms = np.sqrt((np.einsum('np,np->n', d_u, d_u) + np.einsum('np,np->n', d_v, d_v)) / nov)
+                max_rms = max(max_rms, rms.max())
+
+                solutions[w] = (u, v)
+                for n in np.where(rms >= conv)[0]:
+                    new.extend([d_u[n], d_v[n]])
+
+            print('CPHF Iteration %3d: subspace size %4d  Maximum residual RMS = %3.8e' %
+                  (CPHF_ITER, m, max_rms))
+
+            if len(new) == 0:
+                print('CPHF converged in %d iterations and %.2f seconds.' % (CPHF_ITER, time.time() - t))
+                break
+
+            if self.expand_subspace(new) == 0:
+                psi4.core.clean()
+                raise Exception('TDHF subspace solver stagnated.')
+        else:
+            psi4.core.clean()
+            raise Exception('TDHF subspace solver did not converge in %d iterations.' % maxiter)
+
+        self.rhsvecs = [np.concatenate((b[numx], -b[numx])) for numx in range(3)]
+        for w in omegas:
+            u, v = solutions[w]
+            if imaginary:
+                v = 1j * v
+            x = 0.5 * (u + v)
+            y = 0.5 * (v - u)
+            self.responses[w] = [np.concatenate((x[numx], y[numx])) for numx in range(3)]
+        self.x = self.responses[omegas[0]]
+
+    def solve_excitations(self, nroot=5, tda=False, triplet=False, maxiter=50, conv=1.e-6, max_subspace=None):
+        """
+        Finds the lowest excitation energies with a Davidson solver, without
+        forming the (ov x ov) A and B matrices.
+
+        For TDHF/RPA the eigenvalue problem (A - B)(A + B)|X + Y> = w^2 |X + Y>
+        is projected onto one set of trial vectors used for both X + Y and
+        X - Y. The small projected problem is solved in the symmetric form
+        (A - B)^1/2 (A + B) (A - B)^1/2, which is well defined because A - B is
+        positive definite for a stable reference. With tda the Tamm-Dancoff
+        (CIS) matrix A is diagonalized instead. When the subspace reaches
+        max_subspace it is collapsed onto the current eigenvectors, without
+        new J/K builds. The collapse keeps the current and the previous
+        eigenvectors (thick restart), as the current ones alone stall the solver.
+
+        Parameters
+        ----------
+        nroot : int (default, 5)
+            Number of excited states.
+        tda : bool (default, False)
+            Solve the Tamm-Dancoff (CIS) problem instead of the full RPA one.
+        triplet : bool (default, False)
+            Solve for triplet instead of singlet states.
+        max_subspace : int (default, 20 * nroot)
+            Number of trial vectors that triggers a collapse, at least 4 * nroot
+            for TDA and 8 * nroot for RPA.
+
+        Returns
+        -------
+        w : ndarray
+            The nroot lowest excitation energies. The X and Y amplitudes,
+            normalized to X^2 - Y^2 = 1, are stored in self.excitations.
+        """
+
+        nov = self.nocc * self.nvir
+        nroot = min(nroot, nov)
+        denom = self.ia_denom.reshape(-1)
+        if max_subspace is None:
+            max_subspace = 20 * nroot
+        # The restart keeps two sets of Ritz vectors, u and v for each root with RPA,
+        # and leaves as much room again for new vectors
+        nritz = nroot if tda else 2 * nroot
+        max_subspace = min(max(max_subspace, 4 * nritz), nov)
+
+        # Guess: the single excitations with the lowest orbital energy gaps
+        nguess = min(2 * nroot, nov)
+        Q = np.zeros((nguess, nov))
+        Q[np.arange(nguess), np.argsort(denom)[:nguess]] = 1.0
+        Ep, Em = self.hessian_products(Q.reshape(-1, self.nocc, self.nvir), triplet=triplet)
+        EpQ = Ep.reshape(nguess, -1)
+        EmQ = Em.reshape(nguess, -1)
+
+        print('\nStarting %s Davidson iterations for %d %s roots:' %
+              ('TDA' if tda else 'RPA', nroot, 'triplet' if triplet else 'singlet'))
+        t = time.time()
+        prev = None
+        for DAV_ITER in range(1, maxiter + 1):
+            m = Q.shape[0]
+            P = Q.dot(EpQ.T)
+            M = Q.dot(EmQ.T)
+            P = 0.5 * (P + P.T)
+            M = 0.5 * (M + M.T)
+
+            if tda:
+                w, c = np.linalg.eigh(0.5 * (P + M))
+                w = w[:nroot]
+                c = c[:, :nroot]
+                X = c.T.dot(Q)
+                R = 0.5 * c.T.dot(EpQ + EmQ) - w.reshape(-1, 1) * X
+                shift = w.reshape(-1, 1) - denom
+                shift[np.abs(shift) < 1.e-4] = 1.e-4
+                new = R / shift
+                keep = c
+            else:
+                m_vals, m_vecs = np.linalg.eigh(M)
+                if m_vals.min() <= 0.0:
+                    psi4.core.clean()
+                    raise Exception('RPA: A - B is not positive definite, the reference is unstable.')
+                Mh = (m_vecs * np.sqrt(m_vals)).dot(m_vecs.T)
+                w2, T = np.linalg.eigh(Mh.dot(P).dot(Mh))
+                if w2[:nroot].min() <= 0.0:
+                    psi4.core.clean()
+                    raise Exception('RPA: negative w^2, the reference is unstable.')
+                w = np.sqrt(w2[:nroot])
+
+                # u = X + Y and v = X - Y = (A + B) u / w, normalized to u.v = 1
+                c_u = Mh.dot(T[:, :nroot]) / np.sqrt(w)
+                c_v = P.dot(c_u) / w
+                u = c_u.T.dot(Q)
+                v = c_v.T.dot(Q)
+                r_u = c_u.T.dot(EpQ) - w.reshape(-1, 1) * v
+                r_v = c_v.T.dot(EmQ) - w.reshape(-1, 1) * u
+
+                # Diagonal preconditioner [[d, -w], [-w, d]]^-1
+                det = denom ** 2 - w.reshape(-1, 1) ** 2
+                det[np.abs(det) < 1.e-4] = 1.e-4
+                d_u = (denom * r_u + w.reshape(-1, 1) * r_v) / det
+                d_v = (w.reshape(-1, 1) * r_u + denom * r_v) / det
+                R = np.hstack((r_u, r_v))
+                new = np.vstack((d_u, d_v))
+                keep = np.hstack((c_u, c_v))
+
+            rnorm = np.linalg.norm(R, axis=1)
+            nconv = int(np.sum(rnorm < conv))
+            print('Davidson Iteration %3d: %3d/%d converged  subspace size %4d  max residual norm = %3.8e' %
+                  (DAV_ITER, nconv, nroot, m, rnorm.max()))
+            if nconv == nroot:
+                print('Davidson converged in %d iterations and %.2f seconds.' % (DAV_ITER, time.time() - t))
+                break
+
+            if tda:
+                new = new[rnorm >= conv]
+            else:
+                active = np.tile(rnorm >= conv, 2)
+                new = new[active]
+
+            # Thick restart: collapse onto the current and the previous Ritz vectors,
+            # their products follow from the old ones. The corrections are added below.
+            ritz = keep.T.dot(Q)
+            if m + len(new) > max_subspace:
+                if prev is not None:
+                    keep = np.hstack((keep, Q.dot(prev.T)))
+                U = self.orthonormalize(np.zeros((0, m)), keep.T).T
+                Q = U.T.dot(Q)
+                EpQ = U.T.dot(EpQ)
+                EmQ = U.T.dot(EmQ)
+            prev = ritz
+
+            new = self.orthonormalize(Q, new)
+            if len(new) == 0:
+                psi4.core.clean()
+                raise Exception('Davidson solver stagnated.')
+            Ep, Em = self.hessian_products(new.reshape(-1, self.nocc, self.nvir), triplet=triplet)
+            Q = np.vstack((Q, new))
+            EpQ = np.vstack((EpQ, Ep.reshape(len(new), -1)))
+            EmQ = np.vstack((EmQ, Em.reshape(len(new), -1)))
+        else:
+            psi4.core.clean()
+            raise Exception('Davidson solver did not converge in %d iterations.' % maxiter)
+
+        if tda:
+            X = X.reshape(nroot, self.nocc, self.nvir)
+            self.excitations = (w, X, np.zeros_like(X))
+        else:
+            self.excitations = (w, (0.5 * (u + v)).reshape(nroot, self.nocc, self.nvir),
+                                (0.5 * (u - v)).reshape(nroot, self.nocc, self.nvir))
+        return w
+
     def form_polarizability(self):
         self.polar = np.empty((3, 3))
         for numx in range(3):
             for numf in range(3):
                 self.polar[numx, numf] = self.x[numx].dot(self.rhsvecs[numf])
 
+class helper_beta(object):
+    """
+    First dipole hyperpolarizabilities beta(-w_sigma; w1, w2), w_sigma = w1 + w2,
+    from the first-order responses of a helper_CPHF object.
+
+    The responses of the three dipole components are solved once per
+    frequency and cached by (operator, omega) together with their G and
+    epsilon matrices. With method 'krylov' all new frequencies are solved
+    together by solve_dynamic_subspace, 'direct' and 'iterative' call
+    solve_dynamic_direct or solve_dynamic_iterative for each frequency.
+    Negative frequencies follow from the positive ones. The tensor is then
+    assembled with one contraction over all components for each permutation
+    of the three operators.
+    """
+
+    def __init__(self, cphf, method='krylov'):
+        if method not in ['krylov', 'direct', 'iterative']:
+            psi4.core.clean()
+            raise Exception("helper_beta: method %s is not recognized." % method)
+        self.method = method
+        self.cphf = cphf
+        self.C = np.asarray(cphf.C)
+        self.nocc = cphf.nocc
+        self.Co = self.C[:, :self.nocc]
+        self.moenergies = cphf.epsilon
+
+        # Full MO-basis operator integrals
+        self.integrals = {'dipole': np.array([self.C.T.dot(np.asarray(m)).dot(self.C) for m in cphf.tmp_dipoles])}
+        self.cache = {}
+
+    def prepare(self, omegas, operator='dipole'):
+        """Solves for the responses at all frequencies of omegas that are not cached yet."""
+
+        if operator != 'dipole':
+            psi4.core.clean()
+            raise Exception("helper_beta: operator %s is not available." % operator)
+
+        new = sorted(set(abs(float(w)) for w in omegas) - set(w for op, w in self.cache if op == operator))
+        if len(new) > 0 and self.method == 'krylov':
+            self.cphf.solve_dynamic_subspace(omega=new)
+            for w in new:
+                self.cache[(operator, w)] = self.build_response(operator, self.cphf.responses[w], w)
+        elif len(new) > 0:
+            solve = self.cphf.solve_dynamic_direct if self.method == 'direct' else self.cphf.solve_dynamic_iterative
+            for w in new:
+                solve(omega=w)
+                self.cache[(operator, w)] = self.build_response(operator, self.cphf.x, w)
+
+        # x(-w) = -y(w) and y(-w) = -x(w)
+        for w in omegas:
+            w = float(w)
+            if (operator, w) not in self.cache:
+                U = self.cache[(operator, -w)][0]
+                rspvecs = [np.concatenate((-U[i, :self.nocc, self.nocc:].reshape(-1),
+                                           -U[i, self.nocc:, :self.nocc].T.reshape(-1))) for i in range(len(U))]
+                self.cache[(operator, w)] = self.build_response(operator, rspvecs, w)
+
+    def build_response(self, operator, rspvecs, omega):
+        """
+        Repacks the response vectors of every component into U[norb, norb] and
+        forms G = V + F(U), with one J/K build for all components, and the
+        epsilon matrices E = G + (e_p + w) U_pq - U_pq e_q, eqns. (21b) and (34).
+        """
+
+        nocc = self.nocc
+        norb = self.C.shape[1]
+        nov = nocc * (norb - nocc)
+        ncomp = len(rspvecs)
+
+        U = np.zeros((ncomp, norb, norb))
+        for i in range(ncomp):
+            U[i, :nocc, nocc:] = rspvecs[i][nov:].reshape(nocc, -1)
+            U[i, nocc:, :nocc] = rspvecs[i][:nov].reshape(nocc, -1).T
+
+        # X and Y densities of all components in one J/K build
+        C_right = [self.C.dot(U[i, :nocc, :].T) for i in range(ncomp)]
+        C_right += [self.C.dot(U[i, :, :nocc]) for i in range(ncomp)]
+        self.cphf.initialize_jk()
+        J, K = self.cphf.jk.compute([self.Co] * (2 * ncomp), C_right)
+
+        G = self.integrals[operator].copy()
+        for i in range(ncomp):
+            Jn = J[ncomp + i] - J[i]
+            Kn = K[ncomp + i].T - K[i]
+            G[i] += (self.C.T).dot(2 * Jn - Kn).dot(self.C)
+
+        E = G + (self.moenergies[:, None] + omega) * U - U * self.moenergies[None, :]
+        return U, G, E
+
+    def beta(self, w1, w2):
+        """
+        The full beta(-w_sigma; w1, w2) tensor, beta[a, b, c] with a at -w_sigma,
+        b at w1 and c at w2, eqn. (VII-1).
+        """
+
+        w_sigma = w1 + w2
+        self.prepare([w_sigma, w1, w2])
+
+        # The -w_sigma operator enters with the transposed response of +w_sigma
+        U, G, E = self.cache[('dipole', float(w_sigma))]
+        slots = [(U.swapaxes(1, 2), -G.swapaxes(1, 2), -E.swapaxes(1, 2)),
+                 self.cache[('dipole', float(w1))],
+                 self.cache[('dipole', float(w2))]]
+
+        o = self.nocc
+        labels = 'abc'
+        beta = np.zeros((3, 3, 3))
+        for s1, s2, s3 in permutations(range(3)):
+            string = '%spq,%sqr,%srp->abc' % (labels[s1], labels[s2], labels[s3])
+            beta += np.einsum(string, slots[s1][0][:, :o], slots[s2][1], slots[s3][0][:, :, :o], optimize=True)
+            beta -= np.einsum(string, slots[s1][0][:, :o], slots[s2][0], slots[s3][2][:, :, :o], optimize=True)
+        return 2 * beta
+
+    def shg(self, omega):
+        """Second-harmonic generation, beta(-2w; w, w)."""
+        return self.beta(omega, omega)
+
+    def optical_rectification(self, omega):
+        """Optical rectification, beta(0; w, -w)."""
+        return self.beta(omega, -omega)
+
+    def eope(self, omega):
+        """Electro-optical Pockels effect, beta(-w; w, 0)."""
+        return self.beta(omega, 0.0)
+
+
 if __name__ == '__main__':
     print('\n')
     print('@test_CPHF running CPHF.py')
@@ -399,6 +931,13 @@ if __name__ == '__main__':
     helper.form_polarizability()
     assert np.allclose(polar, helper.polar, rtol=0, atol=1.e-5)
 
+    print('\n')
+    print('@test_CPHF running solve_static_pcg')
+
+    helper.solve_static_pcg()
+    helper.form_polarizability()
+    assert np.allclose(polar, helper.polar, rtol=0, atol=1.e-5)
+
     f = 0.0
 
     print('\n')
@@ -435,3 +974,31 @@ if __name__ == '__main__':
     helper.solve_dynamic_iterative(omega=f)
     helper.form_polarizability()
     assert np.allclose(ref, helper.polar, rtol=0, atol=1.e-5)
+
+    print('\n')
+    print('@test_CPHF running solve_dynamic_subspace ({})'.format(f))
+
+    helper.solve_dynamic_subspace(omega=f)
+    helper.form_polarizability()
+    assert np.allclose(ref, helper.polar, rtol=0, atol=1.e-5)
+
+    print('\n')
+    print('@test_CPHF running solve_dynamic_subspace (0.0, {}) in one subspace'.format(f))
+
+    helper.solve_dynamic_subspace(omega=[0.0, f])
+    helper.form_polarizability()
+    assert np.allclose(polar, helper.polar, rtol=0, atol=1.e-5)
+    helper.x = helper.responses[f]
+    helper.form_polarizability()
+    assert np.allclose(ref, helper.polar, rtol=0, atol=1.e-5)
+
+    f_imag = [0.05, 0.5]
+
+    print('\n')
+    print('@test_CPHF running solve_dynamic_subspace at imaginary frequencies {}'.format(f_imag))
+
+    helper.solve_dynamic_subspace(omega=f_imag, imaginary=True)
+    for w in f_imag:
+        helper.solve_dynamic_direct(omega=1j * w)
+        for numx in range(3):
+            assert np.allclose(helper.x[numx], helper.responses[w][numx], rtol=0, atol=1.e-6)
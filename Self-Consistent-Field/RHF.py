@@ -101,11 +101,15 @@ Dold = np.zeros_like(D)
 E_1el = np.einsum('pq,pq->', H + H, D) + Enuc
 print('One-electron energy = %4.16f' % E_1el)
 
+# J_pq = (pq|rs) D_rs and K_pq = (pr|qs) D_rs are built from the change of the
+# density since the last iteration, skipping Schwarz-screened pairs (helper_JK)
+from helper_JK import IncrementalJK
+jk = IncrementalJK(I)
+
 for SCF_ITER in range(1, maxiter + 1):
 
     # Build fock matrix: [Szabo:1996] Eqn. 3.154, pp. 141
-    J = np.einsum('pqrs,rs->pq', I, D)
-    K = np.einsum('prqs,rs->pq', I, D)
+    J, K = jk.compute(D)
     F = H + J * 2 - K
 
     diis_e = np.einsum('ij,jk,kl->il', F, D, S) - np.einsum('ij,jk,kl->il', S, D, F)
@@ -116,6 +120,7 @@ for SCF_ITER in range(1, maxiter + 1):
     SCF_E = np.einsum('pq,pq->', F + H, D) + Enuc
 
     print('SCF Iteration %3d: Energy = %4.16f   dE = % 1.5E   dRMS = %1.5E' % (SCF_ITER, SCF_E, (SCF_E - Eold), dRMS))
+    print('    %s' % jk.report())
     if (abs(SCF_E - Eold) < E_conv) and (dRMS < D_conv):
         break
 
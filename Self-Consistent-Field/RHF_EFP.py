@@ -313,6 +313,10 @@ Enuc = mol.nuclear_repulsion_energy()
 Eold = 0.0
 Dold = np.zeros_like(D)
 
+# Incremental J and K of the density change (helper_JK)
+from helper_JK import IncrementalJK
+jk = IncrementalJK(I)
+
 for SCF_ITER in range(1, maxiter + 1):
 
     # <-- efp: add contribution to Fock matrix
@@ -324,8 +328,7 @@ for SCF_ITER in range(1, maxiter + 1):
     # --> efp
 
     # Build fock matrix
-    J = np.einsum('pqrs,rs->pq', I, D)
-    K = np.einsum('prqs,rs->pq', I, D)
+    J, K = jk.compute(D)
     F = H + J * 2 - K
 
     diis_e = np.einsum('ij,jk,kl->il', F, D, S) - np.einsum('ij,jk,kl->il', S, D, F)
@@ -345,6 +348,7 @@ for SCF_ITER in range(1, maxiter + 1):
 
     print('SCF Iteration %3d: Energy = %4.16f   dE = % 1.5E   dRMS = %1.5E   dEFP = %12.8f'
           % (SCF_ITER, SCF_E, (SCF_E - Eold), dRMS, efp_wfn_dependent_energy))
+    print('    %s' % jk.report())
     if (abs(SCF_E - Eold) < E_conv) and (dRMS < D_conv):
         break
 
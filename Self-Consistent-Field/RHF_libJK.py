@@ -74,8 +74,9 @@ H.add(V)
 A = mints.ao_overlap()
 A.power(-0.5, 1.e-16)
 
-# Build diis
-diis = helper_HF.DIIS_helper(max_vec=6)
+# Build diis. 'ediis' or 'adiis' use the EDIIS/ADIIS energy models far from convergence
+diis_mode = 'diis'
+diis = helper_HF.DIIS_helper(max_vec=6, mode=diis_mode)
 
 # Diagonalize routine
 def build_orbitals(diag):
@@ -133,13 +134,13 @@ for SCF_ITER in range(1, maxiter + 1):
     diis_e.subtract(psi4.core.Matrix.triplet(S, D, F, False, False, False))
     diis_e = psi4.core.Matrix.triplet(A, diis_e, A, False, False, False)
 
-    diis.add(F, diis_e)
-
     # SCF energy and update
     FH = F.clone()
     FH.add(H)
     SCF_E = FH.vector_dot(D) + Enuc
 
+    diis.add(F, diis_e, density=D, energy=SCF_E)
+
     dRMS = diis_e.rms()
 
     print('SCF Iteration %3d: Energy = %4.16f   dE = % 1.5E   dRMS = %1.5E'
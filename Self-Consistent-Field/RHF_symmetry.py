@@ -18,7 +18,7 @@ import time
 import numpy as np
 np.set_printoptions(precision=8, linewidth=200, suppress=True)
 import psi4
-from helper_HF import transform_aotoso, transform_sotoao
+from helper_JK import SymmetryJK
 
 # Memory for Psi4 in GB
 psi4.set_memory('500 MB')
@@ -63,8 +63,10 @@ print('Number of basis functions: %d' % nbf)
 print('Number of spin orbitals per irrep:', nsopi)
 
 # Run a quick check to make sure everything will fit into memory
-I_Size = (nbf**4) * 8.e-9
-print("\nSize of the ERI tensor will be %4.2f GB." % I_Size)
+# Only the (hh|gg) and (hg|hg) SO integral blocks for h >= g are stored
+I_Size = sum(2 * (nsopi[h] * nsopi[g])**2 for h in range(nirrep) for g in range(h + 1)) * 8.e-9
+print("\nSize of the SO ERI blocks will be %4.2f GB (full AO tensor %4.2f GB)." %
+      (I_Size, (nbf**4) * 8.e-9))
 
 # Estimate memory usage
 memory_footprint = I_Size * 1.5
@@ -87,10 +89,6 @@ S_ = filter_empty_irrep(mints.so_overlap().to_array())
 T_ = filter_empty_irrep(mints.so_kinetic().to_array())
 V_ = filter_empty_irrep(mints.so_potential().to_array())
 
-# The two-electron integrals are not blocked according to symmetry, so a
-# transformation between the atomic orbital (AO) and SO bases will be required.
-I_AO = np.asarray(mints.ao_eri())
-
 # In order to convert from the C1 AO basis to the symmetrized SO basis, a set
 # of matrices (one for each irrep with shape [nao, irrep_size]) is used to
 # transform the dense AO representation into the block-diagonal SO
@@ -98,6 +96,11 @@ I_AO = np.asarray(mints.ao_eri())
 # the corresponding AO-to-SO transformation matrix.
 transformers_ = filter_empty_irrep(wfn.aotoso().to_array())
 
+# A block diagonal density only needs the totally symmetric (hh|gg) and
+# (hg|hg) SO integrals, which are built shell pair by shell pair without the
+# full AO tensor.
+jk = SymmetryJK.build(mints, wfn.basisset(), transformers_)
+
 # At this point, all irreps that are not present (such as A_2 in water) should
 # be filtered out.
 assert len(S_) == len(T_) == len(V_) == len(transformers_)
@@ -172,11 +175,8 @@ def form_new_density(A, F, indocc):
 
 for SCF_ITER in range(1, maxiter + 1):
 
-    # Perform the two-electron integral contraction with the density in the AO
-    # basis.
-    D_AO = transform_sotoao(D_, transformers_)
-    J_ = transform_aotoso(np.einsum("mnls,ls->mn", I_AO, D_AO), transformers_)
-    K_ = transform_aotoso(np.einsum("mlns,ls->mn", I_AO, D_AO), transformers_)
+    # J_h and K_h directly from the SO densities of all irreps
+    J_, K_ = jk.compute(D_)
     F_ = [H + (2 * J) - K for H, J, K in zip(H_, J_, K_)]
     E_ = [np.einsum("mn,mn->", D, H + F) for D, H, F in zip(D_, H_, F_)]
 
@@ -1,66 +1,18 @@
 import time
 import numpy as np
 
-class DIIS_helper(object):
-
-    def __init__(self, max_vec=6):
-        self.error = []
-        self.vector = []
-        self.max_vec = max_vec
-
-    def add(self, matrix, error):
-        if len(self.error) > 1:
-            if self.error[-1].shape[0] != error.size:
-                raise Exception("Error vector size does not match previous vector.")
-            if self.vector[-1].shape != matrix.shape:
-                raise Exception("Vector shape does not match previous vector.")
-
-        self.error.append(error.ravel().copy())
-        self.vector.append(matrix.copy())
-
-    def extrapolate(self):
-        # Limit size of DIIS vector
-        diis_count = len(self.vector)
-
-        if diis_count == 0:
-            raise Exception("DIIS: No previous vectors.")
-        if diis_count == 1:
-            return self.vector[0]
-
-        if diis_count > self.max_vec:
-            # Remove oldest vector
-            del self.vector[0]
-            del self.error[0]
-            diis_count -= 1
-
-        # Build error matrix B
-        B = np.empty((diis_count + 1, diis_count + 1))
-        B[-1, :] = -1
-        B[:, -1] = -1
-        B[-1, -1] = 0
-        for num1, e1 in enumerate(self.error):
-            B[num1, num1] = np.vdot(e1, e1)
-            for num2, e2 in enumerate(self.error):
-                if num2 >= num1: continue
-                val = np.vdot(e1, e2)
-                B[num1, num2] = B[num2, num1] = val
-
-        # normalize
-        B[abs(B) < 1.e-14] = 1.e-14
-        B[:-1, :-1] /= np.abs(B[:-1, :-1]).max()
-        # Build residual vector
-        resid = np.zeros(diis_count + 1)
-        resid[-1] = -1
-
-        # Solve pulay equations
-        ci = np.dot(np.linalg.pinv(B), resid)
-
-        # combination of previous fock matrices
-        V = np.zeros_like(self.vector[-1])
-        for num, c in enumerate(ci[:-1]):
-            V += c * self.vector[num]
-
-        return V
+# The shared DIIS engine of the SCF folder
+import os.path
+import sys
+dirname = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(dirname, '..'))
+from helper_DIIS import DIIS as DIIS_helper
+from helper_JK import IncrementalJK
+
+# Converged atomic densities of sad_guess(), one .npy file per (element, basis,
+# charge, multiplicity, convergence). Defaults to psi4's scratch directory
+SAD_CACHE_DIR = os.environ.get('PSI4NUMPY_SAD_CACHE')
+
 
 def uhf(psi4, mol, basis, pop_a=None, pop_b=None, guess_a=None, guess_b=None, do_print=True, E_conv = 1.e-7, D_conv = 1.e-5):
 
@@ -82,7 +34,7 @@ def uhf(psi4, mol, basis, pop_a=None, pop_b=None, guess_a=None, guess_b=None, do
         nocca = pop_a.shape[0]
         if pop_b is None:
             noccb = nocca
-            pop_b = noccb
+            pop_b = pop_a
         else:
             noccb = pop_b.shape[0]
     else:
@@ -90,15 +42,15 @@ def uhf(psi4, mol, basis, pop_a=None, pop_b=None, guess_a=None, guess_b=None, do
         noccb = wfn.nbeta()
 
     if do_print:
-        print '\nNumber of alpha orbitals:   %3d' % nocca
-        print 'Number of beta orbitals:    %3d' % noccb
-        print 'Number of basis functions:  %3d' % nbf
+        print('\nNumber of alpha orbitals:   %3d' % nocca)
+        print('Number of beta orbitals:    %3d' % noccb)
+        print('Number of basis functions:  %3d' % nbf)
 
     V = np.asarray(mints.ao_potential())
     T = np.asarray(mints.ao_kinetic())
 
     if do_print:
-        print '\nTotal time taken for integrals: %.3f seconds.' % (time.time()-t)
+        print('\nTotal time taken for integrals: %.3f seconds.' % (time.time()-t))
 
     t = time.time()
 
@@ -116,7 +68,8 @@ def uhf(psi4, mol, basis, pop_a=None, pop_b=None, guess_a=None, guess_b=None, do
         C = A.dot(C2)
         Cocc = C[:, :nocc]
         if pop is not None:
-            Cocc *= pop
+            # pop holds occupation numbers, D = sum_i pop_i C_i C_i.T
+            Cocc *= np.sqrt(pop)
         D = np.einsum('pi,qi->pq', Cocc, Cocc)
         return (C, D)
 
@@ -258,27 +211,27 @@ def sad(psi4, mol, basis, pop_a=None, pop_b=None, do_print=True, E_conv = 1.e-7,
         nocca = pop_a.shape[0]
         if pop_b is None:
             noccb = nocca
-            pop_b = noccb
+            pop_b = pop_a
         else:
             noccb = pop_b.shape[0]
     else:
         nocca = wfn.nalpha()
         noccb = wfn.nbeta()
 
-    if mol.label(0) == 'C':
-        nocca = 4
-        noccb = 2
+        if mol.label(0) == 'C':
+            nocca = 4
+            noccb = 2
 
     if do_print:
-        print '\nNumber of alpha orbitals:   %3d' % nocca
-        print 'Number of beta orbitals:    %3d' % noccb
-        print 'Number of basis functions:  %3d' % nbf
+        print('\nNumber of alpha orbitals:   %3d' % nocca)
+        print('Number of beta orbitals:    %3d' % noccb)
+        print('Number of basis functions:  %3d' % nbf)
 
     V = np.asarray(mints.ao_potential())
     T = np.asarray(mints.ao_kinetic())
 
     if do_print:
-        print '\nTotal time taken for integrals: %.3f seconds.' % (time.time()-t)
+        print('\nTotal time taken for integrals: %.3f seconds.' % (time.time()-t))
 
     t = time.time()
 
@@ -296,7 +249,8 @@ def sad(psi4, mol, basis, pop_a=None, pop_b=None, do_print=True, E_conv = 1.e-7,
         C = A.dot(C2)
         Cocc = C[:, :nocc]
         if pop is not None:
-            Cocc *= pop
+            # pop holds occupation numbers, D = sum_i pop_i C_i C_i.T
+            Cocc *= np.sqrt(pop)
         D = np.einsum('pi,qi->pq', Cocc, Cocc)
         return (C, D)
 
@@ -311,8 +265,9 @@ def sad(psi4, mol, basis, pop_a=None, pop_b=None, do_print=True, E_conv = 1.e-7,
     Fock_list = []
     DIIS_error = []
 
-    # Initialize the JK object
+    # Initialize the JK object, J and K are built from the density changes
     I = np.asarray(mints.ao_eri())
+    jk = IncrementalJK(I)
 
     # Build a DIIS helper object
     diisa = DIIS_helper()
@@ -329,10 +284,7 @@ def sad(psi4, mol, basis, pop_a=None, pop_b=None, do_print=True, E_conv = 1.e-7,
 
 
         # Build fock matrix
-        Ja = np.einsum('pqrs,rs->pq', I, Da)
-        Jb = np.einsum('pqrs,rs->pq', I, Db)
-        Ka = np.einsum('prqs,rs->pq', I, Da)
-        Kb = np.einsum('prqs,rs->pq', I, Db)
+        (Ja, Jb), (Ka, Kb) = jk.compute([Da, Db])
         Fa = H + (Ja + Jb) - Ka
         Fb = H + (Ja + Jb) - Kb
 
@@ -359,6 +311,7 @@ def sad(psi4, mol, basis, pop_a=None, pop_b=None, do_print=True, E_conv = 1.e-7,
         if do_print:
             print('SCF Iteration %3d: Energy = %20.14f   dE = % 1.5E   dRMS = %1.5E'
                   % (SCF_ITER, SCF_E, (SCF_E - Eold), dRMS))
+            print('    %s' % jk.report())
         if (abs(SCF_E - Eold) < E_conv) and (dRMS < D_conv):
             break
 
@@ -404,3 +357,138 @@ def basis_projection(C, bas1, bas2):
     matT.power(-0.5, 1.e-15)
     Cb = CBBinv.dot(SBA).dot(C).dot(matT)
     return Cb
+
+
+def atomic_occupations(Z, charge=0):
+    """
+    Spherically and spin averaged occupation numbers of one spin of an atom.
+
+    The core shells are fully occupied and the electrons left are spread
+    evenly over the orbitals of the valence shell.
+    """
+    if Z <= 2: # 1s
+        nfrz = 0
+        nact = 1
+    elif Z <= 4: # 1s / 2s
+        nfrz = 1
+        nact = 1
+    elif Z <= 10: # 1s 2s / 2p
+        nfrz = 1
+        nact = 4
+    elif Z <= 12: # 1s 2s 2p / 3s
+        nfrz = 5
+        nact = 1
+    elif Z <= 18: # 1s 2s 2p 3s / 3p
+        nfrz = 6
+        nact = 3
+    elif Z <= 30: # 1s 2s 2p 3s 3p / 4s 3d
+        nfrz = 9
+        nact = 6
+    elif Z <= 36: # 1s 2s 2p 3s 3p 4s 3d / 4p
+        nfrz = 15
+        nact = 3
+    else:
+        raise Exception("Z exceeded!")
+
+    frz = np.ones((nfrz)) * 1.0
+    act = np.ones((nact)) * (Z - charge - nfrz * 2) / float(nact * 2)
+    return np.hstack((frz, act))
+
+
+def sad_cache_dir(psi4):
+    """The cache directory, PSI4NUMPY_SAD_CACHE if set and psi4's scratch directory otherwise."""
+    if SAD_CACHE_DIR is not None:
+        return SAD_CACHE_DIR
+    return os.path.join(psi4.IOManager.shared_object().get_default_path(), 'psi4numpy_sad')
+
+
+def sad_cache_file(symbol, basis, charge, multiplicity, E_conv, D_conv, cache_dir):
+    """The cache file of an atomic density converged to E_conv and D_conv."""
+    basis = ''.join(c if c.isalnum() or c in '-+_' else '_' for c in basis.lower())
+    name = '%s_%s_q%d_m%d_e%g_d%g.npy' % (symbol.upper(), basis, charge, multiplicity, E_conv, D_conv)
+    return os.path.join(cache_dir, name)
+
+
+def sad_guess(psi4, mol, basis, geometry, cache_dir=None, E_conv=1.e-5, D_conv=1.e-5, do_print=False):
+    """
+    Superposition of atomic densities guess with an on-disk cache.
+
+    Each atom gets the spin and spherically averaged density of a fractionally
+    occupied atomic UHF (atomic_occupations), which depends only on the
+    element, basis, charge and multiplicity. These densities, converged to
+    E_conv and D_conv, are read from cache_dir when present and computed and
+    stored once otherwise, so repeated elements and later runs cost a file
+    read. The molecular guess is the block diagonal matrix of the atomic
+    densities, for one spin.
+
+    Parameters
+    ----------
+    psi4 : module
+        The psi4 module.
+    mol : Molecule
+        The molecule, its basis functions are ordered by atom.
+    basis : str
+        The basis set name.
+    geometry : callable
+        The psi4 geometry function, used to build the atoms.
+    cache_dir : str (optional, None)
+        The cache directory, sad_cache_dir() (PSI4NUMPY_SAD_CACHE or psi4's
+        scratch directory) if None.
+
+    Returns
+    -------
+    D : ndarray
+        The block diagonal guess density of one spin.
+    """
+
+    mol.update_geometry()
+    if cache_dir is None:
+        cache_dir = sad_cache_dir(psi4)
+    os.makedirs(cache_dir, exist_ok=True)
+
+    # Densities of the elements seen so far in this molecule
+    densities = {}
+    D_list = []
+    for atom in range(mol.natom()):
+        symbol = mol.symbol(atom).upper()
+        if symbol not in densities:
+            sad_atom = geometry(symbol, "sad_atom")
+            sad_atom.update_geometry()
+            charge = sad_atom.molecular_charge()
+            multiplicity = sad_atom.multiplicity()
+            filename = sad_cache_file(symbol, basis, charge, multiplicity, E_conv, D_conv, cache_dir)
+
+            D = None
+            if os.path.isfile(filename):
+                D = np.load(filename)
+                # A file written with other basis settings (e.g. puream) is recomputed
+                nbf = psi4.new_wavefunction(sad_atom, basis).basisset().nbf()
+                if D.shape != (nbf, nbf):
+                    D = None
+
+            if D is None:
+                psi4.IO.set_default_namespace("sad_atom")
+                pop = atomic_occupations(int(round(mol.Z(atom))), charge)
+                ret = sad(psi4, sad_atom, basis, pop_a=pop, pop_b=pop, do_print=do_print,
+                          E_conv=E_conv, D_conv=D_conv)
+                D = 0.5 * (ret["Da"] + ret["Db"])
+
+                # Write to a temporary name first so that concurrent runs never read half a file
+                tmp_name = filename + '.%d.tmp' % os.getpid()
+                with open(tmp_name, 'wb') as f:
+                    np.save(f, D)
+                os.rename(tmp_name, filename)
+
+            densities[symbol] = D
+
+        D_list.append(densities[symbol])
+
+    size = sum([x.shape[0] for x in D_list])
+    tD = np.zeros((size, size))
+    start = 0
+    for D in D_list:
+        sl = slice(start, start + D.shape[0])
+        tD[sl, sl] = D
+        start += D.shape[0]
+
+    return tD
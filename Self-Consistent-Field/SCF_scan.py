@@ -0,0 +1,65 @@
+"""
+A bond stretching scan of water with the reusable SCFEngine of helper_SCF.
+
+Each point is guessed from the orbitals of the previous one, and the AO
+integrals and JK backend of a geometry are built only once, so the backward
+sweep over the same geometries skips all integral work.
+
+References:
+- RHF/UHF equations & algorithms from [Szabo:1996]
+- ROHF effective Fock matrix from [Tsuchimochi:2010:141102]
+- DIIS equations & algorithms from [Sherrill:1998], [Pulay:1980:393], & [Pulay:1969:197]
+"""
+
+__authors__ = "The Psi4NumPy Developers"
+__credits__ = ["Daniel G. A. Smith"]
+
+__copyright__ = "(c) 2014-2018, The Psi4NumPy Developers"
+__license__ = "BSD-3-Clause"
+__date__ = "2026-10-18"
+
+import numpy as np
+import psi4
+from helper_SCF import SCFEngine
+np.set_printoptions(precision=5, linewidth=200, suppress=True)
+
+# Memory for Psi4 in GB
+psi4.set_memory('2 GB')
+psi4.core.set_output_file('output.dat', False)
+
+# Memory for numpy in GB
+numpy_memory = 2
+
+# RHF, UHF or ROHF
+reference = 'RHF'
+
+# J/K backend: 'psi4', 'dense', 'incremental' or 'numpy_df'
+jk_type = 'psi4'
+
+compare_psi4 = True
+
+psi4.set_options({'basis': 'cc-pvdz', 'scf_type': 'pk', 'e_convergence': 1e-8, 'reference': reference.lower()})
+
+engine = SCFEngine(reference=reference, jk_type=jk_type, scf_type='PK', memory=numpy_memory)
+
+distances = [0.90, 0.95, 1.00, 1.05, 1.10]
+energies = {}
+for R in distances + distances[::-1]:
+    mol = psi4.geometry("""
+    O
+    H 1 %f
+    H 1 %f 2 104
+    symmetry c1
+    """ % (R, R))
+
+    E = engine.compute_energy(mol)
+    if R in energies:
+        psi4.compare_values(energies[R], E, 6, 'Backward sweep R = %4.2f' % R)
+    energies[R] = E
+
+print('\n  R (Angstrom)     %s energy' % reference)
+for R in distances:
+    print('  %10.2f   % 18.12f' % (R, energies[R]))
+
+if compare_psi4:
+    psi4.compare_values(psi4.energy('SCF', molecule=mol), energies[distances[0]], 6, 'SCF Energy')
@@ -18,6 +18,7 @@ import time
 import numpy as np
 np.set_printoptions(precision=3, linewidth=200, suppress=True)
 from helper_HF import *
+from helper_SOSCF import RHFHessian, SOSCF
 import psi4
 
 # Memory for Psi4 in GB
@@ -44,16 +45,10 @@ diis = DIIS_helper()
 hf = helper_HF(mol, scf_type='PK', guess='SAD')
 ndocc = hf.ndocc
 nvirt = hf.nvirt
-mints = psi4.core.MintsHelper(hf.wfn.basisset())
-mI = mints.ao_eri()
 hf.diag(hf.H, set_C=True)
 
-# Build Matrix and Numpy arrays that share memory
-# Updating npC changes mC
-mC = psi4.core.Matrix(hf.nbf, hf.nbf)
-npC = np.asarray(mC)
-occ_mC = psi4.core.Matrix(hf.nbf, hf.ndocc)
-occ_npC = np.asarray(occ_mC)
+# Newton steps from JK builds of the rotated densities, no explicit Hessian
+soscf = SOSCF(max_micro=20, micro_conv=1.e-6)
 
 # Knobs
 E_conv = 1e-8
@@ -92,45 +87,11 @@ for SCF_ITER in range(1, 20):
         e, C = hf.diag(F)
         hf.set_Cleft(C)
         iter_type = 'DIIS'
+        soscf.reset()
     else:
-        # Build MO Fock matrix & electronic gradient
-        moF = np.einsum('ui,vj,uv', hf.Ca, hf.Ca, F)
-        gn = -4 * moF[:ndocc, ndocc:] # [Helgaker:2000] Eqn. 10.8.34, pp. 484
-
-        # AO -> MO ERI transform
-        # Only transform occupied on first index, oN^4 <<< N^5
-        # Update the Psi4 Matrices that these numpy arrays point to
-        npC[:] = hf.Ca
-        occ_npC[:] = hf.Ca[:, :ndocc]
-        MO = np.asarray(mints.mo_transform(mI, occ_mC, mC, mC, mC))
-
-        # Build electronic Hessian: [Helgaker:2000] Eqn. 10.9.22, pp. 494
-        # Biajb = 4 * [(Fab - Fij) + 4 * (ia|jb) - (ib|ja) - (ij|ab)]
-        Biajb = np.einsum('ab,ij->iajb', moF[ndocc:, ndocc:], np.diag(np.ones(ndocc)))
-        Biajb -= np.einsum('ij,ab->iajb', moF[:ndocc:, :ndocc], np.diag(np.ones(nvirt)))
-        Biajb += 4 * MO[:, ndocc:, :ndocc, ndocc:]
-        Biajb -= MO[:, ndocc:, :ndocc, ndocc:].swapaxes(0, 2)
-        Biajb -= MO[:, :ndocc, ndocc:, ndocc:].swapaxes(1, 2)
-        Biajb *= 4
-
-        # Invert B, (o^3 v^3); solves Newton equations H*x = B
-        Binv = np.linalg.inv(Biajb.reshape(ndocc * nvirt, -1)).reshape(ndocc, nvirt, ndocc, nvirt)
-
-        # Build orbital rotation matrix from Hessian inverse & gradient
-        x = np.einsum('iajb,ia->jb', Binv, gn)
-        U = np.zeros_like(hf.Ca)
-        U[:ndocc, ndocc:] = x
-        U[ndocc:, :ndocc] = -x.T
-        U += 0.5 * np.dot(U, U)
-        U[np.diag_indices_from(hf.A)] += 1
-
-        # Easy access to Schmidt orthogonalization
-        U, r = np.linalg.qr(U.T)
-
-        # Rotate and set orbitals
-        C = hf.Ca.dot(U)
+        C = soscf.step(RHFHessian(hf.jk, hf.Ca, F, ndocc), hf.scf_e)
         hf.set_Cleft(C)
-        iter_type = 'SOSCF'
+        iter_type = 'SOSCF, ' + soscf.report()
 
 print('Total time taken for SCF iterations: %.3f seconds \n' % (time.time() - t))
 
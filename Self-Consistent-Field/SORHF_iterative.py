@@ -28,6 +28,9 @@ psi4.core.set_output_file('output.dat', False)
 # Memory for numpy in GB
 numpy_memory = 2
 
+# J/K backend: 'psi4' (psi4.core.JK of SCF_TYPE) or 'numpy_df' (density fitting in NumPy, helper_JK.DFJK)
+jk_type = 'numpy_df'
+
 mol = psi4.geometry("""
 O
 H 1 1.1
@@ -50,7 +53,7 @@ micro_print = True
 
 # Build objects
 diis = DIIS_helper()
-hf = helper_HF(mol, scf_type='DF', guess='CORE')
+hf = helper_HF(mol, scf_type='DF', guess='CORE', jk_type=jk_type, memory=numpy_memory)
 ndocc = hf.ndocc
 nvirt = hf.nvirt
 
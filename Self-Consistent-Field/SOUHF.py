@@ -89,39 +89,22 @@ print('\nTotal time taken for setup: %.3f seconds' % (time.time() - t))
 print('\nStart SCF iterations:\n')
 t = time.time()
 
-
-def transform(I, C1, C2, C3, C4):
-    #MO = np.einsum('pA,pqrs->Aqrs', C1,  I)
-    nao = I.shape[0]
-    MO = np.dot(C1.T, I.reshape(nao, -1)).reshape(C1.shape[1], nao, nao, nao)
-
-    MO = np.einsum('qB,Aqrs->ABrs', C2, MO)
-    MO = np.einsum('rC,ABrs->ABCs', C3, MO)
-    MO = np.einsum('sD,ABCs->ABCD', C4, MO)
-    return MO
-
-# Rotate orbs and produce C and D matrices
-def rotate_orbs(C, x, nocc):
-    U = np.zeros_like(C)
-    U[:nocc, nocc:] = x
-    U[nocc:, :nocc] = -x.T
-
-    expU = U.copy()
-    expU[np.diag_indices_from(U)] += 1
-    expU += 0.5 * np.dot(U, U)
-
-    expU, r = np.linalg.qr(expU.T)
-    Cn = C.dot(expU)
-    D = np.dot(Cn[:,:nocc], Cn[:,:nocc].T)
-    return (Cn, D)
+# Fock builds from the density change; tighter screening to match the 1.e-13
+# convergence targets
+from helper_JK import IncrementalJK
+jk = IncrementalJK(I, screening=1.e-14)
+
+# Newton steps from Hessian products, no explicit Hessian; the products contract
+# C_left C_right.T densities, so they are kept apart from the incremental Fock builds
+from helper_JK import DenseJK
+from helper_SOSCF import UHFHessian, SOSCF
+hess_jk = DenseJK(I)
+soscf = SOSCF(max_micro=30, micro_conv=1.e-6)
 
 for SCF_ITER in range(1, maxiter + 1):
 
     # Build the alpha & beta Fock matrices
-    Ja = np.einsum('pqrs,rs->pq', I, Da)
-    Ka = np.einsum('prqs,rs->pq', I, Da)
-    Jb = np.einsum('pqrs,rs->pq', I, Db)
-    Kb = np.einsum('prqs,rs->pq', I, Db)
+    (Ja, Jb), (Ka, Kb) = jk.compute([Da, Db])
 
     Fa = H + (Ja + Jb) - Ka
     Fb = H + (Ja + Jb) - Kb
@@ -140,70 +123,16 @@ for SCF_ITER in range(1, maxiter + 1):
     dRMS = 0.5 * (np.mean(diisa_e**2)**0.5 + np.mean(diisb_e**2)**0.5)
     print('SCF Iteration %3d: Energy = %4.16f   dE = % 1.5E   dRMS = %1.5E'
           % (SCF_ITER, SCF_E, (SCF_E - Eold), dRMS))
+    print('    %s' % jk.report())
     if (abs(SCF_E - Eold) < E_conv) and (dRMS < D_conv):
         break
 
     Eold = SCF_E
 
-    Cocca = Ca[:, :nalpha]
-    Cvira = Ca[:, nalpha:]
-
-    Coccb = Cb[:, :nbeta]
-    Cvirb = Cb[:, nbeta:]
-
-    # Form gradients from MO Fock matrices: [Helgaker:2000] Eqn. 10.8.34, pp. 484
-    moFa = (Ca.T).dot(Fa).dot(Ca)
-    moFb = (Cb.T).dot(Fb).dot(Cb)
-    grada = -4 * moFa[:nalpha, nalpha:]
-    gradb = -4 * moFb[:nbeta, nbeta:]
-
-    # Form off diagonal contributions to Hessian
-    Jab = 8 * transform(I, Cocca, Cvira, Coccb, Cvirb)
-
-    # Form diagonal alpha contributions
-    MOaa = transform(I, Cocca, Ca, Ca, Ca)
-    Ha  = np.einsum('ab,ij->iajb', moFa[nalpha:, nalpha:], np.diag(np.ones(nalpha)))
-    Ha -= np.einsum('ij,ab->iajb', moFa[:nalpha:, :nalpha], np.diag(np.ones(nbf-nalpha)))
-    Ha += 2 * MOaa[:, nalpha:, :nalpha, nalpha:]
-    Ha -= MOaa[:, nalpha:, :nalpha, nalpha:].swapaxes(0, 2)
-    Ha -= MOaa[:, :nalpha, nalpha:, nalpha:].swapaxes(1, 2)
-    Ha *= 4
-
-    # Form diagonal beta contributions
-    MObb = transform(I, Coccb, Cb, Cb, Cb)
-    Hb  = np.einsum('ab,ij->iajb', moFb[nbeta:, nbeta:], np.diag(np.ones(nbeta)))
-    Hb -= np.einsum('ij,ab->iajb', moFb[:nbeta:, :nbeta], np.diag(np.ones(nbf-nbeta)))
-    Hb += 2 * MObb[:, nbeta:, :nbeta, nbeta:]
-    Hb -= MObb[:, nbeta:, :nbeta, nbeta:].swapaxes(0, 2)
-    Hb -= MObb[:, :nbeta, nbeta:, nbeta:].swapaxes(1, 2)
-    Hb *= 4
-
-    # Build the full Hessian matrix
-    na = Ha.shape[0] * Ha.shape[1]
-    nb = Hb.shape[0] * Hb.shape[1]
-    ntot = na + nb
-
-    #  aa | ab
-    #  -------
-    #  ba | bb
-    Hess = np.zeros((ntot, ntot))
-    Hess[:na,:na] = Ha.reshape(na, na)
-    Hess[:na,na:] = Jab.reshape(na,nb)
-    Hess[na:,:na] = Jab.reshape(na,nb).T
-    Hess[na:,na:] = Hb.reshape(nb, nb)
-
-    # Invert hessian and obtain new vectors
-    Hinv = np.linalg.inv(Hess)
-
-    gradvec = np.hstack((grada.reshape(-1), gradb.reshape(-1)))
-    resultx = np.einsum('ij,j->i', Hinv, gradvec)
-
-    xa = resultx[:na].reshape(Ha.shape[0], Ha.shape[1])
-    xb = resultx[na:].reshape(Hb.shape[0], Hb.shape[1])
-
-    # Rotate the orbitals
-    Ca, Da = rotate_orbs(Ca, xa, nalpha)
-    Cb, Db = rotate_orbs(Cb, xb, nbeta)
+    Ca, Cb = soscf.step(UHFHessian(hess_jk, Ca, Cb, Fa, Fb, nalpha, nbeta), SCF_E)
+    Da = np.dot(Ca[:, :nalpha], Ca[:, :nalpha].T)
+    Db = np.dot(Cb[:, :nbeta], Cb[:, :nbeta].T)
+    print('    SOSCF: %s' % soscf.report())
 
     if SCF_ITER == maxiter:
         clean()
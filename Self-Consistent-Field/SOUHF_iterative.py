@@ -28,6 +28,9 @@ psi4.core.set_output_file('output.dat', False)
 # Memory for numpy in GB
 numpy_memory = 2
 
+# J/K backend: 'psi4' (psi4.core.JK of SCF_TYPE) or 'numpy_df' (density fitting in NumPy, helper_JK.DFJK)
+jk_type = 'numpy_df'
+
 # Triplet O2, actually very multireference
 mol = psi4.geometry("""
     0 3
@@ -141,8 +144,11 @@ Enuc = mol.nuclear_repulsion_energy()
 Eold = 0.0
 
 # Initialize the JK object
-jk = psi4.core.JK.build(wfn.basisset())
-jk.initialize()
+if jk_type == 'psi4':
+    jk = psi4.core.JK.build(wfn.basisset())
+    jk.initialize()
+else:
+    jk = scf_helper.build_jk(jk_type, wfn.basisset(), mints, memory=numpy_memory)
 
 # Build a DIIS helper object
 diisa = scf_helper.DIIS_helper()
@@ -0,0 +1,344 @@
+"""
+DIIS convergence acceleration shared by the SCF, CC and response helpers.
+
+The state and error vectors live in preallocated circular buffers, optionally
+memory mapped to scratch files for large CC amplitudes, and only the row of the
+B matrix belonging to the newest error vector is computed per iteration. For
+SCF, EDIIS and ADIIS coefficients can be used while far from convergence.
+
+References:
+- DIIS equations & algorithm from [Sherrill:1998], [Pulay:1980:393], & [Pulay:1969:197]
+- EDIIS from K. N. Kudin, G. E. Scuseria, and E. Cances, J. Chem. Phys. 116, 8255 (2002)
+- ADIIS from X. Hu and W. Yang, J. Chem. Phys. 132, 054109 (2010)
+"""
+
+__authors__ = "The Psi4NumPy Developers"
+__credits__ = ["Daniel G. A. Smith"]
+
+__copyright__ = "(c) 2014-2018, The Psi4NumPy Developers"
+__license__ = "BSD-3-Clause"
+__date__ = "2026-10-18"
+
+import itertools
+import tempfile
+import numpy as np
+
+
+def minimize_on_simplex(g, H):
+    """
+    Minimizes g.c + 1/2 c.H.c over c >= 0, sum(c) = 1.
+
+    H may be indefinite, so the stationary point of every face of the simplex is
+    tried and the lowest feasible one kept. This is cheap for DIIS subspaces.
+
+    Parameters
+    ----------
+    g : ndarray
+        The linear coefficients (n, ).
+    H : ndarray
+        The symmetric quadratic coefficients (n, n).
+
+    Returns
+    -------
+    c : ndarray
+        The minimizing coefficients.
+    """
+
+    n = g.shape[0]
+    best_val = None
+    best_c = None
+    for size in range(1, n + 1):
+        for face in itertools.combinations(range(n), size):
+            face = list(face)
+
+            # Stationarity on the face: H c + g = lambda, sum(c) = 1
+            K = np.zeros((size + 1, size + 1))
+            K[:size, :size] = H[np.ix_(face, face)]
+            K[:size, -1] = -1
+            K[-1, :size] = 1
+            rhs = np.zeros(size + 1)
+            rhs[:size] = -g[face]
+            rhs[-1] = 1
+            try:
+                sol = np.linalg.solve(K, rhs)
+            except np.linalg.LinAlgError:
+                continue
+            if np.any(sol[:size] < -1.e-12):
+                continue
+
+            c = np.zeros(n)
+            c[face] = np.clip(sol[:size], 0, None)
+            c /= c.sum()
+            val = np.dot(g, c) + 0.5 * np.dot(c, np.dot(H, c))
+            if (best_val is None) or (val < best_val):
+                best_val, best_c = val, c
+
+    return best_c
+
+
+class DIIS(object):
+    """
+    A DIIS extrapolation engine over a circular buffer of vectors.
+
+    States and errors can be single arrays (e.g. a Fock matrix) or tuples of
+    arrays (e.g. t1 and t2, or Fa and Fb); they are packed into one flat vector
+    and extrapolate() returns the same structure.
+
+    Notes
+    -----
+    Equations taken from [Sherrill:1998], [Pulay:1980:393], & [Pulay:1969:197]
+    Algorithms adapted from [Sherrill:1998] & [Pulay:1980:393]
+    """
+
+    def __init__(self, max_vec=6, mode='diis', storage='memory', scratch_dir=None, switch_error=0.1,
+                 gradient_scale=2.0):
+        """
+        Intializes the DIIS class.
+
+        Parameters
+        ----------
+        max_vec : int (default, 6)
+            The maximum number of vectors to use. The oldest vector will be overwritten.
+        mode : {'diis', 'ediis', 'adiis'}
+            'ediis' and 'adiis' take their coefficients from the EDIIS/ADIIS energy models
+            while the largest element of the newest error exceeds switch_error, then fall
+            back to DIIS. Both need add(..., density=, energy=) with the state being the Fock matrix.
+        storage : {'memory', 'disk'}
+            With 'disk' the state and error buffers are memory mapped to temporary files.
+        scratch_dir : str (optional, None)
+            Directory of the temporary files, the system default if None.
+        switch_error : float (default, 0.1)
+            Error threshold of the EDIIS/ADIIS to DIIS switch.
+        gradient_scale : float (default, 2.0)
+            s in dE/dD = s F; 2 for the closed-shell D = Cocc Cocc.T of these scripts and
+            1 for (Da, Db) and (Fa, Fb) pairs.
+        """
+
+        if mode not in ['diis', 'ediis', 'adiis']:
+            raise Exception("DIIS: mode %s is not understood." % mode)
+        if storage not in ['memory', 'disk']:
+            raise Exception("DIIS: storage %s is not understood." % storage)
+
+        self.max_vec = max_vec
+        self.mode = mode
+        self.storage = storage
+        self.scratch_dir = scratch_dir
+        self.switch_error = switch_error
+        self.gradient_scale = gradient_scale
+
+        self.shapes = None
+        self.vectors = None
+        self.errors = None
+        self.B = np.zeros((max_vec, max_vec))
+        self.count = 0
+        self.last = -1
+        self.reference = None
+
+        # EDIIS/ADIIS data: densities, energies and DF[i, j] = tr(D_i F_j)
+        self.densities = None
+        self.energies = np.zeros(max_vec)
+        self.DF = np.zeros((max_vec, max_vec))
+
+    @property
+    def diis_size(self):
+        """The number of stored vectors."""
+        return min(self.count, self.max_vec)
+
+    @property
+    def nbytes(self):
+        total = self.B.nbytes + self.DF.nbytes
+        for buf in [self.vectors, self.errors, self.densities, self.reference]:
+            if buf is not None:
+                total += buf.nbytes
+        return total
+
+    def _allocate(self, nelem):
+        if self.storage == 'memory':
+            return np.zeros((self.max_vec, nelem))
+        scratch = tempfile.TemporaryFile(dir=self.scratch_dir)
+        return np.memmap(scratch, dtype=np.float64, mode='w+', shape=(self.max_vec, nelem))
+
+    def _pack(self, arrays, out=None):
+        """Writes a single array or a tuple of arrays into one flat vector."""
+        if not isinstance(arrays, (tuple, list)):
+            arrays = [arrays]
+        arrays = [np.asarray(x) for x in arrays]
+        size = sum(x.size for x in arrays)
+        if out is None:
+            out = np.empty(size)
+        elif out.shape[0] != size:
+            raise Exception("DIIS: vector size does not match previous vectors.")
+        start = 0
+        for x in arrays:
+            out[start:start + x.size] = x.ravel()
+            start += x.size
+        return out
+
+    def _unpack(self, vec):
+        """Splits a flat vector into the structure of the states."""
+        ret = []
+        start = 0
+        for shape in self.shapes:
+            size = int(np.prod(shape))
+            ret.append(vec[start:start + size].reshape(shape))
+            start += size
+        if self.single:
+            return ret[0]
+        return tuple(ret)
+
+    def _init_buffers(self, state):
+        self.single = not isinstance(state, (tuple, list))
+        states = [state] if self.single else state
+        self.shapes = [np.asarray(x).shape for x in states]
+        nelem = sum(int(np.prod(shape)) for shape in self.shapes)
+        self.vectors = self._allocate(nelem)
+        return nelem
+
+    def set_reference(self, state):
+        """
+        Sets the state that the next add(state) without an error is compared against.
+        """
+        if self.shapes is None:
+            self._init_buffers(state)
+        self.reference = self._pack(state, out=self.reference)
+
+    def add(self, state, error=None, density=None, energy=None):
+        """
+        Adds a set of error and state vectors to the DIIS object.
+
+        Parameters
+        ----------
+        state : array_like or tuple of array_like
+            The state vector to add to the DIIS object.
+        error : array_like or tuple of array_like (optional, None)
+            The error vector to add to the DIIS object. If None the error is the change
+            of the state since set_reference() or the last add()/extrapolate().
+        density : array_like or tuple of array_like (optional, None)
+            The density matrix belonging to the state, needed by EDIIS and ADIIS.
+        energy : float (optional, None)
+            The energy belonging to the state, needed by EDIIS and ADIIS.
+
+        Returns
+        ------
+        None
+        """
+
+        if self.shapes is None:
+            self._init_buffers(state)
+
+        slot = self.count % self.max_vec
+        vec = self._pack(state, out=self.vectors[slot])
+
+        if error is None:
+            if self.reference is None:
+                raise Exception("DIIS: error=None requires a reference state.")
+            if self.errors is None:
+                self.errors = self._allocate(vec.shape[0])
+            err = np.subtract(vec, self.reference, out=self.errors[slot])
+        else:
+            if self.errors is None:
+                self.errors = self._allocate(self._pack(error).shape[0])
+            err = self._pack(error, out=self.errors[slot])
+
+        self.count += 1
+        self.last = slot
+        nvec = self.diis_size
+
+        # Only the row of the new error vector changes
+        row = np.dot(self.errors[:nvec], err)
+        self.B[slot, :nvec] = row
+        self.B[:nvec, slot] = row
+
+        if self.mode != 'diis':
+            if (density is None) or (energy is None):
+                raise Exception("DIIS: %s requires the density and energy of every state." % self.mode)
+            if self.densities is None:
+                self.densities = np.zeros((self.max_vec, vec.shape[0]))
+            dens = self._pack(density, out=self.densities[slot])
+            self.energies[slot] = energy
+            self.DF[:nvec, slot] = np.dot(self.densities[:nvec], vec)
+            self.DF[slot, :nvec] = np.dot(self.vectors[:nvec], dens)
+
+        if self.reference is None:
+            self.reference = vec.copy()
+        else:
+            self.reference[:] = vec
+        self.max_error = np.abs(err).max()
+
+    def diis_coefficients(self):
+        """Solves the Pulay equations over the stored error vectors."""
+
+        nvec = self.diis_size
+
+        # Build error matrix B, [Pulay:1980:393], Eqn. 6, LHS
+        B = np.empty((nvec + 1, nvec + 1))
+        B[-1, :] = -1
+        B[:, -1] = -1
+        B[-1, -1] = 0
+        B[:-1, :-1] = self.B[:nvec, :nvec]
+
+        # normalize
+        B[abs(B) < 1.e-14] = 1.e-14
+        B[:-1, :-1] /= np.abs(B[:-1, :-1]).max()
+
+        # Build residual vector, [Pulay:1980:393], Eqn. 6, RHS
+        resid = np.zeros(nvec + 1)
+        resid[-1] = -1
+
+        # Solve pulay equations
+        ci = np.dot(np.linalg.pinv(B), resid)
+        return ci[:-1]
+
+    def energy_coefficients(self):
+        """Minimizes the EDIIS or ADIIS energy model over the stored states."""
+
+        nvec = self.diis_size
+        s = self.gradient_scale
+        DF = self.DF[:nvec, :nvec]
+        diag = np.diag(DF)
+
+        if self.mode == 'ediis':
+            # E(c) = sum_i c_i E_i - s/4 sum_ij c_i c_j tr[(D_i - D_j)(F_i - F_j)]
+            M = diag.reshape(-1, 1) + diag - DF - DF.T
+            g = self.energies[:nvec].copy()
+            H = -0.5 * s * M
+        else:
+            # E(c) = E_n + s sum_i c_i tr[(D_i - D_n) F_n]
+            #      + s/2 sum_ij c_i c_j tr[(D_i - D_n)(F_j - F_n)]
+            n = self.last
+            g = s * (DF[:, n] - DF[n, n])
+            N = DF - DF[:, n].reshape(-1, 1) - DF[n] + DF[n, n]
+            H = 0.5 * s * (N + N.T)
+
+        return minimize_on_simplex(g, H)
+
+    def extrapolate(self):
+        """
+        Performs the extrapolation for the objects state and error vectors.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        ------
+        ret : ndarray or tuple of ndarray
+            The extrapolated next state, with the structure of the added states
+
+        """
+
+        nvec = self.diis_size
+        if nvec == 0:
+            raise Exception("DIIS: No previous vectors.")
+
+        if nvec == 1:
+            ci = np.ones(1)
+        elif (self.mode != 'diis') and (self.max_error > self.switch_error):
+            ci = self.energy_coefficients()
+        else:
+            ci = self.diis_coefficients()
+
+        # Linear combination of the previous states
+        vec = np.dot(ci, self.vectors[:nvec])
+        self.reference[:] = vec
+        return self._unpack(vec)
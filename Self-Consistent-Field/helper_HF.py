@@ -15,10 +15,103 @@ __license__ = "BSD-3-Clause"
 __date__ = "2017-9-30"
 
 import time
+import collections
 import numpy as np
 import psi4
 np.set_printoptions(precision=5, linewidth=200, suppress=True)
 
+# The shared DIIS engine, under the name the SCF scripts import
+from helper_DIIS import DIIS as DIIS_helper
+from helper_JK import PsiJK
+from helper_JK import build_jk
+
+# One-electron integrals and orthogonalizers of the most recent (basis, geometry)
+# pairs, see ao_integrals(). JK backends, which may hold nbf^4 arrays, are only
+# kept for the most recent one.
+_ao_cache = collections.OrderedDict()
+_ao_cache_size = 4
+
+
+def ao_integrals(mol, basis=None):
+    """
+    Returns the AO quantities of a molecule and basis, reusing them when the
+    same basis and geometry were requested before.
+
+    Parameters
+    ----------
+    mol : psi4.core.Molecule
+        The molecule.
+    basis : {str, None}, optional
+        The basis name, defaults to the global BASIS option.
+
+    Returns
+    -------
+    ints : dict
+        wfn, mints, S, T, V, H, A (S^-1/2), enuc, nbf and jk, a dictionary of the
+        JK backends built so far (see get_jk). The JK backends of the other
+        cached geometries are dropped.
+    """
+
+    if basis is None:
+        basis = psi4.core.get_global_option('BASIS')
+    else:
+        psi4.core.set_global_option("BASIS", basis)
+    mol.update_geometry()
+    geom = np.asarray(mol.geometry())
+    Z = tuple(mol.Z(A) for A in range(mol.natom()))
+    key = (basis.upper(), Z, geom.round(10).tobytes())
+
+    if key in _ao_cache:
+        _ao_cache.move_to_end(key)
+        _drop_old_jk()
+        return _ao_cache[key]
+
+    wfn = psi4.core.Wavefunction.build(mol, basis)
+    mints = psi4.core.MintsHelper(wfn.basisset())
+
+    ints = {'wfn': wfn, 'mints': mints, 'enuc': mol.nuclear_repulsion_energy(), 'jk': {}}
+    ints['S'] = np.asarray(mints.ao_overlap())
+    ints['V'] = np.asarray(mints.ao_potential())
+    ints['T'] = np.asarray(mints.ao_kinetic())
+    ints['H'] = ints['T'] + ints['V']
+    ints['nbf'] = ints['S'].shape[0]
+
+    # Build symmetric orthoganlizer
+    A = mints.ao_overlap()
+    A.power(-0.5, 1.e-14)
+    ints['A'] = np.asarray(A)
+
+    _ao_cache[key] = ints
+    while len(_ao_cache) > _ao_cache_size:
+        _ao_cache.popitem(last=False)
+    _drop_old_jk()
+    return ints
+
+
+def _drop_old_jk():
+    """Releases the JK backends of all but the most recently used entry."""
+    for num, ints in enumerate(_ao_cache.values()):
+        if num < len(_ao_cache) - 1:
+            ints['jk'].clear()
+
+
+def get_jk(ints, jk_type='psi4', scf_type='DF', memory=2):
+    """
+    Returns the JK backend of jk_type (see helper_JK.build_jk) for the AO
+    quantities of ao_integrals(), building it on first use. Backends built
+    with a different memory limit are cached separately.
+    """
+    key = (jk_type.lower(), scf_type.upper(), float(memory))
+    if key not in ints['jk']:
+        ints['jk'][key] = build_jk(jk_type, ints['wfn'].basisset(), ints['mints'], scf_type=scf_type,
+                                   memory=memory)
+    return ints['jk'][key]
+
+
+def clear_ao_cache():
+    """Drops all cached AO integrals and JK backends."""
+    _ao_cache.clear()
+
 
 class helper_HF(object):
     """
@@ -29,7 +122,7 @@ class helper_HF(object):
     Equations and algorithms from [Szabo:1996]
     """
 
-    def __init__(self, mol, basis=None, memory=2, ndocc=None, scf_type='DF', guess='CORE'):
+    def __init__(self, mol, basis=None, memory=2, ndocc=None, scf_type='DF', guess='CORE', jk_type='psi4'):
         """
         Initializes the helper_HF object.
 
@@ -47,6 +140,8 @@ class helper_HF(object):
             The type of JK object to use.
         guess : {"CORE", "SAD"}, optional
             The initial guess type to attempt.
+        jk_type : {"psi4", "dense", "incremental", "numpy_df"}, optional
+            The JK backend, see helper_JK.build_jk. "psi4" uses a psi4.core.JK of type scf_type.
 
         Returns
         ------
@@ -81,21 +176,18 @@ class helper_HF(object):
         if not isinstance(mol, psi4.core.Molecule):
             mol = psi4.geometry(mol)
 
-        if basis is None:
-            basis = psi4.core.get_global_option('BASIS')
-        else:
-            psi4.core.set_global_option("BASIS", basis)
-
-        wfn = psi4.core.Wavefunction.build(mol, basis)
+        # Integrals and orthogonalizer are reused for a basis and geometry seen before
+        ints = ao_integrals(mol, basis)
+        wfn = ints['wfn']
         self.wfn = wfn
-        self.mints = psi4.core.MintsHelper(wfn.basisset())
-        self.enuc = mol.nuclear_repulsion_energy()
+        self.mints = ints['mints']
+        self.enuc = ints['enuc']
 
         # Build out necessary 2D matrices
-        self.S = np.asarray(self.mints.ao_overlap())
-        self.V = np.asarray(self.mints.ao_potential())
-        self.T = np.asarray(self.mints.ao_kinetic())
-        self.H = self.T + self.V
+        self.S = ints['S']
+        self.V = ints['V']
+        self.T = ints['T']
+        self.H = ints['H']
 
         # Holder objects
         self.Da = None
@@ -106,10 +198,8 @@ class helper_HF(object):
         self.J = None
         self.K = None
 
-        # Build symmetric orthoganlizer
-        A = self.mints.ao_overlap()
-        A.power(-0.5, 1.e-14)
-        self.A = np.asarray(A)
+        # Symmetric orthoganlizer
+        self.A = ints['A']
 
         # Get nbf and ndocc for closed shell molecules
         self.epsilon = None
@@ -160,10 +250,7 @@ class helper_HF(object):
         scf_type = scf_type.upper()
         if scf_type not in ['DF', 'PK', 'DIRECT', 'OUT_OF_CORE']:
             raise Exception('SCF_TYPE %s not supported' % scf_type)
-        psi4.set_options({'SCF_TYPE': scf_type})
-        self.jk = psi4.core.JK.build(wfn.basisset())
-        self.jk.initialize()
-        #        self.jk.C_left().append(self.C_left)
+        self.jk = get_jk(ints, jk_type, scf_type, memory)
 
         print('...rank 2 integrals built in %.3f seconds.' % (time.time() - t))
 
@@ -215,11 +302,7 @@ class helper_HF(object):
         F = H + 2 * J[D] - K[D]
         """
 
-        self.jk.C_left_add(self.C_left)
-        self.jk.compute()
-        self.jk.C_clear()
-        self.J = np.asarray(self.jk.J()[0])
-        self.K = np.asarray(self.jk.K()[0])
+        self.J, self.K = self.jk.compute(self.npC_left)
         self.F = self.H + self.J * 2 - self.K
         return self.F
 
@@ -237,116 +320,6 @@ class helper_HF(object):
         return self.scf_e
 
 
-class DIIS_helper(object):
-    """
-    A helper class to compute DIIS extrapolations.
-
-    Notes
-    -----
-    Equations taken from [Sherrill:1998], [Pulay:1980:393], & [Pulay:1969:197]
-    Algorithms adapted from [Sherrill:1998] & [Pulay:1980:393]
-    """
-
-    def __init__(self, max_vec=6):
-        """
-        Intializes the DIIS class.
-
-        Parameters
-        ----------
-        max_vec : int (default, 6)
-            The maximum number of vectors to use. The oldest vector will be deleted.
-        """
-        self.error = []
-        self.vector = []
-        self.max_vec = max_vec
-
-    def add(self, state, error):
-        """
-        Adds a set of error and state vectors to the DIIS object.
-
-        Parameters
-        ----------
-        state : array_like
-            The state vector to add to the DIIS object.
-        error : array_like
-            The error vector to add to the DIIS object.
-
-        Returns
-        ------
-        None
-        """
-
-        error = np.array(error)
-        state = np.array(state)
-        if len(self.error) > 1:
-            if self.error[-1].shape[0] != error.size:
-                raise Exception("Error vector size does not match previous vector.")
-            if self.vector[-1].shape != state.shape:
-                raise Exception("Vector shape does not match previous vector.")
-
-        self.error.append(error.ravel().copy())
-        self.vector.append(state.copy())
-
-    def extrapolate(self):
-        """
-        Performs the DIIS extrapolation for the objects state and error vectors.
-
-        Parameters
-        ----------
-        None
-
-        Returns
-        ------
-        ret : ndarray
-            The extrapolated next state vector
-
-        """
-
-        # Limit size of DIIS vector
-        diis_count = len(self.vector)
-
-        if diis_count == 0:
-            raise Exception("DIIS: No previous vectors.")
-        if diis_count == 1:
-            return self.vector[0]
-
-        if diis_count > self.max_vec:
-            # Remove oldest vector
-            del self.vector[0]
-            del self.error[0]
-            diis_count -= 1
-
-        # Build error matrix B
-        B = np.empty((diis_count + 1, diis_count + 1))
-        B[-1, :] = -1
-        B[:, -1] = -1
-        B[-1, -1] = 0
-        for num1, e1 in enumerate(self.error):
-            B[num1, num1] = np.vdot(e1, e1)
-            for num2, e2 in enumerate(self.error):
-                if num2 >= num1: continue
-                val = np.vdot(e1, e2)
-                B[num1, num2] = B[num2, num1] = val
-
-        # normalize
-        B[abs(B) < 1.e-14] = 1.e-14
-        B[:-1, :-1] /= np.abs(B[:-1, :-1]).max()
-
-        # Build residual vector
-        resid = np.zeros(diis_count + 1)
-        resid[-1] = -1
-
-        # Solve pulay equations
-        ci = np.dot(np.linalg.pinv(B), resid)
-
-        # combination of previous fock matrices
-        V = np.zeros_like(self.vector[-1])
-        for num, c in enumerate(ci[:-1]):
-            V += c * self.vector[num]
-
-        return V
-
-
 def compute_jk(jk, C_left, C_right=None):
     """
     A python wrapper for a Psi4 JK object to consume and produce NumPy arrays.
@@ -358,8 +331,8 @@ def compute_jk(jk, C_left, C_right=None):
 
     Parameters
     ----------
-    jk : psi4.core.JK
-        A initialized Psi4 JK object
+    jk : psi4.core.JK or a helper_JK backend
+        A initialized Psi4 JK object, or any object with compute(C_left, C_right)
     C_left : list of array_like or a array_like object
         Orbitals used to compute the JK object with
     C_right : list of array_like (optional, None)
@@ -394,50 +367,10 @@ def compute_jk(jk, C_left, C_right=None):
     J_list, K_list = compute_jk(jk, [Cocc, Cocc])
     """
 
-    # Clear out the matrices
-    jk.C_clear()
-
-    list_input = True
-    if not isinstance(C_left, (list, tuple)):
-        C_left = [C_left]
-        list_input = False
-
-    for c in C_left:
-        mat = psi4.core.Matrix.from_array(c)
-        jk.C_left_add(mat)
-
-    # Do we have C_right?
-    if C_right is not None:
-        if not isinstance(C_right, (list, tuple)):
-            C_right = [C_right]
-
-        if len(C_left) != len(C_right):
-            raise ValueError("JK: length of left and right matrices is not equal")
-
-        if not isinstance(C_right, (list, tuple)):
-            C_right = [C_right]
-
-        for c in C_right:
-            mat = psi4.core.Matrix.from_array(c)
-            jk.C_right_add(mat)
-
-    # Compute the JK
-    jk.compute()
-
-    # Unpack
-    J = []
-    K = []
-    for n in range(len(C_left)):
-        J.append(np.array(jk.J()[n]))
-        K.append(np.array(jk.K()[n]))
-
-    jk.C_clear()
-
-    # Duck type the return
-    if list_input:
-        return (J, K)
-    else:
-        return (J[0], K[0])
+    # NumPy backends of helper_JK are called directly
+    if isinstance(jk, psi4.core.JK):
+        jk = PsiJK(jk)
+    return jk.compute(C_left, C_right)
 
 
 def rotate_orbitals(C, x, return_d=False):
@@ -0,0 +1,614 @@
+"""
+J and K builders for the SCF scripts.
+
+Every backend has compute(C_left, C_right=None) returning J and K of
+D = C_left C_right.T, for one set of orbitals or a list of them, like
+helper_HF.compute_jk: PsiJK wraps a psi4.core.JK object and DenseJK contracts
+the dense AO ERI tensor. build_jk() makes a backend from its name.
+
+DFJK is the density-fitted backend in NumPy: the fitted (Q|pq) tensor is built
+once from mints.ao_eri(zero, aux, orb, orb) and the metric, as in sDF-MP2.py.
+J goes through the fitted density d_Q = (Q|rs) D_rs, and K through GEMMs over
+blocks of the occupied orbitals, (Q|pi) (Q|qi), sized to the memory limit.
+
+SymmetryJK works in the symmetry adapted (SO) basis of RHF_symmetry.py. For a
+density that is block diagonal over the irreps only the totally symmetric
+(hh|gg) and (hg|hg) integral blocks contribute, and so_eri_blocks() builds just
+those, one bra shell pair at a time, without the full AO tensor.
+
+IncrementalJK contracts the dense AO ERI tensor of mints.ao_eri() with the
+change of the density since the last build, J_n = J_{n-1} + J[D_n - D_{n-1}],
+and skips the (rs) density pairs whose Schwarz bound
+|(pq|rs) dD_rs| <= Q_pq Q_rs |dD_rs|, Q_pq = (pq|pq)^1/2 is below the screening
+threshold. As the SCF converges dD shrinks and fewer pairs survive. A full
+rebuild every few iterations removes the error accumulated by the screening.
+
+References:
+- Incremental Fock builds from [Almlof:1982:385]
+- Schwarz screening from [Haser:1989:104]
+- Density-fitted J and K from [Weigend:2002:4285]
+"""
+
+__authors__ = "The Psi4NumPy Developers"
+__credits__ = ["Daniel G. A. Smith"]
+
+__copyright__ = "(c) 2014-2018, The Psi4NumPy Developers"
+__license__ = "BSD-3-Clause"
+__date__ = "2026-10-18"
+
+import numpy as np
+import psi4
+
+
+class IncrementalJK(object):
+    """
+    Difference-density J/K builds from the dense (pq|rs) AO tensor.
+
+    Notes
+    -----
+    J_pq = (pq|rs) D_rs and K_pq = (pr|qs) D_rs, as in the einsum builds of the SCF scripts.
+    """
+
+    def __init__(self, I, screening=1.e-12, rebuild_every=8):
+        """
+        Initializes the IncrementalJK object.
+
+        Parameters
+        ----------
+        I : array_like
+            The (pq|rs) AO integrals, e.g. np.asarray(mints.ao_eri()).
+        screening : float (default, 1.e-12)
+            Density pairs whose Schwarz bound falls below this value are skipped.
+        rebuild_every : int (default, 8)
+            Number of builds after which J and K are rebuilt from the full density.
+        """
+
+        self.I = np.asarray(I)
+        self.nbf = self.I.shape[0]
+        self.screening = screening
+        self.rebuild_every = rebuild_every
+        # Above this fraction of surviving pairs the contractions run over the
+        # whole tensor instead of gathering the surviving pairs into a copy
+        self.dense_fraction = 0.5
+
+        # Schwarz factors Q_pq = (pq|pq)^1/2 from the diagonal of the (pq, rs) matrix
+        npair = self.nbf * self.nbf
+        self.I_pair = self.I.reshape(npair, npair)
+        self.Q = np.sqrt(np.abs(np.diag(self.I_pair))).reshape(self.nbf, self.nbf)
+        self.Qmax = self.Q.max()
+        # Bound for K: |(pr|qs)| <= Q_pr Q_qs <= Qcol_r Qcol_s
+        self.Qcol = self.Q.max(axis=0)
+
+        self.reset()
+
+    def reset(self):
+        """Forgets the previous densities, the next build is a full one."""
+        self.D_old = None
+        self.J = None
+        self.K = None
+        self.nbuild = 0
+        self.stats = []
+
+    def _contract(self, dD):
+        """
+        Screened J and K of the (difference) density dD.
+
+        Returns J, K and the number of surviving J and K pairs.
+        """
+
+        nbf = self.nbf
+        npair = nbf * nbf
+        absD = np.abs(dD)
+
+        # J_pq = sum_rs (pq|rs) dD_rs over the surviving (rs) and (pq) pairs
+        bound = (self.Q * absD).ravel()
+        keep = self.Qmax * bound >= self.screening
+        cols = np.flatnonzero(keep)
+        if cols.size > self.dense_fraction * npair:
+            # Most pairs survive: a GEMV on the (pq, rs) view, as a fancy-index
+            # gather of the surviving block would copy nearly all of the tensor
+            J = np.dot(self.I_pair, np.where(keep, dD.ravel(), 0.0))
+        else:
+            J = np.zeros(npair)
+            if cols.size:
+                rows = np.flatnonzero(self.Q.ravel() * bound[cols].max() >= self.screening)
+                J[rows] = np.dot(self.I_pair[np.ix_(rows, cols)], dD.ravel()[cols])
+        J = J.reshape(nbf, nbf)
+
+        # K_pq = sum_rs (pr|qs) dD_rs over the surviving (rs) pairs
+        keep = np.outer(self.Qcol, self.Qcol) * absD >= self.screening
+        r, s = np.nonzero(keep)
+        if r.size > self.dense_fraction * npair:
+            # One p at a time, so only a (r, q, s) slab is reordered
+            dDk = np.where(keep, dD, 0.0)
+            K = np.empty((nbf, nbf))
+            for p in range(nbf):
+                K[p] = np.tensordot(self.I[p], dDk, axes=([0, 2], [0, 1]))
+        elif r.size:
+            K = np.tensordot(dD[r, s], self.I[:, r, :, s], axes=(0, 0))
+        else:
+            K = np.zeros((nbf, nbf))
+
+        return J, K, cols.size, r.size
+
+    def compute(self, D):
+        """
+        J and K of the density D, built incrementally from the last call.
+
+        Parameters
+        ----------
+        D : array_like or list of array_like
+            The density, or the list of densities (e.g. [Da, Db]).
+
+        Returns
+        -------
+        J, K : ndarray or list of ndarray
+            J and K matching the structure of D
+        """
+
+        single = not isinstance(D, (list, tuple))
+        Ds = [np.asarray(D)] if single else [np.asarray(x) for x in D]
+
+        full = (self.D_old is None) or (len(self.D_old) != len(Ds)) or \
+               (self.nbuild % self.rebuild_every == 0)
+
+        npair = self.nbf * self.nbf
+        Jpairs = Kpairs = 0
+        if full:
+            self.J, self.K = [], []
+        for num, Dn in enumerate(Ds):
+            dD = Dn if full else Dn - self.D_old[num]
+            J, K, nj, nk = self._contract(dD)
+            Jpairs += nj
+            Kpairs += nk
+            if full:
+                self.J.append(J)
+                self.K.append(K)
+            else:
+                self.J[num] += J
+                self.K[num] += K
+
+        self.D_old = [x.copy() for x in Ds]
+        self.nbuild += 1
+
+        total = npair * len(Ds)
+        self.stats.append({
+            'full': full,
+            'J_pairs': Jpairs,
+            'K_pairs': Kpairs,
+            'skipped': 1.0 - 0.5 * (Jpairs + Kpairs) / total
+        })
+
+        if single:
+            return self.J[0].copy(), self.K[0].copy()
+        return [x.copy() for x in self.J], [x.copy() for x in self.K]
+
+    def report(self):
+        """One line summary of the last build."""
+        st = self.stats[-1]
+        return '%s JK: %.1f%% of density pairs skipped' % ('Full' if st['full'] else 'Incremental',
+                                                        100.0 * st['skipped'])
+
+
+def _as_list(C):
+    if isinstance(C, (list, tuple)):
+        return list(C), True
+    return [C], False
+
+
+class PsiJK(object):
+    """
+    J and K from an initialized psi4.core.JK object (DF, PK, DIRECT, OUT_OF_CORE, ...).
+    """
+
+    def __init__(self, jk):
+        self.jk = jk
+
+    @classmethod
+    def build(cls, basis, scf_type='DF', memory=2):
+        psi4.set_options({'SCF_TYPE': scf_type})
+        jk = psi4.core.JK.build(basis)
+        jk.set_memory(int(memory * 1.25e8))
+        jk.initialize()
+        return cls(jk)
+
+    def compute(self, C_left, C_right=None):
+        jk = self.jk
+
+        # Clear out the matrices
+        jk.C_clear()
+
+        C_left, list_input = _as_list(C_left)
+        for c in C_left:
+            jk.C_left_add(psi4.core.Matrix.from_array(c))
+
+        # Do we have C_right?
+        if C_right is not None:
+            C_right, _ = _as_list(C_right)
+            if len(C_left) != len(C_right):
+                raise ValueError("JK: length of left and right matrices is not equal")
+            for c in C_right:
+                jk.C_right_add(psi4.core.Matrix.from_array(c))
+
+        # Compute the JK
+        jk.compute()
+
+        # Unpack
+        J = []
+        K = []
+        for n in range(len(C_left)):
+            J.append(np.array(jk.J()[n]))
+            K.append(np.array(jk.K()[n]))
+
+        jk.C_clear()
+
+        # Duck type the return
+        if list_input:
+            return (J, K)
+        else:
+            return (J[0], K[0])
+
+
+class DenseJK(object):
+    """
+    J and K from the dense (pq|rs) AO tensor, optionally through IncrementalJK.
+    """
+
+    def __init__(self, I, incremental=False, screening=1.e-12, rebuild_every=8):
+        self.I = np.asarray(I)
+        self.incremental = None
+        if incremental:
+            self.incremental = IncrementalJK(self.I, screening=screening, rebuild_every=rebuild_every)
+
+    @classmethod
+    def build(cls, mints, **kwargs):
+        return cls(np.asarray(mints.ao_eri()), **kwargs)
+
+    def compute(self, C_left, C_right=None):
+        C_left, list_input = _as_list(C_left)
+        if C_right is None:
+            C_right = C_left
+        else:
+            C_right, _ = _as_list(C_right)
+            if len(C_left) != len(C_right):
+                raise ValueError("JK: length of left and right matrices is not equal")
+        D = [np.dot(np.asarray(l), np.asarray(r).T) for l, r in zip(C_left, C_right)]
+
+        if self.incremental is not None:
+            J, K = self.incremental.compute(D)
+        else:
+            J = [np.einsum('pqrs,rs->pq', self.I, x) for x in D]
+            K = [np.einsum('prqs,rs->pq', self.I, x) for x in D]
+
+        if list_input:
+            return (J, K)
+        else:
+            return (J[0], K[0])
+
+
+class DFJK(object):
+    """
+    Density-fitted J and K from the fitted (Q|pq) AO tensor.
+
+    Notes
+    -----
+    (pq|rs) ~ sum_Q (Q|pq) (Q|rs) with (Q|pq) = [J^-1/2]_QP (P|pq), J_PQ = (P|Q).
+    """
+
+    def __init__(self, Qpq, memory=2):
+        """
+        Initializes the DFJK object.
+
+        Parameters
+        ----------
+        Qpq : array_like
+            The fitted (Q|pq) tensor of shape (naux, nbf, nbf).
+        memory : float (default, 2)
+            Memory in GB for the (Q|pi) blocks of the K build.
+        """
+
+        self.Qpq = np.ascontiguousarray(Qpq)
+        self.naux, self.nbf = self.Qpq.shape[:2]
+        self.Qpq_mat = self.Qpq.reshape(self.naux, self.nbf * self.nbf)
+        self.memory = memory
+
+    @classmethod
+    def build(cls, basis, mints, aux=None, memory=2):
+        """
+        Builds (Q|pq) in the JKFIT basis of DF_BASIS_SCF, or in the aux basis given.
+        """
+
+        if aux is None:
+            aux = psi4.core.BasisSet.build(basis.molecule(), "DF_BASIS_SCF",
+                                           psi4.core.get_option("SCF", "DF_BASIS_SCF"), "JKFIT",
+                                           psi4.core.get_global_option('BASIS'), puream=basis.has_puream())
+
+        # (P|pq) is fitted in place, so only one naux * nbf^2 tensor and the metric are held
+        naux, nbf = aux.nbf(), basis.nbf()
+        DF_size = (naux * nbf * nbf + naux * naux) * 8.e-9
+        if DF_size > memory:
+            psi4.core.clean()
+            raise Exception("DF tensor (%4.2f GB) exceeds the memory limit of %4.2f GB." % (DF_size, memory))
+
+        zero_bas = psi4.core.BasisSet.zero_ao_basis_set()
+
+        # Build (P|pq) raw 3-index ERIs, dimension (1, Naux, nbf, nbf)
+        Ppq = mints.ao_eri(zero_bas, aux, basis, basis)
+
+        # Build & invert Coulomb metric, dimension (1, Naux, 1, Naux)
+        metric = mints.ao_eri(zero_bas, aux, zero_bas, aux)
+        metric.power(-0.5, 1.e-14)
+
+        # (Q|pq) = [J^-1/2]_QP (P|pq), one AO index p at a time
+        Qpq = np.asarray(Ppq).reshape(naux, nbf, nbf)
+        metric = np.squeeze(metric)
+        for p in range(nbf):
+            Qpq[:, p, :] = np.dot(metric, Qpq[:, p, :])
+
+        # Whatever is left after (Q|pq) goes to the K blocks
+        return cls(Qpq, memory=max(memory - DF_size, 0.0))
+
+    def block_size(self, nocc, nright=1):
+        """
+        Returns the number of occupied orbitals per K block, such that the (Q|pi)
+        blocks of the left and right orbitals and the transposed copies made by
+        the GEMM fit into memory.
+        """
+        words = self.memory * 1.e9 / 8
+        block = int(words / (2 * (1 + nright) * self.naux * self.nbf))
+        return max(1, min(block, nocc))
+
+    def compute(self, C_left, C_right=None):
+        C_left, list_input = _as_list(C_left)
+        if C_right is None:
+            C_right = [None] * len(C_left)
+        else:
+            C_right, _ = _as_list(C_right)
+            if len(C_left) != len(C_right):
+                raise ValueError("JK: length of left and right matrices is not equal")
+
+        nbf = self.nbf
+        J = []
+        K = []
+        for Cl, Cr in zip(C_left, C_right):
+            Cl = np.asarray(Cl)
+            Cr = Cl if Cr is None else np.asarray(Cr)
+            nocc = Cl.shape[1]
+
+            # J_pq = (Q|pq) d_Q, d_Q = (Q|rs) D_rs
+            D = np.dot(Cl, Cr.T)
+            dQ = np.dot(self.Qpq_mat, D.ravel())
+            J.append(np.dot(dQ, self.Qpq_mat).reshape(nbf, nbf))
+
+            # K_pq = sum_i (Q|pi)_left (Q|qi)_right over blocks of i
+            Kn = np.zeros((nbf, nbf))
+            block = self.block_size(nocc, nright=(0 if Cr is Cl else 1))
+            for start in range(0, nocc, block):
+                stop = min(start + block, nocc)
+                Xl = np.dot(self.Qpq_mat.reshape(-1, nbf), Cl[:, start:stop]).reshape(self.naux, nbf, -1)
+                if Cr is Cl:
+                    Xr = Xl
+                else:
+                    Xr = np.dot(self.Qpq_mat.reshape(-1, nbf), Cr[:, start:stop]).reshape(self.naux, nbf, -1)
+                Xl = Xl.transpose(1, 0, 2).reshape(nbf, -1)
+                Xr = Xr.transpose(1, 0, 2).reshape(nbf, -1)
+                Kn += np.dot(Xl, Xr.T)
+            K.append(Kn)
+
+        if list_input:
+            return (J, K)
+        else:
+            return (J[0], K[0])
+
+
+# Index permutations sigma of a chemist-notation quartet (mn|ls) that leave
+# the integral unchanged: m <-> n, l <-> s and bra <-> ket
+_ERI_PERMUTATIONS = [(0, 1, 2, 3), (1, 0, 2, 3), (0, 1, 3, 2), (1, 0, 3, 2),
+                     (2, 3, 0, 1), (3, 2, 0, 1), (2, 3, 1, 0), (3, 2, 1, 0)]
+
+
+def so_eri_blocks(mints, basis, transformers):
+    """
+    The SO integral blocks needed for J and K of densities that are block diagonal
+    over the irreps.
+
+    Parameters
+    ----------
+    mints : psi4.core.MintsHelper
+        MintsHelper of the orbital basis.
+    basis : psi4.core.BasisSet
+        The orbital basis.
+    transformers : list of array_like
+        AO to SO transformation matrices of the (non-empty) irreps, [nao, nso in irrep].
+
+    Returns
+    -------
+    J_blocks, K_blocks : dict
+        For irrep pairs h >= g, J_blocks[h, g][p, q, r, s] = (p_h q_h|r_g s_g)
+        and K_blocks[h, g][p, r, q, s] = (p_h r_g|q_h s_g). For h == g both are
+        the same array.
+
+    Notes
+    -----
+    Each unique shell quartet (MN|PQ), M >= N, P >= Q, MN >= PQ, is computed
+    once, weighted by one over the number of index permutations that map it
+    onto itself. A shell only feeds the few SO functions with nonzero AO to SO
+    coefficients, so the kets PQ of one bra pair MN are transformed with those
+    columns and summed, and the bra is transformed once per pair and added to
+    every irrep quadruple it contributes to. The permutational images of these
+    partial sums are added once at the end.
+    """
+
+    U = [np.asarray(x) for x in transformers]
+    nso = [x.shape[1] for x in U]
+    nirrep = len(U)
+    pairs = [(h, g) for h in range(nirrep) for g in range(h + 1)]
+
+    nshell = basis.nshell()
+    first = [basis.shell_to_basis_function(M) for M in range(nshell)]
+    nfunc = [basis.shell(M).nfunction for M in range(nshell)]
+    sl = [slice(first[M], first[M] + nfunc[M]) for M in range(nshell)]
+
+    # Irreps, SO columns and AO to SO coefficients that each shell feeds
+    shell_so = []
+    for M in range(nshell):
+        entries = []
+        for h in range(nirrep):
+            cols = np.flatnonzero(np.any(U[h][sl[M]] != 0.0, axis=0))
+            if len(cols):
+                entries.append((h, cols, U[h][sl[M]][:, cols]))
+        shell_so.append(entries)
+
+    # Irrep quadruples of the J (hhgg) and K (hghg) blocks and their images
+    targets = [(h, h, g, g) for h, g in pairs] + [(h, g, h, g) for h, g in pairs if h != g]
+    partial = {}
+    for t in targets:
+        for sigma in _ERI_PERMUTATIONS:
+            key = tuple(t[sigma.index(j)] for j in range(4))
+            if key not in partial:
+                partial[key] = np.zeros([nso[x] for x in key])
+
+    # AO to SO transformation of each shell pair into the irrep pairs it feeds,
+    # with the flattened SO pair columns it adds to
+    ket_irreps = set(key[2:] for key in partial)
+    bra_pairs = [(M, N) for M in range(nshell) for N in range(M + 1)]
+    pair_so = []
+    for M, N in bra_pairs:
+        entries = []
+        for h3, c3, U3 in shell_so[M]:
+            for h4, c4, U4 in shell_so[N]:
+                if (h3, h4) in ket_irreps:
+                    entries.append((h3, h4, (c3[:, None] * nso[h4] + c4).ravel(), np.kron(U3, U4)))
+        pair_so.append(entries)
+
+    for mn, (M, N) in enumerate(bra_pairs):
+
+        # (mn|r_h3 s_h4) for m in M, n in N, summed over the unique kets PQ <= MN
+        ket = {}
+        for pq, (P, Q) in enumerate(bra_pairs[:mn + 1]):
+            weight = 1.0 / (2**((M == N) + (P == Q) + ((M, N) == (P, Q))))
+            block = np.asarray(mints.ao_eri_shell(M, N, P, Q)).reshape(nfunc[M] * nfunc[N], -1)
+            for h3, h4, cols, W in pair_so[pq]:
+                if (h3, h4) not in ket:
+                    ket[h3, h4] = np.zeros((nfunc[M] * nfunc[N], nso[h3] * nso[h4]))
+                ket[h3, h4][:, cols] += weight * np.dot(block, W)
+
+        # Bra to the SO basis, only the columns fed by M and N
+        for h1, c1, U1 in shell_so[M]:
+            for h2, c2, U2 in shell_so[N]:
+                W = np.kron(U1, U2)
+                for (h3, h4), X in ket.items():
+                    key = (h1, h2, h3, h4)
+                    if key in partial:
+                        so = np.dot(W.T, X).reshape(len(c1), len(c2), nso[h3], nso[h4])
+                        partial[key][np.ix_(c1, c2)] += so
+
+    def assemble(t):
+        out = np.zeros([nso[x] for x in t])
+        for sigma in _ERI_PERMUTATIONS:
+            key = tuple(t[sigma.index(j)] for j in range(4))
+            out += partial[key].transpose(sigma)
+        return out
+
+    J_blocks = {}
+    K_blocks = {}
+    for h, g in pairs:
+        J_blocks[h, g] = assemble((h, h, g, g))
+        K_blocks[h, g] = J_blocks[h, g] if h == g else assemble((h, g, h, g))
+
+    return J_blocks, K_blocks
+
+
+class SymmetryJK(object):
+    """
+    J and K of block diagonal SO densities from the symmetry unique SO integrals.
+
+    Notes
+    -----
+    Only the (hh|gg) and (hg|hg) blocks with h >= g are stored, and J and K
+    share the (hh|hh) blocks; the g > h blocks follow from (pq|rs) = (rs|pq).
+    """
+
+    def __init__(self, J_blocks, K_blocks):
+        self.J_blocks = J_blocks
+        self.K_blocks = K_blocks
+        self.nirrep = max(h for h, g in J_blocks) + 1
+
+    @classmethod
+    def build(cls, mints, basis, transformers):
+        return cls(*so_eri_blocks(mints, basis, transformers))
+
+    @property
+    def nbytes(self):
+        blocks = {id(x): x for x in list(self.J_blocks.values()) + list(self.K_blocks.values())}
+        return sum(x.nbytes for x in blocks.values())
+
+    def compute(self, D_):
+        """
+        J and K of the block diagonal density D_.
+
+        Parameters
+        ----------
+        D_ : list or tuple of array_like
+            The density, one [nso in irrep, nso in irrep] matrix per irrep.
+
+        Returns
+        -------
+        J_, K_ : tuple of ndarray
+            J_h and K_h of every irrep
+        """
+
+        J_ = []
+        K_ = []
+        for h in range(self.nirrep):
+            J = 0
+            K = 0
+            for g in range(self.nirrep):
+                D = np.asarray(D_[g])
+                if g <= h:
+                    # J_pq += (p_h q_h|r_g s_g) D_rs, K_pq += (p_h r_g|q_h s_g) D_rs
+                    J = J + np.einsum('pqrs,rs->pq', self.J_blocks[h, g], D)
+                    K = K + np.einsum('prqs,rs->pq', self.K_blocks[h, g], D)
+                else:
+                    J = J + np.einsum('rspq,rs->pq', self.J_blocks[g, h], D)
+                    K = K + np.einsum('rpsq,rs->pq', self.K_blocks[g, h], D)
+            J_.append(J)
+            K_.append(K)
+
+        return tuple(J_), tuple(K_)
+
+
+def build_jk(jk_type, basis, mints, scf_type='DF', memory=2):
+    """
+    Builds a J/K backend.
+
+    Parameters
+    ----------
+    jk_type : {'psi4', 'dense', 'incremental', 'numpy_df'}
+        psi4.core.JK of type scf_type, einsum over the dense ao_eri() tensor,
+        the same tensor contracted with the density changes (IncrementalJK),
+        or density fitting in NumPy (DFJK).
+    basis : psi4.core.BasisSet
+        The orbital basis.
+    mints : psi4.core.MintsHelper
+        MintsHelper of the orbital basis.
+    scf_type : str (default, 'DF')
+        SCF_TYPE of the psi4 backend.
+    memory : float (default, 2)
+        Memory in GB.
+    """
+
+    jk_type = jk_type.lower()
+    if jk_type == 'psi4':
+        return PsiJK.build(basis, scf_type=scf_type, memory=memory)
+    elif jk_type in ['dense', 'incremental']:
+        nbf = basis.nbf()
+        if nbf**4 * 8.e-9 > memory:
+            psi4.core.clean()
+            raise Exception("Dense ERI tensor (%4.2f GB) exceeds the memory limit of %4.2f GB." %
+                            (nbf**4 * 8.e-9, memory))
+        return DenseJK.build(mints, incremental=(jk_type == 'incremental'))
+    elif jk_type == 'numpy_df':
+        return DFJK.build(basis, mints, memory=memory)
+    else:
+        raise Exception("JK type %s is not understood." % jk_type)
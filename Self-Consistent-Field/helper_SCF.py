@@ -0,0 +1,254 @@
+"""
+A reusable RHF/UHF/ROHF engine for calling SCF many times in one process.
+
+The AO integrals, orthogonalizer and JK backend come from helper_HF.ao_integrals
+and helper_HF.get_jk, so repeated calls with the same basis and geometry skip
+all setup, and the orbitals of the previous call are the guess of the next one
+(useful along scans and MD trajectories).
+
+References:
+- RHF/UHF equations & algorithms from [Szabo:1996]
+- ROHF effective Fock matrix from [Tsuchimochi:2010:141102]
+- DIIS equations & algorithm from [Sherrill:1998], [Pulay:1980:393], & [Pulay:1969:197]
+"""
+
+__authors__ = "The Psi4NumPy Developers"
+__credits__ = ["Daniel G. A. Smith"]
+
+__copyright__ = "(c) 2014-2018, The Psi4NumPy Developers"
+__license__ = "BSD-3-Clause"
+__date__ = "2026-10-18"
+
+import time
+import numpy as np
+import psi4
+from helper_HF import ao_integrals
+from helper_HF import get_jk
+from helper_DIIS import DIIS
+
+
+class SCFEngine(object):
+    """
+    Computes SCF energies of molecules with a fixed method setup.
+
+    Examples
+    --------
+
+    >>> engine = SCFEngine(basis='cc-pvdz', reference='RHF', jk_type='dense')
+    >>> for R in [0.9, 1.0, 1.1]:
+    ...     mol = psi4.geometry("O\nH 1 %f\nH 1 %f 2 104\nsymmetry c1" % (R, R))
+    ...     E = engine.compute_energy(mol)
+    """
+
+    def __init__(self,
+                 basis=None,
+                 reference='RHF',
+                 jk_type='psi4',
+                 scf_type='DF',
+                 memory=2,
+                 maxiter=50,
+                 e_conv=1.e-8,
+                 d_conv=1.e-6,
+                 max_diis=6,
+                 diis_mode='diis',
+                 guess='read',
+                 print_level=1):
+        """
+        Initializes the SCFEngine object.
+
+        Parameters
+        ----------
+        basis : {str, None}, optional
+            The basis name, defaults to the global BASIS option.
+        reference : {"RHF", "UHF", "ROHF"}, optional
+            The SCF reference.
+        jk_type : {"psi4", "dense", "incremental", "numpy_df"}, optional
+            The JK backend, see helper_JK.build_jk.
+        scf_type : str, optional
+            SCF_TYPE of the "psi4" JK backend.
+        memory : float, optional
+            Memory in GB for the JK backend.
+        maxiter, e_conv, d_conv : optional
+            Iteration limit and energy / orbital gradient convergence.
+        max_diis : int, optional
+            Size of the DIIS subspace.
+        diis_mode : {"diis", "ediis", "adiis"}, optional
+            See helper_DIIS.DIIS; ROHF always uses "diis".
+        guess : {"read", "core"}, optional
+            "read" starts from the orbitals of the previous call when the basis size matches.
+        print_level : int, optional
+            0 is silent, 1 prints the final energy, 2 every iteration.
+        """
+
+        reference = reference.upper()
+        if reference not in ['RHF', 'UHF', 'ROHF']:
+            raise Exception("Reference %s is not understood." % reference)
+
+        self.basis = basis
+        self.reference = reference
+        self.jk_type = jk_type
+        self.scf_type = scf_type
+        self.memory = memory
+        self.maxiter = maxiter
+        self.e_conv = e_conv
+        self.d_conv = d_conv
+        self.max_diis = max_diis
+        self.diis_mode = diis_mode
+        self.guess = guess.lower()
+        self.print_level = print_level
+
+        self.energy = None
+        self.Ca = None
+        self.Cb = None
+        self.eps_a = None
+        self.eps_b = None
+        self.iterations = 0
+        self.timings = {}
+
+    def _occupations(self, mol):
+        nel = sum(mol.Z(A) for A in range(mol.natom())) - mol.molecular_charge()
+        nel = int(round(nel))
+        nalpha = (nel + mol.multiplicity() - 1) // 2
+        return nalpha, nel - nalpha
+
+    def _guess(self, ints):
+        """Core guess, or the previous orbitals orthonormalized in the new metric."""
+        S, A = ints['S'], ints['A']
+        if (self.guess == 'read') and (self.Ca is not None) and (self.Ca.shape[0] == ints['nbf']):
+            Cs = []
+            for C in [self.Ca, self.Cb]:
+                M = C.T.dot(S).dot(C)
+                e, U = np.linalg.eigh(M)
+                Cs.append(C.dot(U / np.sqrt(e)).dot(U.T))
+            return Cs[0], Cs[1]
+
+        e, C2 = np.linalg.eigh(A.dot(ints['H']).dot(A))
+        C = A.dot(C2)
+        return C, C.copy()
+
+    def _jk(self, jk, Cocc):
+        """J and K of a list of occupied orbital blocks, skipping empty ones."""
+        nbf = Cocc[0].shape[0]
+        idx = [n for n, C in enumerate(Cocc) if C.shape[1] > 0]
+        J = [np.zeros((nbf, nbf)) for C in Cocc]
+        K = [np.zeros((nbf, nbf)) for C in Cocc]
+        if idx:
+            Jc, Kc = jk.compute([Cocc[n] for n in idx])
+            for pos, n in enumerate(idx):
+                J[n] = Jc[pos]
+                K[n] = Kc[pos]
+        return J, K
+
+    def compute_energy(self, mol):
+        """
+        Converges the SCF of mol and returns the total energy.
+
+        Orbitals, orbital energies and densities are kept as Ca, Cb, eps_a,
+        eps_b, Da and Db.
+        """
+
+        t = time.time()
+        ints = ao_integrals(mol, self.basis)
+        jk = get_jk(ints, self.jk_type, self.scf_type, self.memory)
+        nalpha, nbeta = self._occupations(mol)
+        if (self.reference == 'RHF') and (nalpha != nbeta):
+            psi4.core.clean()
+            raise Exception("RHF requires a closed-shell molecule.")
+        Ca, Cb = self._guess(ints)
+        self.timings['setup'] = time.time() - t
+
+        t = time.time()
+        if self.reference == 'ROHF':
+            diis = DIIS(self.max_diis)
+        else:
+            diis = DIIS(self.max_diis, mode=self.diis_mode, gradient_scale=(2.0 if self.reference == 'RHF' else 1.0))
+
+        S, A, H, enuc = ints['S'], ints['A'], ints['H'], ints['enuc']
+        Eold = 0.0
+        for SCF_ITER in range(1, self.maxiter + 1):
+
+            Da = np.dot(Ca[:, :nalpha], Ca[:, :nalpha].T)
+            Db = np.dot(Cb[:, :nbeta], Cb[:, :nbeta].T)
+
+            if self.reference == 'RHF':
+                J, K = self._jk(jk, [Ca[:, :nalpha]])
+                F = H + 2 * J[0] - K[0]
+                SCF_E = np.vdot(F + H, Da) + enuc
+
+                diis_e = A.dot(F.dot(Da).dot(S) - S.dot(Da).dot(F)).dot(A)
+                diis.add(F, diis_e, density=Da, energy=SCF_E)
+
+            else:
+                J, K = self._jk(jk, [Ca[:, :nalpha], Cb[:, :nbeta]])
+                Fa = H + (J[0] + J[1]) - K[0]
+                Fb = H + (J[0] + J[1]) - K[1]
+                SCF_E = 0.5 * (np.vdot(Da + Db, H) + np.vdot(Da, Fa) + np.vdot(Db, Fb)) + enuc
+
+                if self.reference == 'UHF':
+                    diisa_e = A.dot(Fa.dot(Da).dot(S) - S.dot(Da).dot(Fa)).dot(A)
+                    diisb_e = A.dot(Fb.dot(Db).dot(S) - S.dot(Db).dot(Fb)).dot(A)
+                    diis_e = np.hstack((diisa_e.ravel(), diisb_e.ravel()))
+                    diis.add((Fa, Fb), (diisa_e, diisb_e), density=(Da, Db), energy=SCF_E)
+
+                else:
+                    # ROHF effective Fock matrix in the orthogonal basis, as in ROHF_libJK.py
+                    Ct = S.dot(A).dot(Ca)
+                    moFa = Ca.T.dot(Fa).dot(Ca)
+                    moFb = Ca.T.dot(Fb).dot(Ca)
+                    moFeff = 0.5 * (moFa + moFb)
+                    moFeff[:nbeta, nbeta:nalpha] = moFb[:nbeta, nbeta:nalpha]
+                    moFeff[nbeta:nalpha, :nbeta] = moFb[nbeta:nalpha, :nbeta]
+                    moFeff[nbeta:nalpha, nalpha:] = moFa[nbeta:nalpha, nalpha:]
+                    moFeff[nalpha:, nbeta:nalpha] = moFa[nalpha:, nbeta:nalpha]
+                    Feff = Ct.dot(moFeff).dot(Ct.T)
+
+                    IFock = moFeff[:nalpha, nbeta:].copy()
+                    IFock[:, :nalpha - nbeta] /= 2
+                    IFock[nbeta:, :] /= 2
+                    IFock[nbeta:, :nalpha - nbeta] = 0.0
+                    diis_e = Ct[:, :nalpha].dot(IFock).dot(Ct[:, nbeta:].T)
+                    diis.add(Feff, diis_e)
+
+            dRMS = np.mean(diis_e**2)**0.5
+            if self.print_level > 1:
+                print('SCF Iteration %3d: Energy = %4.16f   dE = % 1.5E   dRMS = %1.5E' %
+                      (SCF_ITER, SCF_E, (SCF_E - Eold), dRMS))
+            if (abs(SCF_E - Eold) < self.e_conv) and (dRMS < self.d_conv):
+                break
+
+            Eold = SCF_E
+
+            # New orbitals from the extrapolated Fock matrices
+            if self.reference == 'RHF':
+                F = diis.extrapolate()
+                eps_a, C2 = np.linalg.eigh(A.dot(F).dot(A))
+                Ca = A.dot(C2)
+                Cb, eps_b = Ca, eps_a
+            elif self.reference == 'UHF':
+                Fa, Fb = diis.extrapolate()
+                eps_a, C2 = np.linalg.eigh(A.dot(Fa).dot(A))
+                Ca = A.dot(C2)
+                eps_b, C2 = np.linalg.eigh(A.dot(Fb).dot(A))
+                Cb = A.dot(C2)
+            else:
+                Feff = diis.extrapolate()
+                eps_a, Ct = np.linalg.eigh(Feff)
+                Ca = A.dot(Ct)
+                Cb, eps_b = Ca, eps_a
+
+            if SCF_ITER == self.maxiter:
+                psi4.core.clean()
+                raise Exception("Maximum number of SCF cycles exceeded.")
+
+        self.timings['iterations'] = time.time() - t
+        self.iterations = SCF_ITER
+        self.energy = SCF_E
+        self.Ca, self.Cb = Ca, Cb
+        if SCF_ITER > 1:
+            self.eps_a, self.eps_b = eps_a, eps_b
+        self.Da, self.Db = Da, Db
+
+        if self.print_level > 0:
+            print('%s energy: %.12f hartree in %d iterations (%.3f s setup, %.3f s iterations)' %
+                  (self.reference, SCF_E, SCF_ITER, self.timings['setup'], self.timings['iterations']))
+        return SCF_E
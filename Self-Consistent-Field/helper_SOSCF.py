@@ -0,0 +1,447 @@
+"""
+Matrix-free second-order SCF (SOSCF) shared by the RHF, UHF and ROHF scripts.
+
+The orbital Hessian is never formed. Its product with a trial rotation x comes
+from one JK build with the occupied orbitals and the rotated occupied orbitals,
+[Helgaker:2000] Eqn. 10.8.65, so a Newton step costs a few Fock builds instead
+of the O((ov)^3) inversion of the explicit Hessian. The Newton equations
+H x = g are solved by diagonally preconditioned conjugate gradients that stop at
+the boundary of a trust region, and the trust radius follows the ratio of the
+actual and the predicted energy change.
+
+References:
+- SO equations & algorithm from [Helgaker:2000]
+- PCG from [Shewchuk:1994]
+- Truncated CG trust region from [Steihaug:1983:626]
+"""
+
+__authors__ = "The Psi4NumPy Developers"
+__credits__ = ["Daniel G. A. Smith"]
+
+__copyright__ = "(c) 2014-2018, The Psi4NumPy Developers"
+__license__ = "BSD-3-Clause"
+__date__ = "2026-10-18"
+
+import numpy as np
+from helper_HF import compute_jk
+
+# Smallest diagonal of the preconditioners. Orbital energy differences are not
+# positive when the orbitals are mis-ordered, e.g. from a core guess.
+PRECON_FLOOR = 1.e-2
+
+
+def rotation_matrix(x, nocc, vstart):
+    """
+    Unitary MO rotation of the occupied by virtual rotation x, (nocc, nmo - vstart).
+
+    For ROHF the occupied and virtual spaces overlap in the singly occupied
+    orbitals (vstart = ndocc < nocc), for RHF and UHF vstart = nocc. The
+    exponential is approximated as in helper_HF.rotate_orbitals.
+    """
+
+    nmo = vstart + x.shape[1]
+    U = np.zeros((nmo, nmo))
+    U[:nocc, vstart:] = x
+    U[vstart:, :nocc] -= x.T
+
+    U += 0.5 * np.dot(U, U)
+    U[np.diag_indices_from(U)] += 1
+
+    # Easy access to Schmidt orthogonalization
+    U, r = np.linalg.qr(U.T)
+    return U
+
+
+class RHFHessian(object):
+    """
+    Orbital gradient, diagonal preconditioner and Hessian products of RHF.
+
+    All vectors are flattened (nocc, nvir) rotations.
+    """
+
+    def __init__(self, jk, C, F, nocc):
+        """
+        Parameters
+        ----------
+        jk : psi4.core.JK or a helper_JK backend
+            Used for the Hessian products through helper_HF.compute_jk.
+        C : array_like
+            The current orbitals.
+        F : array_like
+            The AO Fock matrix of the current orbitals.
+        nocc : int
+            The number of doubly occupied orbitals.
+        """
+
+        self.jk = jk
+        self.C = np.asarray(C)
+        self.nocc = nocc
+        self.Co = self.C[:, :nocc]
+        self.Cv = self.C[:, nocc:]
+        self.moF = self.C.T.dot(F).dot(self.C)
+        self.shape = (nocc, self.C.shape[1] - nocc)
+
+        # [Helgaker:2000] Eqn. 10.8.34, pp. 484
+        self.gradient = (-4 * self.moF[:nocc, nocc:]).ravel()
+        eps = np.diag(self.moF)
+        self.precon = (-4 * (eps[:nocc].reshape(-1, 1) - eps[nocc:])).ravel()
+        self.precon = np.maximum(self.precon, PRECON_FLOOR)
+
+    def product(self, x):
+        x = x.reshape(self.shape)
+        nocc = self.nocc
+
+        Hx = np.dot(self.moF[:nocc, :nocc], x)
+        Hx -= np.dot(x, self.moF[nocc:, nocc:])
+
+        # Build two electron part, M = -4 (4 G_{mnip} - g_{mpin} - g_{npim}) K_{ip}
+        # From [Helgaker:2000] Eqn. 10.8.65
+        C_right = -np.dot(self.Cv, x.T)
+        J, K = compute_jk(self.jk, self.Co, C_right)
+        Hx += (self.Co.T).dot(4 * J - K.T - K).dot(self.Cv)
+        Hx *= -4
+        return Hx.ravel()
+
+    def rotate(self, x):
+        """The orbitals rotated by x."""
+        return self.C.dot(rotation_matrix(x.reshape(self.shape), self.nocc, self.nocc))
+
+
+class UHFHessian(object):
+    """
+    Orbital gradient, diagonal preconditioner and Hessian products of UHF.
+
+    The vectors are the flattened alpha (nalpha, nvir_a) and beta (nbeta, nvir_b)
+    rotations, one after the other. Gradient and Hessian are half of those of
+    SOUHF_iterative.py, which gives the same steps but makes them the derivatives
+    of the UHF energy, as needed by the trust region model.
+    """
+
+    def __init__(self, jk, Ca, Cb, Fa, Fb, nalpha, nbeta):
+        self.jk = jk
+        self.C = [np.asarray(Ca), np.asarray(Cb)]
+        self.nocc = [nalpha, nbeta]
+        self.moF = [C.T.dot(F).dot(C) for C, F in zip(self.C, [Fa, Fb])]
+        self.shapes = [(n, C.shape[1] - n) for C, n in zip(self.C, self.nocc)]
+        self.split = self.shapes[0][0] * self.shapes[0][1]
+
+        # [Helgaker:2000] Eqn. 10.8.34, pp. 484
+        grad = []
+        precon = []
+        for moF, n in zip(self.moF, self.nocc):
+            grad.append(-2 * moF[:n, n:].ravel())
+            eps = np.diag(moF)
+            precon.append(-2 * (eps[:n].reshape(-1, 1) - eps[n:]).ravel())
+        self.gradient = np.hstack(grad)
+        self.precon = np.maximum(np.hstack(precon), PRECON_FLOOR)
+
+    def _unpack(self, x):
+        return [x[:self.split].reshape(self.shapes[0]), x[self.split:].reshape(self.shapes[1])]
+
+    def product(self, x):
+        xs = self._unpack(x)
+
+        Co = [C[:, :n] for C, n in zip(self.C, self.nocc)]
+        Cv = [C[:, n:] for C, n in zip(self.C, self.nocc)]
+        C_right = [-np.dot(v, xn.T) for v, xn in zip(Cv, xs)]
+        J, K = compute_jk(self.jk, Co, C_right)
+        Jab = J[0] + J[1]
+
+        Hx = []
+        for spin in range(2):
+            n = self.nocc[spin]
+            moF = self.moF[spin]
+            H = np.dot(moF[:n, :n], xs[spin])
+            H -= np.dot(xs[spin], moF[n:, n:])
+            H += (Co[spin].T).dot(2 * Jab - K[spin].T - K[spin]).dot(Cv[spin])
+            Hx.append(-2 * H.ravel())
+        return np.hstack(Hx)
+
+    def rotate(self, x):
+        """The alpha and beta orbitals rotated by x."""
+        return tuple(C.dot(rotation_matrix(xn, n, n)) for C, xn, n in zip(self.C, self._unpack(x), self.nocc))
+
+
+class ROHFHessian(object):
+    """
+    Orbital gradient, diagonal preconditioner and Hessian products of ROHF.
+
+    The vectors are flattened (nocc, nmo - ndocc) rotations whose singly by
+    singly occupied block is zero, as in SOROHF_iterative.py. The Hessian is the
+    approximate one of that script, the trust region absorbs the difference.
+    """
+
+    def __init__(self, jk, C, Fa, Fb, ndocc, nocc):
+        self.jk = jk
+        self.C = np.asarray(C)
+        self.ndocc = ndocc
+        self.nocc = nocc
+        self.nsocc = nocc - ndocc
+        self.moFa = self.C.T.dot(Fa).dot(self.C)
+        self.moFb = self.C.T.dot(Fb).dot(self.C)
+        self.shape = (nocc, self.C.shape[1] - ndocc)
+
+        moFeff = 0.5 * (self.moFa + self.moFb)
+        moFeff[:ndocc, ndocc:nocc] = self.moFb[:ndocc, ndocc:nocc]
+        moFeff[ndocc:nocc, :ndocc] = self.moFb[ndocc:nocc, :ndocc]
+        moFeff[ndocc:nocc, nocc:] = self.moFa[ndocc:nocc, nocc:]
+        moFeff[nocc:, ndocc:nocc] = self.moFa[nocc:, ndocc:nocc]
+
+        gradient = -4 * moFeff[:nocc, ndocc:]
+        gradient[ndocc:, :self.nsocc] = 0.0
+        gradient[ndocc:] /= 2
+        gradient[:, :self.nsocc] /= 2
+        self.gradient = gradient.ravel()
+
+        eps = np.diag(moFeff)
+        precon = -3.5 * (eps[:nocc].reshape(-1, 1) - eps[ndocc:])
+        precon[ndocc:] *= 0.5
+        precon[:, :self.nsocc] *= 0.5
+        precon[ndocc:, :self.nsocc] = 1
+        self.precon = np.maximum(precon.ravel(), PRECON_FLOOR)
+
+    def product(self, x):
+        x = x.reshape(self.shape)
+        C, ndocc, nocc, nsocc = self.C, self.ndocc, self.nocc, self.nsocc
+        moFa, moFb = self.moFa, self.moFb
+
+        Co_a = C[:, :nocc]
+        Co_b = C[:, :ndocc]
+        C_right_a = np.dot(C[:, nocc:], x[:, nsocc:].T)
+        C_right_b = np.dot(C[:, ndocc:], x[:ndocc, :].T)
+        J, K = compute_jk(self.jk, [Co_a, Co_b], [C_right_a, C_right_b])
+        J1, J2 = J
+        K1, K2 = K
+
+        IAJB = (C[:, :nocc].T).dot(J1 - 0.5 * K1 - 0.5 * K1.T).dot(C[:, ndocc:])
+        IAJB += 0.5 * np.dot(x[:, nsocc:], moFa[nocc:, ndocc:])
+        IAJB -= 0.5 * np.dot(moFa[:nocc, :nocc], x)
+        IAJB[:, :nsocc] = 0.0
+
+        iajb = (C[:, :nocc].T).dot(J2 - 0.5 * K2 - 0.5 * K2.T).dot(C[:, ndocc:])
+        iajb += 0.5 * np.dot(x, moFb[ndocc:, ndocc:])
+        iajb -= 0.5 * np.dot(moFb[:nocc, :ndocc], x[:ndocc, :])
+        iajb[ndocc:, :] = 0.0
+
+        IAjb = (C[:, :nocc].T).dot(J2).dot(C[:, ndocc:])
+        IAjb[ndocc:] += 0.5 * np.dot(x[:, :nsocc].T, moFb[:nocc, ndocc:])
+        IAjb[:, :nsocc] = 0.0
+
+        iaJB = (C[:, :nocc].T).dot(J1).dot(C[:, ndocc:])
+        iaJB[:, :nsocc] += 0.5 * np.dot(moFb[:nocc, nocc:], x[ndocc:, nsocc:].T)
+        iaJB[ndocc:] = 0.0
+
+        Hx = 4 * (IAJB + IAjb + iaJB + iajb)
+        Hx[ndocc:, :nsocc] = 0.0
+        return Hx.ravel()
+
+    def rotation(self, x):
+        """The MO rotation matrix of x."""
+        return rotation_matrix(x.reshape(self.shape), self.nocc, self.ndocc)
+
+    def rotate(self, x):
+        """The orbitals rotated by x."""
+        return self.C.dot(self.rotation(x))
+
+
+def _to_boundary(x, p, radius):
+    """The tau >= 0 with |x + tau p| = radius."""
+    pp = np.vdot(p, p)
+    xp = np.vdot(x, p)
+    xx = np.vdot(x, x)
+    return (-xp + np.sqrt(xp**2 + pp * (radius**2 - xx))) / pp
+
+
+def truncated_pcg(product, gradient, precon, radius, conv=1.e-3, max_iter=10, micro_print=False):
+    """
+    Solves H x = g by preconditioned conjugate gradients within |x| <= radius.
+
+    Starting from x = 0 the iterates grow in length, so the solve stops at the
+    trust radius or along a direction of negative curvature [Steihaug:1983:626].
+
+    Parameters
+    ----------
+    product : callable
+        product(x) returns H x.
+    gradient : ndarray
+        The right hand side g.
+    precon : ndarray
+        The diagonal preconditioner.
+    radius : float
+        The trust radius.
+    conv : float (default, 1.e-3)
+        Convergence of the residual relative to the gradient.
+    max_iter : int (default, 10)
+        The maximum number of Hessian products.
+    micro_print : bool (default, False)
+        Print the residual of every micro iteration.
+
+    Returns
+    -------
+    x, Hx : ndarray
+        The step and its Hessian product
+    niter : int
+        The number of Hessian products
+    status : str
+        'converged', 'trust radius', 'negative curvature' or 'max iterations'
+    """
+
+    x = np.zeros_like(gradient)
+    Hx = np.zeros_like(gradient)
+    r = gradient.copy()
+    z = r / precon
+    p = z.copy()
+    rz = np.vdot(r, z)
+    gnorm = np.linalg.norm(gradient)
+    if gnorm == 0.0:
+        return x, Hx, 0, 'converged'
+
+    status = 'max iterations'
+    for niter in range(1, max_iter + 1):
+        Hp = product(p)
+        pHp = np.vdot(p, Hp)
+
+        if pHp <= 0:
+            tau = _to_boundary(x, p, radius)
+            x += tau * p
+            Hx += tau * Hp
+            status = 'negative curvature'
+            break
+
+        alpha = rz / pHp
+        if np.linalg.norm(x + alpha * p) >= radius:
+            tau = _to_boundary(x, p, radius)
+            x += tau * p
+            Hx += tau * Hp
+            status = 'trust radius'
+            break
+
+        x += alpha * p
+        Hx += alpha * Hp
+        r -= alpha * Hp
+
+        rms = np.linalg.norm(r) / gnorm
+        if micro_print:
+            print('Micro Iteration %5d: Rel. RMS = %1.5e' % (niter, rms))
+        if rms < conv:
+            status = 'converged'
+            break
+
+        z = r / precon
+        rz_new = np.vdot(r, z)
+        p = z + (rz_new / rz) * p
+        rz = rz_new
+
+    return x, Hx, niter, status
+
+
+class SOSCF(object):
+    """
+    Trust region Newton steps from the Hessian objects of this module.
+
+    Examples
+    --------
+
+    soscf = SOSCF()
+    ... in the SCF loop, after building F and the energy of the orbitals C:
+    C = soscf.step(RHFHessian(jk, C, F, ndocc), SCF_E)
+    """
+
+    def __init__(self, radius=0.5, max_radius=2.0, min_radius=1.e-4, max_micro=10, micro_conv=1.e-3,
+                 micro_print=False):
+        """
+        Parameters
+        ----------
+        radius : float (default, 0.5)
+            Initial trust radius, the largest length of a rotation step.
+        max_radius, min_radius : float
+            Bounds of the trust radius.
+        max_micro : int (default, 10)
+            Maximum number of Hessian products per step.
+        micro_conv : float (default, 1.e-3)
+            Convergence of the Newton equations relative to the gradient.
+        micro_print : bool (default, False)
+            Print every micro iteration.
+        """
+
+        self.radius = radius
+        self.max_radius = max_radius
+        self.min_radius = min_radius
+        self.max_micro = max_micro
+        self.micro_conv = micro_conv
+        self.micro_print = micro_print
+        self.reset()
+
+    def reset(self):
+        """Forgets the previous step, e.g. after a conventional SCF update."""
+        self.last_hessian = None
+        self.last_energy = None
+        self.predicted = None
+        self.step_length = 0.0
+        self.niter = 0
+        self.status = ''
+        self.rejected = False
+
+    def _update_radius(self, energy):
+        """
+        Compares the energy change of the last step with the prediction.
+
+        Returns False, and shrinks the trust radius, if the step must be undone.
+        """
+        actual = energy - self.last_energy
+        if (abs(self.predicted) < 1.e-10) and (abs(actual) < 1.e-10):
+            return True
+
+        # A step is only kept if the model and the energy both went down
+        if (self.predicted >= 0) or (actual >= 0):
+            self.radius = max(0.25 * self.step_length, self.min_radius)
+            return False
+
+        ratio = actual / self.predicted
+        if ratio < 0.25:
+            self.radius = max(0.25 * self.step_length, self.min_radius)
+        elif (ratio > 0.75) and (self.step_length > 0.99 * self.radius):
+            self.radius = min(2 * self.radius, self.max_radius)
+        return True
+
+    def step(self, hessian, energy):
+        """
+        New orbitals from a trust region Newton step.
+
+        Parameters
+        ----------
+        hessian : RHFHessian, UHFHessian or ROHFHessian
+            Built from the current orbitals and Fock matrices.
+        energy : float
+            The SCF energy of the current orbitals.
+
+        Returns
+        -------
+        C : ndarray or tuple of ndarray
+            hessian.rotate() of the step. If the previous step raised the
+            energy it is undone and a shorter one taken from the previous orbitals.
+        """
+
+        self.rejected = False
+        if self.last_hessian is not None:
+            if not self._update_radius(energy):
+                hessian, energy = self.last_hessian, self.last_energy
+                self.rejected = True
+
+        x, Hx, self.niter, self.status = truncated_pcg(hessian.product, hessian.gradient, hessian.precon,
+                                                       self.radius, conv=self.micro_conv, max_iter=self.max_micro,
+                                                       micro_print=self.micro_print)
+
+        # Quadratic model of the energy change, E(x) - E(0) = -g.x + 1/2 x.H x
+        self.predicted = -np.vdot(hessian.gradient, x) + 0.5 * np.vdot(x, Hx)
+        self.step_length = np.linalg.norm(x)
+        self.last_hessian = hessian
+        self.last_energy = energy
+        return hessian.rotate(x)
+
+    def report(self):
+        """One line summary of the last step."""
+        ret = 'nmicro %d, %s, radius %1.2e' % (self.niter, self.status, self.radius)
+        if self.rejected:
+            ret += ', previous step rejected'
+        return ret
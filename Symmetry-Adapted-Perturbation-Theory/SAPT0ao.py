@@ -26,6 +26,9 @@ psi4.core.set_output_file('output.dat', False)
 
 numpy_memory = 2
 
+# J/K backend: 'psi4' (psi4.core.JK) or 'numpy_df' (density fitting in NumPy, helper_JK.DFJK)
+jk_type = 'numpy_df'
+
 # Set molecule to dimer
 dimer = psi4.geometry("""
 O   -0.066999140   0.000000000   1.494354740
@@ -42,7 +45,7 @@ psi4.set_options({'basis': 'jun-cc-pVDZ',
                   'e_convergence': 1e-8,
                   'd_convergence': 1e-8})
 
-sapt = helper_SAPT(dimer, memory=8, algorithm='AO')
+sapt = helper_SAPT(dimer, memory=8, algorithm='AO', jk_type=jk_type)
 
 # Build intermediates
 int_timer = sapt_timer('intermediates')
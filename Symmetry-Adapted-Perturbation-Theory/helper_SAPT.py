@@ -17,15 +17,23 @@ import numpy as np
 import time
 import psi4
 
+# NumPy density-fitted J/K builder of the SCF helpers
+import os.path
+import sys
+dirname = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(dirname, '../Self-Consistent-Field'))
+from helper_JK import DFJK
+
 class helper_SAPT(object):
 
-    def __init__(self, dimer, memory=8, algorithm='MO', reference='RHF'):
+    def __init__(self, dimer, memory=8, algorithm='MO', reference='RHF', jk_type='psi4'):
         print("\nInitializing SAPT object...\n")
         tinit_start = time.time()
 
         # Set a few crucial attributes
         self.alg = algorithm.upper()
         self.reference = reference.upper()
+        self.jk_type = jk_type.lower()
         dimer.reset_point_group('c1')
         dimer.fix_orientation(True)
         dimer.fix_com(True)
@@ -182,9 +190,12 @@ class helper_SAPT(object):
                                             "JKFIT", psi4.core.get_global_option('BASIS'),
                                             puream=self.dimer_wfn.basisset().has_puream())
 
-            self.jk = psi4.core.JK.build(self.dimer_wfn.basisset(), aux_basis)
-            self.jk.set_memory(int(memory * 1e9))
-            self.jk.initialize()
+            if self.jk_type == 'numpy_df':
+                self.jk = DFJK.build(self.dimer_wfn.basisset(), self.mints, aux=aux_basis, memory=memory)
+            else:
+                self.jk = psi4.core.JK.build(self.dimer_wfn.basisset(), aux_basis)
+                self.jk.set_memory(int(memory * 1e9))
+                self.jk.initialize()
             print("\n...initialized JK objects in %5.2f seconds." % (time.time() - tstart))
 
         print("\n...finished initializing SAPT object in %5.2f seconds." % (time.time() - tinit_start))
@@ -368,6 +379,8 @@ class helper_SAPT(object):
 
         zero_append = []
         num_compute = 0
+        Cl_list = []
+        Cr_list = []
 
         for num in range(len(Cleft)):
             Cl = Cleft[num]
@@ -389,22 +402,26 @@ class helper_SAPT(object):
                 else:
                     Cr = np.dot(Cr, tensor[num].T)
 
-            Cl = psi4.core.Matrix.from_array(Cl)
-            Cr = psi4.core.Matrix.from_array(Cr)
-
-            self.jk.C_left_add(Cl)
-            self.jk.C_right_add(Cr)
+            Cl_list.append(Cl)
+            Cr_list.append(Cr)
             num_compute += 1
-        
-        self.jk.compute() 
 
-        J_list = []
-        K_list = []
-        for num in range(num_compute):
-            J_list.append(np.array(self.jk.J()[num])) 
-            K_list.append(np.array(self.jk.K()[num])) 
+        if isinstance(self.jk, DFJK):
+            J_list, K_list = self.jk.compute(Cl_list, Cr_list)
+        else:
+            for Cl, Cr in zip(Cl_list, Cr_list):
+                self.jk.C_left_add(psi4.core.Matrix.from_array(Cl))
+                self.jk.C_right_add(psi4.core.Matrix.from_array(Cr))
+
+            self.jk.compute()
+
+            J_list = []
+            K_list = []
+            for num in range(num_compute):
+                J_list.append(np.array(self.jk.J()[num]))
+                K_list.append(np.array(self.jk.K()[num]))
 
-        self.jk.C_clear()
+            self.jk.C_clear()
 
         z = np.zeros((self.nmo, self.nmo))
         for num in zero_append:
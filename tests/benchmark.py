@@ -0,0 +1,570 @@
+"""
+Timing and memory benchmarks of the reference implementations.
+
+Every benchmark runs in a fresh Python process. For each one the harness
+records the wall time, the peak resident set size and the phase timings
+(integrals, transformation, iterations, ...) to a JSON file.
+
+Two kinds of benchmarks exist:
+- Helper benchmarks (SCF, DF-MP2, CCSD, CPHF, SAPT0 electrostatics) call the
+  helper classes directly on generated water clusters and n-alkanes, in any
+  set of basis sets, so the cost can be followed as the system grows.
+- Script benchmarks run the reference scripts unchanged, like the tests do,
+  and read their phases from the "... %.3f seconds" lines they print.
+
+A run can be compared against an earlier JSON file, and benchmarks whose
+wall time, a phase or the peak memory grew by more than a tolerance are
+flagged. The exit code is then 1, so the harness can gate CI jobs.
+
+Examples
+--------
+
+$ python tests/benchmark.py --cases scf,mp2 --molecules water:1,2,4 --basis cc-pvdz -o base.json
+$ python tests/benchmark.py --cases scf,mp2 --molecules water:1,2,4 --basis cc-pvdz --baseline base.json
+$ python tests/benchmark.py --scripts all --no-helpers -o scripts.json
+"""
+
+__authors__ = "The Psi4NumPy Developers"
+__credits__ = ["The Psi4NumPy Developers"]
+
+__copyright__ = "(c) 2014-2018, The Psi4NumPy Developers"
+__license__ = "BSD-3-Clause"
+__date__ = "2026-10-18"
+
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import subprocess
+import tempfile
+from collections import OrderedDict
+
+import numpy as np
+
+base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Marks the result line a worker process prints
+RESULT_TAG = 'BENCHMARK_RESULT '
+
+# Reference scripts of --scripts, relative to the repository root
+SCRIPTS = OrderedDict([
+    ('RHF', 'Self-Consistent-Field/RHF.py'),
+    ('UHF_libJK', 'Self-Consistent-Field/UHF_libJK.py'),
+    ('SORHF_iterative', 'Self-Consistent-Field/SORHF_iterative.py'),
+    ('MP2', 'Moller-Plesset/MP2.py'),
+    ('DF-MP2', 'Moller-Plesset/DF-MP2.py'),
+    ('CCSD', 'Coupled-Cluster/Spin_Orbitals/CCSD/CCSD.py'),
+    ('CCSD_T', 'Coupled-Cluster/RHF/CCSD_T.py'),
+    ('CIS', 'Configuration-Interaction/CIS.py'),
+    ('CISD', 'Configuration-Interaction/CISD.py'),
+    ('SAPT0', 'Symmetry-Adapted-Perturbation-Theory/SAPT0.py'),
+    ('SAPT0ao', 'Symmetry-Adapted-Perturbation-Theory/SAPT0ao.py'),
+    ('CPHF', 'Response-Theory/Self-Consistent-Field/CPHF.py'),
+    ('TDHF', 'Response-Theory/Self-Consistent-Field/TDHF.py'),
+    ('CC_polar', 'Response-Theory/Coupled-Cluster/RHF/polar.py'),
+])
+
+
+### Test molecules
+
+def water_cluster(n, spacing=2.9):
+    """
+    Returns the Cartesian atoms of n water molecules placed on a cubic grid.
+
+    Parameters
+    ----------
+    n : int
+        Number of water molecules.
+    spacing : float, optional
+        Distance between neighbouring oxygens in Angstrom.
+
+    Returns
+    -------
+    fragments : list of list of (str, ndarray)
+        One list of (symbol, xyz) per water molecule.
+    """
+
+    side = int(np.ceil(n**(1.0 / 3) - 1.e-8))
+    monomer = [('O', np.array([0.0, 0.0, 0.0])),
+               ('H', np.array([0.7572, 0.5865, 0.0])),
+               ('H', np.array([-0.7572, 0.5865, 0.0]))]
+
+    fragments = []
+    for w in range(n):
+        shift = spacing * np.array([w % side, (w // side) % side, w // side**2], dtype=float)
+        fragments.append([(sym, xyz + shift) for sym, xyz in monomer])
+    return fragments
+
+
+def alkane(n, r_cc=1.54, r_ch=1.09):
+    """
+    Returns the Cartesian atoms of the all-trans n-alkane C_nH_(2n+2).
+
+    The carbons zigzag in the xy plane with tetrahedral angles, two hydrogens
+    of each CH2 point above and below the plane, and the terminal hydrogens
+    continue the zigzag. n=1 gives methane.
+
+    Returns
+    -------
+    fragments : list of list of (str, ndarray)
+        A single fragment holding all atoms.
+    """
+
+    half = np.arccos(-1.0 / 3) / 2
+    z = np.array([0.0, 0.0, 1.0])
+
+    def carbon(k):
+        return np.array([k * r_cc * np.sin(half), (k % 2) * r_cc * np.cos(half), 0.0])
+
+    atoms = []
+    for k in range(n):
+        C = carbon(k)
+        atoms.append(('C', C))
+
+        # Bond directions to both chain neighbours, real or not
+        u = [(carbon(j) - C) / r_cc for j in [k - 1, k + 1]]
+        away = -(u[0] + u[1])
+        away /= np.linalg.norm(away)
+        for sign in [1, -1]:
+            atoms.append(('H', C + r_ch * (np.cos(half) * away + sign * np.sin(half) * z)))
+        if k == 0:
+            atoms.append(('H', C + r_ch * u[0]))
+        if k == n - 1:
+            atoms.append(('H', C + r_ch * u[1]))
+    return [atoms]
+
+
+MOLECULES = {'water': water_cluster, 'alkane': alkane}
+
+
+def geometry_string(fragments, nfragments=1):
+    """
+    Builds a psi4 geometry string, splitting the fragments into nfragments
+    groups separated by "--" (nfragments=2 gives the dimer of SAPT).
+    """
+
+    if nfragments > len(fragments):
+        raise Exception("Cannot split %d fragments into %d groups." % (len(fragments), nfragments))
+
+    groups = np.array_split(np.arange(len(fragments)), nfragments)
+    blocks = []
+    for group in groups:
+        lines = ['0 1'] if nfragments > 1 else []
+        for f in group:
+            for sym, xyz in fragments[f]:
+                lines.append('%-2s % 14.8f % 14.8f % 14.8f' % (sym, xyz[0], xyz[1], xyz[2]))
+        blocks.append('\n'.join(lines))
+    return '\n--\n'.join(blocks) + '\nsymmetry c1\nno_reorient\nno_com\n'
+
+
+### Helper benchmarks
+
+class PhaseTimer(object):
+    """Accumulates named phase timings in seconds."""
+
+    def __init__(self):
+        self.phases = OrderedDict()
+
+    def add(self, name, seconds):
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def phase(self, name):
+        timer = self
+
+        class _Phase(object):
+            def __enter__(self):
+                self.start = time.time()
+
+            def __exit__(self, *args):
+                timer.add(name, time.time() - self.start)
+
+        return _Phase()
+
+
+def _import_from(directory):
+    path = os.path.join(base_dir, directory)
+    if path not in sys.path:
+        sys.path.append(path)
+
+
+def bench_scf(psi4, geometry, basis, timer, memory, jk_type='psi4'):
+    _import_from('Self-Consistent-Field')
+    from helper_SCF import SCFEngine
+
+    mol = psi4.geometry(geometry)
+    engine = SCFEngine(basis=basis, reference='RHF', jk_type=jk_type, scf_type='DF', memory=memory, print_level=0)
+    energy = engine.compute_energy(mol)
+    timer.add('integrals', engine.timings['setup'])
+    timer.add('iterations', engine.timings['iterations'])
+    return energy
+
+
+def bench_scf_numpy_df(psi4, geometry, basis, timer, memory):
+    return bench_scf(psi4, geometry, basis, timer, memory, jk_type='numpy_df')
+
+
+def bench_mp2(psi4, geometry, basis, timer, memory):
+    _import_from('Moller-Plesset')
+    from helper_DFMP2 import df_mp2_energy
+
+    mol = psi4.geometry(geometry)
+    with timer.phase('scf'):
+        scf_e, wfn = psi4.energy('SCF', return_wfn=True, molecule=mol)
+
+    ndocc = wfn.nalpha()
+    nvirt = wfn.nmo() - ndocc
+    with timer.phase('transformation'):
+        aux = psi4.core.BasisSet.build(mol, "DF_BASIS_MP2", "", "RIFIT", basis)
+        df = psi4.core.DFTensor(wfn.basisset(), aux, wfn.Ca(), ndocc, nvirt)
+        Qov = np.asarray(df.Qov())
+
+    with timer.phase('energy'):
+        eps_occ = np.asarray(wfn.epsilon_a_subset("AO", "ACTIVE_OCC"))
+        eps_vir = np.asarray(wfn.epsilon_a_subset("AO", "ACTIVE_VIR"))
+        MP2corr_OS, MP2corr_SS, stats = df_mp2_energy(Qov, eps_occ, eps_vir, memory=memory)
+    return scf_e + MP2corr_OS + MP2corr_SS
+
+
+def bench_ccsd(psi4, geometry, basis, timer, memory):
+    _import_from('Coupled-Cluster/RHF')
+    from helper_ccenergy import HelperCCEnergy
+
+    mol = psi4.geometry(geometry)
+    with timer.phase('scf'):
+        scf_e, wfn = psi4.energy('SCF', return_wfn=True, molecule=mol)
+    with timer.phase('transformation'):
+        ccsd = HelperCCEnergy(mol, scf_e, wfn, memory=memory)
+    with timer.phase('iterations'):
+        ccsd.compute_energy()
+    return ccsd.ccsd_e
+
+
+def bench_cphf(psi4, geometry, basis, timer, memory):
+    _import_from('Response-Theory/Self-Consistent-Field')
+    from helper_CPHF import helper_CPHF
+
+    mol = psi4.geometry(geometry)
+    with timer.phase('scf'):
+        cphf = helper_CPHF(mol, numpy_memory=memory)
+    with timer.phase('iterations'):
+        cphf.run(method='iterative')
+    return np.trace(cphf.polar) / 3
+
+
+def bench_sapt(psi4, geometry, basis, timer, memory):
+    _import_from('Symmetry-Adapted-Perturbation-Theory')
+    from helper_SAPT import helper_SAPT
+
+    dimer = psi4.geometry(geometry)
+    with timer.phase('scf_transformation'):
+        sapt = helper_SAPT(dimer, memory=memory)
+    with timer.phase('electrostatics'):
+        Elst10 = 4 * np.einsum('abab', sapt.vt('abab'))
+    return Elst10
+
+
+# name: (function, number of fragments)
+CASES = OrderedDict([
+    ('scf', (bench_scf, 1)),
+    ('scf_numpy_df', (bench_scf_numpy_df, 1)),
+    ('mp2', (bench_mp2, 1)),
+    ('ccsd', (bench_ccsd, 1)),
+    ('cphf', (bench_cphf, 1)),
+    ('sapt', (bench_sapt, 2)),
+])
+
+
+def run_worker(case, molecule, size, basis, memory):
+    """Runs one helper benchmark in this process and prints its result line."""
+
+    import psi4
+    psi4.set_memory('%d MB' % int(memory * 1000))
+    psi4.core.set_output_file('output.dat', False)
+    psi4.set_options({'basis': basis, 'scf_type': 'df', 'e_convergence': 1e-8, 'd_convergence': 1e-8})
+
+    func, nfragments = CASES[case]
+    geometry = geometry_string(MOLECULES[molecule](size), nfragments)
+    timer = PhaseTimer()
+    value = func(psi4, geometry, basis, timer, memory)
+    print(RESULT_TAG + json.dumps({'value': float(value), 'phases': timer.phases}))
+
+
+### Process management
+
+def _peak_rss_mb(rusage):
+    # ru_maxrss is in kB on Linux and in bytes on macOS
+    scale = 1.e-6 if sys.platform == 'darwin' else 1.e-3
+    return rusage.ru_maxrss * scale
+
+
+def run_process(command, cwd, timeout=None):
+    """
+    Runs command and returns its output, exit code, wall time, peak RSS (MB)
+    and whether it was killed after timeout seconds.
+
+    The child is reaped with os.wait4 so its own peak RSS is reported, and
+    not the maximum over all children of the harness.
+    """
+
+    with tempfile.TemporaryFile(mode='w+') as out:
+        start = time.time()
+        proc = subprocess.Popen(command, cwd=cwd, stdout=out, stderr=subprocess.STDOUT)
+        peak = None
+        timed_out = False
+        if hasattr(os, 'wait4'):
+            while True:
+                pid, status, rusage = os.wait4(proc.pid, os.WNOHANG)
+                if pid:
+                    break
+                if (timeout is not None) and (time.time() - start > timeout):
+                    proc.kill()
+                    pid, status, rusage = os.wait4(proc.pid, 0)
+                    timed_out = True
+                    break
+                time.sleep(0.01)
+            wall = time.time() - start
+            proc.returncode = os.WEXITSTATUS(status) if os.WIFEXITED(status) else -1
+            peak = _peak_rss_mb(rusage)
+        else:
+            try:
+                proc.wait(timeout)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+                proc.wait()
+                timed_out = True
+            wall = time.time() - start
+        out.seek(0)
+        return out.read(), proc.returncode, wall, peak, timed_out
+
+
+def parse_script_phases(output):
+    """
+    Collects the phase timings scripts print as "... <label> ... %.3f seconds".
+
+    Returns an OrderedDict of label: seconds, summing repeated labels.
+    """
+
+    phases = OrderedDict()
+    for line in output.splitlines():
+        match = re.search(r'(-?[0-9]*\.[0-9]+)\s+seconds', line)
+        if match is None:
+            continue
+        label = line[:match.start()]
+        label = re.sub(r'Total time (taken )?(for)?|took a total of|\bin\b|\.\.\.|:', ' ', label)
+        label = ' '.join(label.split())
+        if label:
+            phases[label] = phases.get(label, 0.0) + float(match.group(1))
+    return phases
+
+
+def benchmark_helper(case, molecule, size, basis, memory, repeat=1, timeout=None):
+    name = '%s/%s-%d/%s' % (case, molecule, size, basis)
+    command = [sys.executable, os.path.abspath(__file__), '--worker', case, molecule, str(size), basis,
+               '--memory', str(memory)]
+    return _benchmark(name, command, repeat, timeout, worker=True)
+
+
+def benchmark_script(name, repeat=1, timeout=None):
+    script = os.path.join(base_dir, SCRIPTS[name])
+    return _benchmark('script/' + name, [sys.executable, script], repeat, timeout, worker=False)
+
+
+def _benchmark(name, command, repeat, timeout, worker):
+    """Runs command repeat times in a scratch directory, keeping the fastest run."""
+
+    best = None
+    for r in range(repeat):
+        cwd = tempfile.mkdtemp(prefix='p4n_bench_')
+        try:
+            output, code, wall, peak, timed_out = run_process(command, cwd, timeout)
+        finally:
+            shutil.rmtree(cwd, ignore_errors=True)
+        result = OrderedDict([('name', name), ('status', 'ok' if code == 0 else 'failed'), ('wall', wall),
+                              ('peak_rss_mb', peak), ('phases', OrderedDict()), ('value', None)])
+        if timed_out:
+            result['status'] = 'failed'
+            result['error'] = 'timeout'
+            return result
+        if code != 0:
+            result['error'] = '\n'.join(output.splitlines()[-20:])
+            return result
+
+        if worker:
+            lines = [l for l in output.splitlines() if l.startswith(RESULT_TAG)]
+            if len(lines) == 0:
+                # The worker exited cleanly without reporting a result
+                result['status'] = 'failed'
+                result['error'] = '\n'.join(output.splitlines()[-20:])
+                return result
+            data = json.loads(lines[-1][len(RESULT_TAG):], object_pairs_hook=OrderedDict)
+            result['phases'] = data['phases']
+            result['value'] = data['value']
+        else:
+            result['phases'] = parse_script_phases(output)
+
+        if (best is None) or (wall < best['wall']):
+            best = result
+    return best
+
+
+### Baseline comparison
+
+def compare_results(results, baseline, tolerance=0.2, memory_tolerance=0.2, min_seconds=0.5, value_tol=1.e-6):
+    """
+    Compares results against the results of a baseline run.
+
+    Parameters
+    ----------
+    results, baseline : list of dict
+        Benchmark results, matched by name.
+    tolerance : float, optional
+        Allowed relative increase of the wall time and of each phase.
+    memory_tolerance : float, optional
+        Allowed relative increase of the peak RSS.
+    min_seconds : float, optional
+        Timings below this in both runs are too noisy to be compared.
+    value_tol : float, optional
+        Allowed change of the computed value (energy, polarizability, ...).
+
+    Returns
+    -------
+    flags : list of str
+        One message per regression; empty if there is none.
+    """
+
+    old = dict((r['name'], r) for r in baseline)
+    flags = []
+
+    def check_time(label, new_t, old_t):
+        if (new_t is None) or (old_t is None) or (max(new_t, old_t) < min_seconds):
+            return
+        if new_t > old_t * (1 + tolerance):
+            flags.append('%s: %s slowed down from %.3f s to %.3f s (x%.2f)' %
+                         (r['name'], label, old_t, new_t, new_t / max(old_t, 1.e-12)))
+
+    for r in results:
+        b = old.get(r['name'])
+        if b is None:
+            continue
+        if r['status'] != 'ok':
+            if b['status'] == 'ok':
+                flags.append('%s: failed, baseline succeeded' % r['name'])
+            continue
+        if b['status'] != 'ok':
+            continue
+
+        check_time('wall time', r['wall'], b['wall'])
+        for phase, seconds in r['phases'].items():
+            check_time('phase "%s"' % phase, seconds, b['phases'].get(phase))
+
+        if (r['peak_rss_mb'] is not None) and (b['peak_rss_mb'] is not None):
+            if r['peak_rss_mb'] > b['peak_rss_mb'] * (1 + memory_tolerance):
+                flags.append('%s: peak RSS grew from %.1f MB to %.1f MB' %
+                             (r['name'], b['peak_rss_mb'], r['peak_rss_mb']))
+
+        if (r['value'] is not None) and (b['value'] is not None):
+            if abs(r['value'] - b['value']) > value_tol:
+                flags.append('%s: value changed from %.10f to %.10f' % (r['name'], b['value'], r['value']))
+
+    return flags
+
+
+def machine_info():
+    info = OrderedDict([('platform', platform.platform()), ('python', platform.python_version()),
+                        ('numpy', np.__version__), ('nproc', os.cpu_count())])
+    try:
+        import psi4
+        info['psi4'] = psi4.__version__
+    except ImportError:
+        info['psi4'] = None
+    return info
+
+
+def _parse_molecules(spec):
+    """Parses "water:1,2,4 alkane:1,2" into [('water', 1), ('water', 2), ...]."""
+    molecules = []
+    for item in spec.split():
+        name, sizes = item.split(':')
+        if name not in MOLECULES:
+            raise Exception("Molecule family %s is not understood." % name)
+        molecules.extend((name, int(n)) for n in sizes.split(','))
+    return molecules
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Timing and memory benchmarks of the Psi4NumPy reference code.')
+    parser.add_argument('--cases', default=','.join(CASES), help='Helper benchmarks, from: %s' % ', '.join(CASES))
+    parser.add_argument('--molecules', default='water:1,2 alkane:1,2',
+                        help='Molecule families and sizes, e.g. "water:1,2,4 alkane:1,3"')
+    parser.add_argument('--basis', default='sto-3g,cc-pvdz', help='Comma separated basis sets')
+    parser.add_argument('--scripts', default='', help='Reference scripts to run, "all" or from: %s' % ', '.join(SCRIPTS))
+    parser.add_argument('--no-helpers', action='store_true', help='Only run the reference scripts')
+    parser.add_argument('--memory', type=float, default=2, help='Memory in GB of each benchmark')
+    parser.add_argument('--repeat', type=int, default=1, help='Runs per benchmark, the fastest is kept')
+    parser.add_argument('--timeout', type=float, default=None, help='Seconds before a benchmark is killed')
+    parser.add_argument('-o', '--output', default='benchmark.json', help='JSON file of the results')
+    parser.add_argument('--baseline', default=None, help='JSON file of an earlier run to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed relative slowdown')
+    parser.add_argument('--memory-tolerance', type=float, default=0.2, help='Allowed relative peak RSS growth')
+    parser.add_argument('--worker', nargs=4, metavar=('CASE', 'MOLECULE', 'SIZE', 'BASIS'), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        case, molecule, size, basis = args.worker
+        run_worker(case, molecule, int(size), basis, args.memory)
+        return 0
+
+    jobs = []
+    if not args.no_helpers:
+        cases = [c for c in args.cases.split(',') if c]
+        for case in cases:
+            if case not in CASES:
+                raise Exception("Benchmark case %s is not understood." % case)
+        for case in cases:
+            for molecule, size in _parse_molecules(args.molecules):
+                if size < CASES[case][1]:
+                    continue
+                for basis in args.basis.split(','):
+                    jobs.append((benchmark_helper, (case, molecule, size, basis, args.memory)))
+
+    scripts = list(SCRIPTS) if args.scripts == 'all' else [s for s in args.scripts.split(',') if s]
+    for name in scripts:
+        if name not in SCRIPTS:
+            raise Exception("Script %s is not understood." % name)
+        jobs.append((benchmark_script, (name,)))
+
+    results = []
+    for func, job_args in jobs:
+        result = func(*job_args, repeat=args.repeat, timeout=args.timeout)
+        results.append(result)
+        rss = ('%8.1f MB' % result['peak_rss_mb']) if result['peak_rss_mb'] is not None else '     n/a'
+        print('%-40s %-6s %10.3f s %s' % (result['name'], result['status'], result['wall'], rss))
+        for phase, seconds in result['phases'].items():
+            print('    %-36s %10.3f s' % (phase, seconds))
+
+    report = OrderedDict([('date', time.strftime('%Y-%m-%d %H:%M:%S')), ('machine', machine_info()),
+                          ('results', results)])
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print('\nResults written to %s' % args.output)
+
+    failed = [r['name'] for r in results if r['status'] != 'ok']
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        flags = compare_results(results, baseline, args.tolerance, args.memory_tolerance)
+        if flags:
+            print('\nRegressions against %s:' % args.baseline)
+            for flag in flags:
+                print('    ' + flag)
+            return 1
+        print('\nNo regressions against %s.' % args.baseline)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
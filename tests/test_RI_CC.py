@@ -17,9 +17,93 @@ def test_CCSD_T(workspace):
     exe_py(workspace, tdir+"/Spin_Orbitals/CCSD", 'CCSD_T')
 
 
+def test_RHF_CCSD_T(workspace):
+    exe_py(workspace, tdir+'/RHF', 'CCSD_T')
+
+
 def test_EOM_CCSD(workspace):
     exe_py(workspace, tdir+'/RHF','EOM_CCSD')
 
 
 #def test_TD_CCSD(workspace):
 #    exe_py(workspace, tdir, 'TD-CCSD')
+
+
+def test_blocked_triples():
+    import sys
+    import numpy as np
+    import psi4
+    sys.path.insert(0, os.path.join(base_dir, tdir, 'Spin_Orbitals', 'CCSD'))
+    from helper_triples import compute_triples_energy, compute_triples_energy_noddy
+
+    psi4.geometry("""
+    O
+    H 1 1.1
+    H 1 1.1 2 104
+    symmetry c1
+    """)
+    psi4.set_options({'basis': '6-31g', 'scf_type': 'pk'})
+    scf_e, wfn = psi4.energy('SCF', return_wfn=True)
+    mints = psi4.core.MintsHelper(wfn.basisset())
+    MO = np.asarray(mints.mo_spin_eri(wfn.Ca(), wfn.Ca()))
+    eps = np.repeat(np.asarray(wfn.epsilon_a()), 2)
+    nocc = 2 * wfn.doccpi()[0]
+    o, v = slice(0, nocc), slice(nocc, MO.shape[0])
+    Focc, Fvir = eps[o], eps[v]
+
+    # MP2 doubles and arbitrary singles; the two algorithms agree for any amplitudes
+    t2 = MO[o, o, v, v] / (Focc.reshape(-1, 1, 1, 1) + Focc.reshape(-1, 1, 1) - Fvir.reshape(-1, 1) - Fvir)
+    t1 = 0.01 * np.random.RandomState(0).rand(nocc, MO.shape[0] - nocc)
+    ints = (MO[v, o, v, v], MO[o, v, o, o], MO[o, o, v, v])
+
+    E_noddy = compute_triples_energy_noddy(t1, t2, *ints, Focc, Fvir)
+    E_blocked, stats = compute_triples_energy(t1, t2, *ints, Focc, Fvir)
+    assert psi4.compare_values(E_noddy, E_blocked, 10, 'Blocked (T)')
+    E_pool, stats = compute_triples_energy(t1, t2, *ints, Focc, Fvir, nproc=2)
+    assert psi4.compare_values(E_noddy, E_pool, 10, 'Blocked (T), process pool')
+
+
+def test_RHF_triples():
+    import sys
+    import numpy as np
+    import psi4
+    sys.path.insert(0, os.path.join(base_dir, tdir, 'Spin_Orbitals', 'CCSD'))
+    sys.path.insert(0, os.path.join(base_dir, tdir, 'RHF'))
+    import helper_cctriples
+    import helper_triples
+
+    psi4.geometry("""
+    O
+    H 1 1.1
+    H 1 1.1 2 104
+    symmetry c1
+    """)
+    psi4.set_options({'basis': '6-31g', 'scf_type': 'pk'})
+    scf_e, wfn = psi4.energy('SCF', return_wfn=True)
+    mints = psi4.core.MintsHelper(wfn.basisset())
+    C = wfn.Ca()
+    eps = np.asarray(wfn.epsilon_a())
+    nocc = wfn.doccpi()[0]
+
+    # Closed-shell amplitudes: MP2 doubles and arbitrary singles
+    MO = np.asarray(mints.mo_eri(C, C, C, C)).swapaxes(1, 2)
+    o, v = slice(0, nocc), slice(nocc, MO.shape[0])
+    Focc, Fvir = eps[o], eps[v]
+    t2 = MO[o, o, v, v] / (Focc.reshape(-1, 1, 1, 1) + Focc.reshape(-1, 1, 1) - Fvir.reshape(-1, 1) - Fvir)
+    t1 = 0.01 * np.random.RandomState(0).rand(nocc, MO.shape[0] - nocc)
+    ints = (MO[v, v, v, o], MO[v, o, o, o], MO[o, o, v, v])
+
+    # The same amplitudes in spin orbitals, alpha and beta interleaved
+    MO_so = np.asarray(mints.mo_spin_eri(C, C))
+    o_so, v_so = slice(0, 2 * nocc), slice(2 * nocc, MO_so.shape[0])
+    Focc_so, Fvir_so = np.repeat(Focc, 2), np.repeat(Fvir, 2)
+    t2_so = MO_so[o_so, o_so, v_so, v_so] / (Focc_so.reshape(-1, 1, 1, 1) + Focc_so.reshape(-1, 1, 1) -
+                                             Fvir_so.reshape(-1, 1) - Fvir_so)
+    t1_so = np.kron(t1, np.eye(2))
+    ints_so = (MO_so[v_so, o_so, v_so, v_so], MO_so[o_so, v_so, o_so, o_so], MO_so[o_so, o_so, v_so, v_so])
+
+    E_so = helper_triples.compute_triples_energy_noddy(t1_so, t2_so, *ints_so, Focc_so, Fvir_so)
+    E_rhf, stats = helper_cctriples.compute_triples_energy(t1, t2, *ints, Focc, Fvir)
+    assert psi4.compare_values(E_so, E_rhf, 10, 'Closed-shell (T)')
+    E_pool, stats = helper_cctriples.compute_triples_energy(t1, t2, *ints, Focc, Fvir, nproc=2, block_size=3)
+    assert psi4.compare_values(E_so, E_pool, 10, 'Closed-shell (T), process pool')
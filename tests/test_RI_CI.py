@@ -21,3 +21,47 @@ def test_CIS(workspace):
 @using_scipy
 def test_FCI(workspace):
     exe_py(workspace, tdir, 'FCI')
+
+
+def test_CIS_davidson():
+    import sys
+    import numpy as np
+    import psi4
+    sys.path.insert(0, os.path.join(base_dir, tdir))
+    sys.path.insert(0, os.path.join(base_dir, 'Response-Theory', 'Self-Consistent-Field'))
+    from helper_CI import Determinant, HamiltonianGenerator
+    from helper_CPHF import helper_CPHF
+
+    mol = psi4.geometry("""
+    O
+    H 1 1.1
+    H 1 1.1 2 104
+    symmetry c1
+    """)
+    psi4.set_options({'basis': 'sto-3g', 'scf_type': 'pk', 'e_convergence': 1e-10, 'd_convergence': 1e-10})
+    scf_e, wfn = psi4.energy('SCF', return_wfn=True)
+
+    # Spin-orbital CIS in the determinant basis, as CIS.py did before the Davidson solver
+    C = wfn.Ca()
+    ndocc = wfn.doccpi()[0]
+    nmo = wfn.nmo()
+    mints = psi4.core.MintsHelper(wfn.basisset())
+    MO = np.asarray(mints.mo_spin_eri(C, C))
+    H = np.asarray(mints.ao_kinetic()) + np.asarray(mints.ao_potential())
+    H = np.einsum('uj,vi,uv', C, C, H)
+    H = np.repeat(np.repeat(H, 2, axis=0), 2, axis=1)
+    spin_ind = np.arange(H.shape[0]) % 2
+    H *= (spin_ind.reshape(-1, 1) == spin_ind)
+
+    occList = [i for i in range(ndocc)]
+    det_ref = Determinant(alphaObtList=occList, betaObtList=occList)
+    detList = det_ref.generateSingleExcitationsOfDet(nmo)
+    detList.append(det_ref)
+    e_det = np.linalg.eigvalsh(HamiltonianGenerator(H, MO).generateMatrix(detList))
+    e_det = e_det[1:] + mol.nuclear_repulsion_energy() - scf_e
+
+    # The M_s = 0 determinants hold the singlets and the triplets
+    helper = helper_CPHF(mol, scf_wfn=wfn)
+    for triplet in (False, True):
+        for excit_e in helper.solve_excitations(3, tda=True, triplet=triplet, conv=1.e-8):
+            assert np.abs(e_det - excit_e).min() < 1.e-6
@@ -38,3 +38,53 @@ def test_MP2_Gradient(workspace):
 
 def test_MP2_Hessian(workspace):
     exe_py(workspace, tdir, 'MP2_Hessian')
+
+
+def test_helper_DFMP2():
+    import sys
+    import numpy as np
+    import psi4
+    sys.path.insert(0, os.path.join(base_dir, tdir))
+    from helper_DFMP2 import df_mp2_energy, df_mp2_energy_parallel
+    from helper_DFMP2 import DFTensorStore, aux_atom_blocks, transform_to_store
+
+    mol = psi4.geometry("""
+    O
+    H 1 1.1
+    H 1 1.1 2 104
+    symmetry c1
+    """)
+    psi4.set_options({'basis': 'cc-pvdz', 'scf_type': 'df', 'e_convergence': 1e-10, 'd_convergence': 1e-10})
+    RHF_E, wfn = psi4.energy('SCF', return_wfn=True)
+    ndocc = wfn.doccpi()[0]
+    nvirt = wfn.nmo() - ndocc
+    eps = np.asarray(wfn.epsilon_a())
+    eps_occ, eps_vir = eps[:ndocc], eps[ndocc:]
+    aux = psi4.core.BasisSet.build(mol, "DF_BASIS_MP2", "", "RIFIT", "cc-pvdz")
+    Qov = np.asarray(psi4.core.DFTensor(wfn.basisset(), aux, wfn.Ca(), ndocc, nvirt).Qov())
+
+    # Reference from the full (ia|jb) tensor
+    iajb = np.einsum('Qia,Qjb->iajb', Qov, Qov)
+    denom = 1.0 / (eps_occ.reshape(-1, 1, 1, 1) - eps_vir.reshape(-1, 1, 1) + eps_occ.reshape(-1, 1) - eps_vir)
+    E_OS = np.einsum('iajb,iajb,iajb->', iajb, iajb, denom)
+    E_SS = np.einsum('iajb,iajb,iajb->', iajb, iajb - iajb.swapaxes(1, 3), denom)
+
+    # Several occupied blocks, in core, in parallel and from disk
+    OS, SS, stats = df_mp2_energy(Qov, eps_occ, eps_vir, block_size=2)
+    assert np.allclose([OS, SS], [E_OS, E_SS], atol=1.e-10)
+    OS, SS, stats = df_mp2_energy_parallel(Qov, eps_occ, eps_vir, nproc=2, block_size=2)
+    assert np.allclose([OS, SS], [E_OS, E_SS], atol=1.e-10)
+
+    mints = psi4.core.MintsHelper(wfn.basisset())
+    zero_bas = psi4.core.BasisSet.zero_ao_basis_set()
+    metric = mints.ao_eri(zero_bas, aux, zero_bas, aux)
+    metric.power(-0.5, 1.e-14)
+    C = np.asarray(wfn.Ca())
+    store = DFTensorStore(aux.nbf(), ndocc, nvirt)
+    Ppq = aux_atom_blocks(mol, wfn.basisset(), "DF_BASIS_MP2", "", "RIFIT", "cc-pvdz")
+    transform_to_store(Ppq, C[:, :ndocc], C[:, ndocc:], store, metric=np.squeeze(metric))
+    try:
+        OS, SS, stats = df_mp2_energy(store, eps_occ, eps_vir, block_size=2)
+    finally:
+        store.close()
+    assert np.allclose([OS, SS], [E_OS, E_SS], atol=1.e-8)
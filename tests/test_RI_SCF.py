@@ -41,6 +41,10 @@ def test_ROHF_libJK(workspace):
     exe_py(workspace, tdir, 'ROHF_libJK')
 
 
+def test_SCF_scan(workspace):
+    exe_py(workspace, tdir, 'SCF_scan')
+
+
 def test_SORHF_iterative(workspace):
     exe_py(workspace, tdir, 'SORHF_iterative')
 
@@ -68,3 +72,298 @@ def test_SOUHF(workspace):
 
 def test_UHF_libJK(workspace):
     exe_py(workspace, tdir, 'UHF_libJK')
+
+
+def test_SAD_cache(tmpdir):
+    import os
+    import sys
+    import types
+    import numpy as np
+    import psi4
+    sys.path.insert(0, os.path.join(base_dir, tdir, 'SAD'))
+    import external
+
+    # The psithon-style API external.py is written against
+    api = types.SimpleNamespace(set_global_option=psi4.core.set_global_option,
+                                get_global_option=psi4.core.get_global_option,
+                                new_wavefunction=psi4.core.Wavefunction.build,
+                                MintsHelper=psi4.core.MintsHelper,
+                                Matrix=psi4.core.Matrix,
+                                IO=psi4.core.IO,
+                                IOManager=psi4.core.IOManager)
+    mol = psi4.geometry("""
+    O
+    H 1 1.1
+    H 1 1.1 2 104
+    symmetry c1
+    """)
+    cache_dir = str(tmpdir)
+
+    D_first = external.sad_guess(api, mol, 'sto-3g', psi4.geometry, cache_dir=cache_dir)
+    assert len(os.listdir(cache_dir)) == 2
+
+    # The second call must read both atomic densities from the cache
+    def no_sad(*args, **kwargs):
+        raise Exception('sad_guess recomputed a cached atomic density')
+
+    sad = external.sad
+    external.sad = no_sad
+    try:
+        D_second = external.sad_guess(api, mol, 'sto-3g', psi4.geometry, cache_dir=cache_dir)
+    finally:
+        external.sad = sad
+    assert np.allclose(D_first, D_second)
+
+
+def test_SOSCF_core_guess():
+    import os
+    import sys
+    import numpy as np
+    import psi4
+    sys.path.insert(0, os.path.join(base_dir, tdir))
+    from helper_JK import DenseJK
+    from helper_SOSCF import SOSCF, RHFHessian, UHFHessian, ROHFHessian
+
+    mol = psi4.geometry("""
+    O
+    H 1 1.1
+    H 1 1.1 2 104
+    symmetry c1
+    """)
+    psi4.set_options({'basis': 'cc-pvdz', 'scf_type': 'pk', 'e_convergence': 1e-10, 'd_convergence': 1e-10})
+    wfn = psi4.core.Wavefunction.build(mol, psi4.core.get_global_option('BASIS'))
+    mints = psi4.core.MintsHelper(wfn.basisset())
+    S = np.asarray(mints.ao_overlap())
+    H = np.asarray(mints.ao_kinetic()) + np.asarray(mints.ao_potential())
+    evals, evecs = np.linalg.eigh(S)
+    A = (evecs * evals**-0.5).dot(evecs.T)
+    jk = DenseJK.build(mints)
+    Enuc = mol.nuclear_repulsion_energy()
+
+    # Core guess, then second-order steps only, no DIIS or diagonalization
+    C_core = A.dot(np.linalg.eigh(A.dot(H).dot(A))[1])
+
+    def uhf(Ca, Cb, nalpha, nbeta):
+        (Ja, Jb), (Ka, Kb) = jk.compute([Ca[:, :nalpha], Cb[:, :nbeta]])
+        Fa = H + Ja + Jb - Ka
+        Fb = H + Ja + Jb - Kb
+        Da = Ca[:, :nalpha].dot(Ca[:, :nalpha].T)
+        Db = Cb[:, :nbeta].dot(Cb[:, :nbeta].T)
+        E = 0.5 * (np.vdot(Da + Db, H) + np.vdot(Da, Fa) + np.vdot(Db, Fb)) + Enuc
+        return E, Fa, Fb
+
+    def converge(reference, nalpha, nbeta):
+        soscf = SOSCF(max_micro=30, micro_conv=1.e-6)
+        Ca = Cb = C_core
+        energies = []
+        for SCF_ITER in range(50):
+            E, Fa, Fb = uhf(Ca, Cb, nalpha, nbeta)
+            if reference == 'RHF':
+                hessian = RHFHessian(jk, Ca, Fa, nalpha)
+            elif reference == 'ROHF':
+                hessian = ROHFHessian(jk, Ca, Fa, Fb, nbeta, nalpha)
+            else:
+                hessian = UHFHessian(jk, Ca, Cb, Fa, Fb, nalpha, nbeta)
+            if np.abs(hessian.gradient).max() < 1.e-7:
+                return E, energies
+            C = soscf.step(hessian, E)
+            if not soscf.rejected:
+                energies.append(E)
+            if reference == 'UHF':
+                Ca, Cb = C
+            else:
+                Ca = Cb = C
+        raise Exception('SO%s did not converge from a core guess' % reference)
+
+    # The trust region keeps every accepted step downhill
+    E_rhf, energies = converge('RHF', 5, 5)
+    assert np.all(np.diff(energies) < 1.e-10)
+    psi4.set_options({'reference': 'rhf'})
+    assert psi4.compare_values(psi4.energy('SCF'), E_rhf, 6, 'SORHF energy')
+
+    mol.set_molecular_charge(1)
+    mol.set_multiplicity(2)
+    E_uhf, energies = converge('UHF', 5, 4)
+    assert np.all(np.diff(energies) < 1.e-10)
+    psi4.set_options({'reference': 'uhf'})
+    assert psi4.compare_values(psi4.energy('SCF'), E_uhf, 6, 'SOUHF energy')
+
+    E_rohf, energies = converge('ROHF', 5, 4)
+    assert np.all(np.diff(energies) < 1.e-10)
+    psi4.set_options({'reference': 'rohf'})
+    assert psi4.compare_values(psi4.energy('SCF'), E_rohf, 6, 'SOROHF energy')
+
+
+def test_IncrementalJK():
+    import sys
+    import numpy as np
+    import psi4
+    sys.path.insert(0, os.path.join(base_dir, tdir))
+    from helper_JK import IncrementalJK
+
+    mol = psi4.geometry("""
+    O
+    H 1 1.1
+    H 1 1.1 2 104
+    symmetry c1
+    """)
+    psi4.set_options({'basis': 'cc-pvdz'})
+    wfn = psi4.core.Wavefunction.build(mol, psi4.core.get_global_option('BASIS'))
+    I = np.asarray(psi4.core.MintsHelper(wfn.basisset()).ao_eri())
+    nbf = I.shape[0]
+
+    # Densities that converge like an SCF, so later builds skip more pairs
+    rng = np.random.RandomState(0)
+    D = rng.rand(nbf, nbf)
+    D = D + D.T
+    jk = IncrementalJK(I, rebuild_every=4)
+    for step in range(8):
+        dD = rng.rand(nbf, nbf) * 10.0**(-step - 1)
+        D = D + dD + dD.T
+        J, K = jk.compute(D)
+        assert np.allclose(J, np.einsum('pqrs,rs->pq', I, D), atol=1.e-9)
+        assert np.allclose(K, np.einsum('prqs,rs->pq', I, D), atol=1.e-9)
+    assert [st['full'] for st in jk.stats] == [True, False, False, False] * 2
+
+
+def test_SymmetryJK():
+    import sys
+    import numpy as np
+    import psi4
+    sys.path.insert(0, os.path.join(base_dir, tdir))
+    from helper_HF import transform_aotoso, transform_sotoao
+    from helper_JK import PsiJK, SymmetryJK
+
+    mol = psi4.geometry("""
+    O
+    H 1 1.1
+    H 1 1.1 2 104
+    """)
+    psi4.set_options({'basis': 'cc-pvdz'})
+    wfn = psi4.core.Wavefunction.build(mol, psi4.core.get_global_option('BASIS'))
+    mints = psi4.core.MintsHelper(wfn.basisset())
+    transformers_ = [t for t in wfn.aotoso().to_array() if t.shape[1] > 0]
+
+    # Random symmetric densities, one per irrep
+    rng = np.random.RandomState(0)
+    D_ = [rng.rand(t.shape[1], t.shape[1]) for t in transformers_]
+    D_ = [D + D.T for D in D_]
+
+    J_, K_ = SymmetryJK.build(mints, wfn.basisset(), transformers_).compute(D_)
+
+    # Reference from the AO density, D = D_AO I^T
+    D_AO = transform_sotoao(D_, transformers_)
+    J, K = PsiJK.build(wfn.basisset(), scf_type='PK').compute(D_AO, np.eye(D_AO.shape[0]))
+    for J_h, K_h, J_ref, K_ref in zip(J_, K_, transform_aotoso(J, transformers_), transform_aotoso(K, transformers_)):
+        assert np.allclose(J_h, J_ref, atol=1.e-10)
+        assert np.allclose(K_h, K_ref, atol=1.e-10)
+
+
+def test_DFJK():
+    import sys
+    import numpy as np
+    import psi4
+    sys.path.insert(0, os.path.join(base_dir, tdir))
+    from helper_JK import DFJK, PsiJK
+
+    mol = psi4.geometry("""
+    O
+    H 1 1.1
+    H 1 1.1 2 104
+    symmetry c1
+    """)
+    psi4.set_options({'basis': 'cc-pvdz'})
+    wfn = psi4.core.Wavefunction.build(mol, psi4.core.get_global_option('BASIS'))
+    mints = psi4.core.MintsHelper(wfn.basisset())
+    nbf = wfn.basisset().nbf()
+
+    rng = np.random.RandomState(0)
+    Cl = rng.rand(nbf, 5) - 0.5
+    Cr = rng.rand(nbf, 5) - 0.5
+
+    J_ref, K_ref = PsiJK.build(wfn.basisset(), scf_type='DF').compute([Cl, Cl], [Cl, Cr])
+
+    jk = DFJK.build(wfn.basisset(), mints)
+
+    # One K block per occupied orbital with no memory left for K
+    for jk in [jk, DFJK(jk.Qpq, memory=0)]:
+        J, K = jk.compute([Cl, Cl], [Cl, Cr])
+        for Jn, Kn, Jr, Kr in zip(J, K, J_ref, K_ref):
+            assert np.allclose(Jn, Jr, atol=1.e-8)
+            assert np.allclose(Kn, Kr, atol=1.e-8)
+
+
+def test_DIIS_energy_models():
+    import sys
+    import numpy as np
+    import psi4
+    sys.path.insert(0, os.path.join(base_dir, tdir))
+    from helper_DIIS import DIIS
+    from helper_JK import DenseJK
+
+    mol = psi4.geometry("""
+    O
+    H 1 1.1
+    H 1 1.1 2 104
+    symmetry c1
+    """)
+    psi4.set_options({'basis': 'cc-pvdz', 'scf_type': 'pk', 'e_convergence': 1e-10, 'd_convergence': 1e-10})
+    wfn = psi4.core.Wavefunction.build(mol, psi4.core.get_global_option('BASIS'))
+    mints = psi4.core.MintsHelper(wfn.basisset())
+    S = np.asarray(mints.ao_overlap())
+    H = np.asarray(mints.ao_kinetic()) + np.asarray(mints.ao_potential())
+    evals, evecs = np.linalg.eigh(S)
+    A = (evecs * evals**-0.5).dot(evecs.T)
+    jk = DenseJK.build(mints)
+    Enuc = mol.nuclear_repulsion_energy()
+    ndocc = 5
+
+    def fock(D):
+        J, K = jk.compute(D, np.eye(D.shape[0]))
+        F = H + 2 * J - K
+        return F, np.vdot(F + H, D) + Enuc
+
+    def scf(mode):
+        diis = DIIS(6, mode=mode)
+        F = H
+        for SCF_ITER in range(100):
+            C = A.dot(np.linalg.eigh(A.dot(F).dot(A))[1])
+            D = C[:, :ndocc].dot(C[:, :ndocc].T)
+            F, E = fock(D)
+            diis_e = A.dot(F.dot(D).dot(S) - S.dot(D).dot(F)).dot(A)
+            if np.abs(diis_e).max() < 1.e-8:
+                return E, diis
+            diis.add(F, diis_e, density=D, energy=E)
+            F = diis.extrapolate()
+        raise Exception('%s did not converge' % mode)
+
+    # Every mode reaches the same SCF solution
+    E_diis = scf('diis')[0]
+    psi4.set_options({'reference': 'rhf'})
+    assert psi4.compare_values(psi4.energy('SCF'), E_diis, 6, 'DIIS energy')
+    for mode in ['ediis', 'adiis']:
+        assert psi4.compare_values(E_diis, scf(mode)[0], 8, mode.upper() + ' energy')
+
+    # Both models are exact for the RHF energy of D(c) = sum_i c_i D_i, so the
+    # coefficients must beat every stored state and any other point on the simplex
+    states = []
+    F = H
+    for SCF_ITER in range(5):
+        C = A.dot(np.linalg.eigh(A.dot(F).dot(A))[1])
+        D = C[:, :ndocc].dot(C[:, :ndocc].T)
+        F, E = fock(D)
+        states.append((F, D, E))
+
+    rng = np.random.RandomState(0)
+    trial = rng.rand(20, len(states))
+    trial /= trial.sum(axis=1, keepdims=True)
+    for mode in ['ediis', 'adiis']:
+        diis = DIIS(6, mode=mode)
+        for F, D, E in states:
+            diis.add(F, F, density=D, energy=E)
+        c = diis.energy_coefficients()
+        assert np.all(c >= 0) and np.isclose(c.sum(), 1.0)
+        E_c = fock(sum(ci * D for ci, (F, D, E) in zip(c, states)))[1]
+        assert E_c <= min(E for F, D, E in states) + 1.e-10
+        for t in trial:
+            assert E_c <= fock(sum(ti * D for ti, (F, D, E) in zip(t, states)))[1] + 1.e-10
@@ -27,3 +27,149 @@ def test_polar_cc(workspace):
 
 def test_optrot_cc(workspace):
     exe_py(workspace, tdir, 'Coupled-Cluster/RHF/optrot')
+
+
+def test_davidson_collapse():
+    import sys
+    import numpy as np
+    import psi4
+    sys.path.insert(0, os.path.join(base_dir, tdir, 'Self-Consistent-Field'))
+    from helper_CPHF import helper_CPHF
+
+    psi4.geometry("""
+    O
+    H 1 1.1
+    H 1 1.1 2 104
+    symmetry c1
+    """)
+    psi4.set_options({'basis': 'cc-pvdz', 'scf_type': 'pk', 'e_convergence': 1e-10, 'd_convergence': 1e-10})
+    cphf = helper_CPHF(psi4.core.get_active_molecule())
+    nov = cphf.nocc * cphf.nvir
+    nroot = 3
+
+    for triplet in (False, True):
+        # Full A + B and A - B from Hessian products with every unit vector
+        Ep, Em = cphf.hessian_products(np.eye(nov).reshape(nov, cphf.nocc, cphf.nvir), triplet=triplet)
+        Ep = Ep.reshape(nov, nov)
+        Em = Em.reshape(nov, nov)
+        ref_tda = np.linalg.eigvalsh(0.5 * (Ep + Em))[:nroot]
+        ref_rpa = np.sort(np.sqrt(np.linalg.eigvals(Em.dot(Ep)).real))[:nroot]
+
+        # A small subspace collapses several times before convergence
+        w_tda = cphf.solve_excitations(nroot, tda=True, triplet=triplet, conv=1.e-7, max_subspace=4 * nroot)
+        w_rpa = cphf.solve_excitations(nroot, triplet=triplet, conv=1.e-7, max_subspace=8 * nroot)
+        assert np.allclose(w_tda, ref_tda, atol=1.e-10)
+        assert np.allclose(w_rpa, ref_rpa, atol=1.e-10)
+
+
+def test_helper_beta():
+    import sys
+    import numpy as np
+    import psi4
+    sys.path.insert(0, os.path.join(base_dir, tdir, 'Self-Consistent-Field'))
+    from helper_CPHF import helper_CPHF, helper_beta
+
+    psi4.geometry("""
+    O
+    H 1 1.1
+    H 1 1.1 2 104
+    symmetry c1
+    """)
+    psi4.set_options({'basis': 'cc-pvdz', 'scf_type': 'pk', 'e_convergence': 1e-10, 'd_convergence': 1e-10})
+    mol = psi4.core.get_active_molecule()
+    krylov = helper_beta(helper_CPHF(mol), method='krylov')
+    direct = helper_beta(helper_CPHF(mol), method='direct')
+    f = 0.0773178
+
+    # The subspace responses against the inverted Hessian, static through -2w
+    for w1, w2 in [(0.0, 0.0), (f, f), (f, -f), (f, 0.0)]:
+        assert np.allclose(krylov.beta(w1, w2), direct.beta(w1, w2), atol=1.e-5)
+
+    # Static beta is symmetric in all indices, SHG in the two w indices
+    static = krylov.beta(0.0, 0.0)
+    assert np.allclose(static, static.transpose(1, 0, 2), atol=1.e-8)
+    assert np.allclose(static, static.transpose(0, 2, 1), atol=1.e-8)
+    shg = krylov.shg(f)
+    assert np.allclose(shg, shg.transpose(0, 2, 1), atol=1.e-8)
+
+    # Overall permutation symmetry, beta(0; w, -w)_abc = beta(-w; w, 0)_cba,
+    # checks the responses at -w derived from +w
+    assert np.allclose(krylov.optical_rectification(f), krylov.eope(f).transpose(2, 1, 0), atol=1.e-8)
+
+
+def _cc_response_setup():
+    """CCSD, Hbar, Lambda and the MO dipole integrals of water in STO-3G."""
+    import sys
+    import numpy as np
+    import psi4
+
+    # The CC helpers import the utils module of Coupled-Cluster/RHF, not this one
+    tests_utils = sys.modules.pop('utils')
+    try:
+        sys.path.insert(0, os.path.join(base_dir, 'Coupled-Cluster', 'RHF'))
+        sys.path.insert(0, os.path.join(base_dir, tdir, 'Coupled-Cluster', 'RHF'))
+        from helper_ccenergy import HelperCCEnergy
+        from helper_cchbar import HelperCCHbar
+        from helper_cclambda import HelperCCLambda
+        import helper_ccpert
+    finally:
+        sys.modules['utils'] = tests_utils
+
+    mol = psi4.geometry("""
+    O
+    H 1 1.1
+    H 1 1.1 2 104
+    symmetry c1
+    """)
+    psi4.set_options({'basis': 'sto-3g', 'scf_type': 'pk', 'e_convergence': 1e-10, 'd_convergence': 1e-10})
+    rhf_e, rhf_wfn = psi4.energy('SCF', return_wfn=True)
+    ccsd = HelperCCEnergy(mol, rhf_e, rhf_wfn)
+    ccsd.compute_energy(e_conv=1e-10, r_conv=1e-10)
+    cchbar = HelperCCHbar(ccsd)
+    cclambda = HelperCCLambda(ccsd, cchbar)
+    cclambda.compute_lambda(r_conv=1e-10)
+
+    dipole_array = ccsd.mints.ao_dipole()
+    names = ["MU_" + cart for cart in 'XYZ']
+    perts = [np.einsum('uj,vi,uv', ccsd.npC, ccsd.npC, np.asarray(dipole_array[i])) for i in range(3)]
+    return helper_ccpert, ccsd, cchbar, cclambda, names, perts
+
+
+def test_ccpert_batch():
+    import numpy as np
+    helper_ccpert, ccsd, cchbar, cclambda, names, perts = _cc_response_setup()
+    omegas = [0.0, 0.077357]
+
+    batch = helper_ccpert.HelperCCPertBatch(names, perts, ccsd, cchbar, cclambda, omegas)
+    batch.solve('right', r_conv=1e-10)
+    batch.solve('left', r_conv=1e-10)
+    tensor = batch.linresp()
+
+    # One HelperCCPert per perturbation and frequency
+    for w, omega in enumerate(omegas):
+        ccpert = []
+        for name, pert in zip(names, perts):
+            ccpert.append(helper_ccpert.HelperCCPert(name, pert, ccsd, cchbar, cclambda, omega))
+            ccpert[-1].solve('right', r_conv=1e-10)
+            ccpert[-1].solve('left', r_conv=1e-10)
+        for a in range(3):
+            for b in range(3):
+                ref = helper_ccpert.HelperCCLinresp(cclambda, ccpert[a], ccpert[b]).linresp()
+                assert np.allclose(tensor[a, b, w], ref, atol=1.e-8)
+
+
+def test_ccpert_krylov():
+    import numpy as np
+    helper_ccpert, ccsd, cchbar, cclambda, names, perts = _cc_response_setup()
+
+    diis = helper_ccpert.HelperCCPertBatch(names, perts, ccsd, cchbar, cclambda, [0.077357])
+    krylov = helper_ccpert.HelperCCPertBatch(names, perts, ccsd, cchbar, cclambda, [0.077357])
+    for omegas in ([0.077357], [0.0, 0.1]):
+        # The second frequencies start from the subspace of the first solve
+        diis.set_omegas(omegas)
+        krylov.set_omegas(omegas)
+        for hand in ('right', 'left'):
+            ref = diis.solve(hand, r_conv=1e-10, solver='diis')
+            pseudo = krylov.solve(hand, r_conv=1e-10, solver='krylov')
+            assert np.allclose(pseudo, ref, atol=1.e-8)
+        assert np.allclose(krylov.linresp(), diis.linresp(), atol=1.e-8)